@@ -0,0 +1,98 @@
+r"""
+Benchmark the solvers and transforms used by the 3D demos
+
+    python benchmark3D.py problem N family
+
+where problem is one of
+
+    poisson     - Helmholtz solver for one Dirichlet direction and two
+                  Fourier directions, as in dirichlet_poisson3D.py
+    biharmonic  - Biharmonic solver for one Dirichlet direction and two
+                  Fourier directions, as in biharmonic3D.py
+    poisson3    - Fast diagonalization solver for Dirichlet in all three
+                  directions, as in dirichlet_dirichlet_dirichlet_poisson3D.py
+
+and family is either legendre or chebyshev. The time of one solve and of a
+complete forward/backward transform are averaged over 10 repetitions and
+reported as the maximum over all processors, e.g.,
+
+    mpirun -np 4 python benchmark3D.py poisson 64 chebyshev
+
+The demos themselves are run as tests, and do not time anything.
+
+"""
+import sys
+import importlib
+from time import time
+import numpy as np
+from shenfun import inner, div, grad, TestFunction, TrialFunction, Array, \
+    Function, Basis, TensorProductSpace
+from shenfun.la import FastDiagonalization
+from mpi4py import MPI
+
+comm = MPI.COMM_WORLD
+
+assert len(sys.argv) in (1, 2, 3, 4)
+problem = sys.argv[1].lower() if len(sys.argv) > 1 else 'poisson'
+N = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+family = sys.argv[3].lower() if len(sys.argv) > 3 else 'chebyshev'
+assert problem in ('poisson', 'biharmonic', 'poisson3')
+assert family in ('legendre', 'chebyshev')
+base = importlib.import_module('.'.join(('shenfun', family)))
+
+if problem == 'poisson3':
+    T = TensorProductSpace(comm, [Basis(N+i, family, bc=(0, 0)) for i in range(3)])
+else:
+    SD = Basis(N, family, bc=(0, 0) if problem == 'poisson' else 'Biharmonic')
+    K1 = Basis(N+1, family='F', dtype='D')
+    K2 = Basis(N+2, family='F', dtype='d')
+    if problem == 'poisson':
+        T = TensorProductSpace(comm, (K1, K2, SD), axes=(0, 1, 2), slab=True)
+    else:
+        T = TensorProductSpace(comm, (K1, K2, SD), axes=(2, 0, 1))
+u = TrialFunction(T)
+v = TestFunction(T)
+
+# Left hand sides as in the demos, with the argument order of the solvers
+if problem == 'poisson3':
+    matrices = inner(v, -div(grad(u)))
+    matrices += inner(v, 2*u)
+    H = FastDiagonalization(T, matrices)
+    solve = H
+elif problem == 'poisson':
+    if family == 'chebyshev':
+        matrices = inner(v, div(grad(u)))
+    else:
+        matrices = inner(grad(v), grad(u))
+    H = base.la.Helmholtz(**matrices)
+    solve = lambda f, u: H(u, f)
+else:
+    if family == 'chebyshev':
+        matrices = inner(v, div(grad(div(grad(u)))))
+    else:
+        matrices = inner(div(grad(v)), div(grad(u)))
+    H = base.la.Biharmonic(**matrices)
+    solve = lambda f, u: H(u, f)
+
+fj = Array(T, buffer=np.random.random(T.forward.input_array.shape))
+f_hat = inner(v, fj)
+u_hat = Function(T)
+uq = Array(T)
+u_hat = solve(f_hat, u_hat)
+
+M = 10
+comm.barrier()
+t0 = time()
+for i in range(M):
+    u_hat = solve(f_hat, u_hat)
+t_solve = comm.reduce((time()-t0)/M, op=MPI.MAX)
+comm.barrier()
+t0 = time()
+for i in range(M):
+    uq = T.backward(u_hat, uq)
+    u_hat = T.forward(uq, u_hat)
+t_transform = comm.reduce((time()-t0)/M, op=MPI.MAX)
+if comm.Get_rank() == 0:
+    print('%s %s mesh %s on %d processors' % (problem, family, str(T.shape()), comm.Get_size()))
+    print('Solve              %2.4e s' % t_solve)
+    print('Forward + backward %2.4e s' % t_transform)
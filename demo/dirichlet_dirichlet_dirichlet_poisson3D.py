@@ -0,0 +1,81 @@
+r"""
+Solve Helmholtz equation in a 3D box with homogeneous Dirichlet boundary
+conditions
+
+    au - \nabla^2 u = f,
+
+Use Shen's Dirichlet basis in all three directions, with either the Legendre
+(default) or the Chebyshev family, e.g.,
+
+    python dirichlet_dirichlet_dirichlet_poisson3D.py 24 chebyshev
+
+The equation to solve is
+
+     a(u, v) - (\nabla^2 u, v)_w = (f, v)_w
+
+The problem is solved with the fast diagonalization solver, where the data
+are redistributed between pencils aligned in each direction in turn, such
+that the demo may be run with MPI, e.g.,
+
+    mpirun -np 4 python dirichlet_dirichlet_dirichlet_poisson3D.py 24
+
+"""
+import sys
+from sympy import symbols, cos, sin, lambdify
+import numpy as np
+from shenfun import inner, grad, TestFunction, TrialFunction, Function, Basis, \
+    TensorProductSpace, Array, div
+from shenfun.la import FastDiagonalization
+from mpi4py import MPI
+
+comm = MPI.COMM_WORLD
+
+assert len(sys.argv) in (1, 2, 3)
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+family = sys.argv[2].lower() if len(sys.argv) == 3 else 'legendre'
+assert family in ('legendre', 'chebyshev')
+
+# Use sympy to compute a rhs, given an analytical solution
+a = 2.
+x, y, z = symbols("x,y,z")
+ue = (cos(2*y)*sin(2*x)*cos(z))*(1-x**2)*(1-y**2)*(1-z**2)
+fe = a*ue - ue.diff(x, 2) - ue.diff(y, 2) - ue.diff(z, 2)
+
+# Lambdify for faster evaluation
+ul = lambdify((x, y, z), ue, 'numpy')
+fl = lambdify((x, y, z), fe, 'numpy')
+
+SD0 = Basis(N, family, bc=(0, 0))
+SD1 = Basis(N+1, family, bc=(0, 0))
+SD2 = Basis(N+2, family, bc=(0, 0))
+T = TensorProductSpace(comm, (SD0, SD1, SD2))
+X = T.local_mesh(True)
+u = TrialFunction(T)
+v = TestFunction(T)
+
+# Get f on quad points
+fj = Array(T, buffer=fl(*X))
+
+# Compute right hand side of Poisson equation
+f_hat = inner(v, fj)
+
+# Get left hand side of Poisson equation
+matrices = inner(v, -div(grad(u)))
+matrices += inner(v, a*u)
+
+# Create fast diagonalization solver
+H = FastDiagonalization(T, matrices)
+
+# Solve and transform to real space
+u_hat = Function(T)           # Solution spectral space
+u_hat = H(f_hat, u_hat)       # Solve
+
+uq = Array(T)
+uq = T.backward(u_hat, uq)
+
+# Compare with analytical solution
+uj = ul(*X)
+error = comm.reduce(abs(uj-uq).max(), op=MPI.MAX)
+if comm.Get_rank() == 0:
+    print('Error = %2.6e' % error)
+    assert error < 1e-8
@@ -3,19 +3,25 @@ Solve Helmholtz equation in 2D with homogeneous Dirichlet boundary conditions
 
     au - \nabla^2 u = f,
 
-Use Shen's Legendre Dirichlet basis
+Use Shen's Dirichlet basis in both directions, with either the Legendre
+(default) or the Chebyshev family, e.g.,
+
+    python dirichlet_dirichlet_poisson2D.py chebyshev
 
 The equation to solve is
 
-     a(u, v) + (\nabla u, \nabla v) = (f, v)
+     a(u, v) - (\nabla^2 u, v)_w = (f, v)_w
+
+The problem is solved with the fast diagonalization solver.
 
 """
 import os
-import importlib
+import sys
 from sympy import symbols, cos, sin, lambdify
 import numpy as np
 from shenfun import inner, grad, TestFunction, TrialFunction, Function, Basis, \
-    TensorProductSpace, Array
+    TensorProductSpace, Array, div
+from shenfun.la import FastDiagonalization
 from mpi4py import MPI
 try:
     import matplotlib.pyplot as plt
@@ -24,9 +30,8 @@ except ImportError:
 
 comm = MPI.COMM_WORLD
 
-basis = 'legendre'
-base = importlib.import_module('.'.join(('shenfun', basis)))
-Solver = base.la.Helmholtz_2dirichlet
+family = sys.argv[-1].lower() if len(sys.argv) == 2 else 'legendre'
+assert family in ('legendre', 'chebyshev')
 
 # Use sympy to compute a rhs, given an analytical solution
 a = 2.
@@ -41,8 +46,8 @@ fl = lambdify((x, y), fe, 'numpy')
 # Size of discretization
 N = (32, 34)
 
-SD0 = Basis(N[0], 'L', bc=(0, 0), scaled=True)
-SD1 = Basis(N[1], 'L', bc=(0, 0), scaled=True)
+SD0 = Basis(N[0], family, bc=(0, 0))
+SD1 = Basis(N[1], family, bc=(0, 0))
 T = TensorProductSpace(comm, (SD0, SD1))
 X = T.local_mesh(True)
 u = TrialFunction(T)
@@ -55,17 +60,15 @@ fj = Array(T, buffer=fl(*X))
 f_hat = inner(v, fj)
 
 # Get left hand side of Poisson equation
-matrices = inner(grad(v), grad(u))
+matrices = inner(v, -div(grad(u)))
 matrices += inner(v, a*u)
 
-# Create Helmholtz linear algebra solver
-H = Solver(T, matrices)
+# Create fast diagonalization solver
+H = FastDiagonalization(T, matrices)
 
 # Solve and transform to real space
 u_hat = Function(T)           # Solution spectral space
-#t0 = time()
-u_hat = H(u_hat, f_hat, 0)    # Solve
-#print('Time ', time()-t0)
+u_hat = H(f_hat, u_hat)       # Solve
 
 uq = Array(T)
 uq = T.backward(u_hat, uq)
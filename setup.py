@@ -2,7 +2,10 @@
 
 import os, sys
 from distutils.core import setup, Extension
+from distutils.errors import CompileError, LinkError
 import subprocess
+import tempfile
+import shutil
 from numpy import get_include
 from Cython.Distutils import build_ext
 from Cython.Build import cythonize
@@ -15,11 +18,31 @@ minor = 1
 cwd = os.path.abspath(os.path.dirname(__file__))
 cdir = os.path.join(cwd, "shenfun", "optimization")
 
+# Extensions with OpenMP parallel loops
+openmp_ext = ("shenfun.optimization.la",)
+
+def has_openmp(compiler):
+    """Return whether compiler can build and link a small OpenMP program"""
+    tmpdir = tempfile.mkdtemp()
+    src = os.path.join(tmpdir, 'test_openmp.c')
+    with open(src, 'w') as f:
+        f.write('#include <omp.h>\n'
+                'int main(void) { return omp_get_max_threads() > 0 ? 0 : 1; }\n')
+    try:
+        objs = compiler.compile([src], output_dir=tmpdir,
+                                extra_postargs=['-fopenmp'])
+        compiler.link_executable(objs, os.path.join(tmpdir, 'test_openmp'),
+                                 extra_postargs=['-fopenmp'])
+    except (CompileError, LinkError):
+        return False
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return True
+
 ext = None
 cmdclass = {}
 class build_ext_subclass(build_ext):
     def build_extensions(self):
-        #extra_compile_args = ['-w', '-Ofast', '-fopenmp', '-march=native']
         extra_compile_args = ['-w', '-Ofast', '-march=native']
         cmd = "echo | %s -E - %s &>/dev/null" % (
             self.compiler.compiler[0], " ".join(extra_compile_args))
@@ -27,9 +50,16 @@ class build_ext_subclass(build_ext):
             subprocess.check_call(cmd, shell=True)
         except:
             extra_compile_args = ['-w', '-O3', '-ffast-math', '-march=native']
-            #extra_compile_args = ['-w', '-O3', '-ffast-math', '-fopenmp', '-march=native']
+        openmp = False
+        if not os.environ.get('SHENFUN_DISABLE_OPENMP'):
+            openmp = has_openmp(self.compiler)
+            if not openmp:
+                print('OpenMP not available. Building serial solvers')
         for e in self.extensions:
             e.extra_compile_args += extra_compile_args
+            if openmp and e.name in openmp_ext:
+                e.extra_compile_args.append('-fopenmp')
+                e.extra_link_args.append('-fopenmp')
         build_ext.build_extensions(self)
 
 args = ""
@@ -44,7 +74,6 @@ if not "sdist" in sys.argv:
                                    sources=[os.path.join(cdir, '{0}.pyx'.format(s))],
                                    language="c++"))  # , define_macros=define_macros
     [e.extra_link_args.extend(["-std=c++11"]) for e in ext]
-    #[e.extra_link_args.extend(["-std=c++11", "-fopenmp"]) for e in ext]
 
     for s in ("Cheb", "convolve", "evaluate"):
         ext += cythonize(Extension("shenfun.optimization.{0}".format(s),
@@ -80,6 +109,7 @@ setup(name = "shenfun",
                   "shenfun.legendre",
                   "shenfun.chebyshev",
                   "shenfun.fourier",
+                  "shenfun.ultraspherical",
                   "shenfun.forms",
                   "shenfun.utilities"
                   ],
@@ -7,14 +7,17 @@ import numpy as np
 from . import chebyshev
 from . import legendre
 from . import fourier
+from . import ultraspherical
 from . import matrixbase
 from .fourier import energy_fourier
 from .matrixbase import *
 from .forms.project import *
 from .forms.inner import *
+from .forms.coefficient import *
 from .forms.operators import *
 from .forms.arguments import *
 from .tensorproductspace import *
+from .sparsegrid import *
 from .utilities import *
 from .utilities.integrators import *
 from .utilities.h5py_writer import *
@@ -212,6 +212,11 @@ class Basis(ChebyshevBase):
             ck = Cheb.derivative_coefficients(fk, ck)
         elif len(fk.shape) == 3:
             ck = Cheb.derivative_coefficients_3D(fk, ck)
+        else:
+            # Collapse all trailing axes, such that any dimension is supported
+            f3 = np.ascontiguousarray(fk).reshape((fk.shape[0], -1, 1))
+            c3 = np.zeros_like(f3)
+            ck[...] = Cheb.derivative_coefficients_3D(f3, c3).reshape(fk.shape)
         return ck
 
     def fast_derivative(self, fj):
@@ -3,7 +3,8 @@
 from copy import copy
 import numpy as np
 from shenfun.optimization import la, Matvec
-from shenfun.la import TDMA as la_TDMA
+from shenfun.la import TDMA as la_TDMA, IntegratedHelmholtz as \
+    la_IntegratedHelmholtz, collapse_axes, collapse_factors
 from shenfun.utilities import inheritdocstrings
 from . import bases
 
@@ -37,7 +38,8 @@ class TDMA(la_TDMA):
             la.TDMA_SymSolve(self.dd, self.ud, self.L, u)
 
         else:
-            raise NotImplementedError
+            la.TDMA_SymSolve3D(self.dd, self.ud, self.L,
+                               collapse_axes(u, axis)[0], 1)
 
         bc.apply_after(u, False)
 
@@ -45,7 +47,101 @@ class TDMA(la_TDMA):
         return u
 
 
-class Helmholtz(object):
+class _MixedPrecision(object):
+    """Mixin for banded solvers that may store their factors in single precision
+
+    The factors are computed in double precision and then stored in single
+    precision, halving the memory used by the factors. Double precision
+    accuracy is recovered with iterative refinement, where the residual is
+    computed in double precision with the matrices of the problem.
+
+    Note that single precision is an option for saving memory, not time.
+    Each refinement step costs a double precision residual, with one matrix
+    vector product for each matrix of the problem, and one more solve. A
+    solve is thus several times slower than with double precision factors.
+    The work arrays of the refinement are allocated on the first solve and
+    reused for right hand sides of the same shape.
+
+    Subclasses implement `_solve` for the factorized problem, `_residual`
+    for the double precision residual and `_batch_axis`, and set `N`, the
+    length of the data along the axis solved along.
+    """
+    _factors = ()
+
+    def _set_precision(self, precision, tol, maxiter):
+        assert precision in ('double', 'single')
+        self.precision = precision
+        self.tol = tol
+        self.maxiter = maxiter
+        self.refinement_steps = 0
+        self.residuals = []
+        self._work = {}
+        if precision == 'single':
+            for name in self._factors:
+                setattr(self, name, getattr(self, name).astype(np.float32))
+
+    def _check_shape(self, u, b):
+        """Assert that u and b fit the factorized problem
+
+        The Cython solvers do not check bounds, so data of wrong length, for
+        example with the axis solved along distributed, must not reach them.
+        """
+        assert u.shape == b.shape
+        axis = self._batch_axis(u)
+        assert 0 <= axis < u.ndim
+        assert u.shape[axis] == self.N, \
+            'Data of length %d along axis %d, expected %d. The axis solved along must not be distributed' %(u.shape[axis], axis, self.N)
+
+    def _work_arrays(self, u):
+        """Return work arrays r, du and w of the refinement, shaped like u
+
+        The arrays are overwritten before use, so they are not zeroed.
+        """
+        key = (u.shape, u.dtype.char)
+        if key not in self._work:
+            self._work.clear()
+            self._work[key] = (np.zeros_like(u), np.zeros_like(u), np.zeros_like(u))
+        return self._work[key]
+
+    @staticmethod
+    def _subtract_matvecs(u, b, r, w, axis, mats, scales):
+        """Return r = b - sum(scale*mat*u) for matrices along axis
+
+        The matrix vector products are computed on 3D views of u, such that
+        the banded Cython implementations of the matrices are used. The work
+        array w has the same shape as u.
+        """
+        u3, w3 = collapse_axes(u, axis, w)
+        r[...] = b
+        for mat, scale in zip(mats, scales):
+            mat._view(1.0).matvec(u3, w3, axis=1)
+            w *= scale
+            r -= w
+        return r
+
+    def _refine(self, u, b):
+        """Refine solution u of the problem with right hand side b"""
+        axis = self._batch_axis(u)
+        s = [slice(None)]*u.ndim
+        s[axis] = self._rows
+        s = tuple(s)
+        r, du, w = self._work_arrays(u)
+        bnorm = np.linalg.norm(b[s])
+        self.residuals = []
+        self.refinement_steps = 0
+        while True:
+            self._residual(u, b, r, w, axis)
+            self.residuals.append(np.linalg.norm(r[s]))
+            if (self.residuals[-1] <= self.tol*bnorm or
+                    self.refinement_steps == self.maxiter):
+                break
+            self._solve(du, r)
+            u[s] += du[s]
+            self.refinement_steps += 1
+        return u
+
+
+class Helmholtz(_MixedPrecision):
     r"""Helmholtz solver
 
     .. math::
@@ -86,6 +182,20 @@ class Helmholtz(object):
 
     where :math:`\alpha` and :math:`\beta` are avalable as A.scale and B.scale.
 
+    Further keyword arguments
+
+    Parameters
+    ----------
+        precision : str, optional
+                    'double' or 'single'. With 'single' the LU factors are
+                    stored in single precision and double precision accuracy
+                    is recovered with iterative refinement. This halves the
+                    memory of the factors, but makes each solve slower
+        tol : float, optional
+              Relative tolerance for the residual of the refinement
+        maxiter : int, optional
+                  Maximum number of refinement steps
+
     Attributes
     ----------
         axis : int
@@ -94,6 +204,10 @@ class Helmholtz(object):
                   Whether or not bases are Neumann
         bc : BoundaryValues
              For Dirichlet problem with inhomogeneous boundary values
+        refinement_steps : int
+                           Number of refinement steps used by the last solve
+        residuals : list
+                    Residual norms of the last solve, one per refinement step
 
     Variables are extracted from the matrices
 
@@ -154,7 +268,12 @@ class Helmholtz(object):
     :math:`(k^2+l^2)`. Note that :math:`k+l` is an array of shape (N, M, 1).
 
     """
+    _factors = ('u0', 'u1', 'u2', 'L')
+
     def __init__(self, *args, **kwargs):
+        precision = kwargs.pop('precision', 'double')
+        tol = kwargs.pop('tol', 1e-14)
+        maxiter = kwargs.pop('maxiter', 4)
 
         if 'ADDmat' in kwargs or 'ANNmat' in kwargs:
             if 'ADDmat' in kwargs:
@@ -217,6 +336,16 @@ class Helmholtz(object):
                 la.LU_Helmholtz_3D(A, B, A.axis, alfa, beta, neumann,
                                    self.u0, self.u1, self.u2, self.L)
 
+            else:
+                alfa, beta, u0, u1, u2, L = collapse_factors(
+                    A.axis, shape, alfa, beta, self.u0, self.u1, self.u2, self.L)
+                la.LU_Helmholtz_3D(A, B, 1, alfa, beta, neumann, u0, u1, u2, L)
+
+        # The Neumann solver leaves out the constant mode
+        self.N = A.shape[0]+2
+        self._rows = slice(int(neumann), A.shape[0])
+        self._set_precision(precision, tol, maxiter)
+
     def __call__(self, u, b):
         """Solve matrix problem
 
@@ -229,7 +358,10 @@ class Helmholtz(object):
                 Output array
 
         If b and u are multidimensional, then the axis over which to solve for is
-        determined on creation of the class.
+        determined on creation of the class. Leading axes of b and u that are
+        not part of the problem the class was created for, are treated as
+        batch axes. For example, all components of a vector may be solved for
+        in one call.
 
         """
 
@@ -246,7 +378,31 @@ class Helmholtz(object):
                 #s[self.axis] = slice(1, 2)
                 #b[s] -= np.pi/4*(self.bc[0] - self.bc[1])*self.beta[s0]
 
-        if np.ndim(u) == 3:
+        self._check_shape(u, b)
+        if self.precision == 'single' and np.shares_memory(u, b):
+            b = b.copy()
+
+        self._solve(u, b)
+
+        if self.precision == 'single':
+            self._refine(u, b)
+
+        if not self.neumann:
+            # Boundary values of 1D bases apply to the first axis
+            self.bc.apply_after(u if self.u0.ndim > 1 else np.moveaxis(u, -1, 0), True)
+
+        return u
+
+    def _solve(self, u, b):
+        """Solve factorized problem without boundary values"""
+        if np.ndim(u) > self.u0.ndim or np.ndim(u) > 3 or (
+                self.u0.dtype == np.float32 and np.ndim(u) < 3):
+            axis = self._batch_axis(u)
+            u3, b3, u0, u1, u2, L = collapse_axes(u, axis, b, self.u0, self.u1,
+                                                  self.u2, self.L)
+            la.Solve_Helmholtz_3D_ptr(1, b3, u3, self.neumann, u0, u1, u2, L)
+
+        elif np.ndim(u) == 3:
 
             #la.Solve_Helmholtz_3D(self.axis, b, u, self.neumann, self.u0, self.u1,
                                   #self.u2, self.L)
@@ -268,11 +424,15 @@ class Helmholtz(object):
 
         else:
             la.Solve_Helmholtz_1D(b, u, self.neumann, self.u0, self.u1, self.u2, self.L)
+        return u
 
-        if not self.neumann:
-            self.bc.apply_after(u, True)
+    def _batch_axis(self, u):
+        return self.axis + np.ndim(u) - self.u0.ndim
 
-        return u
+    def _residual(self, u, b, r, w, axis):
+        """Return r = b - (alfa A + beta B) u in double precision"""
+        return self._subtract_matvecs(u, b, r, w, axis, (self.A, self.B),
+                                      (self.alfa, self.beta))
 
     def matvec(self, v, c):
         """Matrix vector product c = dot(self, v)
@@ -296,7 +456,54 @@ class Helmholtz(object):
         return c
 
 
-class Biharmonic(object):
+@inheritdocstrings
+class IntegratedHelmholtz(la_IntegratedHelmholtz):
+    r"""Integration preconditioned Helmholtz solver for the Dirichlet basis
+
+    .. math::
+
+        \alpha u'' + \beta u = b
+
+    Solves the same problem as :class:`.Helmholtz`, where the stiffness
+    matrix is :math:`(\phi_j'', \phi_k)_w`, but through the twice
+    integrated equation, which is well-conditioned also for large N and
+    small :math:`\alpha/\beta`. See :class:`shenfun.la.IntegratedHelmholtz`.
+
+    Parameters
+    ----------
+        A : SpectralMatrix
+            Stiffness matrix (Dirichlet)
+        B : SpectralMatrix
+            Mass matrix (Dirichlet)
+        alfa : Numpy array
+        beta : Numpy array
+
+    or as a dict with keys
+
+    Parameters
+    ----------
+        ADDmat : A
+                 Stiffness matrix (Dirichlet basis)
+        BDDmat : B
+                 Mass matrix (Dirichlet basis)
+
+    """
+    basis = bases.ShenDirichletBasis
+    stiffness_sign = 1
+
+    def integration_matrix(self, N):
+        from .matrices import integration
+        return integration(N, 2)
+
+    def norm_squared(self, test):
+        from .matrices import get_ck
+        return np.pi/2*get_ck(test.N, test.quad)
+
+    def test_scaling(self, test):
+        return np.ones(test.N-2)
+
+
+class Biharmonic(_MixedPrecision):
     r"""Multidimensional Biharmonic solver for
 
     .. math::
@@ -337,10 +544,28 @@ class Biharmonic(object):
 
     where a0, alfa and beta must be avalable as S.scale, A.scale, B.scale.
 
+    Further keyword arguments
+
+    Parameters
+    ----------
+        precision : str, optional
+                    'double' or 'single'. With 'single' the LU factors are
+                    stored in single precision and double precision accuracy
+                    is recovered with iterative refinement. This halves the
+                    memory of the factors, but makes each solve slower
+        tol : float, optional
+              Relative tolerance for the residual of the refinement
+        maxiter : int, optional
+                  Maximum number of refinement steps
+
     Attributes
     ----------
         axis : int
                The axis over which to solve for
+        refinement_steps : int
+                           Number of refinement steps used by the last solve
+        residuals : list
+                    Residual norms of the last solve, one per refinement step
 
     Variables are extracted from the matrices
 
@@ -399,7 +624,12 @@ class Biharmonic(object):
     :math:`\beta` are :math:`-2(k^2+l^2)` and :math:`(k^2+l^2)^2`, respectively.
     Note that :math:`k+l` is an array of shape (N, M, 1).
     """
+    _factors = ('u0', 'u1', 'u2', 'l0', 'l1', 'ak', 'bk')
+
     def __init__(self, *args, **kwargs):
+        precision = kwargs.pop('precision', 'double')
+        tol = kwargs.pop('tol', 1e-14)
+        maxiter = kwargs.pop('maxiter', 4)
 
         if 'SBBmat' in kwargs:
             assert 'ABBmat' in kwargs and 'BBBmat' in kwargs
@@ -412,6 +642,8 @@ class Biharmonic(object):
         else:
             raise RuntimeError('Wrong input to Biharmonic solver')
 
+        self.S, self.A, self.B = S, A, B
+        self.scales = (a0, alfa, beta)
         self.a0 = a0
         sii, siu, siuu = S[0], S[2], S[4]
         ail, aii, aiu = A[-2], A[0], A[2]
@@ -451,7 +683,17 @@ class Biharmonic(object):
                 la.Biharmonic_factor_pr_2D(S.axis, self.ak, self.bk, self.l0,
                                            self.l1)
 
+            else:
+                args = collapse_factors(S.axis, shape, a0, alfa, beta, self.u0,
+                                        self.u1, self.u2, self.l0, self.l1,
+                                        self.ak, self.bk)
+                la.LU_Biharmonic_3D_n(1, *(args[:3]+[sii, siu, siuu, ail, aii,
+                                                     aiu, bill, bil, bii, biu,
+                                                     biuu]+args[3:8]))
+                la.Biharmonic_factor_pr_3D(1, *(args[-2:]+args[6:8]))
+
         else:
+            self.axis = 0
             self.u0 = np.zeros((2, M))
             self.u1 = np.zeros((2, M))
             self.u2 = np.zeros((2, M))
@@ -464,6 +706,11 @@ class Biharmonic(object):
                                 self.u2, self.l0, self.l1)
             la.Biharmonic_factor_pr(self.ak, self.bk, self.l0, self.l1)
 
+        self.N = S.shape[0]+4
+        self._rows = slice(0, S.shape[0])
+        self._collapsed = None
+        self._set_precision(precision, tol, maxiter)
+
     def __call__(self, u, b):
         """Solve matrix problem
 
@@ -476,11 +723,34 @@ class Biharmonic(object):
                 Output array
 
         If b and u are multidimensional, then the axis over which to solve for is
-        determined on creation of the class.
+        determined on creation of the class. Leading axes of b and u that are
+        not part of the problem the class was created for, are treated as
+        batch axes. For example, all components of a vector may be solved for
+        in one call.
 
         """
 
-        if np.ndim(u) == 3:
+        self._check_shape(u, b)
+        if self.precision == 'single' and np.shares_memory(u, b):
+            b = b.copy()
+
+        self._solve(u, b)
+
+        if self.precision == 'single':
+            self._refine(u, b)
+
+        return u
+
+    def _solve(self, u, b):
+        """Solve factorized problem"""
+        ndim = self.u0.ndim-1
+        if np.ndim(u) > ndim or np.ndim(u) > 3 or (
+                self.u0.dtype == np.float32 and np.ndim(u) < 3):
+            axis = self._batch_axis(u)
+            u3, b3 = collapse_axes(u, axis, b)
+            la.Solve_Biharmonic_3D_n(1, b3, u3, *self._collapsed_factors(u3))
+
+        elif np.ndim(u) == 3:
             la.Solve_Biharmonic_3D_n(self.axis, b, u, self.u0, self.u1,
                                      self.u2, self.l0, self.l1, self.ak,
                                      self.bk, self.a0)
@@ -496,6 +766,40 @@ class Biharmonic(object):
 
         return u
 
+    def _collapsed_factors(self, u3):
+        """Return factors and a0 collapsed to 3D (plus parity axis) for u3
+
+        The factors are repeated by the solver over batch axes, but must be
+        of full length along the last axis of the 3D view u3 of the data.
+        The collapsed factors are computed on the first solve and reused for
+        data of the same shape.
+        """
+        key = (u3.shape[2], self.u0.dtype.char)
+        if self._collapsed is None or self._collapsed[0] != key:
+            shape = self.u0.shape[1:]
+            before = int(np.prod(shape[:self.axis]))
+            after = int(np.prod(shape[self.axis+1:]))
+            s = (before, shape[self.axis], after)
+            factors = []
+            for f in (self.u0, self.u1, self.u2, self.l0, self.l1, self.ak,
+                      self.bk):
+                f = f.reshape((2,)+s)
+                factors.append(np.ascontiguousarray(np.broadcast_to(
+                    f, f.shape[:3]+(u3.shape[2],))))
+            a0 = np.broadcast_to(self.a0, shape).reshape(s)
+            factors.append(np.ascontiguousarray(np.broadcast_to(
+                a0, a0.shape[:2]+(u3.shape[2],))))
+            self._collapsed = (key, factors)
+        return self._collapsed[1]
+
+    def _batch_axis(self, u):
+        return self.axis + np.ndim(u) - self.u0.ndim + 1
+
+    def _residual(self, u, b, r, w, axis):
+        """Return r = b - (a0 S + alfa A + beta B) u in double precision"""
+        return self._subtract_matvecs(u, b, r, w, axis, (self.S, self.A, self.B),
+                                      self.scales)
+
     #def matvec(self, v, c):
         #N = v.shape[0]
         #c[:] = 0
@@ -577,6 +881,7 @@ class PDMA(object):
         shape = list(beta.shape)
 
         if len(shape) == 1:
+            self.axis = 0
             if self.solver == 'python':
                 H = self.alfa[0]*self.A + self.beta[0]*self.B
                 self.d[:] = H[0]
@@ -614,6 +919,11 @@ class PDMA(object):
                 la.LU_Helmholtz_Biharmonic_3D(A, B, A.axis, alfa, beta, self.l2,
                                               self.l1, self.d, self.u1, self.u2)
 
+            else:
+                args = collapse_factors(A.axis, shape, alfa, beta, self.l2,
+                                        self.l1, self.d, self.u1, self.u2)
+                la.LU_Helmholtz_Biharmonic_3D(A, B, 1, *args)
+
     @staticmethod
     def PDMA_LU(l2, l1, d, u1, u2): # pragma: no cover
         """LU decomposition of PDM (for testing only)"""
@@ -675,10 +985,19 @@ class PDMA(object):
                 Output array
 
         If b and u are multidimensional, then the axis over which to solve for is
-        determined on creation of the class.
+        determined on creation of the class. Leading axes of b and u that are
+        not part of the problem the class was created for, are treated as
+        batch axes. For example, all components of a vector may be solved for
+        in one call.
 
         """
-        if np.ndim(u) == 3:
+        if np.ndim(u) > self.d.ndim or np.ndim(u) > 3:
+            axis = self.axis + np.ndim(u) - self.d.ndim
+            u3, b3, l2, l1, d, u1, u2 = collapse_axes(u, axis, b, self.l2, self.l1,
+                                                      self.d, self.u1, self.u2)
+            la.Solve_Helmholtz_Biharmonic_3D_ptr(1, b3, u3, l2, l1, d, u1, u2)
+
+        elif np.ndim(u) == 3:
             la.Solve_Helmholtz_Biharmonic_3D_ptr(self.A.axis, b, u, self.l2,
                                                  self.l1, self.d, self.u1,
                                                  self.u2)
@@ -69,10 +69,12 @@ from __future__ import division
 #__all__ = ['mat']
 
 import numpy as np
+import scipy.sparse as sp
 from shenfun.optimization.Matvec import CDNmat_matvec, BDNmat_matvec, \
     CDDmat_matvec, SBBmat_matvec, SBBmat_matvec3D, Tridiagonal_matvec, \
     Tridiagonal_matvec3D, Pentadiagonal_matvec, Pentadiagonal_matvec3D, \
-    CBD_matvec3D, CBD_matvec, CDB_matvec3D, ADDmat_matvec, BBD_matvec3D
+    CBD_matvec3D, CBD_matvec, CDB_matvec3D, ADDmat_matvec, ADDmat_matvec3D, \
+    BBD_matvec3D
 
 from shenfun.matrixbase import SpectralMatrix
 from shenfun.utilities import inheritdocstrings
@@ -105,6 +107,36 @@ def get_ck(N, quad):
         ck[-1] = 2
     return ck
 
+def integration(N, k=1):
+    r"""Return sparse operator for k-fold integration of Chebyshev series
+
+    The operator maps the N coefficients of a Chebyshev series to the N+k
+    coefficients of its k'th antiderivative, using the recurrence
+
+    .. math::
+
+        \int T_n dx = \frac{T_{n+1}}{2(n+1)} - \frac{T_{n-1}}{2(n-1)}
+
+    The first k rows, that hold the constants of integration, are zero.
+
+    Parameters
+    ----------
+        N : int
+            Number of coefficients
+        k : int, optional
+            Number of integrations
+    """
+    Q = sp.identity(N, format='csr')
+    for n in range(N, N+k):
+        j = np.arange(1, n+1, dtype=float)
+        lower = 1./(2*j)
+        lower[0] = 1
+        upper = np.zeros(n-1)
+        upper[1:] = -1./(2*j[:n-2])
+        I = sp.diags([lower, upper], [-1, 1], shape=(n+1, n), format='csr')
+        Q = I*Q
+    return Q
+
 
 @inheritdocstrings
 class BDDmat(SpectralMatrix):
@@ -131,7 +163,9 @@ class BDDmat(SpectralMatrix):
              2: np.array([-np.pi/2])}
         d[-2] = d[2]
         SpectralMatrix.__init__(self, d, test, trial)
-        self.solve = TDMA(self)
+
+    def get_solver(self):
+        return TDMA(self)
 
     def matvec(self, v, c, format='cython', axis=0):
         N, M = self.shape
@@ -379,7 +413,9 @@ class BNNmat(SpectralMatrix):
              2: -np.pi/2*((k[2:]-2)/(k[2:]))**2}
         d[-2] = d[2]
         SpectralMatrix.__init__(self, d, test, trial)
-        self.solve = neumann_TDMA(self)
+
+    def get_solver(self):
+        return neumann_TDMA(self)
 
     def matvec(self, v, c, format='csr', axis=0):
         c = super(BNNmat, self).matvec(v, c, format=format, axis=axis)
@@ -490,7 +526,6 @@ class BBBmat(SpectralMatrix):
     def __init__(self, test, trial):
         assert isinstance(test[0], SB)
         assert isinstance(trial[0], SB)
-        from shenfun.la import PDMA
         N = test[0].N
         ck = get_ck(N, test[0].quad)
         k = np.arange(N-4, dtype=np.float)
@@ -500,7 +535,10 @@ class BBBmat(SpectralMatrix):
         d[-2] = d[2]
         d[-4] = d[4]
         SpectralMatrix.__init__(self, d, test, trial)
-        self.solve = PDMA(self)
+
+    def get_solver(self):
+        from shenfun.la import PDMA
+        return PDMA(self)
 
     def matvec(self, v, c, format='cython', axis=0):
         c.fill(0)
@@ -976,7 +1014,10 @@ class ADDmat(SpectralMatrix):
 
     def matvec(self, v, c, format='cython', axis=0):
         c.fill(0)
-        if format == 'cython' and v.ndim == 1:
+        if format == 'cython' and v.ndim == 3:
+            ADDmat_matvec3D(v, c, self[0], axis)
+            self.scale_array(c)
+        elif format == 'cython' and v.ndim == 1:
             ADDmat_matvec(v, c, self[0])
             self.scale_array(c)
         else:
@@ -1006,8 +1047,8 @@ class ADDmat(SpectralMatrix):
             se = 0.0
             so = 0.0
         else:
-            se = np.zeros(us.shape[1:])
-            so = np.zeros(us.shape[1:])
+            se = np.zeros(us.shape[1:], dtype=u.dtype)
+            so = np.zeros(us.shape[1:], dtype=u.dtype)
 
         d = self[0]
         d1 = self[2]
@@ -1090,8 +1131,8 @@ class ANNmat(SpectralMatrix):
             se = 0.0
             so = 0.0
         else:
-            se = np.zeros(u.shape[1:])
-            so = np.zeros(u.shape[1:])
+            se = np.zeros(u.shape[1:], dtype=u.dtype)
+            so = np.zeros(u.shape[1:], dtype=u.dtype)
             j2.repeat(np.prod(bs.shape[1:])).reshape(bs.shape)
         d = self[0]*j2
         d1 = self[2]*j2[2:]
@@ -5,7 +5,8 @@ __all__ = ('Expr', 'BasisFunction', 'TestFunction', 'TrialFunction', 'Function',
            'Array', 'Basis')
 
 def Basis(N, family='Fourier', bc=None, dtype='d', quad=None, domain=None,
-          scaled=None, plan=False, padding_factor=1.0, dealias_direct=False):
+          scaled=None, plan=False, padding_factor=1.0, dealias_direct=False,
+          alpha=0):
     """Return basis for one dimension
 
     Parameters
@@ -15,8 +16,8 @@ def Basis(N, family='Fourier', bc=None, dtype='d', quad=None, domain=None,
             Number of quadrature points
         family : str, optional
                  Choose one of (``Chebyshev``, ``C``, ``Legendre``, ``L``,
-                 ``Fourier``, ``F``), where ``C``, ``L`` and ``F`` are short-
-                 forms
+                 ``Fourier``, ``F``, ``Ultraspherical``, ``U``), where ``C``,
+                 ``L``, ``F`` and ``U`` are short-forms
         bc : str or two-tuple, optional
              Choose one of
 
@@ -39,6 +40,8 @@ def Basis(N, family='Fourier', bc=None, dtype='d', quad=None, domain=None,
 
                  - LG - Legendre-Gauss
                  - GL - Legendre-Gauss-Lobatto
+
+               * For family=Ultraspherical the Chebyshev quadratures
         domain : two-tuple of floats, optional
                  The computational domain
         scaled : bool
@@ -51,6 +54,10 @@ def Basis(N, family='Fourier', bc=None, dtype='d', quad=None, domain=None,
                          only for Fourier)
         dealias_direct : bool, optional
                          Use 2/3-rule dealiasing (only Fourier)
+        alpha : int, optional
+                Order of ultraspherical polynomials (only Ultraspherical).
+                Use alpha = 0 (Chebyshev) for trial bases, and alpha equal to
+                the highest derivative of the equation for test bases
 
     Examples
     --------
@@ -129,6 +136,13 @@ def Basis(N, family='Fourier', bc=None, dtype='d', quad=None, domain=None,
 
         return B(N, **par)
 
+    elif family.lower() in ('ultraspherical', 'u'):
+        from shenfun import ultraspherical
+        if quad is not None:
+            assert quad in ('GC', 'GL')
+            par['quad'] = quad
+        return ultraspherical.bases.Basis(N, alpha=alpha, bc=bc, **par)
+
     else:
         raise NotImplementedError
 
@@ -661,6 +675,51 @@ class Function(np.ndarray, BasisFunction):
         self.function_space().eval(x, self, output_array=output_array)
         return output_array
 
+    def refine(self, space, output_array=None):
+        """Return Function moved to space of higher resolution
+
+        The expansion coefficients are zero-padded in spectral space, see
+        :class:`.Regrid`
+
+        Parameters
+        ----------
+        space : :class:`.TensorProductSpace`
+            Space of the same type of bases and higher resolution
+        output_array : :class:`.Function`, optional
+            Return array
+        """
+        assert np.all(np.array(space.spectral_shape()) >=
+                      np.array(self.function_space().spectral_shape()))
+        return self._regrid(space, output_array)
+
+    def coarsen(self, space, output_array=None):
+        """Return Function moved to space of lower resolution
+
+        The expansion coefficients are truncated in spectral space, see
+        :class:`.Regrid`
+
+        Parameters
+        ----------
+        space : :class:`.TensorProductSpace`
+            Space of the same type of bases and lower resolution
+        output_array : :class:`.Function`, optional
+            Return array
+        """
+        assert np.all(np.array(space.spectral_shape()) <=
+                      np.array(self.function_space().spectral_shape()))
+        return self._regrid(space, output_array)
+
+    def _regrid(self, space, output_array=None):
+        from shenfun.tensorproductspace import Regrid
+        T = self.function_space()
+        if output_array is None:
+            output_array = Function(space)
+        if T.num_components() == 1:
+            return Regrid(T, space)(self, output_array)
+        for i in range(T.num_components()):
+            Regrid(T[i], space[i])(self[i], output_array[i])
+        return output_array
+
     def backward(self, output_array=None):
         """Return Function evaluated on quadrature mesh"""
         space = self.function_space()
@@ -0,0 +1,261 @@
+"""
+This module contains classes for forms with variable coefficients, that are
+computed pseudo-spectrally without assembling any matrices for the
+coefficients.
+"""
+import numpy as np
+from shenfun.fourier import FourierBase
+from shenfun.fourier.bases import C2CBasis
+from shenfun.spectralbase import SpectralBase
+from shenfun.matrixbase import LinearOperator
+from shenfun.tensorproductspace import TensorProductSpace
+from .arguments import Expr, BasisFunction, TrialFunction, Function, Array, \
+    Basis
+
+__all__ = ('VariableCoefficient', 'VariableCoefficientOperator')
+
+#pylint: disable=line-too-long
+
+def _orthogonal_base(base, padding_factor=1, plan=False):
+    """Return orthogonal basis using the same mesh as base"""
+    if isinstance(base, FourierBase):
+        dtype = 'D' if isinstance(base, C2CBasis) else 'd'
+        return Basis(base.N, 'F', dtype=dtype, domain=base.domain, plan=plan,
+                     padding_factor=padding_factor,
+                     dealias_direct=base.dealias_direct)
+    return Basis(base.N, base.family(), quad=base.quad, domain=base.domain,
+                 plan=plan)
+
+def _is_orthogonal(space):
+    bases = [space] if isinstance(space, SpectralBase) else space.bases
+    for base in bases:
+        if not isinstance(base, FourierBase) and not base.__class__.__name__ == 'Basis':
+            return False
+    return True
+
+
+class VariableCoefficient(object):
+    r"""Linear operator multiplied by a variable coefficient
+
+    Represents :math:`a(\boldsymbol{x}) \mathcal{L}u`, where :math:`a` is a
+    coefficient known on the quadrature mesh and :math:`\mathcal{L}u` is a
+    scalar Expr on a :class:`.TrialFunction` or a :class:`.Function`. The
+    VariableCoefficient is used as argument to :func:`.inner`, where the
+    weighted inner product with a test function is computed pseudo-spectrally:
+
+        1. Project :math:`\mathcal{L}u` to an orthogonal space
+        2. Transform backwards to the (possibly padded) quadrature mesh
+        3. Multiply pointwise with :math:`a`
+        4. Compute the scalar product with the test function
+
+    As such the dense matrix of the variable coefficient is never assembled,
+    and the cost of the linear form is dominated by the transforms.
+
+    Parameters
+    ----------
+        coefficient : array or callable
+            The coefficient evaluated on the local quadrature mesh of space.
+            A callable is evaluated once on the local mesh. The coefficient
+            is cached and may be updated with :meth:`set_coefficient`
+        expr : :class:`.Expr` or :class:`.BasisFunction`
+            Scalar expression on TrialFunction or Function
+        padding_factor : float, optional
+            Padding of the Fourier directions of the orthogonal space. Use,
+            e.g., 1.5 for a dealiased product
+        space : :class:`.TensorProductSpace` or 1D basis, optional
+            The orthogonal space used for the pointwise product. Defaults to
+            a space with the same bases and decomposition as the function
+            space of expr, but without boundary conditions
+
+    Example
+    -------
+    >>> import numpy as np
+    >>> from mpi4py import MPI
+    >>> from shenfun import Basis, TensorProductSpace, TestFunction, \
+    ...     Function, Dx, inner, VariableCoefficient
+    >>> SD = Basis(12, 'C', bc=(0, 0))
+    >>> K0 = Basis(8, 'F', dtype='d')
+    >>> T = TensorProductSpace(MPI.COMM_WORLD, (SD, K0))
+    >>> u = Function(T)
+    >>> a = VariableCoefficient(lambda x, y: 1+x**2, Dx(u, 0, 2))
+    >>> f = inner(TestFunction(T), a)
+
+    """
+    def __init__(self, coefficient, expr, padding_factor=1, space=None):
+        if isinstance(expr, BasisFunction):
+            expr = Expr(expr)
+        assert isinstance(expr, Expr)
+        assert expr.argument in (1, 2)
+        assert expr.expr_rank() == 1 and expr.rank() == 1, 'Only scalar expressions are implemented'
+        self._expr = expr
+
+        trialspace = expr.function_space()
+        if space is None:
+            if isinstance(trialspace, SpectralBase):
+                space = _orthogonal_base(trialspace, padding_factor, plan=True)
+            else:
+                bases = [_orthogonal_base(base, padding_factor) for base in trialspace.bases]
+                axes = [axis for axes in trialspace.axes for axis in axes]
+                space = TensorProductSpace(trialspace.subcomm, bases, axes=axes,
+                                           dtype=trialspace.dtype)
+        assert _is_orthogonal(space)
+        self.space = space
+
+        bases = [space] if isinstance(space, SpectralBase) else space.bases
+        self._padded = np.any([abs(base.padding_factor-1) > 1e-8 for base in bases])
+
+        self._coefficient = None
+        self._hat = Function(space)
+        self._work = Array(space)
+        self.set_coefficient(coefficient)
+
+    @property
+    def argument(self):
+        """Return argument of expression's basis"""
+        return self._expr.argument
+
+    def function_space(self):
+        """Return function space of expression"""
+        return self._expr.function_space()
+
+    def expr(self, uh=None):
+        """Return expression, optionally applied to Function uh"""
+        if uh is None:
+            return self._expr
+        return Expr(uh, self._expr.terms(), self._expr.scales(), self._expr.indices())
+
+    @property
+    def coefficient(self):
+        """Return cached coefficient on local quadrature mesh"""
+        return self._coefficient
+
+    def set_coefficient(self, coefficient):
+        """Evaluate and cache coefficient
+
+        Parameters
+        ----------
+            coefficient : array or callable
+                The coefficient on the local quadrature mesh of self.space,
+                or a callable of the mesh coordinates
+        """
+        if callable(coefficient):
+            space = self.space
+            if isinstance(space, SpectralBase):
+                X = [space.mesh(int(np.round(space.N*space.padding_factor)))]
+            else:
+                X = space.local_mesh(True)
+            coefficient = coefficient(*X)
+        coefficient = np.broadcast_to(coefficient, self._work.shape)
+        if self._coefficient is None:
+            self._coefficient = np.array(coefficient)
+        else:
+            self._coefficient[...] = coefficient
+
+    def mean(self):
+        """Return arithmetic mean of coefficient on the global mesh"""
+        space = self.space
+        if isinstance(space, SpectralBase):
+            return np.mean(self._coefficient)
+        s = np.sum(self._coefficient)
+        for comm in space.subcomm:
+            s = comm.allreduce(s)
+        return s/np.prod(space.shape())
+
+    def apply(self, test, uh=None, output_array=None):
+        r"""Return linear form :math:`(a \mathcal{L}u_h, v)_w`
+
+        Parameters
+        ----------
+            test : :class:`.Expr` or :class:`.TestFunction`
+                Expression on TestFunction
+            uh : :class:`.Function`, optional
+                Function to use instead of the one in the expression. Must be
+                given if expression is on a TrialFunction
+            output_array : :class:`.Function`, optional
+                Return array
+        """
+        from .project import project
+        from .inner import inner
+
+        expr = self.expr(uh)
+        assert expr.argument == 2
+        testspace = test.function_space()
+        if output_array is None:
+            output_array = Function(testspace)
+
+        self._hat = project(expr, self.space, output_array=self._hat)
+        self._work = self.space.backward(self._hat, self._work)
+        self._work *= self._coefficient
+
+        if not self._padded and isinstance(test, BasisFunction):
+            # Same quadrature mesh, so no need to transform back and forth
+            output_array = testspace.scalar_product(self._work, output_array)
+            return output_array
+
+        self._hat = self.space.forward(self._work, self._hat)
+        output_array = inner(test, self._hat, output_array=output_array)
+        return output_array
+
+    def preconditioner(self, test):
+        """Return banded approximation of bilinear form
+
+        The variable coefficient is replaced by its mean, such that the
+        returned operator is the constant coefficient form, which is banded
+        and may be solved directly, e.g., for preconditioning.
+
+        Parameters
+        ----------
+            test : :class:`.Expr` or :class:`.TestFunction`
+                Expression on TestFunction
+
+        Returns
+        -------
+            :class:`.LinearOperator`
+        """
+        from .inner import inner
+        trial = Expr(TrialFunction(self.function_space()), self._expr.terms(),
+                     self._expr.scales(), self._expr.indices())
+        A = inner(test, trial)
+        if isinstance(A, list):
+            raise NotImplementedError('Only one nonperiodic direction is implemented')
+        return LinearOperator(A)*self.mean()
+
+
+class VariableCoefficientOperator(object):
+    r"""Bilinear form with variable coefficient
+
+    Returned by :func:`.inner` for a test function and a
+    :class:`.VariableCoefficient` on a :class:`.TrialFunction`. The form is
+    never assembled, but applied pseudo-spectrally to Functions.
+
+    Parameters
+    ----------
+        test : :class:`.Expr` or :class:`.TestFunction`
+            Expression on TestFunction
+        trial : :class:`.VariableCoefficient`
+            Variable coefficient on TrialFunction
+    """
+    def __init__(self, test, trial):
+        assert isinstance(trial, VariableCoefficient)
+        assert test.argument == 0
+        self.test = test
+        self.trial = trial
+
+    def __call__(self, uh, output_array=None):
+        """Return linear form for Function uh
+
+        Parameters
+        ----------
+            uh : :class:`.Function`
+                Expansion coefficients in trial space
+            output_array : :class:`.Function`, optional
+                Return array
+        """
+        return self.trial.apply(self.test, uh, output_array)
+
+    def preconditioner(self):
+        """Return banded approximation of operator
+
+        See :meth:`.VariableCoefficient.preconditioner`
+        """
+        return self.trial.preconditioner(self.test)
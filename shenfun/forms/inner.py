@@ -3,16 +3,160 @@ This module contains the inner function that computes the
 weighted inner product.
 """
 import numpy as np
+import six
 from shenfun.fourier import FourierBase
 from shenfun.spectralbase import inner_product
 from shenfun.la import DiagonalMatrix
+from shenfun.matrixbase import LinearOperator
 from shenfun.tensorproductspace import MixedTensorProductSpace
+from shenfun.sparsegrid import SparseTensorProductSpace
 from .arguments import Expr, Function, BasisFunction, Array
+from .coefficient import VariableCoefficient, VariableCoefficientOperator
 
-__all__ = ('inner',)
+__all__ = ('inner', 'ExprOperator')
 
 #pylint: disable=line-too-long,inconsistent-return-statements,too-many-return-statements
 
+def _assemble(test, trial):
+    """Return matrices of bilinear form
+
+    Parameters
+    ----------
+        test : Expr
+            Expression on TestFunction
+        trial : Expr
+            Expression on TrialFunction or Function
+
+    Returns
+    -------
+        A : list
+            One list for each term of the form, with one 1D matrix for each
+            axis
+        S : list
+            One scalar scale for each term
+        B : list
+            One item for each term of the form. The item is an array of
+            scales if all matrices are diagonal. Otherwise it is a dictionary
+            with the nonperiodic matrices using the axis as key, and the
+            contracted diagonal matrices under key 'scale'
+
+    """
+    space = test.function_space()
+    trialspace = trial.function_space()
+    test_scale = test.scales()
+    trial_scale = trial.scales()
+
+    A = []
+    S = []
+    vec = 0
+    for base_test, base_trial in zip(test.terms(), trial.terms()): # vector/scalar
+        for test_j, b0 in enumerate(base_test):              # second index test
+            for trial_j, b1 in enumerate(base_trial):        # second index trial
+                sc = test_scale[vec, test_j]*trial_scale[vec, trial_j]
+                A.append([])
+                assert len(b0) == len(b1)
+                for i, (a, b) in enumerate(zip(b0, b1)): # Third index, one inner for each dimension
+                    ts = trialspace[i]
+                    if isinstance(trialspace, MixedTensorProductSpace): # trial could operate on a vector, e.g., div(u), where u is vector
+                        ts = ts[i]
+                    AA = inner_product((space[i], a), (ts, b))
+                    A[-1].append(AA)
+                    # Take care of domains of not standard size
+                    if not space[i].domain_factor() == 1:
+                        sc *= space[i].domain_factor()**(a+b)
+                S.append(np.array([sc]))
+
+        vec += 1
+
+    # At this point A contains all matrices of the form. The length of A is
+    # the number of inner products. For each index into A there are ndim 1D
+    # inner products along, e.g., x, y and z-directions, or just x, y for 2D.
+    # The ndim matrices are multiplied with each other, and diagonal matrices
+    # can be eliminated and put in a scale array for the non-diagonal matrices
+    # E.g. (v, div(grad(u))) in 2D
+    #
+    # Here A = [[(v[0], u[0]'')_x, (v[1], u[1])_y,
+    #            (v[0], u[0])_x, (v[1], u[1]'')_y ]]
+    #
+    # where v[0], v[1] are the test functions in x- and y-directions, respectively
+    # For example, v[0] could be a ShenDirichletBasis and v[1] could be a
+    # FourierBasis. Same for u.
+    #
+    # There are now two possibilities, either a linear or a bilinear form.
+    # A linear form has trial.argument == 2, whereas a bilinear form has
+    # trial.argument == 1. A linear form should assemble to an array and
+    # return this array. A bilinear form, on the other hand, should return
+    # matrices. Which matrices, and how many, will of course depend on the
+    # form and the number of terms.
+    #
+    # Considering again the tensor product space with ShenDirichlet and Fourier,
+    # the list A will contain matrices as shown above. If Fourier is associated
+    # with index 1, then (v[1], u[1])_y and (v[1], u[1]'')_y will be diagonal
+    # whereas (v[0], u[0]'')_x and (v[0], u[0])_x will in general not. These
+    # two matrices are usually termed the stiffness and mass matrices, and they
+    # have been implemented in chebyshev/matrices.py or legendre/matrices.py,
+    # where they are called ADDmat and BDDmat, respectively.
+    #
+    # The inner product will return a dictionary of a type constructed from the
+    # matrices in A. In this case:
+    #
+    # B = (v[0], u[0]'')_x
+    # B.scale = (v[1], u[1])_y[local_shape]
+    # B.axis = 0
+    # C = (v[0], u[0])_x
+    # C.scale = (v[1], u[1])_y[local_shape]
+    # C.axis = 0
+    # return {'ADDmat': B,
+    #         'BDDmat': C}
+    #
+    # where the name 'ADDmat' is obtained from B.get_key()
+    #
+    # where local_shape is used to indicate that we are only returning the local
+    # values of the scale arrays.
+
+    # Strip off diagonal matrices, put contribution in scale array
+    B = []
+    sparse = isinstance(space, SparseTensorProductSpace)
+    for sc, matrices in zip(S, A):
+        scale = sc.reshape((1,)*(1 if sparse else space.ndim()))
+        nonperiodic = {}
+        for axis, mat in enumerate(matrices):
+            if isinstance(space[axis], FourierBase):
+                mat = mat[0]    # get diagonal
+                if np.ndim(mat) and sparse:
+                    # Diagonal on the sparse set of wavenumbers
+                    k = space.wavenumbers()[axis].astype(int)
+                    mat = mat[k % space[axis].N]
+                elif np.ndim(mat):
+                    mat = space[axis].broadcast_to_ndims(mat, space.ndim(), axis)
+
+                scale = scale*mat
+
+            else:
+                mat.axis = axis
+                nonperiodic[axis] = mat
+
+        # Decomposition
+        if hasattr(space, 'local_slice') and not sparse:
+            s = scale.shape
+            ss = [slice(None)]*space.ndim()
+            ls = space.local_slice()
+            for axis, shape in enumerate(s):
+                if shape > 1:
+                    ss[axis] = ls[axis]
+            scale = (scale[ss]).copy()
+
+        if len(nonperiodic) == 0:
+            # All diagonal matrices
+            B.append(scale)
+
+        else:
+            nonperiodic['scale'] = scale
+            B.append(nonperiodic)
+
+    return A, S, B
+
+
 def inner(expr0, expr1, output_array=None):
     r"""
     Return weighted discrete inner product of linear or bilinear form
@@ -104,6 +248,11 @@ def inner(expr0, expr1, output_array=None):
     else:
         raise RuntimeError
 
+    if isinstance(trial, VariableCoefficient):
+        if trial.argument == 1:
+            return VariableCoefficientOperator(test, trial)
+        return trial.apply(test, output_array=output_array)
+
     if test.rank() == 2: # For vector spaces of rank 2 use recursive algorithm
         ndim = test.function_space().ndim()
 
@@ -144,8 +293,6 @@ def inner(expr0, expr1, output_array=None):
 
     space = test.function_space()
     trialspace = trial.function_space()
-    test_scale = test.scales()
-    trial_scale = trial.scales()
     trial_indices = trial.indices()
 
     uh = None
@@ -154,109 +301,11 @@ def inner(expr0, expr1, output_array=None):
 
     if output_array is None and trial.argument == 2:
         output_array = Function(trial.function_space())
+    elif trial.argument == 2:
+        # Terms are accumulated in output_array
+        output_array.fill(0)
 
-    A = []
-    S = []
-    vec = 0
-    for base_test, base_trial in zip(test.terms(), trial.terms()): # vector/scalar
-        for test_j, b0 in enumerate(base_test):              # second index test
-            for trial_j, b1 in enumerate(base_trial):        # second index trial
-                sc = test_scale[vec, test_j]*trial_scale[vec, trial_j]
-                A.append([])
-                assert len(b0) == len(b1)
-                for i, (a, b) in enumerate(zip(b0, b1)): # Third index, one inner for each dimension
-                    ts = trialspace[i]
-                    if isinstance(trialspace, MixedTensorProductSpace): # trial could operate on a vector, e.g., div(u), where u is vector
-                        ts = ts[i]
-                    AA = inner_product((space[i], a), (ts, b))
-                    A[-1].append(AA)
-                    # Take care of domains of not standard size
-                    if not space[i].domain_factor() == 1:
-                        sc *= space[i].domain_factor()**(a+b)
-                S.append(np.array([sc]))
-
-        vec += 1
-
-    # At this point A contains all matrices of the form. The length of A is
-    # the number of inner products. For each index into A there are ndim 1D
-    # inner products along, e.g., x, y and z-directions, or just x, y for 2D.
-    # The ndim matrices are multiplied with each other, and diagonal matrices
-    # can be eliminated and put in a scale array for the non-diagonal matrices
-    # E.g. (v, div(grad(u))) in 2D
-    #
-    # Here A = [[(v[0], u[0]'')_x, (v[1], u[1])_y,
-    #            (v[0], u[0])_x, (v[1], u[1]'')_y ]]
-    #
-    # where v[0], v[1] are the test functions in x- and y-directions, respectively
-    # For example, v[0] could be a ShenDirichletBasis and v[1] could be a
-    # FourierBasis. Same for u.
-    #
-    # There are now two possibilities, either a linear or a bilinear form.
-    # A linear form has trial.argument == 2, whereas a bilinear form has
-    # trial.argument == 1. A linear form should assemble to an array and
-    # return this array. A bilinear form, on the other hand, should return
-    # matrices. Which matrices, and how many, will of course depend on the
-    # form and the number of terms.
-    #
-    # Considering again the tensor product space with ShenDirichlet and Fourier,
-    # the list A will contain matrices as shown above. If Fourier is associated
-    # with index 1, then (v[1], u[1])_y and (v[1], u[1]'')_y will be diagonal
-    # whereas (v[0], u[0]'')_x and (v[0], u[0])_x will in general not. These
-    # two matrices are usually termed the stiffness and mass matrices, and they
-    # have been implemented in chebyshev/matrices.py or legendre/matrices.py,
-    # where they are called ADDmat and BDDmat, respectively.
-    #
-    # The inner product will return a dictionary of a type constructed from the
-    # matrices in A. In this case:
-    #
-    # B = (v[0], u[0]'')_x
-    # B.scale = (v[1], u[1])_y[local_shape]
-    # B.axis = 0
-    # C = (v[0], u[0])_x
-    # C.scale = (v[1], u[1])_y[local_shape]
-    # C.axis = 0
-    # return {'ADDmat': B,
-    #         'BDDmat': C}
-    #
-    # where the name 'ADDmat' is obtained from B.get_key()
-    #
-    # where local_shape is used to indicate that we are only returning the local
-    # values of the scale arrays.
-
-    # Strip off diagonal matrices, put contribution in scale array
-    B = []
-    for sc, matrices in zip(S, A):
-        scale = sc.reshape((1,)*space.ndim())
-        nonperiodic = {}
-        for axis, mat in enumerate(matrices):
-            if isinstance(space[axis], FourierBase):
-                mat = mat[0]    # get diagonal
-                if np.ndim(mat):
-                    mat = space[axis].broadcast_to_ndims(mat, space.ndim(), axis)
-
-                scale = scale*mat
-
-            else:
-                mat.axis = axis
-                nonperiodic[axis] = mat
-
-        # Decomposition
-        if hasattr(space, 'local_slice'):
-            s = scale.shape
-            ss = [slice(None)]*space.ndim()
-            ls = space.local_slice()
-            for axis, shape in enumerate(s):
-                if shape > 1:
-                    ss[axis] = ls[axis]
-            scale = (scale[ss]).copy()
-
-        if len(nonperiodic) is 0:
-            # All diagonal matrices
-            B.append(scale)
-
-        else:
-            nonperiodic['scale'] = scale
-            B.append(nonperiodic)
+    A, S, B = _assemble(test, trial)
 
     # At this point assembled matrices are in the B list. One item per term, same
     # as A. However, now the Fourier matrices have been contracted into the Numpy
@@ -350,53 +399,269 @@ def inner(expr0, expr1, output_array=None):
 
             return output_array
 
-    elif np.all([len(f) == 3 for f in B]):
-        # Two nonperiodic directions
+    elif np.all([len(f) > 2 for f in B]):
+        # Two or more nonperiodic directions
 
         if trial.argument == 1:  # bilinear form
             return B
 
         else: # linear form
             npaxes = [b for b in B[0].keys() if isinstance(b, int)]
+            steps, work = nonperiodic_steps(space.forward.output_pencil, npaxes,
+                                            output_array.dtype)
+            for i, bb in enumerate(B):
+                if uh.rank() == 2:
+                    wc = uh[trial_indices[0, i]]
+                else:
+                    wc = uh
 
-            pencilA = space.forward.output_pencil
-            subcomms = [c.Get_size() for c in pencilA.subcomm]
-            axis = pencilA.axis
-            assert subcomms[axis] == 1
-            npaxes.remove(axis)
-            second_axis = npaxes[0]
-            pencilB = pencilA.pencil(second_axis)
-            transAB = pencilA.transfer(pencilB, 'd')
+                # Apply the matrices along each non-periodic axis in turn
+                matvec = lambda axis, x, y, bb=bb: bb[axis].matvec(x, y, axis=axis)
+                wh = apply_along_axes(wc, steps, work, matvec)
+                output_array += wh*bb['scale']
 
-            # Output data is aligned in axis, but may be distributed in all other directions
+            return output_array
 
-            if uh.rank() == 2:
-                sp = uh.function_space()
-                wh = Function(sp[axis])
-                wc = Function(sp[axis])
+def nonperiodic_steps(pencil, axes, dtype):
+    """Return steps and work arrays for operating along several axes
 
-            else:
-                wh = Function(trialspace)
-                wc = Function(trialspace)
+    The data is aligned in each of the axes in turn, starting with the axis
+    the data of pencil is aligned in, using the pencil transfers of
+    mpi4py-fft. The work arrays are allocated once, and reused by
+    :func:`apply_along_axes`.
 
-            whB = np.zeros(transAB.subshapeB)
-            wcB = np.zeros(transAB.subshapeB)
+    Parameters
+    ----------
+        pencil : Pencil
+                 Pencil of the data, aligned in one of the axes
+        axes : sequence of ints
+               The axes to operate along
+        dtype : Numpy dtype
+                Type of data
 
-            for i, bb in enumerate(B):
-                if uh.rank() == 2:
-                    wc[:] = uh[trial_indices[0, i]]
-                else:
-                    wc[:] = uh
+    Returns
+    -------
+        steps : list of 2-tuples
+                (axis, transfer), where transfer is None for the first step
+        work : list of 2-tuples
+               Two work arrays for each step
+    """
+    axis = pencil.axis
+    assert axis in axes
+    assert pencil.subcomm[axis].Get_size() == 1
+    steps = [(axis, None)]
+    work = [(np.zeros(pencil.subshape, dtype=dtype),
+             np.zeros(pencil.subshape, dtype=dtype))]
+    for ax in axes:
+        if ax == axis:
+            continue
+        newpencil = pencil.pencil(ax)
+        transfer = pencil.transfer(newpencil, dtype)
+        steps.append((ax, transfer))
+        work.append((np.zeros(transfer.subshapeB, dtype=dtype),
+                     np.zeros(transfer.subshapeB, dtype=dtype)))
+        pencil = newpencil
+    return steps, work
+
+def apply_along_axes(x, steps, work, apply):
+    """Return result of operating along several axes of x
 
-                b = bb[axis]
-                wh = b.matvec(wc, wh, axis=axis)
+    Parameters
+    ----------
+        x : array
+            Input data, aligned like the first work array
+        steps : list of 2-tuples
+                (axis, transfer) as returned by :func:`nonperiodic_steps`
+        work : list of 2-tuples
+               Work arrays as returned by :func:`nonperiodic_steps`
+        apply : callable
+                apply(axis, x, y) computes the operation along axis on x
+                and stores the result in y
 
-                # align in second non-periodic axis
-                transAB.forward(wh, whB)
-                b = bb[second_axis]
-                wcB = b.matvec(whB, wcB, axis=second_axis)
-                transAB.backward(wcB, wh)
-                wh *= bb['scale']
-                output_array += wh
+    Returns
+    -------
+        array
+            One of the work arrays, aligned like x
+    """
+    work[0][0][...] = x
+    y = work[0][0]
+    for level, (axis, transfer) in enumerate(steps):
+        if transfer is not None:
+            transfer.forward(y, work[level][0])
+            y = work[level][0]
+        z = work[level][1] if y is work[level][0] else work[level][0]
+        apply(axis, y, z)
+        y = z
+    for level in range(len(steps)-1, 0, -1):
+        steps[level][1].backward(y, work[level-1][0])
+        y = work[level-1][0]
+    return y
+
+class ExprOperator(object):
+    r"""Matrix-free operator for a bilinear form
+
+    The operator computes the linear form ``inner(expr0, expr1)``, where
+    the TrialFunction of the bilinear form is replaced by a :class:`.Function`,
+    without assembling the form for each new Function. All matrices are
+    computed once on creation, and terms are merged such that a call to the
+    operator computes one (fused) banded matrix vector product for each
+    nonperiodic axis. For two nonperiodic axes, terms that share the matrix
+    of the second axis are summed before the data is redistributed, and all
+    work arrays and the redistribution object are preallocated.
 
+    Parameters
+    ----------
+    expr0, expr1 : :class:`.Expr` or :class:`.BasisFunction`
+        One expression on a :class:`.TestFunction` and one expression on a
+        :class:`.TrialFunction` or :class:`.Function`
+
+    Example
+    -------
+    >>> from shenfun import Basis, TestFunction, TrialFunction, Function, \
+    ...     div, grad, inner, ExprOperator
+    >>> SD = Basis(8, 'C', bc=(0, 0), plan=True)
+    >>> u = TrialFunction(SD)
+    >>> v = TestFunction(SD)
+    >>> L = ExprOperator(v, div(grad(u)))
+    >>> u_hat = Function(SD)
+    >>> u_hat[:-2] = np.random.random(6)
+    >>> np.allclose(L(u_hat), inner(v, div(grad(u_hat))))
+    True
+
+    """
+    def __init__(self, expr0, expr1):
+        assert np.all([hasattr(e, 'argument') for e in (expr0, expr1)])
+        if expr0.argument == 0:
+            test, trial = expr0, expr1
+        else:
+            test, trial = expr1, expr0
+        assert test.argument == 0 and trial.argument in (1, 2)
+
+        self.uh = trial.base if trial.argument == 2 else None
+        if test.rank() == 2:
+            ndim = test.function_space().ndim()
+            self.space = test.function_space()
+            self.operators = [ExprOperator(test[i], trial[i]) for i in range(ndim)]
+            return
+        self.operators = None
+
+        if isinstance(trial, BasisFunction):
+            trial = Expr(trial)
+        if isinstance(test, BasisFunction):
+            test = Expr(test)
+
+        self.space = space = test.function_space()
+        trial_indices = trial.indices()
+        vector = trial.rank() == 2
+        self._work = Function(space)
+        A, S, B = _assemble(test, trial)
+
+        # Group terms on the component of the trial function
+        if np.all([isinstance(b, np.ndarray) for b in B]):
+            self.nonperiodic = 0
+            self.groups = {}
+            for i, b in enumerate(B):
+                comp = trial_indices[0, i] if vector else None
+                d = np.broadcast_to(b, self._work.shape)
+                self.groups[comp] = self.groups[comp] + d if comp in self.groups else d.copy()
+
+        elif np.all([len(f) == 2 for f in B]):
+            self.nonperiodic = 1
+            groups = {}
+            for i, bb in enumerate(B):
+                comp = trial_indices[0, i] if vector else None
+                axis = [b for b in bb.keys() if isinstance(b, int)][0]
+                mat = bb[axis]._view(bb['scale'])
+                mat.axis = axis
+                groups.setdefault(comp, []).append(mat)
+            self.groups = {comp: LinearOperator(mats) for comp, mats in six.iteritems(groups)}
+
+        elif np.all([len(f) == 3 for f in B]):
+            self.nonperiodic = 2
+            npaxes = [b for b in B[0].keys() if isinstance(b, int)]
+            pencilA = space.forward.output_pencil
+            axis = pencilA.axis
+            assert pencilA.subcomm[axis].Get_size() == 1
+            npaxes.remove(axis)
+            self.second_axis = second_axis = npaxes[0]
+            pencilB = pencilA.pencil(second_axis)
+            self.transAB = pencilA.transfer(pencilB, self._work.dtype)
+            self._wB = np.zeros(self.transAB.subshapeB, dtype=self._work.dtype)
+            self._wcB = np.zeros_like(self._wB)
+            self._accB = np.zeros_like(self._wB)
+
+            # Terms that share the matrix along second axis are summed in the
+            # first layout, before the data is redistributed.
+            groups = {}
+            for i, bb in enumerate(B):
+                comp = trial_indices[0, i] if vector else None
+                mat0 = bb[axis]._view(bb['scale'])
+                mat0.axis = axis
+                mat1 = bb[second_axis]._view(1.0)
+                key = (comp, mat1.get_key(), mat1.shape)
+                if key not in groups:
+                    groups[key] = (mat1, [])
+                groups[key][1].append(mat0)
+            self.groups = [(key[0], mat1, LinearOperator(mats))
+                           for key, (mat1, mats) in six.iteritems(groups)]
+
+        else:
+            raise NotImplementedError
+
+    def __call__(self, uh=None, output_array=None):
+        """Return linear form computed with Function uh
+
+        Parameters
+        ----------
+            uh : Function, optional
+                 The Function replacing the TrialFunction. Defaults to the
+                 Function used on creation, if any.
+            output_array : Function, optional
+                           Return array
+        """
+        if uh is None:
+            uh = self.uh
+        assert uh is not None
+        if output_array is None:
+            output_array = Function(self.space)
+
+        if self.operators is not None:
+            for i, op in enumerate(self.operators):
+                output_array[i] = op(uh[i], output_array[i])
             return output_array
+
+        # The first group is computed directly into the result, and the
+        # remaining groups are added in place from the work arrays
+        work = self._work
+        if self.nonperiodic == 0:
+            for i, (comp, d) in enumerate(six.iteritems(self.groups)):
+                u = uh if comp is None else uh[comp]
+                if i == 0:
+                    np.multiply(d, u, out=output_array)
+                else:
+                    np.add(output_array, np.multiply(d, u, out=work), out=output_array)
+
+        elif self.nonperiodic == 1:
+            # LinearOperator.matvec uses one fused Cython kernel for all
+            # the terms of a group with array scales
+            for i, (comp, op) in enumerate(six.iteritems(self.groups)):
+                u = uh if comp is None else uh[comp]
+                if i == 0:
+                    op.matvec(u, output_array)
+                else:
+                    np.add(output_array, op.matvec(u, work), out=output_array)
+
+        else:
+            accB = self._accB
+            for i, (comp, mat1, op) in enumerate(self.groups):
+                u = uh if comp is None else uh[comp]
+                work = op.matvec(u, work)
+                self.transAB.forward(work, self._wB)
+                if i == 0:
+                    mat1.matvec(self._wB, accB, axis=self.second_axis)
+                else:
+                    np.add(accB, mat1.matvec(self._wB, self._wcB, axis=self.second_axis),
+                           out=accB)
+            self.transAB.backward(accB, output_array)
+
+        return output_array
@@ -1,7 +1,7 @@
 import numpy as np
 from shenfun.tensorproductspace import MixedTensorProductSpace
 from .arguments import Expr, TestFunction, TrialFunction, BasisFunction, Function
-from .inner import inner
+from .inner import inner, nonperiodic_steps, apply_along_axes
 
 __all__ = ('project',)
 
@@ -66,24 +66,12 @@ def project(uh, T, output_array=None):
     output_array = inner(v, uh, output_array=output_array)
     B = inner(v, u)
     if isinstance(B, list) and not isinstance(T, MixedTensorProductSpace):
-        # Means we have two non-periodic directions
+        # Means we have two or more non-periodic directions
         npaxes = [b for b in B[0].keys() if isinstance(b, int)]
-        assert len(npaxes) == 2
-
-        pencilA = T.forward.output_pencil
-        axis = pencilA.axis
-        npaxes.remove(axis)
-        second_axis = npaxes[0]
-        pencilB = pencilA.pencil(second_axis)
-        transAB = pencilA.transfer(pencilB, 'd')
-        output_arrayB = np.zeros(transAB.subshapeB)
-        output_arrayB2 = np.zeros(transAB.subshapeB)
-        b = B[0][axis]
-        output_array = b.solve(output_array, output_array, axis=axis)
-        transAB.forward(output_array, output_arrayB)
-        b = B[0][second_axis]
-        output_arrayB2 = b.solve(output_arrayB, output_arrayB2, axis=second_axis)
-        transAB.backward(output_arrayB2, output_array)
+        steps, work = nonperiodic_steps(T.forward.output_pencil, npaxes,
+                                        output_array.dtype)
+        solve = lambda axis, x, y: B[0][axis].solve(x, y, axis=axis)
+        output_array[...] = apply_along_axes(output_array, steps, work, solve)
 
     else:
         # Just zero or one non-periodic direction
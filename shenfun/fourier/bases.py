@@ -11,6 +11,34 @@ __all__ = ['FourierBase', 'R2CBasis', 'C2CBasis']
 
 #pylint: disable=method-hidden, no-member, line-too-long, arguments-differ
 
+def _irfftn(a, s=None, axes=None, overwrite_input=True, **kw):
+    """Return pyfftw.builders.irfftn, which always overwrites the input"""
+    # pylint: disable=unused-argument
+    return pyfftw.builders.irfftn(a, s=s, axes=axes, **kw)
+
+def _fourier_vandermonde(N):
+    """Return Vandermonde matrix of complex Fourier basis with N points"""
+    x = np.arange(N, dtype=np.float)*2*np.pi/N
+    k = np.fft.fftfreq(N, 1./N)
+    return np.exp(1j*x[:, np.newaxis]*k[np.newaxis, :])
+
+def _vandermonde_forward(array, axes):
+    """Return forward transforms of array along complex Fourier axes"""
+    for axis in axes:
+        N = array.shape[axis]
+        P = _fourier_vandermonde(N)
+        fc = np.moveaxis(array, axis, -1)
+        array = np.moveaxis(np.dot(fc, np.conj(P))/N, -1, axis)
+    return array
+
+def _vandermonde_backward(array, axes):
+    """Return backward transforms of array along complex Fourier axes"""
+    for axis in axes:
+        P = _fourier_vandermonde(array.shape[axis])
+        fc = np.moveaxis(array, axis, -1)
+        array = np.moveaxis(np.dot(fc, P.T), -1, axis)
+    return array
+
 @inheritdocstrings
 class FourierBase(SpectralBase):
     r"""Fourier base class
@@ -135,7 +163,7 @@ class FourierBase(SpectralBase):
         self.forward.xfftn()
         self._truncation_forward(self.forward.tmp_array,
                                  self.forward.output_array)
-        self.forward._output_array *= (1./self.N/self.padding_factor)
+        self.forward._output_array *= (1./self.transform_size())
 
         if output_array is not None:
             output_array[...] = self.forward.output_array
@@ -156,8 +184,23 @@ class FourierBase(SpectralBase):
         """
         return array
 
+    def transform_size(self):
+        """Return number of points of planned transform
+
+        Note
+        ----
+        The transform may be planned over several axes, see :meth:`plan`,
+        where the axes other than self.axis are complex Fourier axes
+        """
+        size = self.N*self.padding_factor
+        for axis in self.axes[:-1]:
+            size *= self.forward.input_array.shape[axis]
+        return size
+
     def evaluate_expansion_all(self, input_array, output_array, fast_transform=True):
         if fast_transform is False:
+            if len(self.axes) > 1:
+                input_array = _vandermonde_backward(input_array, self.axes[:-1])
             SpectralBase.evaluate_expansion_all(self, input_array, output_array, False)
         else:
             self.backward.xfftn(normalise_idft=False)
@@ -167,11 +210,13 @@ class FourierBase(SpectralBase):
             self.vandermonde_scalar_product(input_array, output_array)
             return
         output = self.scalar_product.xfftn()
-        output *= (1./self.N/self.padding_factor)
+        output *= (1./self.transform_size())
 
     def vandermonde_scalar_product(self, input_array, output_array):
         SpectralBase.vandermonde_scalar_product(self, input_array, output_array)
         output_array *= 0.5/np.pi
+        if len(self.axes) > 1:
+            output_array[...] = _vandermonde_forward(output_array, self.axes[:-1])
 
     def reference_domain(self):
         return (0., 2*np.pi)
@@ -185,8 +230,8 @@ class R2CBasis(FourierBase):
                  dealias_direct=False):
         FourierBase.__init__(self, N, padding_factor, domain, dealias_direct)
         self.N = N
-        self._xfftn_fwd = pyfftw.builders.rfft
-        self._xfftn_bck = pyfftw.builders.irfft
+        self._xfftn_fwd = pyfftw.builders.rfftn
+        self._xfftn_bck = _irfftn
         if plan:
             self.plan((int(np.floor(padding_factor*N)),), 0, np.float, {})
 
@@ -446,8 +491,8 @@ class C2CBasis(FourierBase):
                  dealias_direct=False):
         FourierBase.__init__(self, N, padding_factor, domain, dealias_direct)
         self.N = N
-        self._xfftn_fwd = pyfftw.builders.fft
-        self._xfftn_bck = pyfftw.builders.ifft
+        self._xfftn_fwd = pyfftw.builders.fftn
+        self._xfftn_bck = pyfftw.builders.ifftn
         if plan:
             self.plan((int(np.floor(padding_factor*N)),), 0, np.complex, {})
 
@@ -1,11 +1,121 @@
 r"""
 This module contains linear algebra solvers for SparseMatrixes
 """
+import hashlib
+from collections import OrderedDict
+from time import time
 import numpy as np
+import six
 from scipy.linalg import decomp_cholesky
 from scipy.sparse.linalg import spsolve
 from shenfun.optimization import la as cython_la
-from shenfun.matrixbase import SparseMatrix
+from shenfun.matrixbase import SparseMatrix, LinearOperator
+
+def collapse_axes(u, axis, *factors):
+    """Return 3D views of arrays for solving along one axis
+
+    All axes of u before axis are collapsed into the first, and all axes
+    after axis are collapsed into the last axis of the returned views. The
+    3D solvers may then be used along the middle axis for arrays of any
+    dimension, traversing all lines with one flat loop.
+
+    Parameters
+    ----------
+        u : array
+            C-contiguous array of any dimension
+        axis : int
+            The axis of u to solve along
+        factors : arrays, optional
+            Arrays, like the factorized matrices of a solver, aligned with
+            the trailing axes of u. Along axis the length may differ. Along
+            the other axes the factors must match u or be of length one.
+            Leading axes of u not covered by the factors are batch axes,
+            over which the factors are repeated without copying.
+            One-dimensional factors are used for all lines.
+
+    Returns
+    -------
+        list of 3D arrays, starting with u
+
+    Note
+    ----
+    The 3D solvers use the same stride along axis for all arrays, so factors
+    that are of length one after axis are broadcasted to a contiguous copy.
+    """
+    assert u.flags['C_CONTIGUOUS']
+    def _collapse(a, ax):
+        shape = a.shape
+        return np.asarray(a).reshape((int(np.prod(shape[:ax])), shape[ax],
+                                      int(np.prod(shape[ax+1:]))))
+
+    u3 = _collapse(u, axis)
+    arrays = [u3]
+    for f in factors:
+        if f.ndim == 1:
+            f3 = f.reshape((1, f.shape[0], 1))
+        else:
+            d = u.ndim - f.ndim
+            assert 0 <= d <= axis
+            for fs, us in ((f.shape[:axis-d], u.shape[d:axis]),
+                           (f.shape[axis-d+1:], u.shape[axis+1:])):
+                assert fs == us or np.prod(fs) == 1
+            f3 = _collapse(f, axis-d)
+        if f3.shape[2] != u3.shape[2]:
+            f3 = np.broadcast_to(f3, f3.shape[:2]+u3.shape[2:])
+        arrays.append(np.ascontiguousarray(f3))
+    return arrays
+
+def collapse_factors(axis, shape, *arrays):
+    """Return 3D arrays for factorizing along one axis
+
+    The factorizations of the 3D solvers are used for arrays of any dimension
+    by collapsing all axes before axis into the first, and all axes after
+    axis into the last axis.
+
+    Parameters
+    ----------
+        axis : int
+            The axis to factorize along
+        shape : sequence of ints
+            Shape of the data, except along axis
+        arrays : arrays
+            Scales and factors. Arrays that are not C-contiguous of the
+            given shape, except along axis, are broadcasted to a copy.
+            Leading axes not in shape, like the parity axis of the
+            Biharmonic factors, are kept. The returned arrays are views,
+            such that factors are filled in place.
+
+    Returns
+    -------
+        list of arrays, collapsed to 3D (plus leading axes)
+    """
+    ndim = len(shape)
+    before = int(np.prod(shape[:axis]))
+    after = int(np.prod(shape[axis+1:]))
+    out = []
+    for a in arrays:
+        a = np.asarray(a)
+        lead = a.shape[:a.ndim-ndim] if a.ndim > ndim else ()
+        s = list(shape)
+        s[axis] = a.shape[-ndim+axis] if a.ndim >= ndim else 1
+        full = lead + tuple(s)
+        if a.shape != full or not a.flags['C_CONTIGUOUS']:
+            a = np.ascontiguousarray(np.broadcast_to(a, full))
+        out.append(a.reshape(lead + (before, full[-ndim+axis], after)))
+    return out
+
+def _spsolve(A, b):
+    """Return solution of sparse real system A x = b
+
+    A complex b is viewed as a real array with twice the number of columns,
+    such that real and imaginary parts are solved for in one pass, using only
+    one factorization of A.
+    """
+    if np.iscomplexobj(b) and not np.iscomplexobj(A.data):
+        br = np.ascontiguousarray(b).reshape((b.shape[0], -1))
+        x = spsolve(A, br.view(b.real.dtype)).reshape((b.shape[0], -1))
+        return np.ascontiguousarray(x).view(b.dtype).reshape(b.shape)
+    return spsolve(A, b)
 
 class TDMA(object):
     """Tridiagonal matrix solver
@@ -46,7 +156,8 @@ class TDMA(object):
             u : array, optional
                 Output array
             axis : int, optional
-                   The axis over which to solve for if b and u are multidimensional
+                   The axis over which to solve for if b and u are multidimensional.
+                   Arrays of any dimension are supported
 
         If u is not provided, then b is overwritten with the solution and returned
         """
@@ -71,7 +182,8 @@ class TDMA(object):
             cython_la.TDMA_SymSolve(self.dd, self.ud, self.L, u)
 
         else:
-            raise NotImplementedError
+            cython_la.TDMA_SymSolve3D(self.dd, self.ud, self.L,
+                                      collapse_axes(u, axis)[0], 1)
 
         u /= self.mat.scale
         return u
@@ -185,7 +297,8 @@ class PDMA(object):
             u : array, optional
                 Output array
             axis : int, optional
-                   The axis over which to solve for if b and u are multidimensional
+                   The axis over which to solve for if b and u are multidimensional.
+                   Arrays of any dimension are supported
 
         If u is not provided, then b is overwritten with the solution and returned
         """
@@ -210,11 +323,254 @@ class PDMA(object):
             cython_la.PDMA_Symsolve(self.d0, self.d1, self.d2, u[:-4])
 
         else:
-            raise NotImplementedError
+            cython_la.PDMA_Symsolve3D_ptr(self.d0, self.d1, self.d2,
+                                          collapse_axes(u, axis)[0], 1)
 
         u /= self.mat.scale
         return u
 
+class IntegratedHelmholtz(object):
+    r"""Integration preconditioned Helmholtz solver for Dirichlet bases
+
+    Solves the same Galerkin problem as the Helmholtz solvers of the
+    Chebyshev and Legendre families, that is
+
+    .. math::
+
+        (\alpha A + \beta B) \hat{u} = b
+
+    where A and B are the stiffness and mass matrices of a Shen Dirichlet
+    basis, but the differential equation is integrated twice before solving.
+
+    The Galerkin system is equivalent to a tau method for the orthogonal
+    coefficients v of u
+
+    .. math::
+
+        c v'' + \beta v = g + \tau_0 \psi_0 + \tau_1 \psi_1
+
+    where c is :math:`\pm \alpha`, g is recovered from b with a recurrence,
+    and :math:`\psi_0` and :math:`\psi_1` are even and odd polynomials that
+    are orthogonal to all test functions. Applying the sparse double
+    integration operator :math:`\mathcal{Q}` of the orthogonal basis gives
+
+    .. math::
+
+        c v_k + \beta (\mathcal{Q} v)_k = (\mathcal{Q} g)_k + \tau_0
+        (\mathcal{Q} \psi_0)_k + \tau_1 (\mathcal{Q} \psi_1)_k, \quad k \ge 2
+
+    which is a tridiagonal system with the identity on the diagonal, bordered
+    by the two boundary rows and the two columns of the tau terms. The
+    condition number is bounded independent of N, whereas the condition
+    number of the stiffness matrix grows like :math:`N^4` (Chebyshev) or
+    :math:`N^2` (Legendre). The tridiagonal system is symmetrized with a
+    diagonal scaling and solved with the symmetric tridiagonal Cython
+    kernels, and the borders are eliminated with precomputed Schur
+    complements, such that the solve is O(N).
+
+    The family specific parts are provided by subclasses
+
+        - basis - The Dirichlet basis class
+        - stiffness_sign - Sign c/alpha of the stiffness matrix
+        - integration_matrix(N) - Sparse double integration operator
+        - norm_squared(test) - Squared norms of the orthogonal basis
+        - test_scaling(test) - Scaling of the test functions
+
+    Parameters
+    ----------
+        A : SpectralMatrix
+            Stiffness matrix (Dirichlet)
+        B : SpectralMatrix
+            Mass matrix (Dirichlet)
+        alfa : Numpy array
+        beta : Numpy array
+
+    or as a dict with keys
+
+    Parameters
+    ----------
+        ADDmat : A
+                 Stiffness matrix (Dirichlet basis)
+        BDDmat : B
+                 Mass matrix (Dirichlet basis)
+
+    where :math:`\alpha` and :math:`\beta` are avalable as A.scale and B.scale.
+    :math:`\alpha` must be nonzero.
+
+    """
+    basis = None
+    stiffness_sign = 1
+
+    def __init__(self, *args, **kwargs):
+        if 'ADDmat' in kwargs:
+            assert 'BDDmat' in kwargs
+            A, B = kwargs['ADDmat'], kwargs['BDDmat']
+            alfa, beta = A.scale, B.scale
+
+        elif len(args) == 4:
+            A, B, alfa, beta = args
+
+        else:
+            raise RuntimeError('Wrong input to IntegratedHelmholtz solver')
+
+        test = A.testfunction[0]
+        assert isinstance(test, self.basis)
+        self.bc = test.bc
+        N = self.N = A.shape[0]+2
+        assert N > 5
+        c = self.stiffness_sign*np.asarray(alfa, dtype=float)
+        beta = np.asarray(beta, dtype=float)
+        assert np.all(c != 0)
+        ndim = max(np.ndim(c), np.ndim(beta), 1)
+        self.axis = A.axis if ndim > 1 else 0
+        c = np.moveaxis(c.reshape((1,)*(ndim-c.ndim)+c.shape), self.axis, 0)
+        beta = np.moveaxis(beta.reshape((1,)*(ndim-beta.ndim)+beta.shape), self.axis, 0)
+        shape = np.broadcast(c, beta).shape[1:]
+        self.c = np.broadcast_to(c, (1,)+shape)
+        scale = np.broadcast_to(beta/c, (1,)+shape)
+
+        self.h = self.norm_squared(test)
+        self.s = self.test_scaling(test)
+        Q = self.Q = self.integration_matrix(N)[2:].tocsr()
+        L, D, U = Q.diagonal(0), Q.diagonal(2), Q.diagonal(4)
+        self.Ld = L
+
+        # Diagonal scaling w that symmetrizes the tridiagonal part
+        ratio = np.sqrt(U/L[2:N-2])
+        self.w = np.ones(N-2)
+        self.w[2::2] = np.cumprod(ratio[0::2])
+        self.w[3::2] = np.cumprod(ratio[1::2])
+        off = np.sqrt(L[2:N-2]*U)
+
+        if len(shape) == 0:
+            self.d0 = 1 + scale[0]*D
+            self.d1 = scale[0]*off
+            self.L = np.zeros_like(self.d1)
+            cython_la.TDMA_SymLU(self.d0, self.d1, self.L)
+
+        else:
+            B_scale = np.moveaxis(scale, 0, self.axis).copy()
+            fshape = list(B_scale.shape)
+            fshape[self.axis] = N-2
+            self.d0 = np.zeros(fshape)
+            fshape[self.axis] = N-4
+            self.d1 = np.zeros(fshape)
+            self.L = np.zeros(fshape)
+            if len(shape) == 1:
+                cython_la.TDMA_SymLU_2D({0: np.ones(N-2)}, {0: D, 2: off}, self.axis,
+                                        1.0, B_scale, self.d0, self.d1, self.L)
+            else:
+                axis = self.axis if len(shape) == 2 else 1
+                args = [B_scale, self.d0, self.d1, self.L]
+                if len(shape) > 2:
+                    args = collapse_factors(self.axis, fshape, *args)
+                cython_la.TDMA_SymLU_3D({0: np.ones(N-2)}, {0: D, 2: off}, axis,
+                                        1.0, *args)
+
+        # Solutions for the columns of the first coefficients and the tau terms
+        self.q = Q.dot(1./self.h)
+        E0 = np.zeros((N-2,)+shape)
+        E0[:2] = scale*L[:2].reshape((2,)+(1,)*len(shape))
+        self.Y0 = self._tdma(E0)
+        Et = -np.broadcast_to(self.q[:N-2].reshape((N-2,)+(1,)*len(shape)), E0.shape)
+        self.Yt = self._tdma(Et)
+
+        # Inverse Schur complements for (v_p, tau_p) of parity p
+        self.S = {}
+        for k in (N, N+1):
+            p = k % 2
+            a = scale[0]*L[k-2]
+            s00 = -a*self.Y0[k-4]
+            s01 = -a*self.Yt[k-4] - self.q[k-2]
+            s10 = 1 - self.Y0[p::2].sum(axis=0)
+            s11 = -self.Yt[p::2].sum(axis=0)
+            det = s00*s11 - s01*s10
+            self.S[p] = (s11/det, -s01/det, -s10/det, s00/det)
+        self.scale = scale
+
+    def integration_matrix(self, N):
+        """Return sparse double integration operator for N coefficients"""
+        raise NotImplementedError
+
+    def norm_squared(self, test):
+        """Return squared norms of the orthogonal basis"""
+        raise NotImplementedError
+
+    def test_scaling(self, test):
+        """Return scaling of the test functions"""
+        raise NotImplementedError
+
+    def _tdma(self, x):
+        """Return solution of symmetrized tridiagonal system, axis first"""
+        w = self.w[(slice(None),)+(None,)*(x.ndim-1)]
+        axis = self.axis + x.ndim - self.d0.ndim
+        z = np.ascontiguousarray(np.moveaxis(w*x, 0, axis))
+        if z.ndim > self.d0.ndim or z.ndim > 3:
+            z3, d0, d1, L = collapse_axes(z, axis, self.d0, self.d1, self.L)
+            cython_la.TDMA_SymSolve3D_VC(d0, d1, L, z3, 1)
+
+        elif z.ndim == 3:
+            cython_la.TDMA_SymSolve3D_VC(self.d0, self.d1, self.L, z, self.axis)
+
+        elif z.ndim == 2:
+            cython_la.TDMA_SymSolve2D_VC(self.d0, self.d1, self.L, z, self.axis)
+
+        else:
+            cython_la.TDMA_SymSolve(self.d0, self.d1, self.L, z)
+
+        return np.moveaxis(z, axis, 0)/w
+
+    def __call__(self, u, b):
+        """Solve matrix problem
+
+        Parameters
+        ----------
+            u : array
+                Output array
+            b : array
+                Array of right hand side
+
+        Leading axes of b and u that are not part of the problem the class
+        was created for, are treated as batch axes.
+
+        """
+        N = self.N
+        axis = self.axis + np.ndim(u) - self.d0.ndim
+        bm = np.moveaxis(b, axis, 0)
+        bc = (slice(None),)+(None,)*(bm.ndim-1)
+
+        # Right hand side of the tau problem, up to the tau terms
+        bt = bm[:N-2]/self.s[bc]
+        g = np.zeros((N,)+bm.shape[1:], dtype=np.result_type(b, float))
+        for p in (0, 1):
+            g[p:N-2:2] = np.cumsum(bt[p::2][::-1], axis=0)[::-1]
+        g /= self.h[bc]
+        rhs = self.Q.dot(g.reshape((N, -1))).reshape(g.shape)/self.c
+
+        y = self._tdma(rhs[:N-2])
+        v = np.zeros_like(g)
+        batch = (1,)*(y.ndim-self.Y0.ndim)
+        Y0 = self.Y0.reshape(self.Y0.shape[:1]+batch+self.Y0.shape[1:])
+        Yt = self.Yt.reshape(Y0.shape)
+        for k in (N, N+1):
+            p = k % 2
+            t0 = rhs[k-2] - self.scale[0]*self.Ld[k-2]*y[k-4]
+            t1 = -y[p::2].sum(axis=0)
+            S = self.S[p]
+            v[p] = S[0]*t0 + S[1]*t1
+            tau = S[2]*t0 + S[3]*t1
+            v[2+p::2] = y[p::2] - Y0[p::2]*v[p] - Yt[p::2]*tau
+
+        # Coefficients of the Dirichlet basis
+        um = np.moveaxis(u, axis, 0)
+        for p in (0, 1):
+            um[p:N-2:2] = np.cumsum(v[p:N-2:2], axis=0)
+        um[:N-2] /= self.s[bc]
+
+        # Boundary values of 1D bases apply to the first axis
+        self.bc.apply_after(u if self.d0.ndim > 1 else np.moveaxis(u, -1, 0), True)
+        return u
+
 class DiagonalMatrix(np.ndarray):
     """Matrix type with only diagonal matrices in all dimensions
 
@@ -257,6 +613,144 @@ class DiagonalMatrix(np.ndarray):
         #c[:] = self*v
         #return c
 
+class SolverCache(object):
+    """Bounded cache of factorized solvers
+
+    Creating one of the Helmholtz, Biharmonic or PDMA solvers factorizes the
+    matrices for all wavenumbers, which is costly compared to a solve. Codes
+    that switch between a few sets of scales, like time steppers with
+    adaptive time step or Runge-Kutta stages with different implicit weights,
+    may get the solvers from the cache instead of recreating them.
+
+    The solvers are keyed on the solver class, the matrices, the definition
+    of the bases of the matrices (see :meth:`.SpaceRegistry.base_key`), and a
+    hash (signature) of the entries of the matrices and of the scale arrays,
+    like alpha/beta or a0. When more than maxsize solvers are cached, the
+    least recently used solver is removed.
+
+    Caching is opt-in. Pass a cache to :class:`.LinearOperator` to have the
+    operator take its solver from the cache, or call the cache directly as
+    in the example below. The cache holds the factorizations until they are
+    evicted, or until :meth:`clear` is called.
+
+    Parameters
+    ----------
+        maxsize : int, optional
+                  Maximum number of cached solvers
+
+    Example
+    -------
+    >>> from shenfun import Basis, TrialFunction, TestFunction, inner, div, grad
+    >>> from shenfun.chebyshev.la import Helmholtz
+    >>> from shenfun.la import SolverCache
+    >>> SD = Basis(8, 'C', bc=(0, 0))
+    >>> u = TrialFunction(SD)
+    >>> v = TestFunction(SD)
+    >>> A = inner(v, div(grad(u)))
+    >>> B = inner(v, u)
+    >>> cache = SolverCache(maxsize=4)
+    >>> H0 = cache(Helmholtz, A, B, np.ones(1), np.ones(1))
+    >>> H1 = cache(Helmholtz, A, B, np.ones(1), np.ones(1))
+    >>> H0 is H1
+    True
+
+    """
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def signature(*args):
+        """Return hashable signature of solver arguments
+
+        Parameters
+        ----------
+            args : SparseMatrix or arrays
+                   The arguments used to create a solver
+        """
+        from shenfun.tensorproductspace import SpaceRegistry
+
+        def digest(a):
+            a = np.ascontiguousarray(a)
+            return (a.shape, a.dtype.str, hashlib.sha1(a.view(np.uint8)).hexdigest())
+
+        key = []
+        for arg in args:
+            if isinstance(arg, SparseMatrix):
+                # Diagonals are hashed with full length, since solvers may
+                # broadcast them
+                N, M = arg.shape
+                diags = tuple((k, digest(np.broadcast_to(v, (min(N+min(k, 0), M-max(k, 0)),))))
+                              for k, v in sorted(arg.items()))
+                bases = [f[0] for f in (getattr(arg, 'testfunction', None),
+                                        getattr(arg, 'trialfunction', None)) if f]
+                key.append((arg.get_key(), arg.shape, getattr(arg, 'axis', 0),
+                            tuple(SpaceRegistry.base_key(base) for base in bases), digest(arg.scale),
+                            diags))
+            else:
+                key.append(digest(arg))
+        return tuple(key)
+
+    def __call__(self, Solver, *args):
+        """Return cached solver, or create a new
+
+        Parameters
+        ----------
+            Solver : class
+                     Solver class, like :class:`.chebyshev.la.Helmholtz`
+            args : SparseMatrix or arrays
+                   Arguments to Solver
+        """
+        key = (Solver, self.signature(*args))
+        if key in self._cache:
+            self.hits += 1
+            item = self._cache.pop(key)
+        else:
+            self.misses += 1
+            solver = Solver(*args)
+            mats = [arg.get_key() for arg in args if isinstance(arg, SparseMatrix)]
+            scales = [np.shape(arg) for arg in args if not isinstance(arg, SparseMatrix)]
+            item = (solver, '%s%s scales %s'%(Solver.__name__, mats, scales))
+            while len(self._cache) >= self.maxsize > 0:
+                self._cache.popitem(last=False)
+        if self.maxsize > 0:
+            self._cache[key] = item
+        return item[0]
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        """Remove all cached solvers"""
+        self._cache.clear()
+
+    def memory(self):
+        """Return memory use in bytes of each cached solver
+
+        The arrays held by a solver are counted, except those of the
+        matrices, which are not owned by the solver. Arrays that are views of
+        the same memory are counted once.
+
+        Returns
+        -------
+            list of 2-tuples (description, nbytes), least recently used first
+        """
+        result = []
+        for solver, description in self._cache.values():
+            seen = set()
+            nbytes = 0
+            for val in vars(solver).values():
+                if isinstance(val, np.ndarray):
+                    while isinstance(val.base, np.ndarray):
+                        val = val.base
+                    if id(val) not in seen:
+                        seen.add(id(val))
+                        nbytes += val.nbytes
+            result.append((description, nbytes))
+        return result
+
 class Solve(object):
     """Solver class for matrix created by Dirichlet bases
 
@@ -307,17 +801,13 @@ class Solve(object):
         assert self.A.shape[0] == b[s].shape[0]
         A = self.A.diags('csr')
         if b.ndim == 1:
-            u[s] = spsolve(A, b[s])
+            u[s] = _spsolve(A, b[s])
         else:
             N = b[s].shape[0]
             P = np.prod(b[s].shape[1:])
             br = b[s].reshape((N, P))
 
-            if b.dtype is np.dtype('complex'):
-                u.real[s] = spsolve(A, br.real).reshape(u[s].shape)
-                u.imag[s] = spsolve(A, br.imag).reshape(u[s].shape)
-            else:
-                u[s] = spsolve(A, br).reshape(u[s].shape)
+            u[s] = _spsolve(A, br).reshape(u[s].shape)
         if hasattr(self, 'bc'):
             self.bc.apply_after(u, True)
 
@@ -376,20 +866,20 @@ class NeumannSolve(object):
 
         b[0] = self.mean
         s = self.s
-        self.A[0][0] = 1
+        if self.A[0][0] != 1:
+            # Copy diagonal, since it may be shared with other matrices
+            d0 = np.array(self.A[0], copy=True)
+            d0[0] = 1
+            self.A[0] = d0
         A = self.A.diags('csr')
         if b.ndim == 1:
-            u[s] = spsolve(A, b[s])
+            u[s] = _spsolve(A, b[s])
         else:
             N = b[s].shape[0]
             P = np.prod(b[s].shape[1:])
             br = b[s].reshape((N, P))
 
-            if b.dtype is np.dtype('complex'):
-                u.real[s] = spsolve(A, br.real).reshape(u[s].shape)
-                u.imag[s] = spsolve(A, br.imag).reshape(u[s].shape)
-            else:
-                u[s] = spsolve(A, br).reshape(u[s].shape)
+            u[s] = _spsolve(A, br).reshape(u[s].shape)
 
         if axis > 0:
             u = np.moveaxis(u, 0, axis)
@@ -398,3 +888,877 @@ class NeumannSolve(object):
         u /= self.A.scale
         return u
 
+
+
+class BlockSolver(object):
+    r"""Direct solver for coupled systems of equations
+
+    Solve a coupled system of equations, like the Stokes problem, for one
+    nonperiodic direction and any number of Fourier directions. The system is
+    given as a matrix of blocks, where block (i, j) couples component i of
+    the test function with component j of the trial function. For example,
+    for the Stokes problem in a channel
+
+    .. math::
+
+        \begin{bmatrix} A & G \\ D & 0 \end{bmatrix}
+        \begin{bmatrix} \hat{u} \\ \hat{p} \end{bmatrix} =
+        \begin{bmatrix} \hat{f} \\ \hat{h} \end{bmatrix}
+
+    Each block is a sum of banded matrices along the nonperiodic axis, with
+    scales that vary with the Fourier wavenumbers, as returned by
+    :func:`.inner`. For each wavenumber the blocks are assembled into one
+    banded matrix, where the unknowns of all components are interleaved such
+    that the bandwidth remains small. The banded matrices of all wavenumbers
+    are LU-factorized with partial pivoting on creation, in one call to a
+    Cython kernel that is parallel over wavenumbers, and :meth:`__call__`
+    only uses forward and backward substitution, in place in a work array.
+    The nonperiodic axis must not be distributed.
+
+    Parameters
+    ----------
+        blocks : list of lists
+                 blocks[i][j] is the matrix coupling test component i with
+                 trial component j. A block may be None (zero block), a
+                 SparseMatrix, a LinearOperator, or a dict or list of
+                 matrices, like returned by :func:`.inner` for forms with
+                 more than one term.
+        constraints : sequence of 3-tuples, optional
+                      Each 3-tuple (component, index, value) fixes the
+                      coefficient index of component to value, for
+                      wavenumbers where the system is singular. Typically
+                      used to fix the mean pressure, e.g., ((1, 0, 0),).
+        modes : array of bools, optional
+                The wavenumbers where the constraints are applied, before
+                factorizing. Must be broadcastable to the local wavenumber
+                mesh, with length 1 along the nonperiodic axis, e.g.,
+                ``K[0] == 0`` for local wavenumbers K along the first axis.
+                If None, then the constraints are applied to the wavenumbers
+                where the smallest pivot of the factorization is less than
+                rtol times the largest, in absolute value.
+        rtol : float, optional
+               Relative pivot tolerance used to find the singular
+               wavenumbers if modes is None
+
+    Example
+    -------
+    >>> from mpi4py import MPI
+    >>> from shenfun import Basis, TensorProductSpace, TestFunction, \
+    ...     TrialFunction, inner, div, grad, Dx
+    >>> from shenfun.la import BlockSolver
+    >>> K0 = Basis(8, 'F', dtype='d')
+    >>> SD = Basis(10, 'C', bc=(0, 0))
+    >>> T = TensorProductSpace(MPI.COMM_WORLD, (K0, SD), axes=(1, 0))
+    >>> u = TrialFunction(T)
+    >>> v = TestFunction(T)
+    >>> A = inner(v, div(grad(u)))
+    >>> C = inner(v, Dx(u, 0, 1))
+    >>> M = BlockSolver([[A, C], [C, A]])
+
+    """
+    def __init__(self, blocks, constraints=(), modes=None, rtol=1e-12):
+        self.constraints = tuple(constraints)
+        n_test = len(blocks)
+        n_trial = len(blocks[0])
+        assert np.all([len(row) == n_trial for row in blocks])
+        self.terms = terms = {}
+        for i, row in enumerate(blocks):
+            for j, block in enumerate(row):
+                if block is None:
+                    continue
+                terms[(i, j)] = LinearOperator(block).terms
+        assert np.all([isinstance(t, SparseMatrix) for tt in terms.values() for t in tt])
+
+        # Size of test (row) and trial (column) components
+        self.test_sizes = test_sizes = [None]*n_test
+        self.trial_sizes = trial_sizes = [None]*n_trial
+        axes = set()
+        for (i, j), tt in six.iteritems(terms):
+            for t in tt:
+                axes.add(getattr(t, 'axis', 0))
+                assert test_sizes[i] in (None, t.shape[0])
+                assert trial_sizes[j] in (None, t.shape[1])
+                test_sizes[i], trial_sizes[j] = t.shape
+        assert len(axes) == 1, 'Only one nonperiodic axis is allowed'
+        assert None not in test_sizes + trial_sizes, 'Empty row or column of blocks'
+        assert sum(test_sizes) == sum(trial_sizes)
+        self.axis = axis = axes.pop()
+        self.trial_bases = [None]*n_trial
+        self.test_bases = [None]*n_test
+        for (i, j), tt in six.iteritems(terms):
+            for t in tt:
+                if hasattr(t, 'trialfunction'):
+                    self.trial_bases[j] = t.trialfunction[0]
+                if hasattr(t, 'testfunction'):
+                    self.test_bases[i] = t.testfunction[0]
+
+        # Interleave unknowns of all components, such that the bandwidth of
+        # the global matrix is small
+        self.rows = self._interleave(test_sizes)
+        self.cols = self._interleave(trial_sizes)
+        n = self.n = sum(test_sizes)
+
+        # The shape of the wavenumber mesh (with length 1 along axis)
+        ndim = max([np.ndim(t.scale) for tt in terms.values() for t in tt]+[axis+1])
+        scales = [self._broadcast_scale(t.scale, ndim) for tt in terms.values() for t in tt]
+        shape = list(np.broadcast(*scales).shape) if len(scales) > 1 else list(scales[0].shape)
+        assert shape[axis] == 1
+        self.ndim = ndim
+        self.mode_shape = tuple(shape[:axis]+shape[axis+1:])
+        nmodes = int(np.prod(self.mode_shape))
+
+        dtype = float
+        for tt in terms.values():
+            for t in tt:
+                if np.iscomplexobj(t.scale) or np.any([np.iscomplexobj(v) for v in t.values()]):
+                    dtype = complex
+
+        # Get global rows, columns, values and scales of all nonzero entries
+        entries = []
+        kl, ku = 0, 0
+        for (i, j), tt in six.iteritems(terms):
+            for t in tt:
+                sc = np.broadcast_to(self._broadcast_scale(t.scale, ndim), shape)
+                sc = np.moveaxis(sc, axis, -1).reshape((nmodes,))
+                N, M = t.shape
+                for key, val in six.iteritems(t):
+                    L = min(N+min(key, 0), M-max(key, 0))
+                    r = np.arange(L) - min(key, 0)
+                    c = r + key
+                    R = self.rows[i][r]
+                    C = self.cols[j][c]
+                    kl = max(kl, (R-C).max())
+                    ku = max(ku, (C-R).max())
+                    entries.append((R, C, np.broadcast_to(val, (L,)), sc))
+        self.kl, self.ku = kl, ku
+        self.dtype = dtype
+
+        # Factorize all wavenumbers at once, in place
+        self.piv = np.zeros((nmodes, n), dtype=np.int32)
+        info = np.zeros(nmodes, dtype=np.int32)
+        if modes is not None:
+            assert len(self.constraints) > 0
+            modes = np.broadcast_to(np.asarray(modes, dtype=bool), shape)
+            self.constrained = np.moveaxis(modes, axis, -1).reshape((nmodes,)).copy()
+            self.lu = self._assemble(entries, np.arange(nmodes))
+            self._constrain(self.lu, np.flatnonzero(self.constrained))
+            cython_la.LU_Banded(self.lu, self.piv, kl, ku, info)
+
+        else:
+            self.lu = self._assemble(entries, np.arange(nmodes))
+            cython_la.LU_Banded(self.lu, self.piv, kl, ku, info)
+            self.constrained = np.zeros(nmodes, dtype=bool)
+            if len(self.constraints) > 0:
+                pivots = abs(self.lu[:, kl+ku])
+                self.constrained[:] = (info > 0) | (pivots.min(axis=1) <= rtol*pivots.max(axis=1))
+                m = np.flatnonzero(self.constrained)
+                if len(m) > 0:
+                    # Assemble and factorize the constrained wavenumbers again
+                    lu = self._assemble(entries, m)
+                    self._constrain(lu, np.arange(len(m)))
+                    piv, inf = self.piv[m], info[m]
+                    cython_la.LU_Banded(lu, piv, kl, ku, inf)
+                    self.lu[m], self.piv[m], info[m] = lu, piv, inf
+
+        if np.any(info != 0):
+            raise RuntimeError('Singular system for wavenumber %d' %np.flatnonzero(info)[0])
+        self._work = None
+
+    def _assemble(self, entries, m, chunk=1024):
+        """Return banded matrices of wavenumbers m
+
+        The matrices are assembled in chunks of wavenumbers, with the
+        wavenumbers along the last (contiguous) axis.
+        """
+        kl, ku, n = self.kl, self.ku, self.n
+        ab = np.zeros((len(m), 2*kl+ku+1, n), dtype=self.dtype)
+        for k in range(0, len(m), chunk):
+            mk = m[k:k+chunk]
+            abk = np.zeros((2*kl+ku+1, n, len(mk)), dtype=self.dtype)
+            for R, C, val, sc in entries:
+                abk[kl+ku+R-C, C] += val[:, np.newaxis]*sc[np.newaxis, mk]
+            ab[k:k+len(mk)] = np.moveaxis(abk, -1, 0)
+        return ab
+
+    def _constrain(self, ab, m):
+        """Replace rows of constrained unknowns with identity for modes m"""
+        kl, ku, n = self.kl, self.ku, self.n
+        for comp, index, _ in self.constraints:
+            r = self.cols[comp][index]
+            c = np.arange(max(0, r-kl), min(n, r+ku+1))
+            ab[m[:, np.newaxis], (kl+ku+r-c)[np.newaxis], c[np.newaxis]] = 0
+            ab[m, kl+ku, r] = 1
+
+    @staticmethod
+    def _interleave(sizes):
+        """Return global index of all unknowns for each component"""
+        comp = np.concatenate([np.full(s, i) for i, s in enumerate(sizes)])
+        index = np.concatenate([np.arange(s) for s in sizes])
+        order = np.lexsort((comp, index))
+        glob = np.empty_like(order)
+        glob[order] = np.arange(len(order))
+        return np.split(glob, np.cumsum(sizes)[:-1])
+
+    @staticmethod
+    def _broadcast_scale(scale, ndim):
+        scale = np.atleast_1d(scale)
+        if scale.ndim < ndim:
+            assert scale.size == 1
+            scale = scale.reshape((1,)*ndim)
+        return scale
+
+    def __call__(self, b, u=None):
+        """Solve coupled system
+
+        Parameters
+        ----------
+            b : array or sequence of arrays
+                Right hand side with one item per test component, e.g., a
+                Function on a MixedTensorProductSpace
+            u : array or sequence of arrays, optional
+                Solution with one item per trial component. The right hand
+                side b is overwritten with the solution if u is not provided.
+
+        """
+        if u is None:
+            u = b
+        axis = self.axis
+        for i, basis in enumerate(self.test_bases):
+            N = self.test_sizes[i] if basis is None else basis.N
+            assert b[i].shape[axis] == N, 'The nonperiodic axis must not be distributed'
+        nmodes = self.lu.shape[0]
+        data_shape = np.moveaxis(b[0], axis, -1).shape[:-1]
+        index = np.broadcast_to(np.arange(nmodes).reshape(self.mode_shape),
+                                data_shape).ravel()
+        P = index.shape[0]
+        dtype = np.result_type(self.lu.dtype, *[bi.dtype for bi in b])
+        if self._work is None or self._work.shape != (P, self.n) or self._work.dtype != dtype:
+            self._work = np.zeros((P, self.n), dtype=dtype)
+        x = self._work
+        for i, N in enumerate(self.test_sizes):
+            bi = np.moveaxis(b[i], axis, -1)
+            x[:, self.rows[i]] = bi[..., :N].reshape((P, N))
+        for comp, ind, value in self.constraints:
+            x[self.constrained[index], self.cols[comp][ind]] = value
+
+        # Real factors are applied to the real and imaginary parts of x
+        xs = x.view(self.lu.dtype)
+        cython_la.Solve_Banded(self.lu, self.piv, self.kl, self.ku, xs, index.astype(np.int64))
+
+        for j, M in enumerate(self.trial_sizes):
+            uj = np.moveaxis(u[j], axis, -1)
+            uj[..., :M] = x[:, self.cols[j]].reshape(uj.shape[:-1]+(M,))
+            uj[..., M:] = 0
+            basis = self.trial_bases[j]
+            if hasattr(basis, 'bc'):
+                basis.bc.apply_after(u[j], True)
+        return u
+
+
+class FastDiagonalization(object):
+    r"""Fast diagonalization solver for several nonperiodic directions
+
+    Solve tensor product problems with two or more nonperiodic directions,
+    and any number of Fourier directions, like
+
+    .. math::
+
+        \alpha (B \otimes B) U + (A \otimes B) U + (B \otimes A) U = F
+
+    where A and B are matrices along the nonperiodic axes, and the scales
+    may vary with the Fourier wavenumbers. Along each nonperiodic axis the
+    terms must use no more than two distinct matrices, typically a mass
+    matrix B and a stiffness matrix A. The generalized eigenvalue problems
+    :math:`A V = B V \Lambda` are solved on creation, and cached for all
+    solvers using the same matrices. Since :math:`(BV)^{-1} A V = \Lambda`
+    and :math:`(BV)^{-1} B V = I`, the problem is diagonal in the tensor
+    product of eigenvectors, and it is solved by
+
+        1. Mapping the right hand side to eigen space with
+           :math:`(BV)^{-1}` along each nonperiodic axis
+        2. Dividing by the (cached) diagonal
+        3. Mapping back with V along each nonperiodic axis
+
+    The mappings are dense matrix-matrix products along one axis, computed
+    with one batched GEMM call per axis. Complex data are viewed as real,
+    such that real and imaginary parts are mapped together by real GEMMs.
+    The data are redistributed between pencils aligned in the nonperiodic
+    axes with the pencil transfers of the output array of T.forward.
+
+    Modes with a zero diagonal, like the constant mode of a pure Neumann
+    problem, are set to zero.
+
+    Parameters
+    ----------
+        T : :class:`.TensorProductSpace`
+        mats : list of dicts
+               Matrices returned by :func:`.inner`, where each term is a
+               dict {axis: SparseMatrix, ..., 'scale': array}
+        mass : dict, optional
+               The mass matrix B along each nonperiodic axis, as
+               {axis: SparseMatrix or key of matrix}. For axes not given
+               the matrix without derivatives is used.
+
+    Example
+    -------
+    >>> from mpi4py import MPI
+    >>> from shenfun import Basis, TensorProductSpace, TestFunction, \
+    ...     TrialFunction, Function, inner, div, grad
+    >>> from shenfun.la import FastDiagonalization
+    >>> SD0 = Basis(8, 'C', bc=(0, 0))
+    >>> SD1 = Basis(10, 'C', bc=(0, 0))
+    >>> T = TensorProductSpace(MPI.COMM_WORLD, (SD0, SD1))
+    >>> u = TrialFunction(T)
+    >>> v = TestFunction(T)
+    >>> H = FastDiagonalization(T, inner(v, div(grad(u))))
+    >>> u_hat = H(Function(T, val=1))
+
+    """
+    def __init__(self, T, mats, mass=None):
+        if isinstance(mats, dict):
+            mats = [mats]
+        assert np.all([isinstance(t, dict) for t in mats])
+        self.T = T
+        self.axes = axes = sorted(set([i for t in mats for i in t if i != 'scale']))
+        assert np.all([set(t.keys()) == set(axes+['scale']) for t in mats])
+
+        # Eigen decomposition along each nonperiodic axis
+        self.V = {}
+        self.P = {}
+        diag = []
+        for axis in axes:
+            keys = []
+            for t in mats:
+                key = t[axis].get_key()
+                if key not in keys:
+                    keys.append(key)
+            if len(keys) > 2:
+                raise NotImplementedError('More than two different matrices along axis %d'%axis)
+            mat = dict([(t[axis].get_key(), t[axis]) for t in mats])
+            if mass is not None and axis in mass:
+                B = mass[axis]
+                B = mat[B if isinstance(B, str) else B.get_key()]
+            else:
+                # The mass matrix is the one without derivatives
+                B = [mat[k] for k in keys if mat[k].testfunction[1] == 0 and
+                     mat[k].trialfunction[1] == 0]
+                B = B[0] if len(B) > 0 else mat[keys[0]]
+            keys.remove(B.get_key())
+            keys.insert(0, B.get_key())
+            A = mat[keys[-1]] if len(keys) == 2 else None
+            lmbda, self.V[axis], self.P[axis] = _eig(A, B, B.testfunction[0])
+            diag.append([lmbda if t[axis].get_key() != keys[0] else 1 for t in mats])
+
+        # Pencils, with the nonperiodic axes aligned in turn
+        pencil = T.forward.output_pencil
+        self.dtype = dtype = T.forward.output_array.dtype
+        local = [slice(st, st+sh) for st, sh in zip(pencil.substart, pencil.subshape)]
+
+        # The diagonal in eigen space, computed in the first pencil
+        den = 0
+        ndim = len(pencil.shape)
+        for n, t in enumerate(mats):
+            c = np.array(t['scale'])
+            for axis in axes:
+                c = c*t[axis].scale
+            for j, axis in enumerate(axes):
+                d = np.broadcast_to(diag[j][n], (pencil.shape[axis],))[local[axis]]
+                shape = [1]*ndim
+                shape[axis] = d.shape[0]
+                c = c*d.reshape(shape)
+            den = den + c
+        den = np.broadcast_to(den, pencil.subshape)
+
+        self.steps = []
+        self.work = [self._work_arrays(pencil.subshape)]
+        order = sorted(axes, key=lambda i: pencil.subshape[i] != pencil.shape[i])
+        for axis in order:
+            transfer = None
+            if pencil.subshape[axis] != pencil.shape[axis]:
+                newpencil = pencil.pencil(axis)
+                transfer = pencil.transfer(newpencil, dtype)
+                dtransfer = pencil.transfer(newpencil, den.dtype)
+                d = np.zeros(dtransfer.subshapeB, dtype=den.dtype)
+                dtransfer.forward(np.ascontiguousarray(den), d)
+                den = d
+                pencil = newpencil
+                self.work.append(self._work_arrays(transfer.subshapeB))
+            self.steps.append((axis, transfer))
+
+        self.dinv = np.zeros(den.shape, dtype=den.dtype)
+        nonzero = abs(den) > 1e-14*abs(den).max()
+        self.dinv[nonzero] = 1./den[nonzero]
+
+    def _work_arrays(self, shape):
+        return (np.zeros(shape, dtype=self.dtype), np.zeros(shape, dtype=self.dtype))
+
+    @staticmethod
+    def _matmul(M, x, y, axis):
+        """Return y = M x along axis, using one batched GEMM"""
+        x3, y3 = collapse_axes(x, axis)[0], collapse_axes(y, axis)[0]
+        if x3.shape[2] == 1:
+            np.dot(x3[..., 0], M.T, out=y3[..., 0])
+            return y
+        if np.iscomplexobj(x) and not np.iscomplexobj(M):
+            x3 = x3.view(x.real.dtype)
+            y3 = y3.view(y.real.dtype)
+        np.matmul(M, x3, out=y3)
+        return y
+
+    def __call__(self, b, u=None):
+        """Solve matrix problem
+
+        Parameters
+        ----------
+            b : array
+                Right hand side on entry and solution on exit unless u is
+                provided. Must be aligned like the output of T.forward
+            u : array, optional
+                Output array
+
+        If u is not provided, then b is overwritten with the solution and returned
+        """
+        if u is None:
+            u = b
+        else:
+            assert u.shape == b.shape
+        b = np.ascontiguousarray(b)
+        assert b.shape == self.work[0][0].shape
+
+        # Map to eigen space
+        level = 0
+        x = b
+        for axis, transfer in self.steps:
+            if transfer is not None:
+                level += 1
+                transfer.forward(x, self.work[level][0])
+                x = self.work[level][0]
+            y = self.work[level][1] if x is self.work[level][0] else self.work[level][0]
+            x = self._matmul(self.P[axis], x, y, axis)
+
+        x *= self.dinv
+
+        # Map back
+        for axis, transfer in reversed(self.steps):
+            y = self.work[level][1] if x is self.work[level][0] else self.work[level][0]
+            x = self._matmul(self.V[axis], x, y, axis)
+            if transfer is not None:
+                level -= 1
+                y = self.work[level][1] if x is self.work[level][0] else self.work[level][0]
+                transfer.backward(x, y)
+                x = y
+        u[...] = x
+        return u
+
+_eigen_cache = OrderedDict()
+_eigen_cache_maxsize = 8
+
+def _matrix_key(M):
+    """Return hashable key of the unscaled entries of matrix M"""
+    if M is None:
+        return None
+    key = [M.get_key(), M.shape]
+    for base, k in (M.testfunction, M.trialfunction):
+        key.extend([base.__class__, base.N, base.quad, k,
+                    getattr(base, '_scaled', False)])
+    return tuple(key)
+
+def _eig(A, B, test):
+    """Return eigenvalues and eigenvectors of generalized problem A V = B V L
+
+    The eigenvectors V and the forward map P = (BV)^{-1} are padded with zeros
+    to the size of test, outside of test.slice(). If A is None, then V is the
+    identity and P is the inverse of B. Results are cached for the most
+    recently used matrices, keyed on the type of matrix, the bases, N and
+    quadrature.
+    """
+    from scipy import linalg as scipy_la
+    key = (_matrix_key(A), _matrix_key(B))
+    if key in _eigen_cache:
+        _eigen_cache[key] = _eigen_cache.pop(key)
+        return _eigen_cache[key]
+
+    Bd = B.diags().toarray()
+    Ad = A.diags().toarray() if A is not None else None
+    N = test.N
+    s = test.slice()
+    lmbda = np.zeros(N)
+    V = np.zeros((N, N))
+    P = np.zeros((N, N))
+    if A is None:
+        V[s, s] = np.eye(Bd.shape[0])
+        P[s, s] = scipy_la.inv(Bd)
+    elif np.allclose(Ad, Ad.T) and np.allclose(Bd, Bd.T):
+        lmbda[s], V[s, s] = scipy_la.eigh(Ad, Bd)
+        P[s, s] = V[s, s].T
+    else:
+        l, v = scipy_la.eig(Ad, Bd)
+        assert np.allclose(l.imag, 0, atol=1e-8*abs(l).max())
+        lmbda[s], V[s, s] = l.real, v.real
+        P[s, s] = scipy_la.inv(Bd.dot(V[s, s]))
+    while len(_eigen_cache) >= _eigen_cache_maxsize:
+        _eigen_cache.popitem(last=False)
+    _eigen_cache[key] = (lmbda, V, P)
+    return lmbda, V, P
+
+
+class KrylovSolver(object):
+    r"""Base class for matrix-free Krylov solvers
+
+    The solvers work directly on the (possibly distributed) arrays of
+    expansion coefficients, like :class:`.Function`, using only matrix vector
+    products with the operator and solves with the preconditioner. Neither
+    are ever assembled as dense matrices. Inner products are computed locally
+    and summed over all processors of the communicator of the function space.
+    The boundary rows of the bases, outside of :meth:`.SpectralBase.slice`,
+    are not part of the system, and are zero in the correction of the
+    initial guess.
+
+    Parameters
+    ----------
+        A : operator
+            Computes the matrix vector product. Either a SparseMatrix, a
+            LinearOperator, or a callable A(u, c) that returns the product
+            c, like :class:`.ExprOperator` or
+            :class:`.VariableCoefficientOperator`
+        M : preconditioner, optional
+            Solves approximately with the operator. Either a SparseMatrix or
+            a LinearOperator (solved using :meth:`.LinearOperator.get_solver`,
+            i.e., the fast Helmholtz/TDMA/PDMA solvers), or a callable
+            M(b, u) that returns u, like :class:`.FastDiagonalization`. The
+            right hand side b is not used after the call, and may be
+            overwritten. Defaults to no preconditioner.
+        rtol : float, optional
+            Relative tolerance, compared with the norm of the residual
+            divided by the norm of the right hand side
+        atol : float, optional
+            Absolute tolerance of the norm of the residual
+        maxiter : int, optional
+            Maximum number of iterations
+        verbose : bool, optional
+            Print residual and time of each iteration (on rank 0)
+
+    After a solve the following attributes are set
+
+        - iterations - Number of iterations
+        - residuals - Residual norm, initially and after each iteration
+        - timings - Wall time of each iteration
+        - converged - Whether the tolerance was reached
+
+    """
+    def __init__(self, A, M=None, rtol=1e-8, atol=0, maxiter=200, verbose=False):
+        self.A = A
+        self.M = M
+        self.rtol = rtol
+        self.atol = atol
+        self.maxiter = maxiter
+        self.verbose = verbose
+        self.comm = None
+        self.iterations = 0
+        self.residuals = []
+        self.timings = []
+        self.converged = False
+        self._precond = None
+        self._masks = []
+        self._real = False
+        self._tol = 0
+
+    def matvec(self, u, c):
+        """Return c = A u"""
+        A = self.A
+        if isinstance(A, SparseMatrix):
+            c = A.matvec(u, c, axis=getattr(A, 'axis', 0))
+        elif isinstance(A, LinearOperator):
+            c = A.matvec(u, c)
+        else:
+            c = A(u, c)
+        return self.mask(c)
+
+    def precondition(self, b, u):
+        """Return u = M^{-1} b. Note that b may be overwritten"""
+        M = self.M
+        if M is None:
+            u[...] = b
+            return u
+        if self._precond is None:
+            if isinstance(M, SparseMatrix):
+                self._precond = lambda b, u: M.solve(b, u=u, axis=getattr(M, 'axis', 0))
+            elif isinstance(M, LinearOperator):
+                self._precond = M.get_solver(b.ndim)
+            else:
+                assert callable(M)
+                self._precond = M
+        return self.mask(self._precond(b, u))
+
+    def mask(self, x):
+        """Zero the boundary rows of x, outside the slices of the bases
+
+        Linear forms contain the scalar product with the boundary functions
+        in these rows, which are not equations for the unknowns.
+        """
+        for s in self._masks:
+            x[s] = 0
+        return x
+
+    def _set_masks(self, space, shape):
+        """Store local index of boundary rows for each axis"""
+        from shenfun.spectralbase import SpectralBase
+        self._masks = []
+        if space is None:
+            return
+        if isinstance(space, SpectralBase):
+            bases, local = [space], [slice(0, space.N)]
+        else:
+            bases, local = space.bases, space.local_slice(True)
+        for axis, base in enumerate(bases):
+            s = base.slice()
+            ls = local[axis]
+            index = np.arange(ls.start, ls.stop)
+            index = np.nonzero((index < s.start) | (index >= s.stop))[0]
+            if len(index) > 0:
+                sl = [slice(None)]*len(shape)
+                sl[axis] = index
+                self._masks.append(tuple(sl))
+
+    def dot(self, x, y):
+        """Return global inner product of arrays x and y
+
+        For spaces of real data the real part is returned, such that the
+        Krylov space is real, and the coefficients remain those of a real
+        function (the imaginary parts of, e.g., the zero wavenumber are not
+        used by the backward transforms and the operators).
+        """
+        d = np.vdot(x, y)
+        if self._real:
+            d = d.real
+        if self.comm is not None:
+            d = self.comm.allreduce(d)
+        return d
+
+    def norm(self, x):
+        """Return global l2 norm of array x"""
+        return np.sqrt(abs(self.dot(x, x)))
+
+    @staticmethod
+    def _zeros_like(b):
+        from shenfun.forms.arguments import Function
+        if isinstance(b, Function):
+            return Function(b.function_space())
+        return np.zeros_like(b)
+
+    def _log(self, res, t0):
+        """Store residual and time of current iteration
+
+        Returns True if converged
+        """
+        self.residuals.append(res)
+        if t0 is not None:
+            self.iterations += 1
+            self.timings.append(time()-t0)
+        if self.verbose and (self.comm is None or self.comm.Get_rank() == 0):
+            print('%s iteration %4d residual %2.6e time %2.4e' %(
+                self.__class__.__name__, self.iterations, res,
+                self.timings[-1] if t0 is not None else 0))
+        self.converged = res <= self._tol
+        return self.converged
+
+    def __call__(self, b, u=None):
+        """Solve A u = b
+
+        Parameters
+        ----------
+            b : array
+                Right hand side, like a :class:`.Function`. Not modified
+            u : array, optional
+                Initial guess on entry and solution on exit. The initial
+                guess is zero if u is not provided.
+
+        Returns
+        -------
+            u : array
+                The solution
+        """
+        if u is None:
+            u = self._zeros_like(b)
+        assert u.shape == b.shape
+        space = b.function_space() if hasattr(b, 'function_space') else None
+        self.comm = getattr(space, 'comm', None)
+        self._real = not np.issubdtype(getattr(space, 'dtype', b.dtype), np.complexfloating)
+        self._set_masks(space, b.shape)
+        self.iterations = 0
+        self.residuals = []
+        self.timings = []
+        self._tol = max(self.rtol*self.norm(self.mask(b.copy())), self.atol)
+        return self.solve(b, u)
+
+    def solve(self, b, u):
+        """Iterate until converged. Overloaded by subclasses"""
+        raise NotImplementedError
+
+
+class CG(KrylovSolver):
+    """Preconditioned conjugate gradient solver
+
+    For Hermitian positive definite operators, like the Legendre Helmholtz
+    and Poisson problems. See :class:`.KrylovSolver` for parameters.
+    """
+    def solve(self, b, u):
+        r = self._zeros_like(b)
+        z = self._zeros_like(b)
+        q = self._zeros_like(b)
+        r = self.matvec(u, r)
+        self.mask(np.subtract(b, r, out=r))
+        if self._log(self.norm(r), None):
+            return u
+        q[...] = r
+        z = self.precondition(q, z)
+        p = z.copy()
+        rz = self.dot(r, z)
+        for _ in range(self.maxiter):
+            t0 = time()
+            q = self.matvec(p, q)
+            alfa = rz / self.dot(p, q)
+            u += alfa*p
+            r -= alfa*q
+            if self._log(self.norm(r), t0):
+                break
+            q[...] = r
+            z = self.precondition(q, z)
+            rz, rz_old = self.dot(r, z), rz
+            p *= rz / rz_old
+            p += z
+        return u
+
+
+class BiCGStab(KrylovSolver):
+    """Right preconditioned stabilized biconjugate gradient solver
+
+    For general (non-symmetric) operators, like the Chebyshev Helmholtz
+    problem. See :class:`.KrylovSolver` for parameters.
+    """
+    def solve(self, b, u):
+        r = self._zeros_like(b)
+        p = self._zeros_like(b)
+        v = self._zeros_like(b)
+        y = self._zeros_like(b)
+        z = self._zeros_like(b)
+        w = self._zeros_like(b)
+        r = self.matvec(u, r)
+        self.mask(np.subtract(b, r, out=r))
+        if self._log(self.norm(r), None):
+            return u
+        r0 = r.copy()
+        rho = alfa = omega = 1.
+        for _ in range(self.maxiter):
+            t0 = time()
+            rho, rho_old = self.dot(r0, r), rho
+            if rho == 0:
+                break
+            beta = (rho/rho_old)*(alfa/omega)
+            p -= omega*v
+            p *= beta
+            p += r
+            w[...] = p
+            y = self.precondition(w, y)
+            v = self.matvec(y, v)
+            alfa = rho / self.dot(r0, v)
+            r -= alfa*v
+            u += alfa*y
+            res = self.norm(r)
+            if res <= self._tol:
+                self._log(res, t0)
+                break
+            w[...] = r
+            z = self.precondition(w, z)
+            w = self.matvec(z, w)
+            omega = self.dot(w, r) / self.dot(w, w)
+            u += omega*z
+            r -= omega*w
+            if self._log(self.norm(r), t0) or omega == 0:
+                break
+        return u
+
+
+class GMRES(KrylovSolver):
+    """Right preconditioned restarted GMRES solver
+
+    For general (non-symmetric) operators. The Arnoldi basis is
+    orthogonalized with modified Gram-Schmidt, and the small least squares
+    problem is updated with Givens rotations, such that the residual norm is
+    known in each iteration without computing the solution.
+
+    Parameters
+    ----------
+        restart : int, optional
+            Number of iterations before GMRES is restarted
+
+    See :class:`.KrylovSolver` for remaining parameters.
+    """
+    def __init__(self, A, M=None, rtol=1e-8, atol=0, maxiter=200, verbose=False,
+                 restart=30):
+        KrylovSolver.__init__(self, A, M=M, rtol=rtol, atol=atol,
+                              maxiter=maxiter, verbose=verbose)
+        self.restart = restart
+
+    def solve(self, b, u):
+        m = self.restart
+        r = self._zeros_like(b)
+        w = self._zeros_like(b)
+        V = [self._zeros_like(b) for _ in range(m+1)]
+        Z = [self._zeros_like(b) for _ in range(m)]
+        dtype = np.result_type(b.dtype, float)
+        H = np.zeros((m+1, m), dtype=dtype)
+        cs = np.zeros(m)
+        sn = np.zeros(m, dtype=dtype)
+        g = np.zeros(m+1, dtype=dtype)
+        r = self.matvec(u, r)
+        self.mask(np.subtract(b, r, out=r))
+        beta = self.norm(r)
+        if self._log(beta, None):
+            return u
+        while self.iterations < self.maxiter:
+            np.divide(r, beta, out=V[0])
+            g[:] = 0
+            g[0] = beta
+            j = 0
+            for j in range(min(m, self.maxiter-self.iterations)):
+                t0 = time()
+                w[...] = V[j]
+                Z[j] = self.precondition(w, Z[j])
+                V[j+1] = self.matvec(Z[j], V[j+1])
+                for i in range(j+1):
+                    H[i, j] = self.dot(V[i], V[j+1])
+                    V[j+1] -= H[i, j]*V[i]
+                H[j+1, j] = self.norm(V[j+1])
+                if H[j+1, j] != 0:
+                    V[j+1] /= H[j+1, j]
+
+                # Apply previous and new Givens rotation
+                for i in range(j):
+                    tmp = cs[i]*H[i, j] + sn[i]*H[i+1, j]
+                    H[i+1, j] = -np.conj(sn[i])*H[i, j] + cs[i]*H[i+1, j]
+                    H[i, j] = tmp
+                rho = np.sqrt(abs(H[j, j])**2 + abs(H[j+1, j])**2)
+                if abs(H[j, j]) == 0:
+                    cs[j], sn[j] = 0, 1
+                else:
+                    cs[j] = abs(H[j, j])/rho
+                    sn[j] = H[j, j]/abs(H[j, j])*np.conj(H[j+1, j])/rho
+                H[j, j] = cs[j]*H[j, j] + sn[j]*H[j+1, j]
+                H[j+1, j] = 0
+                g[j+1] = -np.conj(sn[j])*g[j]
+                g[j] = cs[j]*g[j]
+                if self._log(abs(g[j+1]), t0):
+                    break
+
+            # Update solution
+            k = j+1
+            y = np.linalg.solve(np.triu(H[:k, :k]), g[:k])
+            for i in range(k):
+                u += y[i]*Z[i]
+            if self.converged or self.iterations >= self.maxiter:
+                break
+            r = self.matvec(u, r)
+            self.mask(np.subtract(b, r, out=r))
+            beta = self.norm(r)
+        return u
@@ -5,7 +5,8 @@ import numpy as np
 import scipy.linalg as scipy_la
 from shenfun.optimization import la
 from shenfun.utilities import inheritdocstrings
-from shenfun.la import TDMA as la_TDMA
+from shenfun.la import TDMA as la_TDMA, IntegratedHelmholtz as \
+    la_IntegratedHelmholtz, collapse_axes, collapse_factors
 from . import bases
 
 @inheritdocstrings
@@ -48,7 +49,8 @@ class TDMA(la_TDMA):
             la.TDMA_SymSolve(self.dd, self.ud, self.L, u)
 
         else:
-            raise NotImplementedError
+            la.TDMA_SymSolve3D(self.dd, self.ud, self.L,
+                               collapse_axes(u, axis)[0], 1)
 
         bc.apply_after(u, False)
 
@@ -209,20 +211,25 @@ class Helmholtz(object):
                                  self.d1, self.L)
 
             else:
-                raise NotImplementedError
+                if neumann and B_scale[(0,)*len(shape)] == 0:
+                    B_scale[(0,)*len(shape)] = 1.
+
+                args = collapse_factors(A.axis, shape, B_scale, self.d0,
+                                        self.d1, self.L)
+                la.TDMA_SymLU_3D(A, B, 1, np.asarray(A_scale).flat[0], *args)
 
         else:
             self.d0 = A[0]*A_scale + B[0]*B_scale
             self.d1 = B[2]*B_scale
             self.L = np.zeros_like(self.d1)
-            self.bc = A.testfunction[0].bc
             self.axis = 0
             la.TDMA_SymLU(self.d0, self.d1, self.L)
 
 
     def __call__(self, u, b):
+        axis = self.axis + np.ndim(u) - np.ndim(self.d0)
         ss = [slice(None)]*np.ndim(u)
-        ss[self.axis] = self.s
+        ss[axis] = self.s
         u[ss] = b[ss]
 
         #if not self.neumann:
@@ -238,7 +245,11 @@ class Helmholtz(object):
             #else:
                 #u[s] -= 1./3.*(self.bc[0] - self.bc[1])*self.B_scale[s0]
 
-        if u.ndim == 3:
+        if u.ndim > self.d0.ndim or u.ndim > 3:
+            u3, d0, d1, L = collapse_axes(u, axis, self.d0, self.d1, self.L)
+            la.TDMA_SymSolve3D_VC(d0, d1, L, u3, 1)
+
+        elif u.ndim == 3:
 
             la.TDMA_SymSolve3D_VC(self.d0, self.d1, self.L, u, self.axis)
 
@@ -251,11 +262,63 @@ class Helmholtz(object):
             la.TDMA_SymSolve(self.d0, self.d1, self.L, u)
 
         if not self.neumann:
-            self.bc.apply_after(u, True)
+            # Boundary values of 1D bases apply to the first axis
+            self.bc.apply_after(u if self.d0.ndim > 1 else np.moveaxis(u, -1, 0), True)
 
         return u
 
 
+@inheritdocstrings
+class IntegratedHelmholtz(la_IntegratedHelmholtz):
+    r"""Integration preconditioned Helmholtz solver for the Dirichlet basis
+
+    .. math::
+
+        -\alpha u'' + \beta u = b
+
+    Solves the same problem as :class:`.Helmholtz`, where the stiffness
+    matrix is :math:`(\phi_j', \phi_k')`, but through the twice integrated
+    equation, which is well-conditioned also for large N and small
+    :math:`\alpha/\beta`. See :class:`shenfun.la.IntegratedHelmholtz`.
+
+    Parameters
+    ----------
+        A : SpectralMatrix
+            Stiffness matrix (Dirichlet)
+        B : SpectralMatrix
+            Mass matrix (Dirichlet)
+        alfa : Numpy array
+        beta : Numpy array
+
+    or as a dict with keys
+
+    Parameters
+    ----------
+        ADDmat : A
+                 Stiffness matrix (Dirichlet basis)
+        BDDmat : B
+                 Mass matrix (Dirichlet basis)
+
+    """
+    basis = bases.ShenDirichletBasis
+    stiffness_sign = -1
+
+    def integration_matrix(self, N):
+        from .matrices import integration
+        return integration(N, 2)
+
+    def norm_squared(self, test):
+        h = 2./(2*np.arange(test.N)+1)
+        if test.quad == 'GL':
+            h[-1] = 2./(test.N-1)
+        return h
+
+    def test_scaling(self, test):
+        if test.is_scaled():
+            return 1./np.sqrt(4*np.arange(test.N-2)+6)
+        return np.ones(test.N-2)
+
+
 class Biharmonic(object):
     r"""Multidimensional Biharmonic solver for
 
@@ -389,8 +452,13 @@ class Biharmonic(object):
                 la.PDMA_SymLU_3D(S, A, B, S.axis, S_scale[0, 0, 0], A_scale, B_scale, self.d0, self.d1, self.d2)
             elif np.ndim(B_scale) == 2:
                 la.PDMA_SymLU_2D(S, A, B, S.axis, S_scale[0, 0], A_scale, B_scale, self.d0, self.d1, self.d2)
+            else:
+                args = collapse_factors(S.axis, shape, A_scale, B_scale, self.d0,
+                                        self.d1, self.d2)
+                la.PDMA_SymLU_3D(S, A, B, 1, np.asarray(S_scale).flat[0], *args)
 
         else:
+            self.axis = 0
             self.d0 = S[0]*S_scale + A[0]*A_scale + B[0]*B_scale
             self.d1 = A[2]*A_scale + B[2]*B_scale
             self.d2 = B[4]*B_scale
@@ -398,7 +466,12 @@ class Biharmonic(object):
 
     def __call__(self, u, b):
         u[:] = b
-        if np.ndim(u) == 3:
+        if np.ndim(u) > np.ndim(self.d0) or np.ndim(u) > 3:
+            axis = self.axis + np.ndim(u) - np.ndim(self.d0)
+            u3, d0, d1, d2 = collapse_axes(u, axis, self.d0, self.d1, self.d2)
+            la.PDMA_SymSolve3D_VC(d0, d1, d2, u3, 1)
+
+        elif np.ndim(u) == 3:
             la.PDMA_SymSolve3D_VC(self.d0, self.d1, self.d2, u, self.axis)
         elif np.ndim(u) == 2:
             la.PDMA_SymSolve2D_VC(self.d0, self.d1, self.d2, u, self.axis)
@@ -67,6 +67,7 @@ from __future__ import division
 #__all__ = ['mat']
 
 import numpy as np
+import scipy.sparse as sp
 from shenfun.matrixbase import SpectralMatrix
 from shenfun.utilities import inheritdocstrings
 from shenfun.la import TDMA as neumann_TDMA
@@ -79,6 +80,35 @@ SD = bases.ShenDirichletBasis
 SB = bases.ShenBiharmonicBasis
 SN = bases.ShenNeumannBasis
 
+def integration(N, k=1):
+    r"""Return sparse operator for k-fold integration of Legendre series
+
+    The operator maps the N coefficients of a Legendre series to the N+k
+    coefficients of its k'th antiderivative, using the recurrence
+
+    .. math::
+
+        \int L_n dx = \frac{L_{n+1} - L_{n-1}}{2n+1}
+
+    The first k rows, that hold the constants of integration, are zero.
+
+    Parameters
+    ----------
+        N : int
+            Number of coefficients
+        k : int, optional
+            Number of integrations
+    """
+    Q = sp.identity(N, format='csr')
+    for n in range(N, N+k):
+        j = np.arange(1, n+1, dtype=float)
+        lower = 1./(2*j-1)
+        upper = np.zeros(n-1)
+        upper[1:] = -1./(2*j[:n-2]+3)
+        I = sp.diags([lower, upper], [-1, 1], shape=(n+1, n), format='csr')
+        Q = I*Q
+    return Q
+
 #pylint: disable=unused-variable, redefined-builtin, bad-continuation
 
 @inheritdocstrings
@@ -160,7 +190,9 @@ class BDDmat(SpectralMatrix):
 
         d[2] = d[-2]
         SpectralMatrix.__init__(self, d, test, trial)
-        self.solve = TDMA(self)
+
+    def get_solver(self):
+        return TDMA(self)
 
 
 @inheritdocstrings
@@ -214,7 +246,6 @@ class BBBmat(SpectralMatrix):
 
     """
     def __init__(self, test, trial):
-        from shenfun.la import PDMA
         assert isinstance(test[0], SB)
         assert isinstance(trial[0], SB)
         N = test[0].N
@@ -230,7 +261,10 @@ class BBBmat(SpectralMatrix):
         d[-2] = d[2]
         d[-4] = d[4]
         SpectralMatrix.__init__(self, d, test, trial)
-        self.solve = PDMA(self)
+
+    def get_solver(self):
+        from shenfun.la import PDMA
+        return PDMA(self)
 
 
 @inheritdocstrings
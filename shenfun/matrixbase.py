@@ -2,15 +2,16 @@ r"""
 This module contains classes for working with sparse matrices
 """
 from __future__ import division
-from copy import deepcopy
 from numbers import Number
 from scipy.sparse import diags as sp_diags
 from scipy.sparse.linalg import spsolve
 import numpy as np
 import six
 from .utilities import inheritdocstrings
+from .optimization.Matvec import Banded_matvec3D
 
-__all__ = ['SparseMatrix', 'SpectralMatrix', 'extract_diagonal_matrix', 'check_sanity', 'get_dense_matrix']
+__all__ = ['SparseMatrix', 'SpectralMatrix', 'LinearOperator',
+           'extract_diagonal_matrix', 'check_sanity', 'get_dense_matrix']
 
 class SparseMatrix(dict):
     r"""Base class for sparse matrices
@@ -47,6 +48,16 @@ class SparseMatrix(dict):
     ...       1: np.ones(N-1)}
     >>> SparseMatrix(d, (N, N))
     {-1: array([1., 1., 1.]), 0: array([-2., -2., -2., -2.]), 1: array([1., 1., 1.])}
+
+    Matrix algebra with scalars returns lightweight views that share the
+    diagonals of the original matrix, but use their own scale. Diagonals are
+    never modified in place by the arithmetic operators. A diagonal is only
+    copied when it needs to change, so the original matrix is left intact
+
+    >>> A = SparseMatrix(d, (N, N))
+    >>> B = 2*A
+    >>> B[0] is A[0], B.scale
+    (True, 2.0)
     """
     # pylint: disable=redefined-builtin, missing-docstring
 
@@ -56,6 +67,40 @@ class SparseMatrix(dict):
         self._diags = None
         self.scale = scale
 
+    def __setitem__(self, key, val):
+        dict.__setitem__(self, key, val)
+        self._diags = None
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._diags = None
+
+    def _view(self, scale):
+        """Return shallow copy of self using a different scale
+
+        The returned matrix is of the same class as self and shares all
+        diagonals (and the cached scipy matrix) with self.
+
+        Parameters
+        ----------
+            scale : float or array of floats
+                    Scale of returned matrix
+        """
+        f = self.__class__.__new__(self.__class__)
+        dict.update(f, self)
+        f.__dict__.update(self.__dict__)
+        f.scale = scale
+        return f
+
+    def _scaled_diagonals(self):
+        """Return dictionary of diagonals multiplied by self.scale
+
+        Diagonals are shared with self if the scale is unity.
+        """
+        if isinstance(self.scale, Number) and self.scale == 1:
+            return dict(self)
+        return {key: self.scale*val for key, val in six.iteritems(self)}
+
     def matvec(self, v, c, format='dia', axis=0):
         """Matrix vector product
 
@@ -142,7 +187,7 @@ class SparseMatrix(dict):
     def __imul__(self, y):
         """self.__imul__(y) <==> self*=y"""
         assert isinstance(y, Number)
-        self.scale *= y
+        self.scale = self.scale*y
         return self
 #        for key in self:
 #            # Check if symmetric
@@ -156,8 +201,7 @@ class SparseMatrix(dict):
     def __mul__(self, y):
         """Returns copy of self.__mul__(y) <==> self*y"""
         if isinstance(y, Number):
-            return SparseMatrix(deepcopy(dict(self)), self.shape,
-                                scale=self.scale*y)
+            return self._view(self.scale*y)
         elif isinstance(y, np.ndarray):
             c = np.zeros_like(y)
             c = self.matvec(y, c)
@@ -170,8 +214,7 @@ class SparseMatrix(dict):
     def __div__(self, y):
         """Returns copy self.__div__(y) <==> self/y"""
         if isinstance(y, Number):
-            return SparseMatrix(deepcopy(dict(self)), self.shape,
-                                scale=self.scale/y)
+            return self._view(self.scale/y)
         elif isinstance(y, np.ndarray):
             b = np.zeros_like(y)
             b = self.solve(y, b)
@@ -184,20 +227,26 @@ class SparseMatrix(dict):
         return self.__div__(y)
 
     def __add__(self, d):
-        """Return copy of self.__add__(y) <==> self+d"""
+        """Return copy of self.__add__(y) <==> self+d
+
+        Note
+        ----
+        If the scale of either matrix is an array, then the sum cannot be
+        assembled into one SparseMatrix, and a :class:`.LinearOperator` of
+        the two matrices is returned instead.
+        """
+        if isinstance(d, LinearOperator):
+            return NotImplemented
+        assert isinstance(d, dict)
         if self.__hash__() == d.__hash__():
-            f = SparseMatrix(deepcopy(dict(self)), self.shape,
-                             self.scale+d.scale)
+            f = self._view(self.scale+d.scale)
+        elif np.size(self.scale) > 1 or np.size(d.scale) > 1:
+            f = LinearOperator([self, d])
         else:
-            f = SparseMatrix(deepcopy(dict(self)), self.shape)
-            assert isinstance(d, dict)
+            f = SparseMatrix(self._scaled_diagonals(), self.shape)
             for key, val in six.iteritems(d):
                 if key in f:
-                    # Check if symmetric and make copy if necessary
-                    if -key in f:
-                        if id(f[key]) == id(f[-key]):
-                            f[-key] = deepcopy(f[key])
-                    f[key] = self.scale*f[key] + d.scale*val
+                    f[key] = f[key] + d.scale*val
                 else:
                     f[key] = d.scale*val
 
@@ -208,36 +257,38 @@ class SparseMatrix(dict):
         assert isinstance(d, dict)
         assert d.shape == self.shape
         if self.__hash__() == d.__hash__():
-            self.scale += d.scale
+            self.scale = self.scale + d.scale
         else:
             for key, val in six.iteritems(d):
                 if key in self:
-                    # Check if symmetric and make copy if necessary
-                    if -key in self:
-                        if id(self[key]) == id(self[-key]):
-                            self[-key] = deepcopy(self[key])
-                    self[key] += d.scale*val/self.scale
+                    self[key] = self[key] + d.scale*val/self.scale
                 else:
                     self[key] = d.scale*val/self.scale
 
         return self
 
     def __sub__(self, d):
-        """Return copy of self.__sub__(y) <==> self-d"""
+        """Return copy of self.__sub__(y) <==> self-d
+
+        Note
+        ----
+        If the scale of either matrix is an array, then the difference cannot be
+        assembled into one SparseMatrix, and a :class:`.LinearOperator` of
+        the two matrices is returned instead.
+        """
+        if isinstance(d, LinearOperator):
+            return NotImplemented
         assert isinstance(d, dict)
         # Check is the same matrix
         if self.__hash__() == d.__hash__():
-            f = SparseMatrix(deepcopy(dict(self)), self.shape,
-                             self.scale-d.scale)
+            f = self._view(self.scale-d.scale)
+        elif np.size(self.scale) > 1 or np.size(d.scale) > 1:
+            f = LinearOperator([self, -d])
         else:
-            f = SparseMatrix(deepcopy(dict(self)), self.shape, 1.0)
+            f = SparseMatrix(self._scaled_diagonals(), self.shape)
             for key, val in six.iteritems(d):
                 if key in f:
-                    # Check if symmetric and make copy if necessary
-                    if -key in f:
-                        if id(f[key]) == id(f[-key]):
-                            f[-key] = deepcopy(f[key])
-                    f[key] = self.scale*f[key] - d.scale*val
+                    f[key] = f[key] - d.scale*val
                 else:
                     f[key] = -d.scale*val
 
@@ -248,23 +299,19 @@ class SparseMatrix(dict):
         assert isinstance(d, dict)
         assert d.shape == self.shape
         if self.__hash__() == d.__hash__():
-            self.scale -= d.scale
+            self.scale = self.scale - d.scale
         else:
             for key, val in six.iteritems(d):
                 if key in self:
-                    # Check if symmetric and make copy if necessary
-                    if -key in self:
-                        if id(self[key]) == id(self[-key]):
-                            self[-key] = deepcopy(self[key])
-                    self[key] -= d.scale*val/self.scale
+                    self[key] = self[key] - d.scale*val/self.scale
                 else:
                     self[key] = -d.scale*val/self.scale
 
         return self
 
     def __neg__(self):
-        self.scale *= -1
-        return self
+        """Return copy of self.__neg__() <==> -self"""
+        return self._view(-self.scale)
 
     def __hash__(self):
         return hash(frozenset(self))
@@ -273,7 +320,7 @@ class SparseMatrix(dict):
         return self.__hash__()
 
     def scale_array(self, c):
-        if self.scale not in (1.0, 1):
+        if np.size(self.scale) > 1 or self.scale != 1:
             c *= self.scale
 
     def solve(self, b, u=None, axis=0):
@@ -473,13 +520,39 @@ class SpectralMatrix(SparseMatrix):
             D = get_dense_matrix(test, trial)[:shape[0], :shape[1]]
             d = extract_diagonal_matrix(D)
         SparseMatrix.__init__(self, d, shape, scale)
-        if shape[0] == shape[1]:
-            if test[0].__class__.__name__ == 'ShenNeumannBasis':
-                from shenfun.la import NeumannSolve
-                self.solver = NeumannSolve(self, test[0])
-            else:
-                from shenfun.la import Solve
-                self.solver = Solve(self, test[0])
+        self._solver = None
+
+    def _view(self, scale):
+        f = SparseMatrix._view(self, scale)
+        f._solver = None
+        return f
+
+    def get_solver(self):
+        """Return new instance of the solver used by method `solve`
+
+        Overload in subclasses that have a specialized solver.
+        """
+        assert self.shape[0] == self.shape[1]
+        if self.testfunction[0].__class__.__name__ == 'ShenNeumannBasis':
+            from shenfun.la import NeumannSolve
+            return NeumannSolve(self, self.testfunction[0])
+        from shenfun.la import Solve
+        return Solve(self, self.testfunction[0])
+
+    @property
+    def solver(self):
+        """Return solver for matrix
+
+        The solver is created on first access, such that matrix algebra does
+        not allocate solvers that are never used.
+        """
+        if self._solver is None:
+            self._solver = self.get_solver()
+        return self._solver
+
+    @solver.setter
+    def solver(self, solver):
+        self._solver = solver
 
     def matvec(self, v, c, format='csr', axis=0):
         c = super(SpectralMatrix, self).matvec(v, c, format=format, axis=axis)
@@ -518,47 +591,431 @@ class SpectralMatrix(SparseMatrix):
             return self.__hash__()
         return self.__class__.__name__
 
+
+class LinearOperator(object):
+    r"""Lazy sum of matrices
+
+    A LinearOperator represents the sum of a number of scaled matrices, like
+    :math:`a A + b B + C`, without assembling the sum before it is needed. The
+    terms may be any of SparseMatrix, SpectralMatrix or DiagonalMatrix, and the
+    dictionary returned by :func:`.inner` for bilinear forms with more than one
+    term may be used directly. The scales of the matrices may be arrays that
+    broadcast against the data, as created by :func:`.inner` for
+    multidimensional problems.
+
+    On the first matrix vector product the diagonals of all terms are merged,
+    including the scales, such that the product is computed in one pass over
+    the diagonals, instead of one pass for each term. If any of the scales
+    are arrays, then the product is computed by one Cython kernel over the
+    merged diagonals. The merged diagonals, and the solver, are recomputed
+    if the scale of any term has changed since they were computed.
+
+    Parameters
+    ----------
+        terms : SparseMatrix, DiagonalMatrix, LinearOperator, or list/dict of these
+                The matrices that are summed
+        cache : :class:`.SolverCache`, optional
+                Cache to take the factorized solver from. By default the
+                operator creates, and holds, its own solver. Operators that
+                share a cache share the factorization if they have the same
+                matrices and scales. Terms that are LinearOperators pass on
+                their cache.
+
+    Examples
+    --------
+    >>> from shenfun import Basis, TrialFunction, TestFunction, inner, \
+    ...     div, grad, LinearOperator
+    >>> SD = Basis(8, 'C', bc=(0, 0))
+    >>> u = TrialFunction(SD)
+    >>> v = TestFunction(SD)
+    >>> A = inner(v, div(grad(u)))
+    >>> B = inner(v, u)
+    >>> H = LinearOperator([A, -2*B])
+    >>> len(H.terms)
+    2
+
+    Note
+    ----
+    Method solve dispatches to one of the Helmholtz, Biharmonic or PDMA
+    solvers of the Chebyshev or Legendre family, depending on the names of
+    the terms (see :meth:`.SpectralMatrix.get_key`). Operators of the
+    ultraspherical family are solved with
+    :class:`.ultraspherical.la.AlmostBandedSolver`.
+    """
+    # Make sure Numpy arrays do not try to broadcast over the operator
+    __array_ufunc__ = None
+
+    def __init__(self, terms, cache=None):
+        self.terms = []
+        self._merged = None
+        self._banded = None
+        self._solver = None
+        if isinstance(terms, (SparseMatrix, np.ndarray, LinearOperator)):
+            terms = [terms]
+        elif isinstance(terms, dict):
+            terms = list(terms.values())
+        for term in terms:
+            if cache is None and isinstance(term, LinearOperator):
+                cache = term.cache
+            self._add_term(term)
+        self.cache = cache
+
+    def _add_term(self, term):
+        if isinstance(term, LinearOperator):
+            for t in term.terms:
+                self._add_term(t)
+            return
+
+        assert isinstance(term, (SparseMatrix, np.ndarray))
+        if isinstance(term, SpectralMatrix):
+            for i, t in enumerate(self.terms):
+                if (isinstance(t, SpectralMatrix) and t.get_key() == term.get_key()
+                        and t.shape == term.shape
+                        and getattr(t, 'axis', 0) == getattr(term, 'axis', 0)):
+                    self.terms[i] = t + term
+                    return
+
+        self.terms.append(term)
+        if len(self.terms) > 1:
+            assert isinstance(term, SparseMatrix) == isinstance(self.terms[0], SparseMatrix), \
+                'Cannot mix diagonal and sparse matrices'
+            if isinstance(term, SparseMatrix):
+                assert term.shape == self.terms[0].shape
+                assert getattr(term, 'axis', 0) == self.axis
+
+    @property
+    def shape(self):
+        """Return shape of operator"""
+        return self.terms[0].shape
+
+    @property
+    def axis(self):
+        """Return the axis the operator is applied along"""
+        return getattr(self.terms[0], 'axis', 0)
+
+    def _is_diagonal(self):
+        return not isinstance(self.terms[0], SparseMatrix)
+
+    def _scales(self):
+        """Return copies of the scales of the terms"""
+        return [np.array(t.scale, copy=True) for t in self.terms
+                if isinstance(t, SparseMatrix)]
+
+    def _is_current(self, scales):
+        """Return whether scales are equal to the scales of the terms"""
+        terms = [t for t in self.terms if isinstance(t, SparseMatrix)]
+        return len(scales) == len(terms) and all(
+            np.shape(s) == np.shape(t.scale) and np.array_equal(s, t.scale)
+            for s, t in zip(scales, terms))
+
+    def merge(self, ndim):
+        """Return merged diagonals of all terms
+
+        Parameters
+        ----------
+            ndim : int
+                   The number of dimensions of the data the operator is
+                   applied to
+
+        Returns
+        -------
+            merged : SparseMatrix or array
+                     If all scales are scalars, then the merged diagonals are
+                     returned as one SparseMatrix. If any of the scales are
+                     arrays, then the merged diagonals have the shape of the
+                     broadcasted scales, with the operator axis moved first,
+                     and the diagonals are returned as a dictionary. For
+                     diagonal matrices the sum of all terms is returned.
+        """
+        if (self._merged is not None and self._merged[0] == ndim and
+                self._is_current(self._merged[1])):
+            return self._merged[2]
+
+        if self._is_diagonal():
+            merged = self.terms[0]
+            for t in self.terms[1:]:
+                merged = merged + t
+            self._merged = (ndim, [], np.asarray(merged))
+            return self._merged[2]
+
+        N, M = self.shape
+        axis = self.axis
+        scalar = np.all([np.size(t.scale) == 1 for t in self.terms])
+        d = {}
+        for t in self.terms:
+            scale = t.scale
+            if scalar:
+                scale = np.asarray(scale).item()
+            elif np.ndim(scale) < ndim:
+                scale = np.reshape(scale, np.shape(scale)+(1,)*(ndim-np.ndim(scale)))
+            for key, val in six.iteritems(t):
+                L = min(N+min(key, 0), M-max(key, 0))
+                val = np.broadcast_to(val, (L,))
+                if not scalar:
+                    sh = [1]*ndim
+                    sh[axis] = L
+                    val = np.moveaxis(scale*val.reshape(sh), axis, 0)
+                else:
+                    val = scale*val
+                d[key] = d[key] + val if key in d else val
+
+        if scalar:
+            merged = SparseMatrix(d, self.shape)
+        else:
+            merged = d
+        self._merged = (ndim, self._scales(), merged)
+        return merged
+
+    def _banded_diagonals(self, v, axis):
+        """Return scales, diagonals, offsets and terms for the Cython matvec
+
+        The scales of the terms, which are constant along axis, are broadcast
+        to the shape of v and collapsed to 3D (term, before, after), without
+        copying where the broadcasting allows it. The diagonals of all terms
+        are stored as rows of one array, such that diags[d, j] is the entry
+        of diagonal d in row j. The result is reused for arrays of the same
+        shape and type, as long as the scales are unchanged.
+
+        Parameters
+        ----------
+            v : array
+                Input array of the matrix vector product
+            axis : int
+                   The axis over which to take the product
+        """
+        key = (v.shape, v.dtype.char, axis)
+        if (self._banded is not None and self._banded[0] == key and
+                self._is_current(self._banded[1])):
+            return self._banded[2:]
+
+        N, M = self.shape
+        shape = list(v.shape)
+        shape[axis] = 1
+        scales, diags, offsets, terms = [], [], [], []
+        for i, t in enumerate(self.terms):
+            scale = np.asarray(t.scale)
+            if np.ndim(scale) < v.ndim:
+                scale = np.reshape(scale, np.shape(scale)+(1,)*(v.ndim-np.ndim(scale)))
+            scales.append(np.broadcast_to(scale, shape))
+            for k, val in sorted(six.iteritems(t)):
+                L = min(N+min(k, 0), M-max(k, 0))
+                d = np.zeros(v.shape[axis])
+                d[max(0, -k):max(0, -k)+L] = val
+                diags.append(d)
+                offsets.append(k)
+                terms.append(i)
+        dtype = np.result_type(v.dtype, *(scales+diags))
+        assert dtype == v.dtype, 'Scales of type %s cannot be used with data of type %s' %(dtype, v.dtype)
+        scales = np.broadcast_to(np.array(scales, dtype=dtype, copy=False),
+                                 (len(scales),)+tuple(shape))
+        scales = scales.reshape((len(self.terms), int(np.prod(v.shape[:axis])),
+                                 int(np.prod(v.shape[axis+1:]))))
+        result = (scales, np.array(diags, dtype=dtype),
+                  np.array(offsets, dtype=np.int64), np.array(terms, dtype=np.int64))
+        self._banded = (key, self._scales()) + result
+        return result
+
+    def matvec(self, v, c, format='csr', axis=None):
+        """Matrix vector product
+
+        Returns c = dot(self, v)
+
+        Parameters
+        ----------
+            v : array
+                Numpy input array of ndim>=1
+            c : array
+                Numpy output array of same ndim as v
+            format : str, optional
+                     Choice for computation if all scales are scalars. See
+                     :meth:`.SparseMatrix.matvec`
+            axis : int, optional
+                   The axis over which to take the matrix vector product.
+                   Defaults to the axis of the terms
+        """
+        assert v.shape == c.shape
+        if self._is_diagonal():
+            c[:] = self.merge(v.ndim)*v
+            return c
+
+        if axis is None:
+            axis = self.axis
+        if np.all([np.size(t.scale) == 1 for t in self.terms]):
+            c = self.merge(v.ndim).matvec(v, c, format=format, axis=axis)
+
+        else:
+            from shenfun.la import collapse_axes
+            N, M = self.shape
+            c3 = c if c.flags['C_CONTIGUOUS'] else np.zeros_like(c)
+            v3 = collapse_axes(np.ascontiguousarray(v), axis)[0]
+            b3 = collapse_axes(c3, axis)[0]
+            Banded_matvec3D(v3, b3, *(self._banded_diagonals(v, axis)+(N, M)))
+            if c3 is not c:
+                c[...] = c3
+
+        for t in self.terms:
+            if isinstance(t, SpectralMatrix):
+                if t.testfunction[0].__class__.__name__ == 'ShenNeumannBasis':
+                    ss = [slice(None)]*v.ndim
+                    ss[axis] = 0
+                    c[tuple(ss)] = 0
+                break
+        return c
+
+    def get_solver(self, ndim):
+        """Return solver for operator
+
+        The solver returned is a function of (b, u), that solves for u.
+        If the operator has a cache (see :class:`.SolverCache`), then the
+        factorized solver is taken from the cache, such that operators with
+        the same matrices and scales share one factorization. Otherwise a new
+        solver is created.
+
+        Parameters
+        ----------
+            ndim : int
+                   The number of dimensions of the data to solve for
+        """
+        if self._is_diagonal():
+            from shenfun.la import DiagonalMatrix
+            D = DiagonalMatrix(self.merge(ndim))
+            return lambda b, u: D.solve(b, u=u)
+
+        if len(self.terms) == 1:
+            mat = self.terms[0]
+            return lambda b, u: mat.solve(b, u=u, axis=self.axis)
+
+        assert np.all([isinstance(t, SpectralMatrix) for t in self.terms])
+        mats = {t.get_key(): t for t in self.terms}
+
+        def scale(mat):
+            sc = np.atleast_1d(mat.scale)
+            if np.iscomplexobj(sc):
+                assert np.allclose(sc.imag, 0)
+                sc = sc.real
+            if ndim > 1 and sc.ndim < ndim:
+                sc = np.broadcast_to(sc, (1,)*ndim).copy()
+            return sc
+
+        def solvers(Solver, *args):
+            if self.cache is None:
+                return Solver(*args)
+            return self.cache(Solver, *args)
+
+        from shenfun import chebyshev, legendre, ultraspherical
+        test = self.terms[0].testfunction[0]
+        if isinstance(test, ultraspherical.bases.UltrasphericalBase):
+            solver = solvers(ultraspherical.la.AlmostBandedSolver, *self.terms)
+            return lambda b, u: solver(b, u=u, axis=self.axis)
+
+        if isinstance(test, chebyshev.bases.ChebyshevBase):
+            family = chebyshev
+        elif isinstance(test, legendre.bases.LegendreBase):
+            family = legendre
+        else:
+            raise NotImplementedError
+
+        if family is legendre and 'GDDmat' in mats and not 'ADDmat' in mats:
+            # (v, u'') = -(v', u') for Dirichlet
+            G = mats.pop('GDDmat')
+            A = family.matrices.ADDmat(G.testfunction, G.trialfunction)
+            A.scale = -G.scale
+            A.axis = self.axis
+            mats['ADDmat'] = A
+
+        keys = set(mats.keys())
+        if keys in (set(('ADDmat', 'BDDmat')), set(('ANNmat', 'BNNmat'))):
+            A, B = [mats[k] for k in sorted(keys)]
+            solver = solvers(family.la.Helmholtz, A, B, scale(A), scale(B))
+
+        elif family is chebyshev and keys == set(('SBBmat', 'ABBmat', 'BBBmat')):
+            S, A, B = mats['SBBmat'], mats['ABBmat'], mats['BBBmat']
+            solver = solvers(family.la.Biharmonic, S, A, B, scale(S), scale(A), scale(B))
+
+        elif family is legendre and keys == set(('SBBmat', 'PBBmat', 'BBBmat')):
+            S, A, B = mats['SBBmat'], mats['PBBmat'], mats['BBBmat']
+            solver = solvers(family.la.Biharmonic, S, A, B, scale(S), scale(A), scale(B))
+
+        elif family is chebyshev and keys == set(('ABBmat', 'BBBmat')):
+            A, B = mats['ABBmat'], mats['BBBmat']
+            solver = solvers(family.la.PDMA, A, B, scale(A), scale(B))
+
+        else:
+            raise NotImplementedError('No solver for %s' % str(sorted(keys)))
+
+        return lambda b, u: solver(u, b)
+
+    def solve(self, b, u=None, axis=None):
+        """Solve matrix system self u = b
+
+        Parameters
+        ----------
+            b : array
+                Array of right hand side on entry and solution on exit unless
+                u is provided.
+            u : array, optional
+                Output array
+            axis : int, optional
+                   The axis over which to solve for. Must be the axis of the
+                   terms, and is only included for compatibility with matrices
+
+        The solver is created on the first call and reused for later calls.
+        """
+        assert axis is None or self._is_diagonal() or axis == self.axis
+        if (self._solver is None or self._solver[0] != b.ndim or
+                not self._is_current(self._solver[1])):
+            self._solver = (b.ndim, self._scales(), self.get_solver(b.ndim))
+        if u is None:
+            u = np.zeros_like(b)
+            u = self._solver[2](b, u)
+            b[...] = u
+            return b
+        return self._solver[2](b, u)
+
     def __mul__(self, y):
         """Returns copy of self.__mul__(y) <==> self*y"""
         if isinstance(y, Number):
-            f = SpectralMatrix(deepcopy(dict(self)), self.testfunction,
-                               self.trialfunction, self.scale*y)
+            return LinearOperator([t*y for t in self.terms], cache=self.cache)
         elif isinstance(y, np.ndarray):
-            f = SparseMatrix.__mul__(self, y)
+            c = np.zeros_like(y)
+            return self.matvec(y, c)
+        return NotImplemented
 
-        return f
+    def __rmul__(self, y):
+        """Returns copy of self.__rmul__(y) <==> y*self"""
+        return self.__mul__(y)
 
     def __div__(self, y):
         """Returns copy self.__div__(y) <==> self/y"""
         if isinstance(y, Number):
-            f = SpectralMatrix(deepcopy(dict(self)), self.testfunction,
-                               self.trialfunction, self.scale/y)
+            return self.__mul__(1./y)
         elif isinstance(y, np.ndarray):
-            f = SparseMatrix.__div__(self, y)
+            return self.solve(y.copy())
+        return NotImplemented
 
-        return f
+    def __truediv__(self, y):
+        """Returns copy self.__div__(y) <==> self/y"""
+        return self.__div__(y)
 
     def __add__(self, d):
         """Return copy of self.__add__(y) <==> self+d"""
-        assert isinstance(d, dict)
-        # Check is the same matrix
-        if self.__hash__() == d.__hash__():
-            f = SpectralMatrix(deepcopy(dict(self)), self.testfunction,
-                               self.trialfunction, self.scale+d.scale)
-        else:
-            f = SparseMatrix.__add__(self, d)
-        return f
+        return LinearOperator([self, d])
+
+    def __radd__(self, d):
+        """Return copy of self.__radd__(y) <==> d+self"""
+        return LinearOperator([d, self])
 
     def __sub__(self, d):
         """Return copy of self.__sub__(y) <==> self-d"""
-        assert isinstance(d, dict)
-        # Check is the same matrix
-        if self.__hash__() == d.__hash__():
-            f = SpectralMatrix(deepcopy(dict(self)), self.testfunction,
-                               self.trialfunction, self.scale-d.scale)
-        else:
-            f = SparseMatrix.__sub__(self, d)
-        return f
+        return LinearOperator([self, -d])
+
+    def __rsub__(self, d):
+        """Return copy of self.__rsub__(y) <==> d-self"""
+        return LinearOperator([d, -self])
+
+    def __neg__(self):
+        """Return copy of self.__neg__() <==> -self"""
+        return self.__mul__(-1)
 
 
 def check_sanity(A, test, trial):
@@ -200,16 +200,23 @@ def SBBmat_matvec3D(np.ndarray[T, ndim=3] v,
         int i, j, k, jj
         double p, r, d2
         T d
-        np.ndarray[T, ndim=2] s1 = np.zeros((v.shape[1], v.shape[2]), dtype=v.dtype)
-        np.ndarray[T, ndim=2] s2 = np.zeros((v.shape[1], v.shape[2]), dtype=v.dtype)
-        np.ndarray[T, ndim=2] o1 = np.zeros((v.shape[1], v.shape[2]), dtype=v.dtype)
-        np.ndarray[T, ndim=2] o2 = np.zeros((v.shape[1], v.shape[2]), dtype=v.dtype)
-        int N = v.shape[0]-4
+        np.ndarray[T, ndim=2] s1
+        np.ndarray[T, ndim=2] s2
+        np.ndarray[T, ndim=2] o1
+        np.ndarray[T, ndim=2] o2
+        int N = v.shape[axis]-4
 
     #for i in range(v.shape[1]):
         #for j in range(v.shape[2]):
             #SBBmat_matvec(v[:, i, j], bb[:, i, j], dd)
 
+    shape = [v.shape[0], v.shape[1], v.shape[2]]
+    del shape[axis]
+    s1 = np.zeros(shape, dtype=v.dtype)
+    s2 = np.zeros(shape, dtype=v.dtype)
+    o1 = np.zeros(shape, dtype=v.dtype)
+    o2 = np.zeros(shape, dtype=v.dtype)
+
     if axis == 0:
         k = N-1
         for i in range(v.shape[1]):
@@ -309,6 +316,77 @@ def ADDmat_matvec(np.ndarray[T, ndim=1] v,
             b[k] = dd[k]*v[k] + p*s2
 
 
+def ADDmat_matvec3D(np.ndarray[T, ndim=3] v,
+                    np.ndarray[T, ndim=3] b,
+                    np.ndarray[real_t, ndim=1] dd,
+                    np.int64_t axis):
+    cdef:
+        int i, j, k, jj
+        double p, d2
+        double pi = np.pi
+        np.ndarray[T, ndim=2] s1
+        np.ndarray[T, ndim=2] s2
+        int N = v.shape[axis]-2
+
+    if axis == 0:
+        s1 = np.zeros((v.shape[1], v.shape[2]), dtype=v.dtype)
+        s2 = np.zeros((v.shape[1], v.shape[2]), dtype=v.dtype)
+        for k in range(N-2, N):
+            for i in range(v.shape[1]):
+                for j in range(v.shape[2]):
+                    b[k, i, j] = dd[k]*v[k, i, j]
+
+        for k in xrange(N-3, -1, -1):
+            jj = k+2
+            p = -4*(k+1)*pi
+            d2 = dd[k]
+            for i in xrange(v.shape[1]):
+                for j in xrange(v.shape[2]):
+                    if jj % 2 == 0:
+                        s1[i, j] += v[jj, i, j]
+                        b[k, i, j] = d2*v[k, i, j] + p*s1[i, j]
+                    else:
+                        s2[i, j] += v[jj, i, j]
+                        b[k, i, j] = d2*v[k, i, j] + p*s2[i, j]
+
+    elif axis == 1:
+        s1 = np.zeros((v.shape[0], v.shape[2]), dtype=v.dtype)
+        s2 = np.zeros((v.shape[0], v.shape[2]), dtype=v.dtype)
+        for j in range(N-2, N):
+            for i in range(v.shape[0]):
+                for k in range(v.shape[2]):
+                    b[i, j, k] = dd[j]*v[i, j, k]
+
+        for j in xrange(N-3, -1, -1):
+            jj = j+2
+            p = -4*(j+1)*pi
+            d2 = dd[j]
+            for i in xrange(v.shape[0]):
+                for k in xrange(v.shape[2]):
+                    if jj % 2 == 0:
+                        s1[i, k] += v[i, jj, k]
+                        b[i, j, k] = d2*v[i, j, k] + p*s1[i, k]
+                    else:
+                        s2[i, k] += v[i, jj, k]
+                        b[i, j, k] = d2*v[i, j, k] + p*s2[i, k]
+
+    elif axis == 2:
+        s1 = np.zeros((v.shape[0], v.shape[1]), dtype=v.dtype)
+        s2 = np.zeros((v.shape[0], v.shape[1]), dtype=v.dtype)
+        for i in xrange(v.shape[0]):
+            for j in xrange(v.shape[1]):
+                b[i, j, N-1] = dd[N-1]*v[i, j, N-1]
+                b[i, j, N-2] = dd[N-2]*v[i, j, N-2]
+                for k in xrange(N-3, -1, -1):
+                    jj = k+2
+                    if jj % 2 == 0:
+                        s1[i, j] += v[i, j, jj]
+                        b[i, j, k] = dd[k]*v[i, j, k] - 4*(k+1)*pi*s1[i, j]
+                    else:
+                        s2[i, j] += v[i, j, jj]
+                        b[i, j, k] = dd[k]*v[i, j, k] - 4*(k+1)*pi*s2[i, j]
+
+
 def Tridiagonal_matvec3D(T[:, :, ::1] v,
                          T[:, :, ::1] b,
                          real_t[::1] ld,
@@ -781,3 +859,33 @@ def Helmholtz_matvec(np.ndarray[T, ndim=1] v,
     s2 += v[k+1]
     b[k] = (dd[k]*alfa + bd[k]*beta)*v[k] - pi_half*beta*v[k+2] + ud[k]*alfa*s1
     b[k-1] = (dd[k-1]*alfa + bd[k-1]*beta)*v[k-1] - pi_half*beta*v[k+1] + ud[k-1]*alfa*s2
+
+def Banded_matvec3D(T[:, :, ::1] v,
+                    T[:, :, ::1] b,
+                    const T[:, :, :] scales,
+                    const T[:, ::1] diags,
+                    int_t[::1] offsets,
+                    int_t[::1] terms,
+                    np.intp_t N,
+                    np.intp_t M):
+    # b = sum_t scale_t*A_t*v along the middle axis, where the A_t are banded
+    # N x M matrices. Diagonal d belongs to term terms[d], lies at offsets[d],
+    # and diags[d, j] multiplies v[i, j+offsets[d], k] in row j. The scales
+    # of the terms, scales[t, i, k], may be broadcast with zero strides
+    cdef:
+        np.intp_t i, j, k, d, o, t, j0, j1
+        T dv
+
+    for i in range(v.shape[0]):
+        for j in range(b.shape[1]):
+            for k in range(v.shape[2]):
+                b[i, j, k] = 0
+        for d in range(offsets.shape[0]):
+            o = offsets[d]
+            t = terms[d]
+            j0 = max(0, -o)
+            j1 = min(N, M-o)
+            for j in range(j0, j1):
+                dv = diags[d, j]
+                for k in range(v.shape[2]):
+                    b[i, j, k] += scales[t, i, k]*dv*v[i, j+o, k]
@@ -1,21 +1,108 @@
 #cython: boundscheck=False
 #cython: wraparound=False
 
+import os
+import multiprocessing
 import numpy as np
 cimport cython
 cimport numpy as np
+from cython.parallel cimport prange, parallel
+from libc.stdlib cimport malloc, free
+from libc.math cimport M_PI, fabs, sqrt
 from libcpp.vector cimport vector
 from libcpp.algorithm cimport copy
 
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #define SHENFUN_OPENMP 1
+    #else
+    #define SHENFUN_OPENMP 0
+    #endif
+    """
+    int SHENFUN_OPENMP
+
 ctypedef fused T:
     np.float64_t
     np.complex128_t
 
+# Precision of stored factors, see mixed precision solvers
+ctypedef fused factor_t:
+    np.float32_t
+    np.float64_t
+
 ctypedef np.complex128_t complex_t
 ctypedef np.float64_t real_t
 ctypedef np.int64_t int_t
 ctypedef double real
 
+cdef int _num_threads = 1
+
+def openmp_enabled():
+    """Return whether the solvers were compiled with OpenMP"""
+    return bool(SHENFUN_OPENMP)
+
+def set_num_threads(int n):
+    """Set number of threads used by the multidimensional solvers
+
+    The solvers are parallel over the lines of the array that are orthogonal
+    to the axis solved along. Each line is solved by one thread only, so the
+    results do not depend on the number of threads.
+
+    Parameters
+    ----------
+        n : int
+            Number of threads. Use all available cores if n < 1
+
+    Note
+    ----
+    The number of threads is ignored if the solvers were compiled without
+    OpenMP, see :func:`openmp_enabled`. The default number of threads is 1,
+    or the value of the environment variable OMP_NUM_THREADS.
+    """
+    global _num_threads
+    if n < 1:
+        n = multiprocessing.cpu_count()
+    _num_threads = n
+
+def get_num_threads():
+    """Return number of threads used by the multidimensional solvers"""
+    return _num_threads
+
+try:
+    set_num_threads(int(os.environ.get('OMP_NUM_THREADS', '1').split(',')[0]))
+except ValueError:
+    pass
+
+cdef inline void _outer(Py_ssize_t* shape,
+                        Py_ssize_t* strides,
+                        Py_ssize_t itemsize,
+                        int axis,
+                        Py_ssize_t* n,
+                        Py_ssize_t* st) nogil:
+    # Return shape and strides (in items) of the two axes not equal to axis
+    cdef int i, k = 0
+    for i in range(3):
+        if i != axis:
+            n[k] = shape[i]
+            st[k] = strides[i] // itemsize
+            k += 1
+
+cdef inline Py_ssize_t _offset(Py_ssize_t m,
+                               Py_ssize_t n,
+                               Py_ssize_t* st) nogil:
+    # Return offset of line m, with n lines along the second axis
+    return (m // n)*st[0] + (m % n)*st[1]
+
+cdef inline Py_ssize_t _boffset(Py_ssize_t m,
+                                Py_ssize_t n,
+                                Py_ssize_t* nb,
+                                Py_ssize_t* st) nogil:
+    # Return offset of line m, with n lines along the second axis, in an
+    # array with nb[0] lines along the first axis. The array is repeated
+    # along the first axis if it has fewer lines.
+    return ((m // n) % nb[0])*st[0] + (m % n)*st[1]
+
 
 #def PDMA_SymLU(np.ndarray[np.float64_t, ndim=1, mode='c'] d,
                #np.ndarray[np.float64_t, ndim=1, mode='c'] e,
@@ -51,7 +138,7 @@ cdef void PDMA_SymLU_ptr(real_t* d,
                          real_t* e,
                          real_t* f,
                          int n,
-                         int st):
+                         int st) nogil:
 
     cdef:
         int m, k, i
@@ -76,6 +163,7 @@ cdef void PDMA_SymLU_ptr(real_t* d,
     d[(n-1)*st] -= lam*e[(n-3)*st]
     e[(n-3)*st] = lam
 
+@cython.cdivision(True)
 def PDMA_SymLU_3D(S, A, B, np.int64_t axis,
                  real_t S_scale,
                  real_t[:, :, ::1] A_scale,
@@ -84,65 +172,47 @@ def PDMA_SymLU_3D(S, A, B, np.int64_t axis,
                  real_t[:, :, ::1] d1,
                  real_t[:, :, ::1] d2):
     cdef:
-        unsigned int i, ii, jj, strides
-        np.ndarray[real_t, ndim=1] S_0 = S[0].copy()
-        np.ndarray[real_t, ndim=1] A_0 = A[0].copy()
-        np.ndarray[real_t, ndim=1] A_2 = A[2].copy()
-        np.ndarray[real_t, ndim=1] B_0 = B[0].copy()
-        np.ndarray[real_t, ndim=1] B_2 = B[2].copy()
-        np.ndarray[real_t, ndim=1] B_4 = B[4].copy()
-
-    strides = d0.strides[axis]/d0.itemsize
-    if axis == 0:
-        for i in range(d0.shape[0]):
-            for ii in range(d0.shape[1]):
-                for jj in range(d0.shape[2]):
-                    d0[i, ii, jj] = S_0[i]*S_scale + A_0[i]*A_scale[0,ii,jj] + B_0[i]*B_scale[0, ii, jj]
-                    if i < d1.shape[0]:
-                        d1[i, ii, jj] = A_2[i]*A_scale[0, ii, jj] + B_2[i]*B_scale[0, ii, jj]
-                    if i < d2.shape[0]:
-                        d2[i, ii, jj] = B_4[i]*B_scale[0, ii, jj]
-
-        for ii in range(d0.shape[1]):
-            for jj in range(d0.shape[2]):
-                PDMA_SymLU_ptr(&d0[0, ii, jj],
-                               &d1[0, ii, jj],
-                               &d2[0, ii, jj],
-                               d0.shape[axis],
-                               strides)
-
-    elif axis == 1:
-        for ii in range(d0.shape[0]):
-            for i in range(d0.shape[1]):
-                for jj in range(d0.shape[2]):
-                    d0[ii, i, jj] = S_0[i]*S_scale + A_0[i]*A_scale[ii, 0, jj] + B_0[i]*B_scale[ii, 0, jj]
-                    if i < d1.shape[1]:
-                        d1[ii, i, jj] = A_2[i]*A_scale[ii, 0, jj] + B_2[i]*B_scale[ii, 0, jj]
-                    if i < d2.shape[1]:
-                        d2[ii, i, jj] = B_4[i]*B_scale[ii, 0, jj]
-
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[2]):
-                PDMA_SymLU_ptr(&d0[ii, 0, jj],
-                               &d1[ii, 0, jj],
-                               &d2[ii, 0, jj],
-                               d0.shape[axis],
-                               strides)
-
-    elif axis == 2:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[1]):
-                for i in range(d0.shape[2]):
-                    d0[ii, jj, i] = S_0[i]*S_scale + A_0[i]*A_scale[ii, jj, 0] + B_0[i]*B_scale[ii, jj, 0]
-                    if i < d1.shape[2]:
-                        d1[ii, jj, i] = A_2[i]*A_scale[ii, jj, 0] + B_2[i]*B_scale[ii, jj, 0]
-                    if i < d2.shape[2]:
-                        d2[ii, jj, i] = B_4[i]*B_scale[ii, jj, 0]
-                PDMA_SymLU_ptr(&d0[ii, jj, 0],
-                               &d1[ii, jj, 0],
-                               &d2[ii, jj, 0],
-                               d0.shape[axis],
-                               strides)
+        Py_ssize_t i, m, strides, o0, o1, o2, oa, ob
+        Py_ssize_t N[2]
+        Py_ssize_t st0[2]
+        Py_ssize_t st1[2]
+        Py_ssize_t st2[2]
+        Py_ssize_t sta[2]
+        Py_ssize_t stb[2]
+        int n = d0.shape[axis]
+        int n1 = d1.shape[axis]
+        int n2 = d2.shape[axis]
+        real_t[::1] S_0 = S[0].copy()
+        real_t[::1] A_0 = A[0].copy()
+        real_t[::1] A_2 = A[2].copy()
+        real_t[::1] B_0 = B[0].copy()
+        real_t[::1] B_2 = B[2].copy()
+        real_t[::1] B_4 = B[4].copy()
+        real_t* p0 = &d0[0, 0, 0]
+        real_t* p1 = &d1[0, 0, 0]
+        real_t* p2 = &d2[0, 0, 0]
+        real_t* pa = &A_scale[0, 0, 0]
+        real_t* pb = &B_scale[0, 0, 0]
+
+    strides = d0.strides[axis]//d0.itemsize
+    _outer(d0.shape, d0.strides, d0.itemsize, axis, N, st0)
+    _outer(d1.shape, d1.strides, d1.itemsize, axis, N, st1)
+    _outer(d2.shape, d2.strides, d2.itemsize, axis, N, st2)
+    _outer(A_scale.shape, A_scale.strides, A_scale.itemsize, axis, N, sta)
+    _outer(B_scale.shape, B_scale.strides, B_scale.itemsize, axis, N, stb)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        o0 = _offset(m, N[1], st0)
+        o1 = _offset(m, N[1], st1)
+        o2 = _offset(m, N[1], st2)
+        oa = _offset(m, N[1], sta)
+        ob = _offset(m, N[1], stb)
+        for i in range(n):
+            p0[o0+i*strides] = S_0[i]*S_scale + A_0[i]*pa[oa] + B_0[i]*pb[ob]
+        for i in range(n1):
+            p1[o1+i*strides] = A_2[i]*pa[oa] + B_2[i]*pb[ob]
+        for i in range(n2):
+            p2[o2+i*strides] = B_4[i]*pb[ob]
+        PDMA_SymLU_ptr(&p0[o0], &p1[o1], &p2[o2], n, strides)
 
 def PDMA_SymLU_2D(S, A, B, np.int64_t axis,
                  real_t S_scale,
@@ -160,7 +230,7 @@ def PDMA_SymLU_2D(S, A, B, np.int64_t axis,
         np.ndarray[real_t, ndim=1] B_2 = B[2].copy()
         np.ndarray[real_t, ndim=1] B_4 = B[4].copy()
 
-    strides = d0.strides[axis]/d0.itemsize
+    strides = d0.strides[axis]//d0.itemsize
     if axis == 0:
         for i in range(d0.shape[0]):
             for ii in range(d0.shape[1]):
@@ -193,34 +263,36 @@ def PDMA_SymLU_2D(S, A, B, np.int64_t axis,
                             d0.shape[axis],
                             strides)
 
+@cython.cdivision(True)
 def PDMA_SymSolve3D_VC(real_t[:, :, ::1] d,
                        real_t[:, :, ::1] a,
                        real_t[:, :, ::1] l,
                        T[:, :, ::1] x,
                        np.int64_t axis):
     cdef:
-        unsigned int n = d.shape[0]
-        np.intp_t i, j, k, strides
-
-    strides = x.strides[axis]/x.itemsize
-    if axis == 0:
-        for i in range(d.shape[1]):
-            for j in range(d.shape[2]):
-                PDMA_SymSolve_ptr3(&d[0, i, j], &a[0, i, j], &l[0, i, j],
-                                   &x[0, i, j], d.shape[axis], strides)
-
-    elif axis == 1:
-        for i in range(d.shape[0]):
-            for j in range(d.shape[2]):
-                PDMA_SymSolve_ptr3(&d[i, 0, j], &a[i, 0, j], &l[i, 0, j],
-                                   &x[i, 0, j], d.shape[axis], strides)
-
-    elif axis == 2:
-        for i in range(d.shape[0]):
-            for j in range(d.shape[1]):
-                PDMA_SymSolve_ptr3(&d[i, j, 0], &a[i, j, 0], &l[i, j, 0],
-                                   &x[i, j, 0], d.shape[axis], strides)
-
+        Py_ssize_t m, strides
+        Py_ssize_t N[2]
+        Py_ssize_t Nd[2]
+        Py_ssize_t std[2]
+        Py_ssize_t sta[2]
+        Py_ssize_t stl[2]
+        Py_ssize_t stx[2]
+        real_t* pd = &d[0, 0, 0]
+        real_t* pa = &a[0, 0, 0]
+        real_t* pl = &l[0, 0, 0]
+        T* px = &x[0, 0, 0]
+
+    strides = x.strides[axis]//x.itemsize
+    _outer(d.shape, d.strides, d.itemsize, axis, Nd, std)
+    _outer(a.shape, a.strides, a.itemsize, axis, Nd, sta)
+    _outer(l.shape, l.strides, l.itemsize, axis, Nd, stl)
+    _outer(x.shape, x.strides, x.itemsize, axis, N, stx)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        PDMA_SymSolve_ptr3(&pd[_boffset(m, N[1], Nd, std)],
+                           &pa[_boffset(m, N[1], Nd, sta)],
+                           &pl[_boffset(m, N[1], Nd, stl)],
+                           &px[_offset(m, N[1], stx)],
+                           d.shape[axis], strides)
 
 def PDMA_SymSolve2D_VC(real_t[:, ::1] d,
                        real_t[:, ::1] a,
@@ -231,7 +303,7 @@ def PDMA_SymSolve2D_VC(real_t[:, ::1] d,
         unsigned int n = d.shape[0]
         np.intp_t i, j, strides
 
-    strides = x.strides[axis]/x.itemsize
+    strides = x.strides[axis]//x.itemsize
     if axis == 0:
         for i in range(d.shape[1]):
             PDMA_SymSolve_ptr3(&d[0, i], &a[0, i], &l[0, i],
@@ -266,28 +338,27 @@ def PDMA_Symsolve(real_t[::1] d,
         b[k] /= d[k]
         b[k] -= (e[k]*b[k+2] + f[k]*b[k+4])
 
+@cython.cdivision(True)
 def PDMA_Symsolve3D(real_t [::1] d,
                     real_t [::1] e,
                     real_t [::1] f,
                     T [:, :, ::1] b,
                     np.int64_t axis):
     cdef:
-        int i, j, k
+        Py_ssize_t i, j, k
         int n = d.shape[0]
 
     if axis == 0:
-        for i in xrange(b.shape[1]):
-            for j in xrange(b.shape[2]):
+        for i in prange(b.shape[1], nogil=True, num_threads=_num_threads, schedule='static'):
+            for j in range(b.shape[2]):
                 b[2, i, j] -= e[0]*b[0, i, j]
                 b[3, i, j] -= e[1]*b[1, i, j]
 
-        for k in xrange(4, n):
-            for i in xrange(b.shape[1]):
-                for j in xrange(b.shape[2]):
+            for k in range(4, n):
+                for j in range(b.shape[2]):
                     b[k, i, j] -= (e[k-2]*b[k-2, i, j] + f[k-4]*b[k-4, i, j])
 
-        for i in xrange(b.shape[1]):
-            for j in xrange(b.shape[2]):
+            for j in range(b.shape[2]):
                 b[n-1, i, j] /= d[n-1]
                 b[n-2, i, j] /= d[n-2]
                 b[n-3, i, j] /= d[n-3]
@@ -295,23 +366,22 @@ def PDMA_Symsolve3D(real_t [::1] d,
                 b[n-4, i, j] /= d[n-4]
                 b[n-4, i, j] -= e[n-4]*b[n-2, i, j]
 
-        for k in xrange(n-5,-1,-1):
-            for i in xrange(b.shape[1]):
-                for j in xrange(b.shape[2]):
+            for k in range(n-5, -1, -1):
+                for j in range(b.shape[2]):
                     b[k, i, j] /= d[k]
                     b[k, i, j] -= (e[k]*b[k+2, i, j] + f[k]*b[k+4, i, j])
 
     elif axis == 1:
-        for i in xrange(b.shape[0]):
-            for k in xrange(b.shape[2]):
+        for i in prange(b.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
+            for k in range(b.shape[2]):
                 b[i, 2, k] -= e[0]*b[i, 0, k]
                 b[i, 3, k] -= e[1]*b[i, 1, k]
 
-            for j in xrange(4, n):
-                for k in xrange(b.shape[2]):
+            for j in range(4, n):
+                for k in range(b.shape[2]):
                     b[i, j, k] -= (e[j-2]*b[i, j-2, k] + f[j-4]*b[i, j-4, k])
 
-            for k in xrange(b.shape[2]):
+            for k in range(b.shape[2]):
                 b[i, n-1, k] /= d[n-1]
                 b[i, n-2, k] /= d[n-2]
                 b[i, n-3, k] /= d[n-3]
@@ -319,31 +389,15 @@ def PDMA_Symsolve3D(real_t [::1] d,
                 b[i, n-4, k] /= d[n-4]
                 b[i, n-4, k] -= e[n-4]*b[i, n-2, k]
 
-            for j in xrange(n-5,-1,-1):
-                for k in xrange(b.shape[2]):
+            for j in range(n-5, -1, -1):
+                for k in range(b.shape[2]):
                     b[i, j, k] /= d[j]
                     b[i, j, k] -= (e[j]*b[i, j+2, k] + f[j]*b[i, j+4, k])
 
     elif axis == 2:
-        for i in xrange(b.shape[0]):
-            for j in xrange(b.shape[1]):
-                b[i, j, 2] -= e[0]*b[i, j, 0]
-                b[i, j, 3] -= e[1]*b[i, j, 1]
-
-                for k in xrange(4, n):
-                    b[i, j, k] -= (e[k-2]*b[i, j, k-2] + f[k-4]*b[i, j, k-4])
-
-                b[i, j, n-1] /= d[n-1]
-                b[i, j, n-2] /= d[n-2]
-                b[i, j, n-3] /= d[n-3]
-                b[i, j, n-3] -= e[n-3]*b[i, j, n-1]
-                b[i, j, n-4] /= d[n-4]
-                b[i, j, n-4] -= e[n-4]*b[i, j, n-2]
-
-                for k in xrange(n-5,-1,-1):
-                    b[i, j, k] /= d[k]
-                    b[i, j, k] -= (e[k]*b[i, j, k+2] + f[k]*b[i, j, k+4])
-
+        for i in prange(b.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
+            for j in range(b.shape[1]):
+                PDMA_SymSolve_ptr(&d[0], &e[0], &f[0], &b[i, j, 0], n, 1)
 
 def PDMA_Symsolve2D(real_t [::1] d,
                     real_t [::1] e,
@@ -372,7 +426,7 @@ def PDMA_Symsolve2D(real_t [::1] d,
             b[n-4, j] -= e[n-4]*b[n-2, j]
 
         for k in xrange(n-5,-1,-1):
-            for i in xrange(b.shape[1]):
+            for j in xrange(b.shape[1]):
                 b[k, j] /= d[k]
                 b[k, j] -= (e[k]*b[k+2, j] + f[k]*b[k+4, j])
 
@@ -445,6 +499,7 @@ cdef void PDMA_SymSolve_ptr(real_t* d,
         b[k*st] -= (e[k]*b[(k+2)*st] + f[k]*b[(k+4)*st])
 
 
+@cython.cdivision(True)
 def PDMA_Symsolve3D_ptr(real_t[::1] d,
                         real_t[::1] e,
                         real_t[::1] f,
@@ -452,23 +507,15 @@ def PDMA_Symsolve3D_ptr(real_t[::1] d,
                         np.int64_t axis):
     cdef:
         int n = d.shape[0]
-        int i, j, k, strides
+        Py_ssize_t m, strides
+        Py_ssize_t N[2]
+        Py_ssize_t st[2]
+        T* px = &x[0, 0, 0]
 
-    strides = x.strides[axis]/x.itemsize
-    if axis == 0:
-        for j in range(x.shape[1]):
-            for k in range(x.shape[2]):
-                PDMA_SymSolve_ptr(&d[0], &e[0], &f[0], &x[0,j,k], n, strides)
-
-    elif axis == 1:
-        for i in range(x.shape[0]):
-            for k in range(x.shape[2]):
-                PDMA_SymSolve_ptr(&d[0], &e[0], &f[0], &x[i,0,k], n, strides)
-
-    elif axis == 2:
-        for i in range(x.shape[0]):
-            for j in range(x.shape[1]):
-                PDMA_SymSolve_ptr(&d[0], &e[0], &f[0], &x[i,j,0], n, strides)
+    strides = x.strides[axis]//x.itemsize
+    _outer(x.shape, x.strides, x.itemsize, axis, N, st)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        PDMA_SymSolve_ptr(&d[0], &e[0], &f[0], &px[_offset(m, N[1], st)], n, strides)
 
 def TDMA_SymLU(real_t[::1] d,
                real_t[::1] ud,
@@ -482,11 +529,11 @@ def TDMA_SymLU(real_t[::1] d,
         d[i] = d[i] - ld[i-2]*ud[i-2]
 
 
-cdef TDMA_SymLU_ptr(real_t* d,
-                    real_t* ud,
-                    real_t* ld,
-                    int n,
-                    int st):
+cdef void TDMA_SymLU_ptr(real_t* d,
+                         real_t* ud,
+                         real_t* ld,
+                         int n,
+                         int st) nogil:
     cdef:
         int i
 
@@ -494,6 +541,7 @@ cdef TDMA_SymLU_ptr(real_t* d,
         ld[(i-2)*st] = ud[(i-2)*st]/d[(i-2)*st]
         d[i*st] = d[i*st] - ld[(i-2)*st]*ud[(i-2)*st]
 
+@cython.cdivision(True)
 def TDMA_SymLU_3D(A, B, np.int64_t axis,
                  real_t A_scale,
                  real_t[:, :, ::1] B_scale,
@@ -501,51 +549,34 @@ def TDMA_SymLU_3D(A, B, np.int64_t axis,
                  real_t[:, :, ::1] d1,
                  real_t[:, :, ::1] L):
     cdef:
-        unsigned int i, ii, jj, strides
-        np.ndarray[real_t, ndim=1] A_0 = A[0].copy()
-        np.ndarray[real_t, ndim=1] B_0 = B[0].copy()
-        np.ndarray[real_t, ndim=1] B_2 = B[2].copy()
-
-    strides = d0.strides[axis]/d0.itemsize
-    if axis == 0:
-        for ii in range(d0.shape[1]):
-            for jj in range(d0.shape[2]):
-                for i in range(d0.shape[0]):
-                    d0[i, ii, jj] = A_0[i]*A_scale + B_0[i]*B_scale[0, ii, jj]
-                for i in range(d1.shape[0]):
-                    d1[i, ii, jj] = B_2[i]*B_scale[0, ii, jj]
-                TDMA_SymLU_ptr(&d0[0, ii, jj],
-                               &d1[0, ii, jj],
-                               &L[0, ii, jj],
-                               d0.shape[axis],
-                               strides)
-
-    elif axis == 1:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[2]):
-                for i in range(d0.shape[1]):
-                    d0[ii, i, jj] = A_0[i]*A_scale + B_0[i]*B_scale[ii, 0, jj]
-                for i in range(d1.shape[axis]):
-                    d1[ii, i, jj] = B_2[i]*B_scale[ii, 0, jj]
-                TDMA_SymLU_ptr(&d0[ii, 0, jj],
-                               &d1[ii, 0, jj],
-                               &L[ii, 0, jj],
-                               d0.shape[axis],
-                               strides)
-
-    elif axis == 2:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[1]):
-                for i in range(d0.shape[2]):
-                    d0[ii, jj, i] = A_0[i]*A_scale + B_0[i]*B_scale[ii, jj, 0]
-                for i in range(d1.shape[axis]):
-                    d1[ii, jj, i] = B_2[i]*B_scale[ii, jj, 0]
-                TDMA_SymLU_ptr(&d0[ii, jj, 0],
-                               &d1[ii, jj, 0],
-                               &L[ii, jj, 0],
-                               d0.shape[axis],
-                               strides)
-
+        Py_ssize_t i, m, strides, o0, o1, ob
+        Py_ssize_t N[2]
+        Py_ssize_t st0[2]
+        Py_ssize_t st1[2]
+        Py_ssize_t stb[2]
+        int n = d0.shape[axis]
+        int n1 = d1.shape[axis]
+        real_t[::1] A_0 = A[0].copy()
+        real_t[::1] B_0 = B[0].copy()
+        real_t[::1] B_2 = B[2].copy()
+        real_t* p0 = &d0[0, 0, 0]
+        real_t* p1 = &d1[0, 0, 0]
+        real_t* pL = &L[0, 0, 0]
+        real_t* pb = &B_scale[0, 0, 0]
+
+    strides = d0.strides[axis]//d0.itemsize
+    _outer(d0.shape, d0.strides, d0.itemsize, axis, N, st0)
+    _outer(d1.shape, d1.strides, d1.itemsize, axis, N, st1)
+    _outer(B_scale.shape, B_scale.strides, B_scale.itemsize, axis, N, stb)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        o0 = _offset(m, N[1], st0)
+        o1 = _offset(m, N[1], st1)
+        ob = _offset(m, N[1], stb)
+        for i in range(n):
+            p0[o0+i*strides] = A_0[i]*A_scale + B_0[i]*pb[ob]
+        for i in range(n1):
+            p1[o1+i*strides] = B_2[i]*pb[ob]
+        TDMA_SymLU_ptr(&p0[o0], &p1[o1], &pL[o1], n, strides)
 
 def TDMA_SymLU_2D(A, B, np.int64_t axis,
                  real_t A_scale,
@@ -559,7 +590,7 @@ def TDMA_SymLU_2D(A, B, np.int64_t axis,
         np.ndarray[real_t, ndim=1] B_0 = B[0].copy()
         np.ndarray[real_t, ndim=1] B_2 = B[2].copy()
 
-    strides = d0.strides[axis]/d0.itemsize
+    strides = d0.strides[axis]//d0.itemsize
     if axis == 0:
         for ii in range(d0.shape[1]):
             for i in range(d0.shape[0]):
@@ -603,6 +634,7 @@ cdef void TDMA_SymSolve_ptr(real_t* d,
         x[i*st] = (x[i*st] - a[i]*x[(i+2)*st])/d[i]
 
 
+@cython.cdivision(True)
 def TDMA_SymSolve3D_ptr(real_t[::1] d,
                         real_t[::1] a,
                         real_t[::1] l,
@@ -610,23 +642,15 @@ def TDMA_SymSolve3D_ptr(real_t[::1] d,
                         np.int64_t axis):
     cdef:
         int n = d.shape[0]
-        int i, j, k, strides
-
-    strides = x.strides[axis]/x.itemsize
-    if axis == 0:
-        for j in range(x.shape[1]):
-            for k in range(x.shape[2]):
-                TDMA_SymSolve_ptr(&d[0], &a[0], &l[0], &x[0,j,k], n, strides)
+        Py_ssize_t m, strides
+        Py_ssize_t N[2]
+        Py_ssize_t st[2]
+        T* px = &x[0, 0, 0]
 
-    elif axis == 1:
-        for i in range(x.shape[0]):
-            for k in range(x.shape[2]):
-                TDMA_SymSolve_ptr(&d[0], &a[0], &l[0], &x[i,0,k], n, strides)
-
-    elif axis == 2:
-        for i in range(x.shape[0]):
-            for j in range(x.shape[1]):
-                TDMA_SymSolve_ptr(&d[0], &a[0], &l[0], &x[i,j,0], n, strides)
+    strides = x.strides[axis]//x.itemsize
+    _outer(x.shape, x.strides, x.itemsize, axis, N, st)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        TDMA_SymSolve_ptr(&d[0], &a[0], &l[0], &px[_offset(m, N[1], st)], n, strides)
 
 def TDMA_SymSolve(real_t[::1] d,
                   real_t[::1] a,
@@ -645,35 +669,34 @@ def TDMA_SymSolve(real_t[::1] d,
         x[i] = (x[i] - a[i]*x[i+2])/d[i]
 
 
+@cython.cdivision(True)
 def TDMA_SymSolve3D(real_t[::1] d,
                     real_t[::1] a,
                     real_t[::1] l,
                     T[:,:,::1] x,
                     np.int64_t axis):
     cdef:
-        unsigned int n = d.shape[0]
-        np.intp_t i, j, k
+        int n = d.shape[0]
+        Py_ssize_t i, j, k
         real_t d1
 
     if axis == 0:
-        for i in range(2, n):
-            for j in range(x.shape[1]):
+        for j in prange(x.shape[1], nogil=True, num_threads=_num_threads, schedule='static'):
+            for i in range(2, n):
                 for k in range(x.shape[2]):
                     x[i, j, k] -= l[i-2]*x[i-2, j, k]
 
-        for j in range(x.shape[1]):
             for k in range(x.shape[2]):
                 x[n-1, j, k] = x[n-1, j, k]/d[n-1]
                 x[n-2, j, k] = x[n-2, j, k]/d[n-2]
 
-        for i in range(n - 3, -1, -1):
-            d1 = 1./d[i]
-            for j in range(x.shape[1]):
+            for i in range(n - 3, -1, -1):
+                d1 = 1./d[i]
                 for k in range(x.shape[2]):
                     x[i, j, k] = (x[i, j, k] - a[i]*x[i+2, j, k])*d1
 
     elif axis == 1:
-        for i in range(x.shape[0]):
+        for i in prange(x.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
             for j in range(2, n):
                 for k in range(x.shape[2]):
                     x[i, j, k] -= l[j-2]*x[i, j-2, k]
@@ -687,15 +710,9 @@ def TDMA_SymSolve3D(real_t[::1] d,
                     x[i, j, k] = (x[i, j, k] - a[j]*x[i, j+2, k])/d[j]
 
     elif axis == 2:
-        for i in range(x.shape[0]):
+        for i in prange(x.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
             for j in range(x.shape[1]):
-                for k in range(2, n):
-                    x[i, j, k] -= l[k-2]*x[i, j, k-2]
-
-                x[i, j, n-1] = x[i, j, n-1]/d[n-1]
-                x[i, j, n-2] = x[i, j, n-2]/d[n-2]
-                for k in range(n - 3, -1, -1):
-                    x[i, j, k] = (x[i, j, k] - a[k]*x[i, j, k+2])/d[k]
+                TDMA_SymSolve_ptr(&d[0], &a[0], &l[0], &x[i, j, 0], n, 1)
 
 def TDMA_SymSolve2D(real_t[::1] d,
                     real_t[::1] a,
@@ -733,34 +750,36 @@ def TDMA_SymSolve2D(real_t[::1] d,
                 x[i, j] = (x[i, j] - a[j]*x[i, j+2])/d[j]
 
 
+@cython.cdivision(True)
 def TDMA_SymSolve3D_VC(real_t[:, :, ::1] d,
                        real_t[:, :, ::1] a,
                        real_t[:, :, ::1] l,
                        T[:,:,::1] x,
                        np.int64_t axis):
     cdef:
-        unsigned int n = d.shape[0]
-        np.intp_t i, j, k, strides
-
-    strides = x.strides[axis]/x.itemsize
-    if axis == 0:
-        for i in range(d.shape[1]):
-            for j in range(d.shape[2]):
-                TDMA_SymSolve_ptr3(&d[0, i, j], &a[0, i, j], &l[0, i, j],
-                                   &x[0, i, j], d.shape[axis], strides)
-
-    elif axis == 1:
-        for i in range(d.shape[0]):
-            for j in range(d.shape[2]):
-                TDMA_SymSolve_ptr3(&d[i, 0, j], &a[i, 0, j], &l[i, 0, j],
-                                   &x[i, 0, j], d.shape[axis], strides)
-
-    elif axis == 2:
-        for i in range(d.shape[0]):
-            for j in range(d.shape[1]):
-                TDMA_SymSolve_ptr3(&d[i, j, 0], &a[i, j, 0], &l[i, j, 0],
-                                   &x[i, j, 0], d.shape[axis], strides)
-
+        Py_ssize_t m, strides
+        Py_ssize_t N[2]
+        Py_ssize_t Nd[2]
+        Py_ssize_t std[2]
+        Py_ssize_t sta[2]
+        Py_ssize_t stl[2]
+        Py_ssize_t stx[2]
+        real_t* pd = &d[0, 0, 0]
+        real_t* pa = &a[0, 0, 0]
+        real_t* pl = &l[0, 0, 0]
+        T* px = &x[0, 0, 0]
+
+    strides = x.strides[axis]//x.itemsize
+    _outer(d.shape, d.strides, d.itemsize, axis, Nd, std)
+    _outer(a.shape, a.strides, a.itemsize, axis, Nd, sta)
+    _outer(l.shape, l.strides, l.itemsize, axis, Nd, stl)
+    _outer(x.shape, x.strides, x.itemsize, axis, N, stx)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        TDMA_SymSolve_ptr3(&pd[_boffset(m, N[1], Nd, std)],
+                           &pa[_boffset(m, N[1], Nd, sta)],
+                           &pl[_boffset(m, N[1], Nd, stl)],
+                           &px[_offset(m, N[1], stx)],
+                           d.shape[axis], strides)
 
 def TDMA_SymSolve2D_VC(real_t[:, ::1] d,
                        real_t[:, ::1] a,
@@ -771,7 +790,7 @@ def TDMA_SymSolve2D_VC(real_t[:, ::1] d,
         unsigned int n = d.shape[0]
         np.intp_t i, j, strides
 
-    strides = x.strides[axis]/x.itemsize
+    strides = x.strides[axis]//x.itemsize
     if axis == 0:
         for j in range(d.shape[1]):
             TDMA_SymSolve_ptr3(&d[0, j], &a[0, j], &l[0, j],
@@ -891,10 +910,10 @@ def Solve_Helmholtz_1D(np.ndarray[T, ndim=1] fk,
 cdef void Solve_Helmholtz_1D_ptr(T* fk,
                                  T* u_hat,
                                  bint neumann,
-                                 real_t* d0,
-                                 real_t* d1,
-                                 real_t* d2,
-                                 real_t* L,
+                                 factor_t* d0,
+                                 factor_t* d1,
+                                 factor_t* d2,
+                                 factor_t* L,
                                  T* y,
                                  int N,
                                  int strides) nogil:
@@ -929,64 +948,49 @@ cdef void Solve_Helmholtz_1D_ptr(T* fk,
         for i in xrange(1, N):
             u_hat[i*st] /= (i*i)
 
+@cython.cdivision(True)
 def Solve_Helmholtz_3D_ptr(np.int64_t axis,
                            T[:,:,::1] fk,
                            T[:,:,::1] u_hat,
                            bint neumann,
-                           real_t[:,:,::1] d0,
-                           real_t[:,:,::1] d1,
-                           real_t[:,:,::1] d2,
-                           real_t[:,:,::1] L):
+                           factor_t[:,:,::1] d0,
+                           factor_t[:,:,::1] d1,
+                           factor_t[:,:,::1] d2,
+                           factor_t[:,:,::1] L):
     cdef:
-        T* fk_ptr
-        T* u_hat_ptr
-        real_t* d0_ptr
-        real_t* d1_ptr
-        real_t* d2_ptr
-        real_t* L_ptr
-        vector[T] y
-        int ii, jj, strides
-
-    strides = fk.strides[axis]/fk.itemsize
-    y.resize(d0.shape[axis])
-    if axis == 0:
-        for ii in range(d0.shape[1]):
-            for jj in range(d0.shape[2]):
-                fk_ptr = &fk[0,ii,jj]
-                u_hat_ptr = &u_hat[0,ii,jj]
-                d0_ptr = &d0[0,ii,jj]
-                d1_ptr = &d1[0,ii,jj]
-                d2_ptr = &d2[0,ii,jj]
-                L_ptr = &L[0,ii,jj]
-                Solve_Helmholtz_1D_ptr(fk_ptr, u_hat_ptr, neumann, d0_ptr,
-                                       d1_ptr, d2_ptr, L_ptr, &y[0], d0.shape[axis],
-                                       strides)
-    elif axis == 1:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[2]):
-                fk_ptr = &fk[ii,0,jj]
-                u_hat_ptr = &u_hat[ii,0,jj]
-                d0_ptr = &d0[ii,0,jj]
-                d1_ptr = &d1[ii,0,jj]
-                d2_ptr = &d2[ii,0,jj]
-                L_ptr = &L[ii,0,jj]
-                Solve_Helmholtz_1D_ptr(fk_ptr, u_hat_ptr, neumann, d0_ptr,
-                                       d1_ptr, d2_ptr, L_ptr, &y[0], d0.shape[axis],
-                                       strides)
-
-    elif axis == 2:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[1]):
-                fk_ptr = &fk[ii,jj,0]
-                u_hat_ptr = &u_hat[ii,jj,0]
-                d0_ptr = &d0[ii,jj,0]
-                d1_ptr = &d1[ii,jj,0]
-                d2_ptr = &d2[ii,jj,0]
-                L_ptr = &L[ii,jj,0]
-                Solve_Helmholtz_1D_ptr(fk_ptr, u_hat_ptr, neumann, d0_ptr,
-                                       d1_ptr, d2_ptr, L_ptr, &y[0], d0.shape[axis],
-                                       strides)
-
+        T* y
+        T* pf = &fk[0, 0, 0]
+        T* pu = &u_hat[0, 0, 0]
+        factor_t* p0 = &d0[0, 0, 0]
+        factor_t* p1 = &d1[0, 0, 0]
+        factor_t* p2 = &d2[0, 0, 0]
+        factor_t* pL = &L[0, 0, 0]
+        int n = d0.shape[axis]
+        Py_ssize_t m, strides
+        Py_ssize_t N[2]
+        Py_ssize_t Nd[2]
+        Py_ssize_t stf[2]
+        Py_ssize_t st0[2]
+        Py_ssize_t st1[2]
+        Py_ssize_t st2[2]
+
+    strides = fk.strides[axis]//fk.itemsize
+    _outer(fk.shape, fk.strides, fk.itemsize, axis, N, stf)
+    _outer(d1.shape, d1.strides, d1.itemsize, axis, Nd, st1)
+    _outer(d2.shape, d2.strides, d2.itemsize, axis, Nd, st2)
+    _outer(d0.shape, d0.strides, d0.itemsize, axis, Nd, st0)
+    with nogil, parallel(num_threads=_num_threads):
+        y = <T*>malloc(n*sizeof(T))
+        for m in prange(N[0]*N[1], schedule='static'):
+            Solve_Helmholtz_1D_ptr(&pf[_offset(m, N[1], stf)],
+                                   &pu[_offset(m, N[1], stf)],
+                                   neumann,
+                                   &p0[_boffset(m, N[1], Nd, st0)],
+                                   &p1[_boffset(m, N[1], Nd, st1)],
+                                   &p2[_boffset(m, N[1], Nd, st2)],
+                                   &pL[_boffset(m, N[1], Nd, st1)],
+                                   y, n, strides)
+        free(y)
 
 def Solve_Helmholtz_2D_ptr(np.int64_t axis,
                            T[:,::1] fk,
@@ -1006,7 +1010,7 @@ def Solve_Helmholtz_2D_ptr(np.int64_t axis,
         vector[T] y
         int ii, strides
 
-    strides = fk.strides[axis]/fk.itemsize
+    strides = fk.strides[axis]//fk.itemsize
     y.resize(d0.shape[axis])
     if axis == 0:
         for ii in range(d0.shape[1]):
@@ -1032,52 +1036,105 @@ def Solve_Helmholtz_2D_ptr(np.int64_t axis,
                                     strides)
 
 
+cdef void LU_Helmholtz_1D_ptr(real_t* A_0,
+                              real_t* A_2,
+                              real_t* A_4,
+                              real_t* B_m2,
+                              real_t* B_0,
+                              real_t* B_2,
+                              real_t A_scale,
+                              real_t B_scale,
+                              bint neumann,
+                              real_t* d0,
+                              real_t* d1,
+                              real_t* d2,
+                              real_t* L,
+                              int N,
+                              int st) nogil:
+    # Same as LU_Helmholtz_1D, but for strided output and with the Neumann
+    # modifications of A and B already applied (except for A_0[0])
+    cdef:
+        int i
+        real_t a00 = A_0[0]
+
+    if neumann:
+        a00 = M_PI/A_scale
+
+    d0[0] = A_scale*a00 + B_scale*B_0[0]
+    d0[st] = A_scale*A_0[1] + B_scale*B_0[1]
+    d1[0] = A_scale*A_2[0] + B_scale*B_2[0]
+    d1[st] = A_scale*A_2[1] + B_scale*B_2[1]
+    d2[0] = A_scale*A_4[0]
+    d2[st] = A_scale*A_4[1]
+    for i in range(2, N):
+        L[(i-2)*st] = B_scale*B_m2[i-2] / d0[(i-2)*st]
+        d0[i*st] = A_scale*A_0[i] + B_scale*B_0[i] - L[(i-2)*st]*d1[(i-2)*st]
+        if i < N-2:
+            d1[i*st] = A_scale*A_2[i] + B_scale*B_2[i] - L[(i-2)*st]*d2[(i-2)*st]
+        if i < N-4:
+            d2[i*st] = A_scale*A_4[i] - L[(i-2)*st]*d2[(i-2)*st]
+
+@cython.cdivision(True)
 def LU_Helmholtz_3D(A, B, np.int64_t axis,
-                    np.ndarray[real_t, ndim=3] A_scale,
-                    np.ndarray[real_t, ndim=3] B_scale,
+                    real_t[:, :, ::1] A_scale,
+                    real_t[:, :, ::1] B_scale,
                     bint neumann,
-                    np.ndarray[real_t, ndim=3] d0,
-                    np.ndarray[real_t, ndim=3] d1,
-                    np.ndarray[real_t, ndim=3] d2,
-                    np.ndarray[real_t, ndim=3] L):
+                    real_t[:, :, ::1] d0,
+                    real_t[:, :, ::1] d1,
+                    real_t[:, :, ::1] d2,
+                    real_t[:, :, ::1] L):
     cdef:
-        unsigned int ii, jj
-
-    if axis == 0:
-        for ii in range(d0.shape[1]):
-            for jj in range(d0.shape[2]):
-                LU_Helmholtz_1D(A, B,
-                                A_scale[0, ii, jj],
-                                B_scale[0, ii, jj],
-                                neumann,
-                                d0[:, ii, jj],
-                                d1[:, ii, jj],
-                                d2[:, ii, jj],
-                                L [:, ii, jj])
+        int i, N
+        Py_ssize_t m, strides
+        Py_ssize_t M[2]
+        Py_ssize_t sta[2]
+        Py_ssize_t stb[2]
+        Py_ssize_t st0[2]
+        Py_ssize_t st1[2]
+        Py_ssize_t st2[2]
+        real_t[::1] A_0 = A[0].copy()
+        real_t[::1] A_2 = A[2].copy()
+        real_t[::1] A_4 = A[4].copy()
+        real_t[::1] B_m2 = B[-2].copy()
+        real_t[::1] B_0 = B[0].copy()
+        real_t[::1] B_2 = B[2].copy()
+        real_t* pa = &A_scale[0, 0, 0]
+        real_t* pb = &B_scale[0, 0, 0]
+        real_t* p0 = &d0[0, 0, 0]
+        real_t* p1 = &d1[0, 0, 0]
+        real_t* p2 = &d2[0, 0, 0]
+        real_t* pL = &L[0, 0, 0]
 
-    elif axis == 1:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[2]):
-                LU_Helmholtz_1D(A, B,
-                                A_scale[ii, 0, jj],
-                                B_scale[ii, 0, jj],
-                                neumann,
-                                d0[ii, :, jj],
-                                d1[ii, :, jj],
-                                d2[ii, :, jj],
-                                L [ii, :, jj])
+    N = A_0.shape[0]
+    if neumann:
+        B_0[0] = 0.0
+        for i in range(1, N):
+            A_0[i] /= pow(i, 2)
+            B_0[i] /= pow(i, 2)
+        for i in range(2, N):
+            A_2[i-2] /= pow(i, 2)
+            B_2[i-2] /= pow(i, 2)
+        for i in range(4, N):
+            A_4[i-4] /= pow(i, 2)
+        for i in range(1, N-2):
+            B_m2[i] /= pow(i, 2)
 
-    elif axis == 2:
-        for ii in range(d0.shape[0]):
-            for jj in range(d0.shape[1]):
-                LU_Helmholtz_1D(A, B,
-                                A_scale[ii, jj, 0],
-                                B_scale[ii, jj, 0],
-                                neumann,
-                                d0[ii, jj, :],
-                                d1[ii, jj, :],
-                                d2[ii, jj, :],
-                                L [ii, jj, :])
+    strides = d0.strides[axis]//d0.itemsize
+    _outer(A_scale.shape, A_scale.strides, A_scale.itemsize, axis, M, sta)
+    _outer(B_scale.shape, B_scale.strides, B_scale.itemsize, axis, M, stb)
+    _outer(d1.shape, d1.strides, d1.itemsize, axis, M, st1)
+    _outer(d2.shape, d2.strides, d2.itemsize, axis, M, st2)
+    _outer(d0.shape, d0.strides, d0.itemsize, axis, M, st0)
+    for m in prange(M[0]*M[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        LU_Helmholtz_1D_ptr(&A_0[0], &A_2[0], &A_4[0], &B_m2[0], &B_0[0], &B_2[0],
+                            pa[_offset(m, M[1], sta)],
+                            pb[_offset(m, M[1], stb)],
+                            neumann,
+                            &p0[_offset(m, M[1], st0)],
+                            &p1[_offset(m, M[1], st1)],
+                            &p2[_offset(m, M[1], st2)],
+                            &pL[_offset(m, M[1], st1)],
+                            N, strides)
 
 def Solve_Helmholtz_3D(np.int64_t axis,
                        np.ndarray[T, ndim=3] fk,
@@ -1661,17 +1718,17 @@ def Solve_oe_Biharmonic_1D(bint odd,
 def Solve_Biharmonic_3D_n(np.int64_t axis,
                           np.ndarray[T, ndim=3, mode='c'] fk,
                           np.ndarray[T, ndim=3, mode='c'] uk,
-                          np.ndarray[real_t, ndim=4, mode='c'] u0,
-                          np.ndarray[real_t, ndim=4, mode='c'] u1,
-                          np.ndarray[real_t, ndim=4, mode='c'] u2,
-                          np.ndarray[real_t, ndim=4, mode='c'] l0,
-                          np.ndarray[real_t, ndim=4, mode='c'] l1,
-                          np.ndarray[real_t, ndim=4, mode='c'] a,
-                          np.ndarray[real_t, ndim=4, mode='c'] b,
+                          np.ndarray[factor_t, ndim=4, mode='c'] u0,
+                          np.ndarray[factor_t, ndim=4, mode='c'] u1,
+                          np.ndarray[factor_t, ndim=4, mode='c'] u2,
+                          np.ndarray[factor_t, ndim=4, mode='c'] l0,
+                          np.ndarray[factor_t, ndim=4, mode='c'] l1,
+                          np.ndarray[factor_t, ndim=4, mode='c'] a,
+                          np.ndarray[factor_t, ndim=4, mode='c'] b,
                           np.ndarray[real_t, ndim=3] a0):
 
     cdef:
-        int i, j, k, kk, m, M, ke, ko, jj, je, jo
+        int i, j, k, kk, m, M, ke, ko, jj, je, jo, jf
         np.float_t ac
         np.ndarray[T, ndim=2, mode='c'] s1
         np.ndarray[T, ndim=2, mode='c'] s2
@@ -1687,48 +1744,43 @@ def Solve_Biharmonic_3D_n(np.int64_t axis,
         o2 = np.zeros((fk.shape[1], fk.shape[2]), dtype=fk.dtype)
 
         M = u0.shape[1]
-        for j in range(fk.shape[1]):
+        for j in prange(fk.shape[1], nogil=True, num_threads=_num_threads, schedule='static'):
             for k in range(fk.shape[2]):
                 y[0, j, k] = fk[0, j, k]
                 y[1, j, k] = fk[1, j, k]
                 y[2, j, k] = fk[2, j, k] - l0[0, 0, j, k]*y[0, j, k]
                 y[3, j, k] = fk[3, j, k] - l0[1, 0, j, k]*y[1, j, k]
 
-        for i in xrange(2, M):
-            ke = 2*i
-            ko = ke+1
-            for j in range(fk.shape[1]):
+            for i in range(2, M):
+                ke = 2*i
+                ko = ke+1
                 for k in range(fk.shape[2]):
                     y[ko, j, k] = fk[ko, j, k] - l0[1, i-1, j, k]*y[ko-2, j, k] - l1[1, i-2, j, k]*y[ko-4, j, k]
                     y[ke, j, k] = fk[ke, j, k] - l0[0, i-1, j, k]*y[ke-2, j, k] - l1[0, i-2, j, k]*y[ke-4, j, k]
 
-        ke = 2*(M-1)
-        ko = ke+1
-        for j in range(fk.shape[1]):
+            ke = 2*(M-1)
+            ko = ke+1
             for k in range(fk.shape[2]):
                 uk[ke, j, k] = y[ke, j, k] / u0[0, M-1, j, k]
                 uk[ko, j, k] = y[ko, j, k] / u0[1, M-1, j, k]
 
-        ke = 2*(M-2)
-        ko = ke+1
-        for j in range(fk.shape[1]):
+            ke = 2*(M-2)
+            ko = ke+1
             for k in range(fk.shape[2]):
                 uk[ke, j, k] = (y[ke, j, k] - u1[0, M-2, j, k]*uk[ke+2, j, k]) / u0[0, M-2, j, k]
                 uk[ko, j, k] = (y[ko, j, k] - u1[1, M-2, j, k]*uk[ko+2, j, k]) / u0[1, M-2, j, k]
 
-        ke = 2*(M-3)
-        ko = ke+1
-        for j in range(fk.shape[1]):
+            ke = 2*(M-3)
+            ko = ke+1
             for k in range(fk.shape[2]):
                 uk[ke, j, k] = (y[ke, j, k] - u1[0, M-3, j, k]*uk[ke+2, j, k] - u2[0, M-3, j, k]*uk[ke+4, j, k]) / u0[0, M-3, j, k]
                 uk[ko, j, k] = (y[ko, j, k] - u1[1, M-3, j, k]*uk[ko+2, j, k] - u2[1, M-3, j, k]*uk[ko+4, j, k]) / u0[1, M-3, j, k]
 
-        for kk in xrange(M-4, -1, -1):
-            ke = 2*kk
-            ko = ke+1
-            je = ke+6
-            jo = ko+6
-            for j in range(fk.shape[1]):
+            for kk in range(M-4, -1, -1):
+                ke = 2*kk
+                ko = ke+1
+                je = ke+6
+                jo = ko+6
                 for k in range(fk.shape[2]):
                     ac = a0[0, j, k]
                     s1[j, k] += uk[je, j, k]/(je+3.)
@@ -1745,51 +1797,53 @@ def Solve_Biharmonic_3D_n(np.int64_t axis,
         o2 = np.zeros((fk.shape[0], fk.shape[2]), dtype=fk.dtype)
 
         M = u0.shape[2]
-        for j in range(fk.shape[0]):
+        for j in prange(fk.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
+            # Factors are repeated along the first axis if shorter
+            jf = j % u0.shape[1]
             for k in range(fk.shape[2]):
                 y[j, 0, k] = fk[j, 0, k]
                 y[j, 1, k] = fk[j, 1, k]
-                y[j, 2, k] = fk[j, 2, k] - l0[0, j, 0, k]*y[j, 0, k]
-                y[j, 3, k] = fk[j, 3, k] - l0[1, j, 0, k]*y[j, 1, k]
+                y[j, 2, k] = fk[j, 2, k] - l0[0, jf, 0, k]*y[j, 0, k]
+                y[j, 3, k] = fk[j, 3, k] - l0[1, jf, 0, k]*y[j, 1, k]
 
-            for i in xrange(2, M):
+            for i in range(2, M):
                 ke = 2*i
                 ko = ke+1
                 for k in range(fk.shape[2]):
-                    y[j, ko, k] = fk[j, ko, k] - l0[1, j, i-1, k]*y[j, ko-2, k] - l1[1, j, i-2, k]*y[j, ko-4, k]
-                    y[j, ke, k] = fk[j, ke, k] - l0[0, j, i-1, k]*y[j, ke-2, k] - l1[0, j, i-2, k]*y[j, ke-4, k]
+                    y[j, ko, k] = fk[j, ko, k] - l0[1, jf, i-1, k]*y[j, ko-2, k] - l1[1, jf, i-2, k]*y[j, ko-4, k]
+                    y[j, ke, k] = fk[j, ke, k] - l0[0, jf, i-1, k]*y[j, ke-2, k] - l1[0, jf, i-2, k]*y[j, ke-4, k]
 
             ke = 2*(M-1)
             ko = ke+1
             for k in range(fk.shape[2]):
-                uk[j, ke, k] = y[j, ke, k] / u0[0, j, M-1, k]
-                uk[j, ko, k] = y[j, ko, k] / u0[1, j, M-1, k]
+                uk[j, ke, k] = y[j, ke, k] / u0[0, jf, M-1, k]
+                uk[j, ko, k] = y[j, ko, k] / u0[1, jf, M-1, k]
 
             ke = 2*(M-2)
             ko = ke+1
             for k in range(fk.shape[2]):
-                uk[j, ke, k] = (y[j, ke, k] - u1[0, j, M-2, k]*uk[j, ke+2, k]) / u0[0, j, M-2, k]
-                uk[j, ko, k] = (y[j, ko, k] - u1[1, j, M-2, k]*uk[j, ko+2, k]) / u0[1, j, M-2, k]
+                uk[j, ke, k] = (y[j, ke, k] - u1[0, jf, M-2, k]*uk[j, ke+2, k]) / u0[0, jf, M-2, k]
+                uk[j, ko, k] = (y[j, ko, k] - u1[1, jf, M-2, k]*uk[j, ko+2, k]) / u0[1, jf, M-2, k]
 
             ke = 2*(M-3)
             ko = ke+1
             for k in range(fk.shape[2]):
-                uk[j, ke, k] = (y[j, ke, k] - u1[0, j, M-3, k]*uk[j, ke+2, k] - u2[0, j, M-3, k]*uk[j, ke+4, k]) / u0[0, j, M-3, k]
-                uk[j, ko, k] = (y[j, ko, k] - u1[1, j, M-3, k]*uk[j, ko+2, k] - u2[1, j, M-3, k]*uk[j, ko+4, k]) / u0[1, j, M-3, k]
+                uk[j, ke, k] = (y[j, ke, k] - u1[0, jf, M-3, k]*uk[j, ke+2, k] - u2[0, jf, M-3, k]*uk[j, ke+4, k]) / u0[0, jf, M-3, k]
+                uk[j, ko, k] = (y[j, ko, k] - u1[1, jf, M-3, k]*uk[j, ko+2, k] - u2[1, jf, M-3, k]*uk[j, ko+4, k]) / u0[1, jf, M-3, k]
 
-            for kk in xrange(M-4, -1, -1):
+            for kk in range(M-4, -1, -1):
                 ke = 2*kk
                 ko = ke+1
                 je = ke+6
                 jo = ko+6
                 for k in range(fk.shape[2]):
-                    ac = a0[j, 0, k]
+                    ac = a0[jf, 0, k]
                     s1[j, k] += uk[j, je, k]/(je+3.)
                     s2[j, k] += (uk[j, je, k]/(je+3.))*((je+2.)*(je+2.))
-                    uk[j, ke, k] = (y[j, ke, k] - u1[0, j, kk, k]*uk[j, ke+2, k] - u2[0, j, kk, k]*uk[j, ke+4, k] - a[0, j, kk, k]*ac*s1[j, k] - b[0, j, kk, k]*ac*s2[j, k]) / u0[0, j, kk, k]
+                    uk[j, ke, k] = (y[j, ke, k] - u1[0, jf, kk, k]*uk[j, ke+2, k] - u2[0, jf, kk, k]*uk[j, ke+4, k] - a[0, jf, kk, k]*ac*s1[j, k] - b[0, jf, kk, k]*ac*s2[j, k]) / u0[0, jf, kk, k]
                     o1[j, k] += uk[j, jo, k]/(jo+3.)
                     o2[j, k] += (uk[j, jo, k]/(jo+3.))*((jo+2.)*(jo+2.))
-                    uk[j, ko, k] = (y[j, ko, k] - u1[1, j, kk, k]*uk[j, ko+2, k] - u2[1, j, kk, k]*uk[j, ko+4, k] - a[1, j, kk, k]*ac*o1[j, k] - b[1, j, kk, k]*ac*o2[j, k]) / u0[1, j, kk, k]
+                    uk[j, ko, k] = (y[j, ko, k] - u1[1, jf, kk, k]*uk[j, ko+2, k] - u2[1, jf, kk, k]*uk[j, ko+4, k] - a[1, jf, kk, k]*ac*o1[j, k] - b[1, jf, kk, k]*ac*o2[j, k]) / u0[1, jf, kk, k]
 
 
     elif axis == 2:
@@ -1799,14 +1853,14 @@ def Solve_Biharmonic_3D_n(np.int64_t axis,
         o2 = np.zeros((fk.shape[0], fk.shape[1]), dtype=fk.dtype)
 
         M = u0.shape[3]
-        for j in range(fk.shape[0]):
+        for j in prange(fk.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
             for k in range(fk.shape[1]):
                 y[j, k, 0] = fk[j, k, 0]
                 y[j, k, 1] = fk[j, k, 1]
                 y[j, k, 2] = fk[j, k, 2] - l0[0, j, k, 0]*y[j, k, 0]
                 y[j, k, 3] = fk[j, k, 3] - l0[1, j, k, 0]*y[j, k, 1]
 
-                for i in xrange(2, M):
+                for i in range(2, M):
                     ke = 2*i
                     ko = ke+1
                     y[j, k, ko] = fk[j, k, ko] - l0[1, j, k, i-1]*y[j, k, ko-2] - l1[1, j, k, i-2]*y[j, k, ko-4]
@@ -1827,7 +1881,7 @@ def Solve_Biharmonic_3D_n(np.int64_t axis,
                 uk[j, k, ke] = (y[j, k, ke] - u1[0, j, k, M-3]*uk[j, k, ke+2] - u2[0, j, k, M-3]*uk[j, k, ke+4]) / u0[0, j, k, M-3]
                 uk[j, k, ko] = (y[j, k, ko] - u1[1, j, k, M-3]*uk[j, k, ko+2] - u2[1, j, k, M-3]*uk[j, k, ko+4]) / u0[1, j, k, M-3]
 
-                for kk in xrange(M-4, -1, -1):
+                for kk in range(M-4, -1, -1):
                     ke = 2*kk
                     ko = ke+1
                     je = ke+6
@@ -2618,6 +2672,7 @@ def Solve_Helmholtz_Biharmonic_1D_p(T[::1] fk,
                             d_ptr, u1_ptr, u2_ptr, d.shape[0],
                             strides)
 
+@cython.cdivision(True)
 def Solve_Helmholtz_Biharmonic_3D_ptr(np.int64_t axis,
                            T[:,:,::1] fk,
                            T[:,:,::1] u_hat,
@@ -2627,58 +2682,39 @@ def Solve_Helmholtz_Biharmonic_3D_ptr(np.int64_t axis,
                            real_t[:,:,::1] u1,
                            real_t[:,:,::1] u2):
     cdef:
-        T* fk_ptr
-        T* u_hat_ptr
-        real_t* d_ptr
-        real_t* u1_ptr
-        real_t* u2_ptr
-        real_t* l1_ptr
-        real_t* l2_ptr
-        int ii, jj, strides
-
-    strides = fk.strides[axis]/fk.itemsize
-    if axis == 0:
-        for ii in range(d.shape[1]):
-            for jj in range(d.shape[2]):
-                fk_ptr = &fk[0,ii,jj]
-                u_hat_ptr = &u_hat[0,ii,jj]
-                d_ptr = &d[0,ii,jj]
-                u1_ptr = &u1[0,ii,jj]
-                u2_ptr = &u2[0,ii,jj]
-                l1_ptr = &l1[0,ii,jj]
-                l2_ptr = &l2[0,ii,jj]
-                Solve_Helmholtz_Biharmonic_1D_ptr(fk_ptr, u_hat_ptr, l2_ptr, l1_ptr,
-                                       d_ptr, u1_ptr, u2_ptr, d.shape[axis],
-                                       strides)
-
-    elif axis == 1:
-        for ii in range(d.shape[0]):
-            for jj in range(d.shape[2]):
-                fk_ptr = &fk[ii,0,jj]
-                u_hat_ptr = &u_hat[ii,0,jj]
-                d_ptr = &d[ii,0,jj]
-                u1_ptr = &u1[ii,0,jj]
-                u2_ptr = &u2[ii,0,jj]
-                l1_ptr = &l1[ii,0,jj]
-                l2_ptr = &l2[ii,0,jj]
-                Solve_Helmholtz_Biharmonic_1D_ptr(fk_ptr, u_hat_ptr, l2_ptr, l1_ptr,
-                                       d_ptr, u1_ptr, u2_ptr, d.shape[axis],
-                                       strides)
-
-    elif axis == 2:
-        for ii in range(d.shape[0]):
-            for jj in range(d.shape[1]):
-                fk_ptr = &fk[ii,jj,0]
-                u_hat_ptr = &u_hat[ii,jj,0]
-                d_ptr = &d[ii,jj,0]
-                u1_ptr = &u1[ii,jj,0]
-                u2_ptr = &u2[ii,jj,0]
-                l1_ptr = &l1[ii,jj,0]
-                l2_ptr = &l2[ii,jj,0]
-                Solve_Helmholtz_Biharmonic_1D_ptr(fk_ptr, u_hat_ptr, l2_ptr, l1_ptr,
-                                       d_ptr, u1_ptr, u2_ptr, d.shape[axis],
-                                       strides)
-
+        T* pf = &fk[0, 0, 0]
+        T* pu = &u_hat[0, 0, 0]
+        real_t* pl2 = &l2[0, 0, 0]
+        real_t* pl1 = &l1[0, 0, 0]
+        real_t* pd = &d[0, 0, 0]
+        real_t* pu1 = &u1[0, 0, 0]
+        real_t* pu2 = &u2[0, 0, 0]
+        Py_ssize_t m, strides
+        Py_ssize_t N[2]
+        Py_ssize_t Nd[2]
+        Py_ssize_t stf[2]
+        Py_ssize_t stl2[2]
+        Py_ssize_t stl1[2]
+        Py_ssize_t std[2]
+        Py_ssize_t stu1[2]
+        Py_ssize_t stu2[2]
+
+    strides = fk.strides[axis]//fk.itemsize
+    _outer(l2.shape, l2.strides, l2.itemsize, axis, Nd, stl2)
+    _outer(l1.shape, l1.strides, l1.itemsize, axis, Nd, stl1)
+    _outer(u1.shape, u1.strides, u1.itemsize, axis, Nd, stu1)
+    _outer(u2.shape, u2.strides, u2.itemsize, axis, Nd, stu2)
+    _outer(fk.shape, fk.strides, fk.itemsize, axis, N, stf)
+    _outer(d.shape, d.strides, d.itemsize, axis, Nd, std)
+    for m in prange(N[0]*N[1], nogil=True, num_threads=_num_threads, schedule='static'):
+        Solve_Helmholtz_Biharmonic_1D_ptr(&pf[_offset(m, N[1], stf)],
+                                          &pu[_offset(m, N[1], stf)],
+                                          &pl2[_boffset(m, N[1], Nd, stl2)],
+                                          &pl1[_boffset(m, N[1], Nd, stl1)],
+                                          &pd[_boffset(m, N[1], Nd, std)],
+                                          &pu1[_boffset(m, N[1], Nd, stu1)],
+                                          &pu2[_boffset(m, N[1], Nd, stu2)],
+                                          d.shape[axis], strides)
 
 def LU_Helmholtz_Biharmonic_3D(A, B, np.int64_t axis,
                     np.ndarray[real_t, ndim=3] A_scale,
@@ -2726,3 +2762,381 @@ def LU_Helmholtz_Biharmonic_3D(A, B, np.int64_t axis,
                                 d[ii, jj, :],
                                 u1[ii, jj, :],
                                 u2[ii, jj, :])
+
+cdef inline double _cabs1(T a) nogil:
+    if T is complex_t:
+        return fabs(a.real) + fabs(a.imag)
+    else:
+        return fabs(a)
+
+cdef int LU_Banded_ptr(T* ab,
+                       int* piv,
+                       Py_ssize_t n,
+                       Py_ssize_t kl,
+                       Py_ssize_t ku) nogil:
+    # LU-factorize one banded matrix with partial pivoting, like Lapack's
+    # gbtf2. Entry (i, j) is stored in ab[(kl+ku+i-j)*n+j], with kl rows of
+    # fill-in on top. Pivots are zero-based. Returns the zero-based index of
+    # the first zero pivot plus one, or 0.
+    cdef:
+        Py_ssize_t kv = kl+ku
+        Py_ssize_t i, j, c, jp, km, ju = 0
+        double amax
+        T tmp
+        int info = 0
+
+    for j in range(ku+1, min(kv, n)):
+        for i in range(kv-j, kl):
+            ab[i*n+j] = 0
+    for j in range(n):
+        if j+kv < n:
+            for i in range(kl):
+                ab[i*n+j+kv] = 0
+        km = min(kl, n-j-1)
+        jp = 0
+        amax = _cabs1(ab[kv*n+j])
+        for i in range(1, km+1):
+            if _cabs1(ab[(kv+i)*n+j]) > amax:
+                amax = _cabs1(ab[(kv+i)*n+j])
+                jp = i
+        piv[j] = j+jp
+        if amax != 0:
+            ju = max(ju, min(j+ku+jp, n-1))
+            if jp != 0:
+                for c in range(j, ju+1):
+                    tmp = ab[(kv+jp-c+j)*n+c]
+                    ab[(kv+jp-c+j)*n+c] = ab[(kv-c+j)*n+c]
+                    ab[(kv-c+j)*n+c] = tmp
+            tmp = ab[kv*n+j]
+            for i in range(1, km+1):
+                ab[(kv+i)*n+j] = ab[(kv+i)*n+j] / tmp
+            for c in range(j+1, ju+1):
+                tmp = ab[(kv-c+j)*n+c]
+                if tmp != 0:
+                    for i in range(1, km+1):
+                        ab[(kv+i-c+j)*n+c] = ab[(kv+i-c+j)*n+c] - ab[(kv+i)*n+j]*tmp
+        elif info == 0:
+            info = j+1
+    return info
+
+cdef void Solve_Banded_ptr(T* lu,
+                           int* piv,
+                           T* x,
+                           Py_ssize_t n,
+                           Py_ssize_t kl,
+                           Py_ssize_t ku,
+                           Py_ssize_t st) nogil:
+    # Solve with factors from LU_Banded_ptr, in place for x with stride st
+    cdef:
+        Py_ssize_t kv = kl+ku
+        Py_ssize_t i, j, l
+        T tmp
+
+    for j in range(n-1):
+        l = piv[j]
+        tmp = x[l*st]
+        if l != j:
+            x[l*st] = x[j*st]
+            x[j*st] = tmp
+        for i in range(1, min(kl, n-j-1)+1):
+            x[(j+i)*st] = x[(j+i)*st] - lu[(kv+i)*n+j]*tmp
+    for j in range(n-1, -1, -1):
+        x[j*st] = x[j*st] / lu[kv*n+j]
+        tmp = x[j*st]
+        for i in range(max(0, j-kv), j):
+            x[i*st] = x[i*st] - lu[(kv+i-j)*n+j]*tmp
+
+def LU_Banded(T[:, :, ::1] ab,
+              int[:, ::1] piv,
+              int kl,
+              int ku,
+              int[::1] info):
+    """LU-factorize banded matrices with partial pivoting, in place
+
+    Parameters
+    ----------
+        ab : array of shape (M, 2*kl+ku+1, n)
+             M banded matrices in Lapack's gbtrf storage, with entry (i, j)
+             of matrix m in ab[m, kl+ku+i-j, j]
+        piv : array of ints of shape (M, n)
+              Zero-based pivot indices on return
+        kl, ku : int
+                 Number of sub- and superdiagonals
+        info : array of ints of shape (M,)
+               On return, nonzero for matrices with a zero pivot
+    """
+    cdef Py_ssize_t m
+    for m in prange(ab.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
+        info[m] = LU_Banded_ptr(&ab[m, 0, 0], &piv[m, 0], ab.shape[2], kl, ku)
+
+def Solve_Banded(T[:, :, ::1] lu,
+                 int[:, ::1] piv,
+                 int kl,
+                 int ku,
+                 T[:, ::1] x,
+                 int_t[::1] index):
+    """Solve banded systems with factors from :func:`LU_Banded`, in place
+
+    Parameters
+    ----------
+        lu : array of shape (M, 2*kl+ku+1, n)
+             Factorized banded matrices
+        piv : array of ints of shape (M, n)
+        kl, ku : int
+                 Number of sub- and superdiagonals
+        x : array of shape (P, s*n)
+            P right hand sides, each with s interleaved vectors, e.g.,
+            s = 2 for the real and imaginary parts of complex data
+        index : array of ints of shape (P,)
+                The matrix used for each right hand side
+    """
+    cdef:
+        Py_ssize_t p, k, n = lu.shape[2]
+        Py_ssize_t s = x.shape[1] // n
+    for p in prange(x.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
+        for k in range(s):
+            Solve_Banded_ptr(&lu[index[p], 0, 0], &piv[index[p], 0], &x[p, k], n, kl, ku, s)
+
+cdef inline T _conj(T a) nogil:
+    if T is complex_t:
+        return a.conjugate()
+    else:
+        return a
+
+cdef inline double _abs2(T a) nogil:
+    if T is complex_t:
+        return a.real*a.real + a.imag*a.imag
+    else:
+        return a*a
+
+cdef void AlmostBanded_QR_ptr(T* win,
+                              T* F,
+                              T* V,
+                              real_t* beta,
+                              T* R,
+                              real_t* B,
+                              Py_ssize_t N,
+                              Py_ssize_t nbc,
+                              Py_ssize_t ml,
+                              Py_ssize_t mu) nogil:
+    # QR-factorize one almost-banded matrix with Householder reflections.
+    # Row r of the banded part holds columns r-ml, ..., r+ml+mu in
+    # win[r*W:(r+1)*W], and the fill-in of the boundary rows is stored as
+    # the linear combination F[r*nbc:(r+1)*nbc] of the rows of B.
+    cdef:
+        Py_ssize_t W = 2*ml+mu+1
+        Py_ssize_t L = ml+1
+        Py_ssize_t i, j, k, t, c, nb, nc
+        double alpha, vv, a0
+        T a, w
+        T* v
+
+    for j in range(N):
+        nb = min(ml+1, N-j)
+        nc = min(ml+mu+1, N-j)
+        v = &V[j*L]
+        alpha = 0
+        for t in range(nb):
+            a = win[(j+t)*W+ml-t]
+            for k in range(nbc):
+                a = a + F[(j+t)*nbc+k]*B[k*N+j]
+            v[t] = a
+            alpha += _abs2(a)
+        alpha = sqrt(alpha)
+        a0 = sqrt(_abs2(v[0]))
+        if a0 == 0:
+            v[0] = v[0] + alpha
+        else:
+            v[0] = v[0] + v[0]/a0*alpha
+        vv = 0
+        for t in range(nb):
+            vv += _abs2(v[t])
+        beta[j] = 2/vv if vv > 0 else 0
+        for c in range(nc):
+            w = 0
+            for t in range(nb):
+                w = w + _conj(v[t])*win[(j+t)*W+c-t+ml]
+            w = w*beta[j]
+            for t in range(nb):
+                win[(j+t)*W+c-t+ml] = win[(j+t)*W+c-t+ml] - v[t]*w
+        for k in range(nbc):
+            w = 0
+            for t in range(nb):
+                w = w + _conj(v[t])*F[(j+t)*nbc+k]
+            w = w*beta[j]
+            for t in range(nb):
+                F[(j+t)*nbc+k] = F[(j+t)*nbc+k] - v[t]*w
+
+    for j in range(N):
+        a = win[j*W+ml]
+        for k in range(nbc):
+            a = a + F[j*nbc+k]*B[k*N+j]
+        R[j] = a
+
+cdef Py_ssize_t AlmostBanded_Reflect_ptr(T* V,
+                                         real_t* beta,
+                                         T* y,
+                                         real_t* suffix,
+                                         double tol2,
+                                         Py_ssize_t j0,
+                                         Py_ssize_t j1,
+                                         Py_ssize_t N,
+                                         Py_ssize_t ml,
+                                         Py_ssize_t s,
+                                         bint adaptive) nogil:
+    # Apply reflections j0, ..., j1-1 to the s interleaved vectors of y.
+    # If adaptive, stop when the norm of the remaining part of y is below
+    # tol2, with suffix[i] the squared norm of y[i:] on entry. Returns the
+    # number of reflections applied in total.
+    cdef:
+        Py_ssize_t L = ml+1
+        Py_ssize_t j, k, t, nb
+        double rem
+        T w
+        T* v
+
+    for j in range(j0, j1):
+        nb = min(ml+1, N-j)
+        v = &V[j*L]
+        rem = 0
+        for k in range(s):
+            w = 0
+            for t in range(nb):
+                w = w + _conj(v[t])*y[(j+t)*s+k]
+            w = w*beta[j]
+            for t in range(nb):
+                y[(j+t)*s+k] = y[(j+t)*s+k] - v[t]*w
+            for t in range(1, nb):
+                rem += _abs2(y[(j+t)*s+k])
+        if adaptive and rem + suffix[j+nb] <= tol2:
+            return j+1
+    return j1
+
+cdef void AlmostBanded_Back_ptr(T* win,
+                                T* F,
+                                T* R,
+                                real_t* B,
+                                T* y,
+                                T* x,
+                                T* work,
+                                Py_ssize_t n,
+                                Py_ssize_t N,
+                                Py_ssize_t nbc,
+                                Py_ssize_t ml,
+                                Py_ssize_t mu,
+                                Py_ssize_t s) nogil:
+    # Back substitution for the first n unknowns, with running sums of the
+    # boundary rows in work
+    cdef:
+        Py_ssize_t W = 2*ml+mu+1
+        Py_ssize_t i, j, k, c, c1
+        T r
+
+    for k in range(s):
+        for i in range(nbc):
+            work[i] = 0
+        for j in range(n-1, -1, -1):
+            c1 = min(n, j+ml+mu+1)
+            r = y[j*s+k]
+            for c in range(j+1, c1):
+                r = r - win[j*W+ml+c-j]*x[c*s+k]
+            for i in range(nbc):
+                r = r - F[j*nbc+i]*work[i]
+            r = r / R[j]
+            x[j*s+k] = r
+            for i in range(nbc):
+                work[i] = work[i] + r*B[i*N+j]
+
+def AlmostBanded_QR(T[:, :, ::1] win,
+                    T[:, :, ::1] F,
+                    T[:, :, ::1] V,
+                    real_t[:, ::1] beta,
+                    T[:, ::1] R,
+                    real_t[:, ::1] B):
+    """QR-factorize almost-banded matrices, in place
+
+    Parameters
+    ----------
+        win : array of shape (P, N, 2*ml+mu+1)
+              Banded parts of P matrices, with row r holding the columns
+              r-ml, ..., r+ml+mu. Overwritten with the upper triangular
+              factor
+        F : array of shape (P, N, nbc)
+            Fill-in of the dense boundary rows, as linear combinations of
+            the rows of B. Initialized with the identity in the first rows
+        V : array of shape (P, N, ml+1)
+            Householder vectors on return
+        beta : array of shape (P, N)
+               Householder factors on return
+        R : array of shape (P, N)
+            Diagonals of the upper triangular factors on return
+        B : array of shape (nbc, N)
+            Dense boundary rows
+    """
+    cdef:
+        Py_ssize_t p
+        Py_ssize_t N = win.shape[1]
+        Py_ssize_t ml = V.shape[2]-1
+        Py_ssize_t mu = win.shape[2]-2*ml-1
+    for p in prange(win.shape[0], nogil=True, num_threads=_num_threads, schedule='static'):
+        AlmostBanded_QR_ptr(&win[p, 0, 0], &F[p, 0, 0], &V[p, 0, 0], &beta[p, 0],
+                            &R[p, 0], &B[0, 0], N, B.shape[0], ml, mu)
+
+def AlmostBanded_Solve(T[:, :, ::1] win,
+                       T[:, :, ::1] F,
+                       T[:, :, ::1] V,
+                       real_t[:, ::1] beta,
+                       T[:, ::1] R,
+                       real_t[:, ::1] B,
+                       T[:, ::1] y,
+                       T[:, ::1] x,
+                       real_t[:, ::1] suffix,
+                       double tol):
+    """Solve with factors from :func:`AlmostBanded_QR`
+
+    The reflections are applied to all right hand sides, until the norm of
+    the remaining part of each is below tol times its total norm. The
+    solutions are then truncated to the largest number of coefficients n
+    needed by any right hand side.
+
+    Parameters
+    ----------
+        win, F, V, beta, R : arrays
+                             Factors from :func:`AlmostBanded_QR`
+        B : array of shape (nbc, N)
+            Dense boundary rows
+        y : array of shape (P, s*N)
+            P right hand sides, each with s interleaved vectors, e.g.,
+            s = 2 for the real and imaginary parts of complex data.
+            Overwritten
+        x : array of shape (P, s*N)
+            Zero on entry and solutions on return
+        suffix : array of shape (P, N+1)
+                 suffix[p, i] is the squared norm of y[p, i*s:] on entry
+
+    Returns
+    -------
+        n : int
+            Number of coefficients of the solutions
+    """
+    cdef:
+        Py_ssize_t p, n
+        Py_ssize_t P = y.shape[0]
+        Py_ssize_t N = win.shape[1]
+        Py_ssize_t nbc = B.shape[0]
+        Py_ssize_t ml = V.shape[2]-1
+        Py_ssize_t mu = win.shape[2]-2*ml-1
+        Py_ssize_t s = y.shape[1] // N
+        int_t[::1] used = np.zeros(P, dtype=np.int64)
+        T[:, ::1] work = np.zeros((P, nbc+1), dtype=np.asarray(y).dtype)
+
+    for p in prange(P, nogil=True, num_threads=_num_threads, schedule='static'):
+        used[p] = AlmostBanded_Reflect_ptr(&V[p, 0, 0], &beta[p, 0], &y[p, 0], &suffix[p, 0],
+                                           tol*tol*suffix[p, 0], 0, N, N, ml, s, True)
+    n = np.max(np.asarray(used)) if P > 0 else N
+    for p in prange(P, nogil=True, num_threads=_num_threads, schedule='static'):
+        AlmostBanded_Reflect_ptr(&V[p, 0, 0], &beta[p, 0], &y[p, 0], &suffix[p, 0],
+                                 0, used[p], n, N, ml, s, False)
+        AlmostBanded_Back_ptr(&win[p, 0, 0], &F[p, 0, 0], &R[p, 0], &B[0, 0], &y[p, 0],
+                              &x[p, 0], &work[p, 0], n, N, nbc, ml, mu, s)
+    return n
@@ -0,0 +1,305 @@
+r"""
+Module for sparse grid (hyperbolic cross) spaces of Fourier bases.
+
+The sparse space is spanned by the hyperbolic cross of wavenumbers, that is
+the union of the wavenumbers of all anisotropic full grids with
+:math:`N_i = 2^{l_i}` and :math:`l_0 + l_1 + \ldots + l_{d-1} = L`, where
+:math:`N = 2^L` is the resolution of the bases along each axis. The number of
+wavenumbers and grid points is of order :math:`N \log(N)^{d-1}` instead of
+:math:`N^d`.
+
+The transforms use the combination technique: the forward transform combines
+the forward transforms of all full grids with
+
+.. math::
+
+    |l| = L - q, \quad q = 0, 1, \ldots, d-1
+
+with weights :math:`(-1)^q \binom{d-1}{q}`, which is the sparse grid
+interpolant. The backward transform folds the aliased wavenumbers of the
+sparse expansion onto each of the finest full grids, such that the
+expansion is evaluated exactly on the sparse grid. The full grids are
+regular :class:`.TensorProductSpace` s with planned transforms, and they
+are distributed over the processors.
+
+"""
+from scipy.special import comb
+import numpy as np
+from mpi4py import MPI
+from shenfun.fourier.bases import C2CBasis
+from shenfun.tensorproductspace import TensorProductSpace
+
+__all__ = ('SparseTensorProductSpace',)
+
+#pylint: disable=line-too-long, len-as-condition, missing-docstring
+
+
+def _levels(d, total, maxlevel):
+    """Yield all d-tuples of levels <= maxlevel that sum to total"""
+    if d == 1:
+        if 0 <= total <= maxlevel:
+            yield (total,)
+        return
+    for l in range(min(total, maxlevel)+1):
+        for rest in _levels(d-1, total-l, maxlevel):
+            yield (l,)+rest
+
+
+class _SparseTransform(object):
+
+    def __init__(self, func, input_array, output_array):
+        self.func = func
+        self.input_array = input_array
+        self.output_array = output_array
+
+    def __call__(self, input_array=None, output_array=None, **kw):
+        if input_array is not None:
+            self.input_array[...] = input_array
+        self.func(self.input_array, self.output_array)
+        if output_array is not None:
+            output_array[...] = self.output_array
+            return output_array
+        return self.output_array
+
+
+class SparseTensorProductSpace(object):
+    """Class for sparse grid (hyperbolic cross) spaces of Fourier bases
+
+    Arrays on the sparse grid and Functions of the sparse expansion
+    coefficients are 1D arrays, stored in the order of :meth:`mesh` and
+    :meth:`wavenumbers`, respectively. Both are the same on all processors.
+
+    Parameters
+    ----------
+        comm : MPI communicator
+        bases : list
+                List of 1D C2C Fourier bases, all of the same size
+                N = 2**L. The bases define the domain and the finest
+                resolution along each axis.
+
+    Example
+    -------
+    >>> from mpi4py import MPI
+    >>> from shenfun import Basis, Array, Function
+    >>> from shenfun.sparsegrid import SparseTensorProductSpace
+    >>> bases = [Basis(16, 'F', dtype='D') for i in range(3)]
+    >>> S = SparseTensorProductSpace(MPI.COMM_WORLD, bases)
+    >>> S.shape(), S.spectral_shape()
+    ((104,), (104,))
+    """
+    def __init__(self, comm, bases):
+        self.comm = comm
+        self.bases = bases
+        d = len(bases)
+        N = bases[0].N
+        L = int(np.log2(N))
+        assert N == 2**L, 'Sparse grids require N = 2**L'
+        for base in bases:
+            assert isinstance(base, C2CBasis)
+            assert base.N == N
+            assert abs(base.padding_factor-1) < 1e-8
+        self.N = N
+        self.level = L
+        self.dtype = np.dtype(np.complex)
+
+        # Full grids of the combination technique
+        self.grids = []
+        for q in range(min(d, L+1)):
+            c = (-1)**q*comb(d-1, q, exact=True)
+            for l in _levels(d, L-q, L):
+                self.grids.append((l, c))
+
+        # Sparse index set of wavenumbers and points, as integer keys
+        fine = (N,)*d
+        wavenumbers = []
+        points = []
+        for l, c in self.grids:
+            if sum(l) == L:
+                k, j = self._grid_indices(l)
+                wavenumbers.append(k)
+                points.append(j)
+        self._k = np.unique(np.concatenate(wavenumbers))
+        self._j = np.unique(np.concatenate(points))
+        self._kindex = np.array(np.unravel_index(self._k, fine)).T - N//2
+        self._jindex = np.array(np.unravel_index(self._j, fine)).T
+
+        # Maps between the full grids and the sparse sets. The backward
+        # transform is computed on the finest grids only, where each point
+        # is owned by the first grid that contains it.
+        owner = -np.ones(len(self._j), dtype=int)
+        self._maps = []
+        for i, (l, c) in enumerate(self.grids):
+            k, j = self._grid_indices(l)
+            kmap = np.searchsorted(self._k, k)
+            jmap = np.searchsorted(self._j, j)
+            fold = owned = None
+            if sum(l) == L:
+                shape = tuple(2**np.array(l))
+                fold = np.ravel_multi_index(tuple((self._kindex % shape).T), shape)
+                owned = owner[jmap] == -1
+                owner[jmap[owned]] = i
+            self._maps.append((kmap, jmap, fold, owned))
+
+        # Distribute the full grids over the processors
+        rank, size = comm.Get_rank(), comm.Get_size()
+        self._local = [i for i in range(len(self.grids)) if i % size == rank]
+        self._spaces = {}
+        for i in self._local:
+            l = self.grids[i][0]
+            self._spaces[i] = TensorProductSpace(
+                MPI.COMM_SELF, [C2CBasis(2**li, domain=base.domain) for li, base in zip(l, bases)])
+
+        self.forward = _SparseTransform(self._forward, np.zeros(len(self._j), dtype=self.dtype),
+                                        np.zeros(len(self._k), dtype=self.dtype))
+        self.backward = _SparseTransform(self._backward, np.zeros(len(self._k), dtype=self.dtype),
+                                         np.zeros(len(self._j), dtype=self.dtype))
+        # The scalar product of the Fourier bases is normalized like forward
+        self.scalar_product = _SparseTransform(self._forward, np.zeros(len(self._j), dtype=self.dtype),
+                                               np.zeros(len(self._k), dtype=self.dtype))
+
+    def _grid_indices(self, l):
+        """Return keys of wavenumbers and points of full grid with levels l
+
+        The keys are returned in the C-order of the full grid, with the
+        wavenumbers ordered as in a forward transform.
+        """
+        N = self.N
+        fine = (N,)*len(l)
+        k = [np.fft.fftfreq(2**li, 1./2**li).astype(int)+N//2 for li in l]
+        j = [np.arange(2**li)*2**(self.level-li) for li in l]
+        k = np.ravel_multi_index(np.meshgrid(*k, indexing='ij'), fine).ravel()
+        j = np.ravel_multi_index(np.meshgrid(*j, indexing='ij'), fine).ravel()
+        return k, j
+
+    def _forward(self, input_array, output_array):
+        output_array[...] = 0
+        for i in self._local:
+            l, c = self.grids[i]
+            kmap, jmap, _, _ = self._maps[i]
+            T = self._spaces[i]
+            u = T.forward.input_array
+            u[...] = input_array[jmap].reshape(u.shape)
+            u_hat = T.forward()
+            output_array[kmap] += c*u_hat.ravel()
+        self.comm.Allreduce(MPI.IN_PLACE, output_array, op=MPI.SUM)
+        return output_array
+
+    def _backward(self, input_array, output_array):
+        output_array[...] = 0
+        for i in self._local:
+            l, _ = self.grids[i]
+            _, jmap, fold, owned = self._maps[i]
+            if fold is None:
+                continue
+            T = self._spaces[i]
+            u_hat = T.backward.input_array
+            n = u_hat.size
+            u_hat[...] = (np.bincount(fold, weights=input_array.real, minlength=n) +
+                          1j*np.bincount(fold, weights=input_array.imag, minlength=n)).reshape(u_hat.shape)
+            u = T.backward().ravel()
+            output_array[jmap[owned]] = u[owned]
+        self.comm.Allreduce(MPI.IN_PLACE, output_array, op=MPI.SUM)
+        return output_array
+
+    def wavenumbers(self, scaled=False):
+        """Return list of the wavenumbers along each axis
+
+        Parameters
+        ----------
+            scaled : bool, optional
+                     Scale wavenumbers with size of domain
+        """
+        k = [self._kindex[:, i].astype(float) for i in range(len(self))]
+        if scaled:
+            k = [ki*base.domain_factor() for ki, base in zip(k, self.bases)]
+        return k
+
+    def local_wavenumbers(self, broadcast=False, scaled=False):
+        return self.wavenumbers(scaled=scaled)
+
+    def mesh(self):
+        """Return list of the coordinates of the sparse grid along each axis"""
+        return [base.points_and_weights(self.N, scaled=True)[0][self._jindex[:, i]]
+                for i, base in enumerate(self.bases)]
+
+    def local_mesh(self, broadcast=False):
+        return self.mesh()
+
+    def shape(self, spectral=False):
+        """Return shape of arrays
+
+        Parameters
+        ----------
+            spectral : bool, optional
+                       If True then return shape of spectral space
+        """
+        return (len(self._k),) if spectral else (len(self._j),)
+
+    def spectral_shape(self):
+        return self.shape(True)
+
+    def local_shape(self, spectral=True):
+        return self.shape(spectral)
+
+    def eval(self, points, coefficients, output_array=None):
+        """Evaluate Function at points, given expansion coefficients
+
+        Parameters
+        ----------
+            points : array
+                     Points of shape (number of points, ndim)
+            coefficients : array
+                           Expansion coefficients
+            output_array : array, optional
+                           Return array, function values at points
+        """
+        points = np.atleast_2d(points)
+        out = np.zeros(len(points), dtype=self.dtype)
+        for i0 in range(0, len(points), 1000):
+            pc = slice(i0, min(i0+1000, len(points)))
+            V = np.ones((pc.stop-pc.start, len(self._k)), dtype=self.dtype)
+            for axis, base in enumerate(self.bases):
+                x = base.map_reference_domain(points[pc, axis])
+                V *= np.exp(1j*x[:, np.newaxis]*self._kindex[np.newaxis, :, axis])
+            out[pc] = V.dot(coefficients)
+        if output_array is not None:
+            output_array[:] = out
+            return output_array
+        return out
+
+    def norm(self, coefficients):
+        """Return L2 norm of Function, using Parseval's theorem
+
+        Parameters
+        ----------
+            coefficients : array
+                           Expansion coefficients
+        """
+        vol = np.prod([float(base.domain[1]-base.domain[0]) for base in self.bases])
+        return np.sqrt(vol*np.sum(abs(np.asarray(coefficients))**2))
+
+    def destroy(self):
+        for T in self._spaces.values():
+            T.destroy()
+
+    def __iter__(self):
+        return iter(self.bases)
+
+    def rank(self):
+        """Return rank of space"""
+        return 1
+
+    def ndim(self):
+        """Return dimension of space"""
+        return len(self.bases)
+
+    def __len__(self):
+        return len(self.bases)
+
+    def num_components(self):
+        """Return number of spaces"""
+        return 1
+
+    def __getitem__(self, i):
+        """Return instance of base i"""
+        return self.bases[i]
@@ -163,6 +163,7 @@ class SpectralBase(object):
         self.quad = quad
         self._mass = None # Mass matrix (if needed)
         self.axis = 0
+        self.axes = (0,)          # Axes of planned transform, self.axis last
         self.xfftn_fwd = None
         self.xfftn_bck = None
         self._xfftn_fwd = None    # pyfftw forward transform function
@@ -528,18 +529,20 @@ class SpectralBase(object):
         ----------
             shape : array
                     Local shape of global array
-            axis : int
-                   This base's axis in global TensorProductSpace
+            axis : int or tuple of ints
+                   This base's axis in global TensorProductSpace. A tuple
+                   of axes, with this base's axis last, plans one
+                   multidimensional transform over all axes
             dtype : numpy.dtype
                     Type of array
             options : dict
                       Options for planning transforms
         """
-        if isinstance(axis, tuple):
-            axis = axis[0]
+        axes = axis if isinstance(axis, tuple) else (axis,)
+        axis = axes[-1]
 
         if isinstance(self.forward, Transform):
-            if self.forward.input_array.shape == shape and self.axis == axis:
+            if self.forward.input_array.shape == shape and self.axes == axes:
                 # Already planned
                 return
 
@@ -556,18 +559,19 @@ class SpectralBase(object):
         plan_fwd = self._xfftn_fwd
         plan_bck = self._xfftn_bck
 
-        n = shape[axis]
+        n = [shape[ax] for ax in axes]
         U = pyfftw.empty_aligned(shape, dtype=dtype)
-        xfftn_fwd = plan_fwd(U, n=n, axis=axis, **opts)
+        xfftn_fwd = plan_fwd(U, s=n, axes=axes, **opts)
         U.fill(0)
         V = xfftn_fwd.output_array
-        xfftn_bck = plan_bck(V, n=n, axis=axis, **opts)
+        xfftn_bck = plan_bck(V, s=n, axes=axes, **opts)
         V.fill(0)
 
         xfftn_fwd.update_arrays(U, V)
         xfftn_bck.update_arrays(V, U)
 
         self.axis = axis
+        self.axes = axes
 
         if self.padding_factor > 1.+1e-8:
             trunc_array = self._get_truncarray(shape, V.dtype)
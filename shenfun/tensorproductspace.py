@@ -1,18 +1,27 @@
 """
 Module for implementation of the TensorProductSpace class and related methods.
 """
+import os
+import json
+import tempfile
+import itertools
+from time import time
 from numbers import Number
 import warnings
+import weakref
 import sympy
 import numpy as np
+import scipy.sparse as sp
 import shenfun
 from shenfun.fourier.bases import R2CBasis, C2CBasis
 from shenfun import chebyshev, legendre
+from mpi4py import MPI
 from mpi4py_fft.mpifft import Transform
 from mpi4py_fft.pencil import Subcomm, Pencil
 
 __all__ = ('TensorProductSpace', 'VectorTensorProductSpace',
-           'MixedTensorProductSpace', 'Convolve')
+           'MixedTensorProductSpace', 'Convolve', 'PointEvaluator', 'GridEvaluator',
+           'Regrid', 'SpaceRegistry', 'space_registry')
 
 #pylint: disable=line-too-long, redefined-outer-name, len-as-condition, redefined-argument-from-local, no-else-return, no-self-use, no-member, missing-docstring
 
@@ -36,14 +45,40 @@ class TensorProductSpace(object):
                 will be inferred from the bases.
         slab : bool, optional
                Use 1D slab decomposition instead of default pencil.
+        autotune : bool or str, optional
+                   Time short trial transforms for the decompositions of comm
+                   (slab, pencil and the factorizations of the process grid)
+                   and the orders of the axes that are usable by the solvers
+                   (see balance), and use the fastest. If a filename is given,
+                   then the choice is stored in this json file, keyed by
+                   shape, bases, number of processors and planning options,
+                   such that later runs skip the tuning.
+        balance : bool, optional
+                  Use the order of the axes and the dimensions of the process
+                  grid that minimize the largest number of active modes on
+                  any processor in spectral space. Active modes are the modes
+                  of the spectral pencil inside the index set of each base,
+                  i.e., N//2+1 for R2C bases and N-2 (N-4) for Shen's
+                  Dirichlet (Biharmonic) bases. The estimate is computed
+                  without planning any transforms. Only decompositions
+                  where axes[0] is aligned in spectral space and no
+                  non-periodic axis is distributed in spectral space are
+                  considered, such that the solvers work. See
+                  :meth:`load_imbalance` for the resulting distribution of
+                  work.
         kw : dict, optional
              Dictionary that can be used to plan transforms. Input to method
-             `plan` for the bases.
+             `plan` for the bases. The key 'collapse' (default True) is used
+             to plan one multidimensional transform for consecutive Fourier
+             axes that are not distributed.
 
     """
-    def __init__(self, comm, bases, axes=None, dtype=None, slab=False, **kw):
+    def __init__(self, comm, bases, axes=None, dtype=None, slab=False,
+                 autotune=False, balance=False, **kw):
         self.comm = comm
         self.bases = bases
+        self._point_evaluator = None
+        self._registry = None
         shape = self.shape()
         assert shape
         assert min(shape) > 0
@@ -73,11 +108,19 @@ class TensorProductSpace(object):
 
         if isinstance(comm, Subcomm):
             assert slab is False
+            assert autotune is False
+            assert balance is False
             assert len(comm) == len(shape)
             assert comm[axes[-1]].Get_size() == 1
             self.subcomm = comm
         else:
-            if slab:
+            if autotune:
+                filename = autotune if isinstance(autotune, str) else None
+                axes, dims = self._autotune(comm, axes, dtype, filename, kw)
+            elif balance:
+                assert slab is False
+                axes, dims = self._balance(comm, axes, kw.get('collapse', True))
+            elif slab:
                 dims = [1] * len(shape)
                 dims[axes[0]] = comm.Get_size()
             else:
@@ -85,17 +128,8 @@ class TensorProductSpace(object):
                 dims[axes[-1]] = 1
             self.subcomm = Subcomm(comm, dims)
 
-        collapse = False # kw.pop('collapse', True)
-        if collapse:
-            groups = [[]]
-            for axis in reversed(axes):
-                if self.subcomm[axis].Get_size() == 1:
-                    groups[0].insert(0, axis)
-                else:
-                    groups.insert(0, [axis])
-            self.axes = tuple(map(tuple, groups))
-        else:
-            self.axes = tuple((axis,) for axis in axes)
+        collapse = kw.pop('collapse', True)
+        self.axes = self._groups(axes, [c.Get_size() for c in self.subcomm], collapse)
 
         self.xfftn = []
         self.transfer = []
@@ -126,6 +160,10 @@ class TensorProductSpace(object):
 
         self.pencil[1] = pencilA
 
+        for axes in self.axes:
+            for axis in axes[:-1]:
+                self.bases[axis].axis = axis
+
         self.forward = Transform(
             [o.forward for o in self.xfftn],
             [o.forward for o in self.transfer],
@@ -144,6 +182,240 @@ class TensorProductSpace(object):
                                  chebyshev.bases.ShenDirichletBasis)):
                 base.bc.set_tensor_bcs(self)
 
+    @staticmethod
+    def _collapsible(base):
+        return (isinstance(base, (R2CBasis, C2CBasis)) and
+                abs(base.padding_factor-1) < 1e-8 and
+                not base.dealias_direct)
+
+    def _groups(self, axes, dims, collapse=True):
+        """Return tuple of groups of axes transformed together
+
+        Parameters
+        ----------
+            axes : list of ints
+                   The order of the axes to transform
+            dims : list of ints
+                   Number of processors along each axis of the process grid
+            collapse : bool, optional
+                       Whether to collapse axes that are not distributed
+        """
+        if not collapse:
+            return tuple((axis,) for axis in axes)
+        # Axes that are never distributed are collapsed with the next
+        # axis transformed, if both are Fourier, such that one
+        # multidimensional transform is planned for the group
+        groups = [[axes[-1]]]
+        for axis in reversed(axes[:-1]):
+            if (dims[axis] == 1 and
+                    isinstance(self.bases[axis], C2CBasis) and
+                    all([self._collapsible(self.bases[ax]) for ax in [axis]+groups[0]])):
+                groups[0].insert(0, axis)
+            else:
+                groups.insert(0, [axis])
+        return tuple(map(tuple, groups))
+
+    def _candidates(self, comm, axes, collapse=True):
+        """Return all orders of axes and dimensions of process grid
+
+        Only the decompositions that are usable by the solvers are returned,
+        i.e., the first axis of the order (aligned in spectral space) is
+        axes[0], and no axis of a non-periodic base is distributed in
+        spectral space.
+
+        Parameters
+        ----------
+            comm : MPI communicator
+            axes : list of ints
+                   The axes to transform. The last item is only exchanged
+                   for axes with the same type of base
+            collapse : bool, optional
+                       Whether to collapse axes that are not distributed
+        """
+        shape = self.shape()
+        size = min(min(shape), min(self.spectral_shape()))
+        candidates = []
+        for order in itertools.permutations(axes):
+            if not order[0] == axes[0]:
+                continue
+            if not type(self.bases[order[-1]]) is type(self.bases[axes[-1]]):
+                continue
+            distributed = [i for i in range(len(shape)) if i != order[-1]]
+            for f in _factorizations(comm.Get_size(), len(distributed)):
+                if max(f) > size:
+                    continue
+                dims = [1]*len(shape)
+                for i, d in zip(distributed, f):
+                    dims[i] = d
+                spectral_dims = self._spectral_dims(order, dims, collapse)
+                if any([d > 1 for base, d in zip(self.bases, spectral_dims)
+                        if not isinstance(base, (R2CBasis, C2CBasis))]):
+                    continue
+                candidates.append((list(order), dims))
+        return candidates
+
+    def _balance(self, comm, axes, collapse=True):
+        """Return order of axes and dimensions of process grid with the
+        smallest maximum number of active modes on any processor
+
+        Parameters
+        ----------
+            comm : MPI communicator
+            axes : list of ints
+                   The axes to transform
+            collapse : bool, optional
+                       Whether to collapse axes that are not distributed
+
+        Note
+        ----
+        The default decomposition is used if no other candidate is better,
+        or if there are no candidates usable by the solvers.
+        """
+        dims = [0]*len(self.bases)
+        dims[axes[-1]] = 1
+        dims = list(MPI.Compute_dims(comm.Get_size(), dims))
+        candidates = self._candidates(comm, axes, collapse)
+        if len(candidates) == 0:
+            return list(axes), dims
+        if (list(axes), dims) in candidates:
+            candidates.insert(0, (list(axes), dims))
+        work = [self._max_work(order, dims, collapse) for order, dims in candidates]
+        return candidates[int(np.argmin(work))]
+
+    def _spectral_dims(self, axes, dims, collapse=True):
+        """Return number of processors along each axis in spectral space
+
+        Parameters
+        ----------
+            axes : list of ints
+                   The order of the axes to transform
+            dims : list of ints
+                   Number of processors along each axis of the process grid
+            collapse : bool, optional
+                       Whether to collapse axes that are not distributed
+        """
+        # Follow the alignment of the pencils from physical to spectral space
+        dims = list(dims)
+        groups = self._groups(axes, dims, collapse)
+        aligned = groups[-1][-1]
+        for group in reversed(groups[:-1]):
+            dims[aligned], dims[group[-1]] = dims[group[-1]], dims[aligned]
+            aligned = group[-1]
+        return dims
+
+    def _max_work(self, axes, dims, collapse=True):
+        """Return largest number of active modes on any processor
+
+        Parameters
+        ----------
+            axes : list of ints
+                   The order of the axes to transform
+            dims : list of ints
+                   Number of processors along each axis of the process grid
+            collapse : bool, optional
+                       Whether to collapse axes that are not distributed
+        """
+        work = 1
+        for base, size in zip(self.bases, self._spectral_dims(axes, dims, collapse)):
+            N = base.N//2+1 if isinstance(base, R2CBasis) else base.N
+            work *= max([_active_modes(base, _blockslice(N, size, rank))
+                         for rank in range(size)])
+        return work
+
+    def local_work(self):
+        """Return number of active modes on this processor
+
+        Active modes are the modes in the local spectral array that are
+        inside the index sets of the bases, see :meth:`.SpectralBase.slice`.
+        """
+        work = 1
+        for base, s in zip(self.bases, self.local_slice(True)):
+            work *= _active_modes(base, s)
+        return work
+
+    def load_imbalance(self):
+        """Return work of all processors relative to the mean
+
+        The work is measured as the number of active modes on each processor,
+        see :meth:`local_work`. The maximum of the returned array is the
+        imbalance factor, which is 1 for a perfectly balanced distribution.
+        """
+        work = self.local_work()
+        for comm in self.subcomm:
+            work = comm.allgather(work)
+        work = np.array(work, dtype=float).ravel()
+        return work/work.mean()
+
+    def _autotune(self, comm, axes, dtype, filename=None, kw=None):
+        """Return fastest order of axes and dimensions of process grid
+
+        Parameters
+        ----------
+            comm : MPI communicator
+            axes : list of ints
+                   The axes to transform. The last item is only exchanged
+                   for axes with the same type of base
+            dtype : numpy.dtype
+                    Type of input data in real physical space
+            filename : str, optional
+                       Json file storing the choices. No file is used if
+                       None
+            kw : dict, optional
+                 Options for planning transforms
+        """
+        kw = kw or {}
+        key = str((tuple(self.shape()),
+                   tuple(str(SpaceRegistry.base_key(base)) for base in self.bases),
+                   comm.Get_size(), dtype.char, tuple(axes),
+                   tuple(sorted((k, repr(v)) for k, v in kw.items()))))
+        if filename is not None:
+            cache = None
+            if comm.Get_rank() == 0 and os.path.exists(filename):
+                with open(filename, 'r') as f:
+                    cache = json.load(f)
+            cache = comm.bcast(cache, root=0)
+            if cache is not None and key in cache:
+                return cache[key]['axes'], cache[key]['dims']
+
+        candidates = self._candidates(comm, axes, kw.get('collapse', True))
+        if len(candidates) == 0:
+            dims = [0]*len(self.bases)
+            dims[axes[-1]] = 1
+            return list(axes), list(MPI.Compute_dims(comm.Get_size(), dims))
+
+        M = 3
+        timings = []
+        for order, dims in candidates:
+            T = TensorProductSpace(Subcomm(comm, dims), self.bases, axes=order,
+                                   dtype=dtype, **kw)
+            u = T.forward.input_array
+            u_hat = T.forward.output_array
+            u[:] = 1
+            u_hat = T.forward(u, u_hat)
+            comm.barrier()
+            t0 = time()
+            for i in range(M):
+                u = T.backward(u_hat, u)
+                u_hat = T.forward(u, u_hat)
+            timings.append(comm.allreduce(time()-t0, op=MPI.MAX))
+            T.destroy()
+
+        order, dims = candidates[int(np.argmin(timings))]
+        if filename is not None and comm.Get_rank() == 0:
+            # Read again, since other jobs may have written to the file, and
+            # replace the file atomically with the updated choices
+            cache = {}
+            if os.path.exists(filename):
+                with open(filename, 'r') as f:
+                    cache = json.load(f)
+            cache[key] = {'axes': order, 'dims': dims}
+            fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                           suffix='.json')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f, indent=1)
+            getattr(os, 'replace', os.rename)(tmpname, filename)
+        return order, dims
+
     def convolve(self, a_hat, b_hat, ab_hat):
         """Convolution of a_hat and b_hat
 
@@ -175,7 +447,7 @@ class TensorProductSpace(object):
         ab_hat = self.forward(a*b, ab_hat)
         return ab_hat
 
-    def eval(self, points, coefficients, output_array=None, cython=True):
+    def eval(self, points, coefficients, output_array=None, cython=None):
         """Evaluate Function at points, given expansion coefficients
 
         Parameters
@@ -185,11 +457,18 @@ class TensorProductSpace(object):
                 Expansion coefficients
             output_array : array, optional
                 Return array, function values at points
-            cython : bool, optional
-                Whether to use optimized cython implementation or not
+            cython : bool or None, optional
+                Whether to use optimized cython implementation or not. If
+                None, then use a :class:`.PointEvaluator`, that is kept for
+                as long as the points are the same
 
         """
-        if cython:
+        if cython is None:
+            evaluator = self._point_evaluator
+            if evaluator is None or not np.array_equal(evaluator.points, np.atleast_2d(points)):
+                evaluator = self._point_evaluator = PointEvaluator(self, points)
+            return evaluator(coefficients, output_array)
+        elif cython:
             return self._eval_cython(points, coefficients, output_array)
         else:
             return self._eval_python(points, coefficients, output_array)
@@ -236,6 +515,10 @@ class TensorProductSpace(object):
             output_array : array, optional
                            Return array, function values at points
         """
+        if len(self) not in (2, 3):
+            # The cython kernels are implemented for 2D and 3D only
+            return PointEvaluator(self, points)(coefficients, output_array)
+
         out = coefficients
         P = []
         r2c = -1
@@ -303,7 +586,18 @@ class TensorProductSpace(object):
         return output_array
 
     def destroy(self):
-        """Destructor"""
+        """Destructor
+
+        Note
+        ----
+        A space shared through a :class:`.SpaceRegistry` is only destroyed
+        when the last reference to it is destroyed.
+        """
+        if self._registry is not None and self._registry.release(self) > 0:
+            return
+        for base in self.bases:
+            if isinstance(getattr(base, 'bc', None), BoundaryValues) and base.bc.T is self:
+                base.bc.destroy()
         self.subcomm.destroy()
         for trans in self.transfer:
             trans.destroy()
@@ -472,6 +766,31 @@ class TensorProductSpace(object):
         return self.bases[i]
 
 
+def _blockslice(N, size, rank):
+    """Return slice of block owned by rank of N items distributed on size"""
+    q, r = divmod(N, size)
+    n = q + (1 if r > rank else 0)
+    s = rank * q + min(rank, r)
+    return slice(s, s+n)
+
+
+def _active_modes(base, s):
+    """Return number of indices in slice s inside index set of base"""
+    active = base.slice()
+    return max(0, min(s.stop, active.stop) - max(s.start, active.start))
+
+
+def _factorizations(n, k):
+    """Return all ordered factorizations of n in k positive integers"""
+    if k == 1:
+        return [(n,)]
+    f = []
+    for d in range(1, n+1):
+        if n % d == 0:
+            f.extend([(d,)+g for g in _factorizations(n//d, k-1)])
+    return f
+
+
 class MixedTensorProductSpace(object):
     """Class for composite tensorproductspaces.
 
@@ -591,6 +910,578 @@ class VectorTransform(object):
         return output_array
 
 
+def _clenshaw(family, c, x):
+    r"""Return sum of orthogonal series using Clenshaw's algorithm
+
+    .. math::
+
+        \sum_{k=0}^{N-1} c_k p_k(x)
+
+    where :math:`p_k` are the Chebyshev or Legendre polynomials
+
+    Parameters
+    ----------
+        family : str
+                 'chebyshev' or 'legendre'
+        c : array
+            Coefficients along the first axis
+        x : array
+            Points, broadcastable against c[0]
+    """
+    N = c.shape[0]
+    b1 = np.zeros(np.broadcast(c[0], x).shape, dtype=c.dtype)
+    b2 = np.zeros_like(b1)
+    if family == 'chebyshev':
+        for k in range(N-1, 0, -1):
+            b1, b2 = c[k] + 2*x*b1 - b2, b1
+        return c[0] + x*b1 - b2
+    assert family == 'legendre'
+    for k in range(N-1, 0, -1):
+        b1, b2 = c[k] + (2*k+1)/(k+1)*x*b1 - (k+1)/(k+2)*b2, b1
+    return c[0] + x*b1 - 0.5*b2
+
+
+class PointEvaluator(object):
+    """Class for evaluating Functions of a TensorProductSpace at given points
+
+    The expansion is contracted axis by axis over the local coefficients, for
+    chunks of points. The largest axis is contracted first, for all points
+    at once, with a matrix-matrix product. The remaining axes are contracted
+    point by point, with batched matrix-vector products for the Fourier axes
+    and Clenshaw's algorithm for the Chebyshev and Legendre axes, using the
+    coefficients of the orthogonal polynomials. The partial sums of all
+    processors are finally added with one reduction.
+
+    The basis data of the points (Vandermonde matrices for Fourier axes and
+    mapped points for the remaining axes) are computed once, such that an
+    instance should be reused when the points are the same for many
+    evaluations, e.g., for probes or particles that are tracked over
+    several time steps.
+
+    Parameters
+    ----------
+        T : TensorProductSpace
+        points : array
+                 Points of shape (number of points, ndim)
+        root : int, optional
+               Only reduce to this rank. Default is to return the values on
+               all processors.
+        chunksize : int, optional
+                    Maximum size of the temporary arrays used
+    """
+    def __init__(self, T, points, root=None, chunksize=2**20):
+        self.T = T
+        self.points = np.atleast_2d(points).copy()
+        assert self.points.shape[-1] == len(T)
+        self.root = root
+        self.chunksize = chunksize
+        self.dtype = T.forward.input_array.dtype
+        local_slice = T.local_slice()
+        self._data = []
+        for axis, base in enumerate(T):
+            x = base.map_reference_domain(self.points[:, axis])
+            sl = local_slice[axis]
+            if isinstance(base, (R2CBasis, C2CBasis)):
+                V = base.vandermonde(x)[:, sl]
+                if isinstance(base, R2CBasis):
+                    # Account for the conjugate half of the spectrum
+                    k = np.arange(sl.start, sl.stop)
+                    M = base.N//2+1 if base.N % 2 == 1 else base.N//2
+                    V = V*np.where((k > 0) & (k < M), 2, 1)
+                self._data.append((None, None, V))
+            else:
+                S = base.get_vandermonde_basis(np.eye(base.N))[:, sl]
+                family = base.family()
+                if family in ('chebyshev', 'legendre'):
+                    self._data.append((family, S, x))
+                else:
+                    V = base.get_vandermonde_basis(base.vandermonde(x))[:, sl]
+                    self._data.append((None, None, V))
+
+    def __call__(self, coefficients, output_array=None):
+        """Return Function evaluated at the points
+
+        Parameters
+        ----------
+            coefficients : array
+                           Expansion coefficients
+            output_array : array, optional
+                           Return array, function values at points
+        """
+        u = np.asarray(coefficients)
+        for axis, (family, S, x) in enumerate(self._data):
+            if family is not None:
+                u = np.moveaxis(np.tensordot(S, u, axes=(1, axis)), 0, axis)
+
+        # Contract the largest axis first, for all points
+        order = list(np.argsort(u.shape)[::-1])
+        first = order.pop(0)
+        rest = int(np.prod(u.shape))//u.shape[first]
+        M = len(self.points)
+        chunk = max(1, min(M, self.chunksize//max(rest, 1)))
+        out = np.zeros(M, dtype=np.result_type(u, complex))
+        for i0 in range(0, M, chunk):
+            pc = slice(i0, min(i0+chunk, M))
+            w = self._contract(u, first, first, pc)
+            removed = [first]
+            for axis in order:
+                ax = axis - len([r for r in removed if r < axis])
+                w = self._contract(w, ax, axis, pc, True)
+                removed.append(axis)
+            out[pc] = w
+
+        out = out.real if self.dtype.char in 'fdg' else out
+        out = np.ascontiguousarray(out, dtype=self.dtype)
+        comm = self.T.comm
+        if self.root is None:
+            comm.Allreduce(MPI.IN_PLACE, out, op=MPI.SUM)
+        elif comm.Get_rank() == self.root:
+            comm.Reduce(MPI.IN_PLACE, out, op=MPI.SUM, root=self.root)
+        else:
+            comm.Reduce(out, None, op=MPI.SUM, root=self.root)
+
+        if output_array is not None:
+            output_array[:] = out
+            return output_array
+        return out
+
+    def _contract(self, w, ax, axis, pc, pointwise=False):
+        """Return w contracted along its axis ax for the points pc
+
+        Parameters
+        ----------
+            w : array
+                Coefficients
+            ax : int
+                 Axis of w to contract
+            axis : int
+                   Axis of the TensorProductSpace corresponding to ax
+            pc : slice
+                 The points
+            pointwise : bool, optional
+                        If False, then w is the same for all points, and the
+                        points are appended as the last axis of the returned
+                        array. If True, then the last axis of w are the points.
+        """
+        family, _, x = self._data[axis]
+        if pointwise is False:
+            V = x[pc]
+            if family is not None:
+                V = self.T.bases[axis].vandermonde(x[pc])
+            return np.tensordot(w, V, axes=(ax, 1))
+        if family is None:
+            wp = np.moveaxis(np.moveaxis(w, ax, -2), -1, 0)
+            shape = wp.shape
+            wp = wp.reshape((shape[0], -1, shape[-1]))
+            w = np.matmul(wp, x[pc][:, :, np.newaxis]).reshape(shape[:-1])
+            return np.moveaxis(w, 0, -1)
+        return _clenshaw(family, np.moveaxis(w, ax, 0), x[pc])
+
+
+def _regrid_map(base0, base1):
+    """Return map of coefficients along one axis from base0 to base1
+
+    The map is returned as a list of (source index, destination index,
+    factor), and a destination index where only the real part should be
+    kept, or None.
+    """
+    assert base0.__class__ is base1.__class__
+    N0, N1 = base0.N, base1.N
+    entries = []
+    real = None
+    if isinstance(base0, C2CBasis):
+        for i, k in enumerate(np.fft.fftfreq(N0, 1./N0).astype(int)):
+            if N0 % 2 == 0 and k == -N0//2 and N1 > N0:
+                # Nyquist mode is split symmetrically between -N0/2 and N0/2
+                entries.extend([(i, k % N1, 0.5), (i, -k, 0.5)])
+            elif abs(k) < N1/2. or (N1 % 2 == 0 and abs(k) == N1//2):
+                # For even N1, both -N1/2 and N1/2 add to the Nyquist mode
+                entries.append((i, k % N1, 1))
+
+    elif isinstance(base0, R2CBasis):
+        for k in range(N0//2+1):
+            if N0 % 2 == 0 and k == N0//2 and N1 > N0:
+                entries.append((k, k, 0.5))
+            elif N1 % 2 == 0 and k == N1//2 and N0 > N1:
+                entries.append((k, k, 2))
+                real = k
+            elif k <= N1//2:
+                entries.append((k, k, 1))
+
+    else:
+        # Shen bases have trailing coefficients, e.g., for boundary values
+        stop0, stop1 = base0.slice().stop, base1.slice().stop
+        for i in range(min(stop0, stop1)):
+            entries.append((i, i, 1))
+        if N0-stop0 == N1-stop1:
+            for j in range(N0-stop0):
+                entries.append((stop0+j, stop1+j, 1))
+
+    return entries, real
+
+
+class Regrid(object):
+    """Class for moving Functions to a space of different resolution
+
+    The expansion coefficients are copied, truncated or zero-padded directly
+    in spectral space, where the two spaces must use the same type of bases
+    along all axes. Coefficients of Shen bases are kept for the common basis
+    functions, and boundary coefficients are moved to the end. The Nyquist
+    modes of Fourier bases are split when refining and added when
+    coarsening. The data is moved between the pencils of the two spaces with
+    one single Alltoallv.
+
+    Parameters
+    ----------
+        T0 : TensorProductSpace
+             Space of input Functions
+        T1 : TensorProductSpace
+             Space of output Functions
+    """
+    def __init__(self, T0, T1):
+        assert len(T0) == len(T1)
+        assert T0.forward.output_array.dtype == T1.forward.output_array.dtype
+        self.T0 = T0
+        self.T1 = T1
+        comm = self.comm = T0.comm
+        self.maps = []
+        self.real = []
+        for base0, base1 in zip(T0, T1):
+            entries, real = _regrid_map(base0, base1)
+            self.maps.append(np.array(entries, dtype=float).reshape((-1, 3)))
+            self.real.append(real)
+
+        slices0 = comm.allgather([(s.start, s.stop) for s in T0.local_slice()])
+        slices1 = comm.allgather([(s.start, s.stop) for s in T1.local_slice()])
+        rank = comm.Get_rank()
+
+        # Source indices to send to each rank, and source indices and
+        # sparse maps of the blocks received from each rank
+        self.send = []
+        self.recv = []
+        for p in range(comm.Get_size()):
+            self.send.append(self._block(slices0[rank], slices1[p])[0])
+            self.recv.append(self._block(slices0[p], slices1[rank]))
+
+    def _block(self, slice0, slice1):
+        """Return local source indices and sparse maps of a block"""
+        index = []
+        mats = []
+        for (start0, stop0), (start1, stop1), m in zip(slice0, slice1, self.maps):
+            m = m[(m[:, 0] >= start0) & (m[:, 0] < stop0) &
+                  (m[:, 1] >= start1) & (m[:, 1] < stop1)]
+            src = np.unique(m[:, 0]).astype(int)
+            j = np.searchsorted(src, m[:, 0])
+            mats.append(sp.csr_matrix((m[:, 2], (m[:, 1].astype(int)-start1, j)),
+                                      shape=(stop1-start1, len(src))))
+            index.append(src-start0)
+        return index, mats
+
+    def __call__(self, u_hat, output_array=None):
+        """Return u_hat moved to T1
+
+        Parameters
+        ----------
+            u_hat : array
+                    Expansion coefficients of T0. Leading axes not in T0 are
+                    treated one by one, e.g., for vectors
+            output_array : array, optional
+                           Expansion coefficients of T1
+        """
+        if output_array is None:
+            output_array = shenfun.Function(self.T1)
+        if u_hat.ndim > len(self.T0):
+            for u, v in zip(u_hat, output_array):
+                self(u, v)
+            return output_array
+
+        # Pack and exchange
+        blocks = [u_hat[np.ix_(*index)] for index in self.send]
+        sendbuf = np.concatenate([b.ravel() for b in blocks]+[np.zeros(0, dtype=u_hat.dtype)])
+        sendcounts = [b.size for b in blocks]
+        recvshapes = [tuple(len(i) for i in index) for index, _ in self.recv]
+        recvcounts = [int(np.prod(shape)) for shape in recvshapes]
+        recvbuf = np.zeros(sum(recvcounts), dtype=u_hat.dtype)
+        self.comm.Alltoallv([sendbuf, (sendcounts, np.cumsum([0]+sendcounts[:-1]))],
+                            [recvbuf, (recvcounts, np.cumsum([0]+recvcounts[:-1]))])
+
+        # Unpack and map each received block along all axes
+        output_array[...] = 0
+        offset = 0
+        for (_, mats), shape, count in zip(self.recv, recvshapes, recvcounts):
+            if count > 0:
+                w = recvbuf[offset:offset+count].reshape(shape)
+                for axis, mat in enumerate(mats):
+                    w = np.moveaxis(w, axis, 0)
+                    w = np.moveaxis((mat*w.reshape((w.shape[0], -1))).reshape(
+                        (mat.shape[0],)+w.shape[1:]), 0, axis)
+                output_array += w
+            offset += count
+
+        for axis, k in enumerate(self.real):
+            s = self.T1.local_slice()[axis]
+            if k is not None and s.start <= k < s.stop:
+                sl = [slice(None)]*output_array.ndim
+                sl[axis] = k-s.start
+                output_array[tuple(sl)] = output_array[tuple(sl)].real
+        return output_array
+
+
+class GridEvaluator(object):
+    """Class for evaluating Functions on a structured grid
+
+    The grid is the tensor product of 1D arrays of points, one for each axis,
+    e.g., a uniform grid for visualization. The expansion is evaluated with
+    sum factorization, where each axis is contracted in turn with a 1D matrix
+    of the basis functions evaluated at the points of that axis. The axes are
+    contracted in the same order as for a backward transform, and the data
+    are redistributed between pencils in the same way, such that the
+    evaluated Function is returned distributed over the processors. The
+    conjugate half of the spectrum is accounted for along an R2C axis.
+
+    The matrices are computed once, and shared between axes using the same
+    basis and points, such that an instance should be reused for many
+    evaluations.
+
+    Parameters
+    ----------
+        T : TensorProductSpace
+        grid : sequence of arrays
+               1D arrays of points, in the true domain, for each axis
+    """
+    def __init__(self, T, grid):
+        assert len(grid) == len(T)
+        self.T = T
+        self.grid = [np.atleast_1d(np.asarray(x, dtype=float)) for x in grid]
+        self.dtype = T.forward.input_array.dtype
+        self.mats = []
+        cache = {}
+        for base, x in zip(T, self.grid):
+            key = (base.__class__, base.N, base.quad, tuple(base.domain), x.tobytes())
+            if key not in cache:
+                cache[key] = self._matrix(base, x)
+            self.mats.append(cache[key])
+
+        # Pencils and transfers for the contractions, starting from spectral
+        # space and ending aligned in the axis transformed first by T.forward
+        dtype = np.result_type(T.forward.output_array.dtype, *self.mats)
+        self.pencil = []
+        self.transfer = []
+        pencilA = T.pencil[1]
+        shape = list(pencilA.shape)
+        for i, axes in enumerate(T.axes):
+            for axis in axes:
+                shape[axis] = len(self.grid[axis])
+            pencilA = Pencil(pencilA.subcomm, shape, axes[-1])
+            self.pencil.append(pencilA)
+            if i < len(T.axes)-1:
+                pencilB = pencilA.pencil(T.axes[i+1][-1])
+                self.transfer.append(pencilA.transfer(pencilB, dtype))
+                pencilA = pencilB
+        self._work = [np.zeros(p.subshape, dtype=dtype) for p in self.pencil]
+        self._recv = [np.zeros(t.subshapeB, dtype=dtype) for t in self.transfer]
+
+    @staticmethod
+    def _matrix(base, x):
+        """Return matrix of basis functions evaluated at x"""
+        xr = base.map_reference_domain(x)
+        if isinstance(base, R2CBasis):
+            V = base.vandermonde(xr)
+            # Account for the conjugate half of the spectrum
+            k = np.arange(V.shape[1])
+            M = base.N//2+1 if base.N % 2 == 1 else base.N//2
+            return V*np.where((k > 0) & (k < M), 2, 1)
+        if isinstance(base, C2CBasis):
+            return base.vandermonde(xr)
+        return base.get_vandermonde_basis(base.vandermonde(xr))
+
+    def local_slice(self):
+        """Return local view into the global grid of the evaluated Function"""
+        p = self.pencil[-1]
+        return tuple([slice(start, start+n) for start, n in zip(p.substart, p.subshape)])
+
+    def local_mesh(self, broadcast=False):
+        """Return local part of the grid
+
+        Parameters
+        ----------
+            broadcast : bool, optional
+                        Return broadcasted mesh
+        """
+        mesh = []
+        for axis, (x, s) in enumerate(zip(self.grid, self.local_slice())):
+            X = x[s]
+            shape = [1]*len(self.grid)
+            shape[axis] = len(X)
+            mesh.append(X.reshape(shape))
+        if broadcast:
+            return np.broadcast_arrays(*mesh)
+        return mesh
+
+    def __call__(self, coefficients, output_array=None):
+        """Return Function evaluated on the local part of the grid
+
+        Parameters
+        ----------
+            coefficients : array
+                           Expansion coefficients. Leading axes not in T are
+                           treated one by one, e.g., for vectors
+            output_array : array, optional
+                           Function values on the local part of the grid
+        """
+        u = np.asarray(coefficients)
+        if u.ndim > len(self.T):
+            if output_array is None:
+                output_array = np.zeros((u.shape[0],)+self.pencil[-1].subshape,
+                                        dtype=self.dtype)
+            for ui, vi in zip(u, output_array):
+                self(ui, vi)
+            return output_array
+
+        for i, axes in enumerate(self.T.axes):
+            for axis in axes:
+                u = np.moveaxis(np.tensordot(self.mats[axis], u, axes=(1, axis)), 0, axis)
+            w = self._work[i]
+            w[...] = u
+            if i < len(self.transfer):
+                self.transfer[i].forward(w, self._recv[i])
+                u = self._recv[i]
+            else:
+                u = w
+
+        if output_array is None:
+            output_array = np.zeros(u.shape, dtype=self.dtype)
+        output_array[...] = u.real if self.dtype.char in 'fdg' else u
+        return output_array
+
+    def destroy(self):
+        for trans in self.transfer:
+            trans.destroy()
+
+
+class SpaceRegistry(object):
+    """Registry of shared TensorProductSpaces
+
+    Equivalent spaces, that is spaces with equivalent bases (type, N, quad,
+    padding, domain and boundary conditions), the same communicator, axes,
+    dtype, decomposition and planning options, are planned only once. The
+    planned transforms, work arrays, pencils and transfer objects are then
+    shared by all users of the space. The spaces are reference counted, and
+    a space is removed from the registry and destroyed when its
+    :meth:`TensorProductSpace.destroy` method has been called once for each
+    time it has been returned by :meth:`get`.
+
+    Note
+    ----
+    The bases of a shared space may be other, equivalent, instances than
+    the bases given to :meth:`get`.
+
+    Example
+    -------
+    >>> from mpi4py import MPI
+    >>> from shenfun import Basis
+    >>> from shenfun.tensorproductspace import space_registry
+    >>> T0 = space_registry.get(MPI.COMM_WORLD, (Basis(8, 'C'), Basis(8, 'F', dtype='d')))
+    >>> T1 = space_registry.get(MPI.COMM_WORLD, (Basis(8, 'C'), Basis(8, 'F', dtype='d')))
+    >>> T0 is T1
+    True
+    >>> T0.destroy(); T1.destroy()
+    >>> len(space_registry)
+    0
+    """
+    def __init__(self):
+        self._spaces = {}
+
+    @staticmethod
+    def base_key(base):
+        """Return hashable key of the definition of base
+
+        Parameters
+        ----------
+            base : instance of :class:`.SpectralBase`
+        """
+        bc = getattr(base, 'bc', None)
+        if isinstance(bc, BoundaryValues):
+            bc = tuple((b.shape, b.dtype.str, b.tobytes())
+                       if isinstance(b, np.ndarray) else b for b in bc.bc)
+        return (base.__class__, base.N, base.quad, float(base.padding_factor),
+                tuple(base.domain), getattr(base, 'dealias_direct', False),
+                getattr(base, '_scaled', False), getattr(base, 'mean', None),
+                getattr(base, 'alpha', None),
+                tuple(getattr(base, 'boundary_conditions', ())), bc)
+
+    def key(self, comm, bases, axes=None, dtype=None, **kw):
+        """Return hashable key of the definition of a TensorProductSpace
+
+        Parameters
+        ----------
+            comm : MPI communicator or Subcomm
+            bases : list
+                    List of 1D bases
+            axes : tuple of ints, optional
+            dtype : data-type, optional
+            kw : dict, optional
+                 Remaining keyword arguments to :class:`.TensorProductSpace`
+        """
+        if isinstance(comm, Subcomm):
+            comm = tuple(c.py2f() for c in comm)
+        else:
+            comm = comm.py2f()
+        axes = tuple(np.atleast_1d(axes)) if axes is not None else None
+        dtype = np.dtype(dtype).char if dtype is not None else None
+        return (comm, tuple(self.base_key(base) for base in bases), axes, dtype,
+                tuple(sorted((k, repr(v)) for k, v in kw.items())))
+
+    def get(self, comm, bases, axes=None, dtype=None, **kw):
+        """Return shared TensorProductSpace
+
+        A new space is created if there is no equivalent space in the
+        registry. The arguments are as for :class:`.TensorProductSpace`.
+        """
+        key = self.key(comm, bases, axes=axes, dtype=dtype, **kw)
+        if key not in self._spaces:
+            T = TensorProductSpace(comm, bases, axes=axes, dtype=dtype, **kw)
+            T._registry = self
+            self._spaces[key] = [T, 0]
+        self._spaces[key][1] += 1
+        return self._spaces[key][0]
+
+    def release(self, T):
+        """Release one reference to T and return the number left
+
+        Parameters
+        ----------
+            T : TensorProductSpace
+        """
+        for key, (space, count) in self._spaces.items():
+            if space is T:
+                if count > 1:
+                    self._spaces[key][1] -= 1
+                    return count-1
+                del self._spaces[key]
+                T._registry = None
+                return 0
+        return 0
+
+    def count(self, T):
+        """Return number of references to T
+
+        Parameters
+        ----------
+            T : TensorProductSpace
+        """
+        for space, count in self._spaces.values():
+            if space is T:
+                return count
+        return 0
+
+    def __len__(self):
+        return len(self._spaces)
+
+
+space_registry = SpaceRegistry()
+
+
 class Convolve(object):
     """Class for convolving without truncation.
 
@@ -611,6 +1502,12 @@ class Convolve(object):
     For convolve with truncation forward, use just the convolve method
     of the Tp space instead.
 
+    The space T is shared through the :data:`space_registry`, such that
+    several instances of Convolve for the same padding space plan T only
+    once. The reference to T is released when the instance is garbage
+    collected, or earlier by calling :meth:`destroy`. T is destroyed when
+    no instance refers to it anymore.
+
     Parameters
     ----------
         padding_space : TensorProductSpace
@@ -627,9 +1524,17 @@ class Convolve(object):
             bases.append(newbase)
         axes = []
         for axis in padding_space.axes:
-            axes.append(axis[0])
-        newspace = TensorProductSpace(padding_space.comm, bases, axes=axes)
+            axes.extend(axis)
+        newspace = space_registry.get(padding_space.comm, bases, axes=axes)
         self.newspace = newspace
+        # Release the registry reference also if destroy is never called.
+        # Not at exit, where the communicators may already be freed
+        self._release = weakref.finalize(self, newspace.destroy)
+        self._release.atexit = False
+
+    def destroy(self):
+        """Release the reference to the shared unpadded space"""
+        self._release()
 
     def __call__(self, a_hat, b_hat, ab_hat=None):
         """Compute convolution of a_hat and b_hat without truncation
@@ -662,11 +1567,30 @@ class BoundaryValues(object):
         T : TensorProductSpace
         bc : tuple of numbers
              Tuple with physical boundary values at edges of 1D domain
+
+    Note
+    ----
+    Boundary values given as sympy expressions may depend on the coordinates
+    x, y, z and on any other parameters, like time. The expressions are
+    compiled (lambdified) once, and the boundary coordinates and the order of
+    the transforms are stored when the base is used in a TensorProductSpace.
+    Updating the parameters with :meth:`update_bcs` then evaluates the
+    compiled functions on the boundary and transforms the boundary data.
+    The boundary values of a TensorProductSpace are not computed before all
+    parameters are given, and evaluating with a parameter missing raises a
+    RuntimeError.
+
+    If all the other bases of the TensorProductSpace are Fourier, and the
+    Dirichlet axis is not distributed, then only the two boundary planes
+    are transformed, using a TensorProductSpace of the Fourier bases with
+    its own work arrays. Otherwise an update costs a full forward transform
+    of the TensorProductSpace.
     """
     # pylint: disable=protected-access, redefined-outer-name, dangerous-default-value, unsubscriptable-object
 
     def __init__(self, T, bc=(0, 0)):
         self.T = T
+        self.base = T           # The 1D Dirichlet base of the boundary values
         self.bc = bc            # Containing Data, sympy.Exprs or np.ndarray
         self.bcs = [0, 0]       # Processed bc
         self.bcs_final = [0, 0] # Data. May differ from bcs only for TensorProductSpaces
@@ -675,20 +1599,27 @@ class BoundaryValues(object):
         self.slm1 = -1
         self.slm2 = -2
         self.axis = 0
+        self.params = {}        # Values of the parameters of sympy.Exprs
+        self._functions = [None, None]
+        self._tensor = None     # Cached data of the TensorProductSpace
         self.update_bcs(bc=bc)
 
     def update_bcs(self, sympy_params=None, bc=None):
-        if sympy_params:
-            assert isinstance(sympy_params, dict)
-            for i in range(2):
-                if isinstance(self.bc[i], sympy.Expr):
-                    self.bcs[i] = self.bc[i].evalf(subs=sympy_params)
-            self.bcs_final[:] = self.bcs
+        """Update boundary values
 
+        Parameters
+        ----------
+            sympy_params : dict, optional
+                           Values of the parameters of the boundary values
+                           given as sympy expressions, e.g., {t: 0.5}
+            bc : tuple, optional
+                 New boundary values
+        """
         if bc is not None:
             assert isinstance(bc, (list, tuple))
             assert len(bc) == 2
             self.bc = list(bc)
+            self._functions = [None, None]
             for i in range(2):
                 if isinstance(bc[i], (Number, sympy.Expr, np.ndarray)):
                     self.bcs[i] = bc[i]
@@ -697,6 +1628,58 @@ class BoundaryValues(object):
 
             self.bcs_final[:] = self.bcs
 
+        if sympy_params:
+            assert isinstance(sympy_params, dict)
+            self.params.update(sympy_params)
+
+        if self._tensor is not None and (bc is not None or sympy_params):
+            self._set_tensor_bcs_values()
+
+        elif sympy_params:
+            for i in range(2):
+                if isinstance(self.bc[i], sympy.Expr):
+                    self.bcs[i] = self._evaluate(i, [])
+            self.bcs_final[:] = self.bcs
+
+    def _evaluate(self, i, X):
+        """Return compiled bc[i] evaluated at mesh X and current parameters
+
+        Parameters
+        ----------
+            i : int
+                0 or 1 for the left or right boundary
+            X : list of arrays
+                Mesh of the boundary, one item for each axis
+        """
+        if self._functions[i] is None:
+            bc = self.bc[i]
+            spatial = [x for x in sympy.symbols('x,y,z') if x in bc.free_symbols]
+            params = sorted(bc.free_symbols.difference(spatial), key=str)
+            axes = ['xyz'.index(str(x)) for x in spatial]
+            self._functions[i] = (axes, params,
+                                  sympy.lambdify(spatial+params, bc, 'numpy'))
+        axes, params, f = self._functions[i]
+        self._check_params()
+        p = [self.params.get(sym, self.params.get(str(sym))) for sym in params]
+        return f(*([X[axis] for axis in axes]+p))
+
+    def _missing_params(self):
+        """Return names of parameters of the sympy.Exprs without a value"""
+        missing = set()
+        for bc in self.bc:
+            if isinstance(bc, sympy.Expr):
+                for sym in bc.free_symbols:
+                    if str(sym) not in ('x', 'y', 'z') and sym not in self.params \
+                        and str(sym) not in self.params:
+                        missing.add(str(sym))
+        return sorted(missing)
+
+    def _check_params(self):
+        missing = self._missing_params()
+        if missing:
+            raise RuntimeError('No value given for parameter(s) %s of the boundary values. '
+                               'Use update_bcs(sympy_params)' % ', '.join(missing))
+
     def set_tensor_bcs(self, T):
         self.T = T
         if isinstance(T, (chebyshev.bases.ShenDirichletBasis,
@@ -705,6 +1688,7 @@ class BoundaryValues(object):
             # Mainly for testing that solvers and other routines work along any dimension.
             self.set_slices(T)
             self.axis = T.axis
+            self._tensor = None
 
         elif any(isinstance(base, (chebyshev.bases.ShenDirichletBasis,
                                    legendre.bases.ShenDirichletBasis))
@@ -722,15 +1706,20 @@ class BoundaryValues(object):
             number_of_bases_after_dirichlet = 0
             bases = []
             for axes in reversed(T.axes):
-                base = T.bases[axes[0]]
-                assert len(axes) == 1
-                assert axes[0] == base.axis
-                if isinstance(base, (legendre.bases.ShenDirichletBasis,
-                                     chebyshev.bases.ShenDirichletBasis)):
+                base = T.bases[axes[-1]]
+                assert axes[-1] == base.axis
+                if base is self.base:
                     axis = self.axis = base.axis
                     dirichlet_base = base
                     bases.append('D')
 
+                elif isinstance(base, (legendre.bases.ShenDirichletBasis,
+                                       chebyshev.bases.ShenDirichletBasis)):
+                    # Another Dirichlet base, with its own boundary values
+                    if axis is None:
+                        number_of_bases_after_dirichlet += 1
+                    bases.append('D')
+
                 else:
                     if axis is None:
                         number_of_bases_after_dirichlet += 1
@@ -738,105 +1727,237 @@ class BoundaryValues(object):
 
             self.set_slices(dirichlet_base)
 
-            if self.has_nonhomogeneous_bcs() is False:
-                self.bcs[0] = self.bcs_final[0] = 0
-                self.bcs[1] = self.bcs_final[1] = 0
-                return
-
-            # Set boundary values
-            # These are values set at the end of a transform in Dirichlet space,
-            # but before any Fourier transforms
-            # Shape is like real space, since Dirichlet does not alter shape
-            b = Array(T)
-            s = T.local_slice(False)[axis]
-
-            if isinstance(self.bc[0], sympy.Expr):
-                bc0 = self.bc[0]
-                bc1 = self.bc[1]
-                X = T.local_mesh(True)
-                x, y, z = sympy.symbols("x,y,z")
-                sym0 = [sym for sym in (x, y, z) if sym in bc0.free_symbols]
-                sym1 = [sym for sym in (x, y, z) if sym in bc1.free_symbols]
-                lbc0 = sympy.lambdify(sym0, bc0, 'numpy')
-                lbc1 = sympy.lambdify(sym1, bc1, 'numpy')
-                Y0 = []
-                Y1 = []
-                for i, ax in enumerate((x, y, z)):
-                    if ax in bc0.free_symbols:
-                        Y0.append(X[i][dirichlet_base.sl(0)])
-                    if ax in bc1.free_symbols:
-                        Y1.append(X[i][dirichlet_base.sl(0)])
-
-                f_bc0 = lbc0(*Y0)
-                f_bc1 = lbc1(*Y1)
-                if s.stop == dirichlet_base.N:
-                    b[self.slm2] = f_bc0
-                    b[self.slm1] = f_bc1
-
-            elif isinstance(self.bc[0], Number):
-                if s.stop == dirichlet_base.N:
-                    b[self.slm2] = self.bc[0]
-                    b[self.slm1] = self.bc[1]
-
-            elif isinstance(self.bc[0], np.ndarray):
-                if s.stop == dirichlet_base.N:
-                    b[self.slm2] = self.bc[0][self.sl0]
-                    b[self.slm1] = self.bc[0][self.slm1]
-
+            # Store the boundary mesh and the order of the transforms once,
+            # such that the boundary values may be updated cheaply
+            X = T.local_mesh(True)
+            mesh = [np.broadcast_to(x, T.local_shape(False))[tuple(dirichlet_base.sl(0))].copy()
+                    for x in X]
+            self.destroy()
+            plane_space, m = self._plane_space(T, dirichlet_base,
+                                               number_of_bases_after_dirichlet)
+            if plane_space is None:
+                b = Array(T)
             else:
-                raise NotImplementedError
+                b = np.zeros((2,)+T.forward.input_array[tuple(dirichlet_base.sl(0))].shape,
+                             dtype=T.dtype)
+            self._tensor = {'b': b,
+                            'mesh': mesh,
+                            'on_boundary': T.local_slice(False)[axis].stop == dirichlet_base.N,
+                            'n': number_of_bases_after_dirichlet,
+                            'bases': bases,
+                            'plane_space': plane_space,
+                            'm': m}
+            if not self._missing_params():
+                # Else computed by update_bcs when the parameters are given
+                self._set_tensor_bcs_values()
+
+    @staticmethod
+    def _plane_space(T, base, n):
+        """Return space for transforming the boundary planes of base in T
 
-            if number_of_bases_after_dirichlet == 0:
-                # Dirichlet base is the first to be transformed
-                b_hat = b
+        Parameters
+        ----------
+            T : TensorProductSpace
+            base : The Dirichlet base of T
+            n : int
+                Number of groups of axes in T transformed before base
+
+        Returns
+        -------
+            2-tuple (P, m), where P is a TensorProductSpace of new instances
+            of the other bases of T, and m is the number of transforms of P
+            that precede base in T. P uses the process grid of T without the
+            axis of base, and groups and transforms the axes in the same
+            order, such that the planes are distributed as in T. This
+            requires that all other bases are Fourier, and that the axis of
+            base is not distributed in any layout of T. For 2D spaces, P is
+            the planned new instance of the other base. (None, None) is
+            returned if the planes cannot be transformed alone.
+        """
+        axis = base.axis
+        order = [ax for axes in reversed(T.axes) for ax in reversed(axes)]
+        if sorted(order) != list(range(len(T.bases))) or len(T.bases) < 2:
+            return None, None
+        if not all(isinstance(b, (R2CBasis, C2CBasis)) for b in T.bases if b is not base):
+            return None, None
+        N = T.forward.input_array.shape[axis]
+        for xfftn in T.forward._xfftn:
+            if (xfftn.input_array.shape[axis] != N or
+                    xfftn.output_array.shape[axis] != N):
+                return None, None
+
+        bases = [b.__class__(b.N, padding_factor=b.padding_factor,
+                             domain=b.domain, dealias_direct=b.dealias_direct)
+                 for b in T.bases if b is not base]
+        sl = tuple(base.sl(0))
+        if len(bases) == 1:
+            # Only serial, since the Fourier axis is then never distributed
+            bases[0].plan(T.forward.input_array[sl].shape, 0, T.dtype, {})
+            return bases[0], min(n, 1)
+        axes = [ax - (ax > axis) for ax in reversed(order) if ax != axis]
+        # The subcommunicators are shared with T, not created
+        subcomm = tuple.__new__(Subcomm, [c for i, c in enumerate(T.subcomm) if i != axis])
+        P = TensorProductSpace(subcomm, bases, axes=axes, dtype=T.dtype)
+        # The groups of P must transform the axes transformed before base
+        # in T first, or else the layouts of P differ from those of T
+        before = set(ax - (ax > axis) for axes in T.axes[len(T.axes)-n:] for ax in axes)
+        done = set()
+        for m, axes in enumerate(reversed(P.axes)):
+            if done == before:
+                break
+            done.update(axes)
+        else:
+            m = len(P.axes)
+        if (done != before or
+                P.forward.input_array.shape != T.forward.input_array[sl].shape or
+                P.forward.output_array.shape != T.forward.output_array[sl].shape):
+            # Not P.destroy(), since the subcommunicators belong to T
+            for trans in P.transfer:
+                trans.destroy()
+            return None, None
+        return P, m
 
-            elif number_of_bases_after_dirichlet == 1:
-                T.forward._xfftn[0].input_array[...] = b
+    def destroy(self):
+        """Release the transfer objects of the boundary plane space
 
-                T.forward._xfftn[0]()
-                arrayA = T.forward._xfftn[0].output_array
-                arrayB = T.forward._xfftn[1].input_array
-                T.forward._transfer[0](arrayA, arrayB)
-                b_hat = arrayB.copy()
+        Called by :meth:`.TensorProductSpace.destroy` of the space that the
+        boundary values are computed for.
+        """
+        if self._tensor is not None and self._tensor['plane_space'] is not None:
+            for trans in getattr(self._tensor['plane_space'], 'transfer', ()):
+                trans.destroy()
+            self._tensor['plane_space'] = None
 
-            elif number_of_bases_after_dirichlet == 2:
-                T.forward._xfftn[0].input_array[...] = b
+    def _set_tensor_bcs_values(self):
+        """Compute boundary values for the stored TensorProductSpace
 
-                T.forward._xfftn[0]()
-                arrayA = T.forward._xfftn[0].output_array
-                arrayB = T.forward._xfftn[1].input_array
-                T.forward._transfer[0](arrayA, arrayB)
+        Note
+        ----
+        If there is a space for the boundary planes, then only the two
+        planes are transformed, with the work arrays of that space. Else the
+        boundary values are placed in the stored local Array, and the
+        transforms along the remaining bases are performed on the entire
+        Array, with the work arrays of the TensorProductSpace. The input and
+        output arrays of its forward transform are restored afterwards.
+        """
+        self._check_params()
+        T = self.T
+        data = self._tensor
+        n = data['n']
+        bases = data['bases']
+
+        if self.has_nonhomogeneous_bcs() is False:
+            self.bcs[0] = self.bcs_final[0] = 0
+            self.bcs[1] = self.bcs_final[1] = 0
+            return
+
+        if data['plane_space'] is not None:
+            self._set_plane_bcs_values()
+            return
+
+        # Set boundary values
+        # These are values set at the end of a transform in Dirichlet space,
+        # but before any Fourier transforms
+        # Shape is like real space, since Dirichlet does not alter shape
+        b = data['b']
+        if data['on_boundary']:
+            if isinstance(self.bc[0], (Number, sympy.Expr)):
+                for i, sl in enumerate((self.slm2, self.slm1)):
+                    if isinstance(self.bc[i], sympy.Expr):
+                        b[tuple(sl)] = self._evaluate(i, data['mesh'])
+                    else:
+                        b[tuple(sl)] = self.bc[i]
 
-                T.forward._xfftn[1]()
-                arrayA = T.forward._xfftn[1].output_array
-                arrayB = T.forward._xfftn[2].input_array
-                T.forward._transfer[1](arrayA, arrayB)
-                b_hat = arrayB.copy()
+            elif isinstance(self.bc[0], np.ndarray):
+                b[self.slm2] = self.bc[0][self.sl0]
+                b[self.slm1] = self.bc[0][self.slm1]
 
-            # Now b_hat contains the correct slices in slm1 and slm2
-            self.bcs[0] = b_hat[self.slm2].copy()
-            self.bcs[1] = b_hat[self.slm1].copy()
+            else:
+                raise NotImplementedError
 
-            # Final
-            T.forward._xfftn[0].input_array[...] = b
-            for i in range(len(T.forward._transfer)):
-                if bases[i] == 'F':
-                    T.forward._xfftn[i]()
-                else:
-                    T.forward._xfftn[i].output_array[...] = T.forward._xfftn[i].input_array
+        saved = (T.forward.input_array.copy(), T.forward.output_array.copy())
+        if n == 0:
+            # Dirichlet base is the first to be transformed
+            self.bcs[0] = b[self.slm2].copy()
+            self.bcs[1] = b[self.slm1].copy()
 
+        elif 'D' in bases[:n]:
+            # Transform the bases after the Dirichlet base, in any number of dimensions
+            T.forward._xfftn[0].input_array[...] = b
+            for i in range(n):
+                T.forward._xfftn[i]()
                 arrayA = T.forward._xfftn[i].output_array
                 arrayB = T.forward._xfftn[i+1].input_array
                 T.forward._transfer[i](arrayA, arrayB)
 
-            if bases[-1] == 'F':
-                T.forward._xfftn[-1]()
+            # Now arrayB contains the correct slices in slm1 and slm2
+            self.bcs[0] = arrayB[self.slm2].copy()
+            self.bcs[1] = arrayB[self.slm1].copy()
+
+        # Final. If all bases after the Dirichlet base are Fourier, then bcs
+        # are picked up on the way
+        T.forward._xfftn[0].input_array[...] = b
+        for i in range(len(T.forward._transfer)):
+            if bases[i] == 'F':
+                T.forward._xfftn[i]()
             else:
-                T.forward._xfftn[-1].output_array[...] = T.forward._xfftn[-1].input_array
+                T.forward._xfftn[i].output_array[...] = T.forward._xfftn[i].input_array
+
+            arrayA = T.forward._xfftn[i].output_array
+            arrayB = T.forward._xfftn[i+1].input_array
+            T.forward._transfer[i](arrayA, arrayB)
+            if i+1 == n and 'D' not in bases[:n]:
+                self.bcs[0] = arrayB[self.slm2].copy()
+                self.bcs[1] = arrayB[self.slm1].copy()
+
+        if bases[-1] == 'F':
+            T.forward._xfftn[-1]()
+        else:
+            T.forward._xfftn[-1].output_array[...] = T.forward._xfftn[-1].input_array
+
+        b_hat = T.forward._xfftn[-1].output_array
+        self.bcs_final[0] = b_hat[self.slm2].copy()
+        self.bcs_final[1] = b_hat[self.slm1].copy()
+        T.forward.input_array[...] = saved[0]
+        T.forward.output_array[...] = saved[1]
+
+    def _set_plane_bcs_values(self):
+        """Compute boundary values by transforming the boundary planes"""
+        data = self._tensor
+        P = data['plane_space']
+        b = data['b']
+        if isinstance(self.bc[0], (Number, sympy.Expr)):
+            for i in range(2):
+                if isinstance(self.bc[i], sympy.Expr):
+                    b[i] = self._evaluate(i, data['mesh'])
+                else:
+                    b[i] = self.bc[i]
+
+        elif isinstance(self.bc[0], np.ndarray):
+            b[0] = self.bc[0][tuple(self.sl0)]
+            b[1] = self.bc[0][tuple(self.slm1)]
 
-            b_hat = T.forward._xfftn[-1].output_array
-            self.bcs_final[0] = b_hat[self.slm2].copy()
-            self.bcs_final[1] = b_hat[self.slm1].copy()
+        else:
+            raise NotImplementedError
+
+        m = data['m']
+        if isinstance(P, TensorProductSpace):
+            xfftn, transfer = P.forward._xfftn, P.forward._transfer
+        else:
+            xfftn, transfer = [P.forward], []
+        for i in range(2):
+            xfftn[0].input_array[...] = b[i]
+            if m == 0:
+                self.bcs[i] = b[i].copy()
+            for j, trans in enumerate(transfer):
+                xfftn[j]()
+                trans(xfftn[j].output_array, xfftn[j+1].input_array)
+                if j+1 == m:
+                    self.bcs[i] = xfftn[j+1].input_array.copy()
+            xfftn[-1]()
+            self.bcs_final[i] = xfftn[-1].output_array.copy()
+            if m == len(xfftn):
+                self.bcs[i] = self.bcs_final[i].copy()
 
     def set_slices(self, T):
         self.sl0 = T.sl(0)
@@ -844,28 +1965,41 @@ class BoundaryValues(object):
         self.slm1 = T.sl(-1)
         self.slm2 = T.sl(-2)
 
+    @staticmethod
+    def _batch(u, s):
+        # Leading axes of u not covered by the slices s are batch axes
+        if isinstance(s, list) and np.ndim(u) > len(s):
+            return tuple([Ellipsis]+s)
+        return s
+
     def apply_before(self, u, final=False, scales=(0.5, 0.5)):
+        sl0, sl1 = self._batch(u, self.sl0), self._batch(u, self.sl1)
         if final is True:
-            u[self.sl0] += scales[0]*(self.bcs_final[0] + self.bcs_final[1])
-            u[self.sl1] += scales[1]*(self.bcs_final[0] - self.bcs_final[1])
+            u[sl0] += scales[0]*(self.bcs_final[0] + self.bcs_final[1])
+            u[sl1] += scales[1]*(self.bcs_final[0] - self.bcs_final[1])
 
         else:
-            u[self.sl0] += scales[0]*(self.bcs[0] + self.bcs[1])
-            u[self.sl1] += scales[1]*(self.bcs[0] - self.bcs[1])
+            u[sl0] += scales[0]*(self.bcs[0] + self.bcs[1])
+            u[sl1] += scales[1]*(self.bcs[0] - self.bcs[1])
 
     def apply_after(self, u, final=False):
+        slm2, slm1 = self._batch(u, self.slm2), self._batch(u, self.slm1)
         if final is True:
-            u[self.slm2] = self.bcs_final[0]
-            u[self.slm1] = self.bcs_final[1]
+            u[slm2] = self.bcs_final[0]
+            u[slm1] = self.bcs_final[1]
 
         else:
-            u[self.slm2] = self.bcs[0]
-            u[self.slm1] = self.bcs[1]
+            u[slm2] = self.bcs[0]
+            u[slm1] = self.bcs[1]
 
     def has_nonhomogeneous_bcs(self):
-        if self.bcs[0] == 0 and self.bcs[1] == 0:
-            return False
-        return True
+        for bc in self.bc:
+            if isinstance(bc, np.ndarray):
+                if np.any(bc != 0):
+                    return True
+            elif bc != 0:
+                return True
+        return False
 
 def some_basic_tests():
     import pyfftw
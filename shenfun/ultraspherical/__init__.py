@@ -0,0 +1,4 @@
+"""Functionality for working with ultraspherical (Gegenbauer) bases"""
+from . import la
+from .bases import *
+from .matrices import *
@@ -0,0 +1,356 @@
+r"""
+Module for defining bases in the ultraspherical (Gegenbauer) family
+
+The family contains the Chebyshev polynomials of the first kind,
+:math:`T_n`, and the ultraspherical polynomials :math:`C^{(\alpha)}_n` for
+integer :math:`\alpha > 0`. Following Olver and Townsend, differential
+equations are discretized with a Chebyshev trial basis and an ultraspherical
+test basis of order equal to the highest derivative, since
+
+.. math::
+
+    \frac{d^k T_n}{dx^k} = 2^{k-1} (k-1)! \, n \, C^{(k)}_{n-k}
+
+such that both differentiation and conversion between the bases are sparse
+operators, see :mod:`.ultraspherical.matrices`.
+
+All bases use the Chebyshev quadrature points, and transforms are computed
+with the fast Chebyshev transforms followed by a banded conversion of the
+coefficients.
+"""
+import numpy as np
+from numpy.polynomial import chebyshev as n_cheb
+from scipy.linalg import solve_banded
+from scipy.special import gammaln
+from shenfun.spectralbase import SpectralBase, work, Transform
+from shenfun.chebyshev.bases import Basis as ChebyshevBasis
+from shenfun.utilities import inheritdocstrings
+
+__all__ = ['UltrasphericalBase', 'Basis']
+
+#pylint: disable=method-hidden,no-else-return,not-callable,abstract-method,no-member,cyclic-import
+
+
+def gegenbauer_vandermonde(x, alpha, N):
+    r"""Return Vandermonde matrix of ultraspherical polynomials
+
+    Parameters
+    ----------
+        x : array
+            Points for evaluation
+        alpha : int
+                Order of the polynomials. Chebyshev polynomials of the first
+                kind for alpha = 0, otherwise :math:`C^{(\alpha)}_n`
+        N : int
+            Number of polynomials
+    """
+    if alpha == 0:
+        return n_cheb.chebvander(x, N-1)
+    V = np.zeros((len(x), N))
+    if N > 0:
+        V[:, 0] = 1
+    if N > 1:
+        V[:, 1] = 2*alpha*x
+    for n in range(1, N-1):
+        V[:, n+1] = (2*(n+alpha)*x*V[:, n] - (n+2*alpha-1)*V[:, n-1])/(n+1)
+    return V
+
+
+def norm_squared(N, alpha, quad='GC'):
+    r"""Return squared weighted norms of ultraspherical polynomials
+
+    .. math::
+
+        h_n = \int_{-1}^1 C^{(\alpha)}_n(x)^2 (1-x^2)^{\alpha-1/2} dx
+
+    Parameters
+    ----------
+        N : int
+            Number of polynomials
+        alpha : int
+                Order of the polynomials
+        quad : str, optional
+               Type of quadrature. For alpha = 0 and Gauss-Lobatto the last
+               norm is the discrete norm of the quadrature
+    """
+    n = np.arange(N)
+    if alpha == 0:
+        h = np.full(N, np.pi/2)
+        h[0] = np.pi
+        if quad == 'GL':
+            h[-1] = np.pi
+        return h
+    return np.exp(np.log(np.pi) + (1-2*alpha)*np.log(2) + gammaln(n+2*alpha)
+                  - gammaln(n+1) - np.log(n+alpha) - 2*gammaln(alpha))
+
+
+@inheritdocstrings
+class UltrasphericalBase(SpectralBase):
+    """Base class for all ultraspherical bases
+
+    Parameters
+    ----------
+        N : int, optional
+            Number of quadrature points
+        quad : str, optional
+               Type of quadrature
+
+               - GL - Chebyshev-Gauss-Lobatto
+               - GC - Chebyshev-Gauss
+
+        alpha : int, optional
+                Order of the ultraspherical polynomials. Use 0 for Chebyshev
+                polynomials of the first kind
+        domain : 2-tuple of floats, optional
+                 The computational domain
+    """
+
+    def __init__(self, N=0, quad="GC", alpha=0, domain=(-1., 1.)):
+        assert quad in ('GC', 'GL')
+        assert int(alpha) == alpha and alpha >= 0
+        SpectralBase.__init__(self, N, quad, domain=domain)
+        self.alpha = int(alpha)
+        self.CT = ChebyshevBasis(N, quad, domain=domain)
+
+    @staticmethod
+    def family():
+        return 'ultraspherical'
+
+    def reference_domain(self):
+        return (-1., 1.)
+
+    def points_and_weights(self, N, scaled=False):
+        points, weights = self.CT.points_and_weights(N)
+        if self.alpha > 0:
+            weights = weights*(1-points**2)**self.alpha
+        if scaled is True:
+            points = self.map_true_domain(points)
+        return points, weights
+
+    def vandermonde(self, x):
+        """Return Chebyshev Vandermonde matrix
+
+        The Vandermonde matrix is common to all bases of the family, and the
+        basis functions are computed from its second column, which is x.
+
+        Parameters
+        ----------
+            x : array
+                points for evaluation
+
+        """
+        return n_cheb.chebvander(x, self.N-1)
+
+    def get_vandermonde_basis(self, V):
+        if self.alpha == 0:
+            return V
+        return gegenbauer_vandermonde(V[:, 1], self.alpha, self.N)
+
+    def get_vandermonde_basis_derivative(self, V, k=0):
+        """Return k'th derivatives of basis as a Vandermonde matrix
+
+        Parameters
+        ----------
+            V : array of ndim = 2
+                Chebyshev Vandermonde matrix
+            k : int
+                k'th derivative
+        """
+        assert self.N == V.shape[1]
+        if k == 0:
+            return self.get_vandermonde_basis(V)
+        P = np.zeros(V.shape)
+        C = gegenbauer_vandermonde(V[:, 1], self.alpha+k, self.N-k)
+        if self.alpha == 0:
+            n = np.arange(k, self.N)
+            P[:, k:] = C*n*2**(k-1)*np.prod(np.arange(1, k))
+        else:
+            P[:, k:] = C*2**k*np.prod(np.arange(self.alpha, self.alpha+k))
+        return P
+
+    def norm_squared(self):
+        """Return squared weighted norms of the basis functions"""
+        return norm_squared(self.N, self.alpha, self.quad)
+
+    def to_chebyshev(self, array, axis=0):
+        """Return coefficients of array converted to Chebyshev coefficients
+
+        Parameters
+        ----------
+            array : array
+                    Expansion coefficients of basis. Overwritten with the
+                    Chebyshev coefficients, and returned.
+            axis : int, optional
+                   The axis of the coefficients
+        """
+        from .matrices import conversion_diagonals
+        N = array.shape[axis]
+        a = np.moveaxis(array, axis, 0)
+        b = a.reshape((N, -1))
+        for lam in range(self.alpha-1, -1, -1):
+            d0, d2 = conversion_diagonals(N, lam)
+            ab = np.zeros((3, N))
+            ab[0, 2:] = d2
+            ab[2] = d0
+            b = solve_banded((0, 2), ab, b, overwrite_b=True, check_finite=False)
+        a[...] = b.reshape(a.shape)
+        return array
+
+    def from_chebyshev(self, array, axis=0):
+        """Return Chebyshev coefficients of array converted to basis
+
+        Parameters
+        ----------
+            array : array
+                    Chebyshev expansion coefficients. Overwritten with the
+                    coefficients of this basis, and returned.
+            axis : int, optional
+                   The axis of the coefficients
+        """
+        from .matrices import conversion_diagonals
+        N = array.shape[axis]
+        s0 = [slice(None)]*array.ndim
+        s2 = [slice(None)]*array.ndim
+        s0[axis] = slice(0, -2)
+        s2[axis] = slice(2, None)
+        s0, s2 = tuple(s0), tuple(s2)
+        for lam in range(self.alpha):
+            d0, d2 = conversion_diagonals(N, lam)
+            c2 = self.broadcast_to_ndims(d2, array.ndim, axis)*array[s2]
+            array *= self.broadcast_to_ndims(d0, array.ndim, axis)
+            array[s0] += c2
+        return array
+
+    def evaluate_scalar_product(self, input_array, output_array, fast_transform=True):
+        # Exact weighted scalar product of the Chebyshev interpolant
+        output = self.CT.forward(fast_transform=fast_transform)
+        self.from_chebyshev(output, self.axis)
+        output *= self.broadcast_to_ndims(self.norm_squared(), output.ndim, self.axis)
+
+    def apply_inverse_mass(self, array):
+        array /= self.broadcast_to_ndims(self.norm_squared(), array.ndim, self.axis)
+        return array
+
+    def evaluate_expansion_all(self, input_array, output_array, fast_transform=True):
+        if self.alpha == 0:
+            self.CT.backward(fast_transform=fast_transform)
+            return
+        w_hat = work[(input_array, 0)]
+        w_hat[...] = input_array
+        self.to_chebyshev(w_hat, self.axis)
+        self.CT.backward(w_hat, fast_transform=fast_transform)
+        assert output_array is self.CT.backward.output_array
+
+    def eval(self, x, fk, output_array=None):
+        if output_array is None:
+            output_array = np.zeros(x.shape)
+        x = self.map_reference_domain(x)
+        output_array[:] = n_cheb.chebval(x, self.to_chebyshev(fk.copy()))
+        return output_array
+
+    def plan(self, shape, axis, dtype, options):
+        if isinstance(axis, tuple):
+            axis = axis[0]
+
+        if isinstance(self.forward, Transform):
+            if self.forward.input_array.shape == shape and self.axis == axis:
+                # Already planned
+                return
+
+        self.CT.plan(shape, axis, dtype, options)
+        self.axis = self.CT.axis
+        xfftn_fwd = self.CT.forward.xfftn
+        xfftn_bck = self.CT.backward.xfftn
+        U = self.CT.forward.input_array
+        V = self.CT.forward.output_array
+        self.forward = Transform(self.forward, xfftn_fwd, U, V, V)
+        self.backward = Transform(self.backward, xfftn_bck, V, V, U)
+        self.scalar_product = Transform(self.scalar_product, xfftn_fwd, U, V, V)
+
+    def __eq__(self, other):
+        return (SpectralBase.__eq__(self, other) and
+                self.alpha == getattr(other, 'alpha', None))
+
+    __hash__ = SpectralBase.__hash__
+
+
+@inheritdocstrings
+class Basis(UltrasphericalBase):
+    r"""Basis for ultraspherical series
+
+    For alpha = 0 the basis functions are the Chebyshev polynomials of the
+    first kind, :math:`T_n`, and otherwise the ultraspherical polynomials
+    :math:`C^{(\alpha)}_n`, orthogonal with weight
+    :math:`(1-x^2)^{\alpha-1/2}`. Boundary conditions are not built into the
+    basis functions, but are imposed as boundary rows (boundary bordering) by
+    the solver of the linear system, see :class:`.ultraspherical.la.AlmostBandedSolver`.
+
+    Parameters
+    ----------
+        N : int, optional
+            Number of quadrature points
+        quad : str, optional
+               Type of quadrature
+
+               - GL - Chebyshev-Gauss-Lobatto
+               - GC - Chebyshev-Gauss
+
+        alpha : int, optional
+                Order of the ultraspherical polynomials
+        bc : str or 2-tuple of numbers, optional
+             Boundary conditions imposed on the solution of linear systems
+             where this basis is the trial basis. Only for alpha = 0.
+
+             - 2-tuple (a, b) - Dirichlet with :math:`u(1)=a` and :math:`u(-1)=b`
+             - Dirichlet - Homogeneous Dirichlet
+             - Neumann - Homogeneous Neumann
+             - Biharmonic - Homogeneous Dirichlet and Neumann at both ends
+
+        plan : bool, optional
+               Plan transforms on __init__ or not. If basis is part of a
+               TensorProductSpace, then planning needs to be delayed.
+        domain : 2-tuple of floats, optional
+                 The computational domain
+    """
+
+    def __init__(self, N=0, quad="GC", alpha=0, bc=None, plan=False,
+                 domain=(-1., 1.)):
+        UltrasphericalBase.__init__(self, N, quad, alpha, domain=domain)
+        if bc is None:
+            bcs = []
+        elif isinstance(bc, tuple):
+            assert len(bc) == 2
+            bcs = [(1, 0, bc[0]), (-1, 0, bc[1])]
+        elif bc.lower() == 'dirichlet':
+            bcs = [(1, 0, 0), (-1, 0, 0)]
+        elif bc.lower() == 'neumann':
+            bcs = [(1, 1, 0), (-1, 1, 0)]
+        elif bc.lower() == 'biharmonic':
+            bcs = [(1, 0, 0), (-1, 0, 0), (1, 1, 0), (-1, 1, 0)]
+        else:
+            raise NotImplementedError
+        assert self.alpha == 0 or len(bcs) == 0, 'Boundary conditions only for alpha = 0'
+        self.boundary_conditions = bcs
+        if plan:
+            self.plan(N, 0, np.float, {})
+
+    def boundary_matrix(self):
+        r"""Return boundary rows of the linear system
+
+        Row i contains the k'th derivative of all basis functions, evaluated
+        at boundary x, for the i'th boundary condition (x, k, value).
+        """
+        B = np.zeros((len(self.boundary_conditions), self.N))
+        n = np.arange(self.N)
+        for i, (x, k, _) in enumerate(self.boundary_conditions):
+            d = np.ones(self.N)
+            for j in range(k):
+                d *= (n**2-j**2)/(2*j+1.)
+            if x < 0:
+                d *= (-1.)**(n+k)
+            B[i] = d*self.domain_factor()**k
+        return B
+
+    def boundary_values(self):
+        """Return values of boundary conditions"""
+        return np.array([val for _, _, val in self.boundary_conditions])
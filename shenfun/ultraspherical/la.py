@@ -0,0 +1,162 @@
+"""Solvers for the ultraspherical family"""
+#pylint: disable=line-too-long, len-as-condition, missing-docstring, too-many-instance-attributes, too-many-locals
+
+import numpy as np
+from shenfun.matrixbase import LinearOperator
+from shenfun.optimization import la
+
+__all__ = ['AlmostBandedSolver']
+
+
+class AlmostBandedSolver(object):
+    r"""Adaptive QR solver for boundary bordered ultraspherical systems
+
+    The Galerkin matrices of the ultraspherical family are banded. Boundary
+    conditions are imposed by replacing the last rows of the Galerkin system
+    with dense boundary rows at the top, which gives an almost-banded system
+
+    .. math::
+
+        \begin{bmatrix} B \\ \text{diag}(h)^{-1} A \end{bmatrix} u =
+        \begin{bmatrix} c \\ \text{diag}(h)^{-1} b \end{bmatrix}
+
+    where B contains the boundary rows of the trial basis, c the boundary
+    values, A the first N-len(c) rows of the operator and h the squared norms
+    of the test functions. The system is factorized with Householder
+    reflections, where the fill-in of the dense boundary rows is represented
+    as a linear combination of the boundary rows, such that both
+    factorization and solve are O(N) (Olver and Townsend, SIAM Review 55,
+    2013). The factorization is computed once and vectorized over all lines
+    of multidimensional data.
+
+    The solve is adaptive: the reflections are applied to the right hand side
+    until the norm of the remaining part is below tol times the norm of the
+    right hand side, and the solution is truncated to the number of
+    coefficients used, which is returned by :meth:`solve`.
+
+    Parameters
+    ----------
+        mats : UltrasphericalMatrices
+               Terms of the operator, with the same test and trial bases.
+               The scales may be arrays for multidimensional problems
+        tol : float, optional
+              Relative tolerance of the adaptive solve
+    """
+
+    def __init__(self, *mats, tol=1e-14):
+        op = LinearOperator(list(mats))
+        self.axis = op.axis
+        test = op.terms[0].testfunction[0]
+        trial = op.terms[0].trialfunction[0]
+        ndim = max([np.ndim(t.scale) for t in op.terms]+[1])
+        diags = op.merge(ndim)
+        self.N = op.shape[0]
+        self.diags = {key: np.asarray(val) for key, val in diags.items()}
+        self.h = test.norm_squared()
+        self.B = trial.boundary_matrix()
+        self.values = trial.boundary_values()
+        self.tol = tol
+        self._factors = {}
+
+    def factorize(self, shape):
+        """Return factorization for lines of given shape
+
+        Parameters
+        ----------
+            shape : tuple
+                    Shape of data with the axis of the solver removed
+        """
+        if shape in self._factors:
+            return self._factors[shape]
+        N, B, h = self.N, self.B, self.h
+        nbc = B.shape[0]
+        offsets = sorted(self.diags.keys())
+        ml = max(nbc-offsets[0], nbc-1, 0)
+        mu = max(offsets[-1]-nbc, 0)
+        P = int(np.prod(shape))
+        dtype = np.result_type(float, *self.diags.values())
+
+        # Banded part of rows, row r holding columns r-ml, ..., r+ml+mu
+        win = np.zeros((P, N, 2*ml+mu+1), dtype=dtype)
+        for off, val in self.diags.items():
+            val = val.reshape(val.shape[:1]+(1,)*(len(shape)+1-val.ndim)+val.shape[1:])
+            val = np.broadcast_to(val, val.shape[:1]+shape).reshape((val.shape[0], P))
+            i0, i1 = max(0, -off), min(N-nbc, N-off)
+            q0 = i0+min(off, 0)
+            win[:, i0+nbc:i1+nbc, off-nbc+ml] = (val[q0:q0+i1-i0]/h[i0:i1, None]).T
+
+        # Fill-in of dense boundary rows, row r is F[r].dot(B)
+        F = np.zeros((P, N, nbc), dtype=dtype)
+        F[:, np.arange(nbc), np.arange(nbc)] = 1
+        V = np.zeros((P, N, ml+1), dtype=dtype)
+        beta = np.zeros((P, N))
+        R = np.zeros((P, N), dtype=dtype)
+        la.AlmostBanded_QR(win, F, V, beta, R, B)
+
+        self._factors[shape] = (win, F, V, beta, R, ml, mu)
+        return self._factors[shape]
+
+    def __call__(self, b, u=None, axis=0):
+        """Solve matrix problem Au = b
+
+        Parameters
+        ----------
+        b : array
+            Array of right hand side on entry and solution on exit unless
+            u is provided.
+        u : array, optional
+            Output array
+        axis : int, optional
+               The axis over which to solve for if b and u are multidimensional
+
+        If u is not provided, then b is overwritten with the solution and returned
+
+        """
+        return self.solve(b, u=u, axis=axis)[0]
+
+    def solve(self, b, u=None, axis=0):
+        """Solve matrix problem Au = b
+
+        Parameters
+        ----------
+        b : array
+            Array of right hand side on entry and solution on exit unless
+            u is provided.
+        u : array, optional
+            Output array
+        axis : int, optional
+               The axis over which to solve for if b and u are multidimensional
+
+        Returns
+        -------
+            2-tuple (u, n), where n is the number of coefficients used for
+            the solution. The remaining coefficients of u are zero.
+        """
+        if u is None:
+            u = b
+        else:
+            assert u.shape == b.shape
+        N, B, h = self.N, self.B, self.h
+        nbc = B.shape[0]
+        bm = np.moveaxis(b, axis, 0)
+        shape = bm.shape[1:]
+        P = int(np.prod(shape))
+        win, F, V, beta, R, ml, mu = self.factorize(shape)
+
+        y = np.zeros((P, N), dtype=np.result_type(win, b))
+        y[:, nbc:] = (bm[:N-nbc].reshape((N-nbc, P))/h[:N-nbc, None]).T
+        if np.any(self.values != 0):
+            if P > 1:
+                raise NotImplementedError('Inhomogeneous boundary conditions only implemented in 1D')
+            y[:, :nbc] = self.values
+        suffix = np.zeros((P, N+1))
+        suffix[:, :N] = np.cumsum(abs(y[:, ::-1])**2, axis=1)[:, ::-1]
+
+        # Complex data with real factors are solved as interleaved real and
+        # imaginary parts
+        x = np.zeros_like(y)
+        yv, xv = (y.view(win.dtype), x.view(win.dtype)) if y.dtype != win.dtype else (y, x)
+        n = la.AlmostBanded_Solve(win, F, V, beta, R, B, yv, xv, suffix, self.tol)
+        um = np.moveaxis(u, axis, 0)
+        um[...] = x.T.reshape(um.shape)
+        return u, n
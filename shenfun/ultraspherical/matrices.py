@@ -0,0 +1,267 @@
+r"""
+This module contains the inner product matrices of the ultraspherical family.
+
+The matrices are assembled from the sparse operators of Olver and Townsend
+instead of Vandermonde type computations. For a trial basis of order
+:math:`\lambda`, differentiated k times, and a test basis of order
+:math:`\mu \ge \lambda + k`, the weighted inner product matrix is
+
+.. math::
+
+    (C^{(\mu)}_i, a \frac{d^k C^{(\lambda)}_j}{dx^k})_{w} = h^{(\mu)}_i
+    (\mathcal{S}_{\mu-1} \cdots \mathcal{S}_{\lambda+k} \mathcal{M}_{\lambda+k}[a]
+    \mathcal{D}_{\lambda, k})_{ij}
+
+where :math:`\mathcal{D}_{\lambda, k}` is the differentiation operator from
+:math:`C^{(\lambda)}` to :math:`C^{(\lambda+k)}`, :math:`\mathcal{S}_{\lambda}`
+is the conversion operator from :math:`C^{(\lambda)}` to
+:math:`C^{(\lambda+1)}`, :math:`\mathcal{M}_{\lambda}[a]` is multiplication
+with the variable coefficient :math:`a(x)` and :math:`h^{(\mu)}_i` are the
+squared norms of the test functions. The Chebyshev polynomials are
+:math:`C^{(0)}_n = T_n`. All operators are banded, and the matrices are
+banded whenever the coefficient is well approximated by a low order
+Chebyshev series.
+
+All matrices may be looked up using the 'mat' dictionary, which returns the
+generic :class:`.UltrasphericalMatrix` for any combination of bases
+
+>>> from shenfun.ultraspherical.matrices import mat
+>>> from shenfun.ultraspherical.bases import Basis
+>>> T = Basis(10, bc=(0, 0))
+>>> C2 = Basis(10, alpha=2)
+>>> A = mat[((Basis, 0), (Basis, 2))]((C2, 0), (T, 2))
+>>> sorted(A.keys())
+[2]
+
+Variable coefficients are given as a callable or as Chebyshev coefficients
+
+>>> from shenfun.ultraspherical.matrices import UltrasphericalMatrix
+>>> B = UltrasphericalMatrix((C2, 0), (T, 0), coefficient=lambda x: 1+x**2)
+>>> sorted(B.keys())
+[-2, 0, 2, 4, 6]
+
+"""
+from __future__ import division
+
+import hashlib
+import numpy as np
+from numpy.polynomial import chebyshev as n_cheb
+import scipy.sparse as sp
+from shenfun.matrixbase import SpectralMatrix, get_dense_matrix, \
+    extract_diagonal_matrix
+from .bases import UltrasphericalBase
+
+__all__ = ['UltrasphericalMatrix', 'conversion', 'differentiation',
+           'multiplication', 'mat']
+
+
+def conversion_diagonals(N, lam):
+    r"""Return main and second superdiagonal of conversion operator
+
+    The operator converts coefficients of :math:`C^{(\lambda)}` series to
+    coefficients of :math:`C^{(\lambda+1)}` series.
+
+    Parameters
+    ----------
+        N : int
+            Number of coefficients
+        lam : int
+              Order of input series
+    """
+    n = np.arange(N, dtype=float)
+    if lam == 0:
+        d0 = np.full(N, 0.5)
+        d0[0] = 1
+        d2 = np.full(max(N-2, 0), -0.5)
+    else:
+        d0 = lam/(n+lam)
+        d2 = -lam/(n[2:]+lam)
+    return d0, d2
+
+
+def conversion(N, lam, mu):
+    r"""Return sparse conversion operator from order lam to order mu
+
+    Parameters
+    ----------
+        N : int
+            Number of coefficients
+        lam : int
+              Order of input series
+        mu : int
+             Order of output series, mu >= lam
+    """
+    assert mu >= lam
+    S = sp.identity(N, format='csr')
+    for l in range(lam, mu):
+        d0, d2 = conversion_diagonals(N, l)
+        S = sp.diags([d0, d2], [0, 2], shape=(N, N), format='csr') * S
+    return S
+
+
+def differentiation(N, lam, k):
+    r"""Return sparse differentiation operator
+
+    The k'th derivative of a :math:`C^{(\lambda)}` series, as a
+    :math:`C^{(\lambda+k)}` series.
+
+    Parameters
+    ----------
+        N : int
+            Number of coefficients
+        lam : int
+              Order of input series
+        k : int
+            Number of derivatives
+    """
+    if k == 0:
+        return sp.identity(N, format='csr')
+    n = np.arange(k, N, dtype=float)
+    if lam == 0:
+        d = n*2**(k-1)*np.prod(np.arange(1, k))
+    else:
+        d = np.full(N-k, 2.**k*np.prod(np.arange(lam, lam+k)))
+    return sp.diags([d], [k], shape=(N, N), format='csr')
+
+
+def multiplication(N, lam, a):
+    r"""Return sparse operator for multiplication with a(x)
+
+    Parameters
+    ----------
+        N : int
+            Number of coefficients
+        lam : int
+              Order of the series
+        a : array
+            Chebyshev coefficients of a(x)
+
+    Note
+    ----
+    The operator is computed with Clenshaw's algorithm, using the recurrence
+    of the multiplication with x. The returned operator is exact for the
+    leading N x N block if the series are padded with len(a) coefficients.
+    """
+    n = np.arange(N, dtype=float)
+    if lam == 0:
+        lower = np.full(N-1, 0.5)
+        lower[0] = 1
+        upper = np.full(N-1, 0.5)
+    else:
+        lower = (n[:-1]+1)/(2*(n[:-1]+lam))
+        upper = (n[1:]+2*lam-1)/(2*(n[1:]+lam))
+    X = sp.diags([lower, upper], [-1, 1], shape=(N, N), format='csr')
+    I = sp.identity(N, format='csr')
+    b1 = sp.csr_matrix((N, N))
+    b2 = sp.csr_matrix((N, N))
+    for aj in a[:0:-1]:
+        b1, b2 = aj*I + 2*X*b1 - b2, b1
+    return a[0]*I + X*b1 - b2
+
+
+def _chebyshev_coefficients(coefficient, base, tol=1e-13):
+    """Return chopped Chebyshev coefficients of variable coefficient"""
+    if callable(coefficient):
+        f = lambda x: coefficient(base.map_true_domain(x))*np.ones(x.shape)
+        deg = 8
+        while True:
+            a = n_cheb.chebinterpolate(f, deg)
+            if np.all(abs(a[-2:]) <= tol*abs(a).max()) or deg >= base.N:
+                break
+            deg *= 2
+    else:
+        a = np.atleast_1d(np.array(coefficient, dtype=float))
+    a = np.where(abs(a) > tol*abs(a).max(), a, 0)
+    nz = np.nonzero(a)[0]
+    return a[:nz[-1]+1] if len(nz) else a[:1]
+
+
+class UltrasphericalMatrix(SpectralMatrix):
+    r"""Inner product matrix of the ultraspherical family
+
+    .. math::
+
+        A_{ij} = (C^{(\mu)}_i, a \frac{d^k C^{(\lambda)}_j}{dx^k})_w
+
+    The matrix is banded for :math:`\mu \ge \lambda + k`, and otherwise
+    computed from Vandermonde matrices.
+
+    Parameters
+    ----------
+        test : 2-tuple of (basis, int)
+               Test basis :math:`C^{(\mu)}`. Cannot be differentiated
+        trial : 2-tuple of (basis, int)
+                Trial basis :math:`C^{(\lambda)}` and k
+        scale : float or array, optional
+                Scale matrix with this constant or array of constants
+        coefficient : callable or array, optional
+                      Variable coefficient a(x) as a function of the true
+                      domain coordinate, or as Chebyshev coefficients on the
+                      reference domain
+    """
+    def __init__(self, test, trial, scale=1.0, coefficient=None):
+        assert isinstance(test[0], UltrasphericalBase)
+        assert isinstance(trial[0], UltrasphericalBase)
+        assert test[1] == 0, 'Test cannot be differentiated (weighted space)'
+        mu, lam, k = test[0].alpha, trial[0].alpha, trial[1]
+        self._coefficient = None
+        a = np.ones(1)
+        if coefficient is not None:
+            a = _chebyshev_coefficients(coefficient, trial[0])
+            self._coefficient = hashlib.sha1(a.view(np.uint8)).hexdigest()[:8]
+
+        N, M = test[0].N, trial[0].N
+        assert N == M
+        if mu >= lam + k:
+            Ne = N + 2*mu + len(a) + 2
+            S = conversion(Ne, lam+k, mu)
+            D = differentiation(Ne, lam, k)
+            if len(a) > 1 or a[0] != 1:
+                D = multiplication(Ne, lam+k, a)*D
+            A = (sp.diags(test[0].norm_squared(), 0)*(S*D)[:N, :N]).tocsr()
+            d = {}
+            for i in np.unique(A.tocoo().col - A.tocoo().row):
+                v = A.diagonal(i)
+                if np.any(v != 0):
+                    d[int(i)] = v
+        else:
+            assert coefficient is None, 'Variable coefficient requires alpha_test >= alpha_trial + k'
+            D = get_dense_matrix(test, trial)[:N, :M]
+            d = dict(extract_diagonal_matrix(D))
+        SpectralMatrix.__init__(self, d, test, trial, scale=scale)
+
+    def get_key(self):
+        key = 'U%d_%d_%dmat' % (self.testfunction[0].alpha,
+                                self.trialfunction[0].alpha,
+                                self.trialfunction[1])
+        if self._coefficient is not None:
+            key += '_' + self._coefficient
+        return key
+
+    def __hash__(self):
+        return hash((self.get_key(), self.shape))
+
+    def get_solver(self):
+        from .la import AlmostBandedSolver
+        return AlmostBandedSolver(self)
+
+
+class _UltraMatDict(dict):
+    """Dictionary of inner product matrices
+
+    All keys return the generic :class:`.UltrasphericalMatrix`.
+
+    """
+
+    def __missing__(self, key):
+        c = UltrasphericalMatrix
+        self[key] = c
+        return c
+
+    def __getitem__(self, key):
+        matrix = dict.__getitem__(self, key)
+        assert key[0][1] == 0, 'Test cannot be differentiated (weighted space)'
+        return matrix
+
+
+mat = _UltraMatDict({})
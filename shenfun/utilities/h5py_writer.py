@@ -53,7 +53,7 @@ class HDF5Writer(object):
         ----
         Fields with names 'name' will be stored under
 
-            - name/{2,3}D/tstep
+            - name/{ndim}D/tstep
 
         """
         assert isinstance(u, np.ndarray)
@@ -142,16 +142,7 @@ class HDF5Writer(object):
         if group not in self.f:
             self.f.create_group(group)
         self.f[group].create_dataset(str(tstep), shape=self.T.shape(spectral), dtype=u.dtype)
-        if self.T.ndim() == 5:
-            self.f["/".join((group, str(tstep)))][s[0], s[1], s[2], s[3], s[4]] = u
-        elif self.T.ndim() == 4:
-            self.f["/".join((group, str(tstep)))][s[0], s[1], s[2], s[3]] = u
-        elif self.T.ndim() == 3:
-            self.f["/".join((group, str(tstep)))][s[0], s[1], s[2]] = u
-        elif self.T.ndim() == 2:
-            self.f["/".join((group, str(tstep)))][s[0], s[1]] = u
-        else:
-            raise NotImplementedError
+        self.f["/".join((group, str(tstep)))][tuple(s)] = u
 
     def _write_slice_group(self, name, slname, ndims, sp, u, sl, sf, inside, tstep):
         group = "/".join((name, "{}D".format(ndims), slname))
@@ -160,10 +151,4 @@ class HDF5Writer(object):
         N = self.T.shape()
         self.f[group].create_dataset(str(tstep), shape=np.take(N, sp), dtype=u.dtype)
         if inside == 1:
-            if len(sf) == 3:
-                self.f["/".join((group, str(tstep)))][sf[0], sf[1], sf[2]] = u[sl]
-            elif len(sf) == 2:
-                self.f["/".join((group, str(tstep)))][sf[0], sf[1]] = u[sl]
-            elif len(sf) == 1:
-                self.f["/".join((group, str(tstep)))][sf[0]] = u[sl]
-
+            self.f["/".join((group, str(tstep)))][tuple(sf)] = u[tuple(sl)]
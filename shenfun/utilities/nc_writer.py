@@ -42,7 +42,7 @@ class NCWriter(object):
         x = T.mesh()
         s = self.T.local_slice(False)
         for i in range(len(x)):
-            xyz = {0:'x', 1:'y', 2:'z'}[i]
+            xyz = 'xyz'[i] if len(x) <= 3 else 'x%d' % i
             self.f.createDimension(xyz, np.squeeze(x[i]).size)
             nc_xyz = self.f.createVariable(xyz, self._dtype, (xyz))
             self.dims.append(xyz)
@@ -77,21 +77,11 @@ class NCWriter(object):
             assert len(self.names) == u.shape[0]
             s = self.T.local_slice(False)
             for i in range(u.shape[0]):
-                if self.T.ndim() == 3:
-                    self.handles[i][it, s[0], s[1], s[2]] = u[i]
-                elif self.T.ndim() == 2:
-                    self.handles[i][it, s[0], s[1]] = u[i]
-                else:
-                    raise NotImplementedError
+                self.handles[i][(it,)+tuple(s)] = u[i]
         else:
             assert len(self.names) == 1
             s = self.T.local_slice(False)
-            if self.T.ndim() == 3:
-                self.handles[0][it, s[0], s[1], s[2]] = u[:]
-            elif self.T.ndim() == 2:
-                self.handles[0][it, s[0], s[1]] = u[:]
-            else:
-                raise NotImplementedError
+            self.handles[0][(it,)+tuple(s)] = u[:]
 
         self.f.sync()
 
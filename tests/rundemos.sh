@@ -33,6 +33,9 @@ python biharmonic2D.py legendre
 python biharmonic3D.py legendre
 
 python dirichlet_dirichlet_poisson2D.py
+python dirichlet_dirichlet_poisson2D.py chebyshev
+python dirichlet_dirichlet_dirichlet_poisson3D.py
+python dirichlet_dirichlet_dirichlet_poisson3D.py 24 chebyshev
 
 python NavierStokes.py
 
@@ -41,6 +44,9 @@ mpirun -np 4 python dirichlet_poisson3D.py 24 chebyshev
 mpirun -np 4 python dirichlet_poisson2D.py 24 legendre
 mpirun -np 4 python dirichlet_poisson3D.py 24 legendre
 
+mpirun -np 4 python dirichlet_dirichlet_dirichlet_poisson3D.py 24 legendre
+mpirun -np 4 python dirichlet_dirichlet_dirichlet_poisson3D.py 24 chebyshev
+
 mpirun -np 4 python dirichlet_Helmholtz2D.py 32 legendre
 mpirun -np 4 python dirichlet_Helmholtz2D.py 32 chebyshev
 
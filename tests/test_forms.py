@@ -107,6 +107,54 @@ def test_index(u):
     assert va1.function_space() is u.function_space()[1]
     assert va2.function_space() is u.function_space()[2]
 
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_expr_operator(family):
+    SD = shenfun.Basis(N, family, bc=(0, 0))
+    K0 = shenfun.Basis(N, 'F', dtype='D')
+    K1 = shenfun.Basis(N, 'F', dtype='d')
+    for bases in ((K0, K1, SD), (SD, shenfun.Basis(N+2, family, bc=(0, 0))), (K0, K1)):
+        T = shenfun.TensorProductSpace(comm, bases)
+        TV = shenfun.VectorTensorProductSpace([T]*T.ndim())
+        u = shenfun.TrialFunction(T)
+        v = shenfun.TestFunction(T)
+        uh = shenfun.Function(T)
+        uh[:] = np.random.random(uh.shape)
+        L = shenfun.ExprOperator(v, shenfun.div(shenfun.grad(u)))
+        assert np.allclose(L(uh), shenfun.inner(v, shenfun.div(shenfun.grad(uh))))
+        w = shenfun.TrialFunction(TV)
+        wh = shenfun.Function(TV)
+        wh[:] = np.random.random(wh.shape)
+        L = shenfun.ExprOperator(v, shenfun.div(w))
+        out = shenfun.Function(T)
+        assert L(wh, out) is out
+        assert np.allclose(out, shenfun.inner(v, shenfun.div(wh)))
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_variable_coefficient(family):
+    SD = shenfun.Basis(N, family, bc=(0, 0))
+    K0 = shenfun.Basis(N, 'F', dtype='d')
+    T = shenfun.TensorProductSpace(comm, (SD, K0))
+    O = shenfun.TensorProductSpace(comm, (shenfun.Basis(N, family, quad=SD.quad), shenfun.Basis(N, 'F', dtype='d')))
+    v = shenfun.TestFunction(T)
+    uh = shenfun.Function(T)
+    uh[:] = np.random.random(uh.shape)
+    uh = T.forward(T.backward(uh), uh)
+    X = T.local_mesh(True)
+    a = 1 + X[0]**2 + np.sin(X[1])
+    f = shenfun.inner(v, shenfun.VariableCoefficient(a, shenfun.div(shenfun.grad(uh))))
+    d2 = shenfun.project(shenfun.div(shenfun.grad(uh)), O).backward()
+    assert np.allclose(f, shenfun.inner(v, shenfun.Array(T, buffer=a*d2)))
+
+    u = shenfun.TrialFunction(T)
+    L = shenfun.inner(v, shenfun.VariableCoefficient(lambda x, y: 1+x**2+np.sin(y), shenfun.div(shenfun.grad(u))))
+    assert np.allclose(L(uh), f)
+
+    # Constant coefficient with padding, where the preconditioner is exact
+    L = shenfun.inner(v, shenfun.VariableCoefficient(2., shenfun.div(shenfun.grad(u)), padding_factor=1.5))
+    f = L(uh)
+    assert np.allclose(f, 2*shenfun.inner(v, shenfun.div(shenfun.grad(uh))))
+    assert np.allclose(L.preconditioner().solve(f.copy()), uh)
+
 if __name__ == '__main__':
     # test_mul(u2)
     # test_imul(u2)
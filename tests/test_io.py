@@ -1,6 +1,20 @@
+import pytest
+import numpy as np
 from shenfun import *
 from mpi4py import MPI
 
+try:
+    import h5py
+    h5py_mpi = h5py.get_config().mpi
+except ImportError:
+    h5py_mpi = False
+
+try:
+    from netCDF4 import Dataset
+    netcdf4 = True
+except ImportError:
+    netcdf4 = False
+
 N = (12, 13, 14, 15)
 comm = MPI.COMM_WORLD
 
@@ -52,6 +66,27 @@ def test_mixed_3D():
     hfile.close()
     generate_xdmf('h5test4.h5')
 
+@pytest.mark.skipif(not h5py_mpi, reason='h5py with MPI support not installed')
+def test_regular_4D():
+    K0 = Basis(N[0], 'F', dtype='D')
+    K1 = Basis(N[1], 'F', dtype='D')
+    K2 = Basis(N[2], 'F', dtype='d')
+    K3 = Basis(N[3], 'C')
+    T = TensorProductSpace(comm, (K0, K1, K2, K3))
+    hfile = HDF5Writer('h5test5.h5', ['u'], T)
+    u = Array(T)
+    u[:] = np.random.random(u.shape)
+    hfile.write_tstep(0, u)
+    hfile.write_slice_tstep(0, [slice(None), 4, slice(None), slice(None)], u)
+    hfile.close()
+    s = T.local_slice(False)
+    with h5py.File('h5test5.h5', 'r') as f:
+        assert np.allclose(f['u/4D/0'][tuple(s)], u)
+        if s[1].start <= 4 < s[1].stop:
+            sl = (s[0], s[2], s[3])
+            assert np.allclose(f['u/3D/slice_4_slice_slice/0'][sl],
+                               u[:, 4-s[1].start])
+
 def test_nc_regular_2D():
     K0 = Basis(N[0], 'F')
     K1 = Basis(N[1], 'C')
@@ -95,3 +130,21 @@ def test_nc_mixed_3D():
     #ncfile.write_slice_tstep(0, [slice(None), 4, slice(None)], uf)
     #ncfile.write_slice_tstep(0, [slice(None), 4, 4], uf)
     ncfile.close()
+
+@pytest.mark.skipif(not netcdf4, reason='netCDF4 not installed')
+def test_nc_regular_4D():
+    K0 = Basis(N[0], 'F', dtype='D')
+    K1 = Basis(N[1], 'F', dtype='D')
+    K2 = Basis(N[2], 'F', dtype='d')
+    K3 = Basis(N[3], 'C')
+    T = TensorProductSpace(comm, (K0, K1, K2, K3))
+    ncfile = NCWriter('nctest5.nc', ['u'], T, clobber=True)
+    u = Array(T)
+    u[:] = np.random.random(u.shape)
+    ncfile.write_tstep(0, u)
+    ncfile.close()
+    s = T.local_slice(False)
+    f = Dataset('nctest5.nc', 'r')
+    assert f['u'].dimensions == ('t', 'x0', 'x1', 'x2', 'x3')
+    assert np.allclose(f['u'][(0,)+tuple(s)], u)
+    f.close()
@@ -10,6 +10,28 @@ N = 32
 
 quads = ('GC', 'GL')
 
+def nonperiodic_space(SD, axis, sizes=(8, 6, 9)):
+    """Return TensorProductSpace with SD along axis, and Fourier elsewhere
+
+    The last of the Fourier bases is real. The axis of SD is transformed
+    last, such that it is not distributed in spectral space, and the solvers
+    along it may be used with MPI.
+    """
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace
+    others = [i for i in range(len(sizes)) if i != axis]
+    bases = [Basis(n, 'F', dtype='D') for n in sizes]
+    bases[others[-1]] = Basis(sizes[others[-1]], 'F', dtype='d')
+    bases[axis] = SD
+    return TensorProductSpace(MPI.COMM_WORLD, bases, axes=[axis]+others)
+
+def assert_batch_solve(H, f, uh):
+    """Assert that H solves the batch [f, 2*f], where uh solves f"""
+    fb = np.array([f, 2*f])
+    wb = H(np.zeros_like(fb), fb)
+    assert np.allclose(wb[0], uh, rtol=1e-12, atol=1e-14)
+    assert np.allclose(wb[1], 2*uh, rtol=1e-12, atol=1e-14)
+
 @pytest.mark.parametrize('quad', quads)
 def test_PDMA(quad):
     SB = Basis(N, 'C', bc='Biharmonic', quad=quad, plan=True)
@@ -60,6 +82,537 @@ def test_solve(quad):
     ww = B.solve(bb, ww, axis=1)
     assert np.all(abs(ww-u_hat[:-2].repeat(N-2).reshape((N-2, N-2)).transpose()) < 1e-8)
 
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('bc', ((0, 0), 'Neumann'))
+def test_solve_complex(family, bc):
+    from shenfun.la import Solve, NeumannSolve
+    SD = Basis(N, family, bc=bc)
+    A = inner(TestFunction(SD), div(grad(TrialFunction(SD))))
+    solvers = [A.solve, (NeumannSolve if bc == 'Neumann' else Solve)(A, SD)]
+    for shape in ((N,), (N, 4)):
+        b = np.random.random(shape) + 1j*np.random.random(shape)
+        b[-2:] = 0
+        for solver in solvers:
+            u = solver(b.copy())
+            assert np.allclose(u, solver(b.real.copy()) + 1j*solver(b.imag.copy()))
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('bc', ((0, 0), 'Biharmonic'))
+def test_linear_operator(family, bc):
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace, LinearOperator
+    SD = Basis(12, family, bc=bc)
+    K1 = Basis(8, 'F', dtype='D')
+    K2 = Basis(9, 'F', dtype='d')
+    T = TensorProductSpace(MPI.COMM_WORLD, (K1, K2, SD))
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if bc == 'Biharmonic':
+        mats = inner(v, div(grad(div(grad(u)))))
+    elif family == 'C':
+        mats = inner(v, div(grad(u)))
+    else:
+        mats = inner(grad(v), grad(u))
+    H = LinearOperator(mats)
+    uh = Function(T)
+    uh[:] = np.random.random(uh.shape)+1j*np.random.random(uh.shape)
+    s = (slice(None), slice(None), SD.slice())
+    uh[s[:2]+(slice(SD.slice().stop, None),)] = 0
+    c0 = np.zeros_like(uh)
+    for mat in mats.values():
+        w = np.zeros_like(uh)
+        c0 += mat.matvec(uh, w, format='csr', axis=mat.axis)
+    c1 = H.matvec(uh, np.zeros_like(uh))
+    assert np.allclose(c0, c1)
+    wh = H.solve(c1, u=Function(T))
+    assert np.allclose(wh[s], uh[s])
+
+    # Reassigned scales are used by later products and solves
+    for t in H.terms:
+        t.scale = 2*t.scale
+    assert np.allclose(H.matvec(uh, np.zeros_like(uh)), 2*c1)
+    wh = H.solve(2*c1, u=Function(T))
+    assert np.allclose(wh[s], uh[s])
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_linear_operator_1D(family):
+    from shenfun import LinearOperator
+    SD = Basis(N, family, bc=(0, 0), plan=True)
+    u = TrialFunction(SD)
+    v = TestFunction(SD)
+    if family == 'C':
+        A = inner(v, div(grad(u)))
+    else:
+        A = inner(grad(v), grad(u))
+    B = inner(v, u)
+    H = A - 2*B
+    assert isinstance(H, SparseMatrix)
+    H = LinearOperator([A, -2*B])
+    assert len(H.terms) == 2
+    H = H + B
+    assert len(H.terms) == 2
+    uh = Function(SD)
+    uh[:-2] = np.random.random(N-2)
+    b = H*uh
+    c = A.matvec(uh, np.zeros(N)) - B.matvec(uh, np.zeros(N))
+    assert np.allclose(b, c)
+    assert np.allclose(H/b, uh)
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_block_solver(family):
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace, LinearOperator, Dx
+    from shenfun.la import BlockSolver
+    K0 = Basis(8, 'F', dtype='D')
+    K1 = Basis(9, 'F', dtype='d')
+    SD = Basis(12, family, bc=(0, 0))
+    # Keep the nonperiodic axis aligned in spectral space
+    T = TensorProductSpace(MPI.COMM_WORLD, (K0, K1, SD), axes=(2, 0, 1))
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if family == 'C':
+        A = inner(v, div(grad(u)))
+    else:
+        A = inner(grad(v), grad(u))
+    B = inner(v, u)
+    C = inner(v, Dx(u, 0, 1))
+    blocks = [[A, C], [C, LinearOperator(A) - B]]
+    M = BlockSolver(blocks)
+    shape = (2,)+T.forward.output_array.shape
+    uh = np.random.random(shape) + 1j*np.random.random(shape)
+    uh[..., -2:] = 0
+    b = np.zeros_like(uh)
+    for i in range(2):
+        for j in range(2):
+            b[i] += LinearOperator(blocks[i][j]).matvec(uh[j], np.zeros_like(uh[j]))
+    wh = M(b, np.zeros_like(b))
+    assert np.allclose(wh, uh)
+
+    # Singular system with fixed mean value
+    SN = Basis(12, family, bc='Neumann')
+    T = TensorProductSpace(MPI.COMM_WORLD, (K1, SN), axes=(1, 0))
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if family == 'C':
+        A = inner(v, div(grad(u)))
+    else:
+        A = inner(grad(v), grad(u))
+    K = T.local_wavenumbers()
+    zero = np.any(K[0] == 0) # Only the rank owning k=0 sees the singular mode
+    if zero:
+        with pytest.raises(RuntimeError):
+            BlockSolver([[A]])
+    M = BlockSolver([[A]], constraints=((0, 0, 0),))
+    uh = np.random.random((1,)+T.forward.output_array.shape)
+    uh[..., -2:] = 0
+    uh[0, 0, 0] = 0
+    b = LinearOperator(A).matvec(uh[0], np.zeros_like(uh[0]))[np.newaxis]
+    wh = M(b.copy())
+    assert np.allclose(wh[..., 1:], uh[..., 1:])
+    assert not zero or abs(wh[0, 0, 0]) < 1e-12
+
+    # Constrain the modes marked by the caller
+    M = BlockSolver([[A]], constraints=((0, 0, 0),), modes=K[0] == 0)
+    assert M.constrained.sum() == np.sum(K[0] == 0)
+    wh = M(b)
+    assert np.allclose(wh[..., 1:], uh[..., 1:])
+    assert not zero or abs(wh[0, 0, 0]) < 1e-12
+
+    # A nearly singular, but valid, system is not constrained
+    u = TrialFunction(SN)
+    v = TestFunction(SN)
+    A = inner(v, div(grad(u))) if family == 'C' else inner(grad(v), grad(u))
+    B = inner(v, u)
+    for eps, constrained in ((0, True), (1e-6, False)):
+        M = BlockSolver([[[A, eps*B]]], constraints=((0, 0, 0),))
+        assert M.constrained[0] == constrained
+        uh = np.random.random(12)
+        uh[-2:] = 0
+        if constrained:
+            uh[0] = 0
+        b = np.zeros(12)
+        b[:-2] = (A.scale*A.diags().toarray() + eps*B.diags().toarray()).dot(uh[:-2])
+        wh = M([b])
+        assert np.allclose(wh[0], uh)
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('bc', ((0, 0), 'Biharmonic'))
+@pytest.mark.parametrize('axis', (0, 1, 2))
+def test_solver_threads(family, bc, axis):
+    from shenfun import LinearOperator
+    from shenfun.optimization import la
+    SD = Basis(12, family, bc=bc)
+    T = nonperiodic_space(SD, axis)
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if bc == 'Biharmonic':
+        mats = inner(v, div(grad(div(grad(u)))))
+    elif family == 'C':
+        mats = inner(v, div(grad(u)))
+    else:
+        mats = inner(grad(v), grad(u))
+    uh = Function(T)
+    uh[:] = np.random.random(uh.shape)+1j*np.random.random(uh.shape)
+    s = [slice(None)]*3
+    s[axis] = slice(SD.slice().stop, None)
+    uh[tuple(s)] = 0
+    H = LinearOperator(mats)
+    f = H.matvec(uh, np.zeros_like(uh), format='csr')
+    num_threads = la.get_num_threads()
+    wh = []
+    for n in (1, 3):
+        la.set_num_threads(n)
+        H = LinearOperator(mats)
+        wh.append(H.solve(f.copy(), u=Function(T)))
+    la.set_num_threads(num_threads)
+    assert np.array_equal(wh[0], wh[1])
+    assert np.allclose(wh[0], uh)
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('bc', ((0, 0), 'Biharmonic'))
+@pytest.mark.parametrize('axis', (0, 1, 2))
+def test_solver_batch(family, bc, axis):
+    from shenfun import LinearOperator
+    SD = Basis(12, family, bc=bc)
+    T = nonperiodic_space(SD, axis)
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if bc == 'Biharmonic':
+        mats = inner(v, div(grad(div(grad(u)))))
+    elif family == 'C':
+        mats = inner(v, div(grad(u)))
+    else:
+        mats = inner(grad(v), grad(u))
+    H = LinearOperator(mats)
+    uh = np.random.random((2, 3)+T.forward.output_array.shape)
+    uh = uh + 1j*np.random.random(uh.shape)
+    s = [slice(None)]*5
+    s[axis+2] = slice(SD.slice().stop, None)
+    uh[tuple(s)] = 0
+    f = np.zeros_like(uh)
+    for i in np.ndindex(uh.shape[:2]):
+        f[i] = H.matvec(uh[i], f[i], format='csr')
+    wh = H.get_solver(3)(f, np.zeros_like(f))
+    assert np.allclose(wh, uh)
+
+    # Batch of 1D problems, and constant coefficient TDMA along any axis
+    SD = Basis(12, family, bc=bc)
+    u, v = TrialFunction(SD), TestFunction(SD)
+    mats = [inner(v, div(grad(u))), inner(v, u)]
+    if bc == 'Biharmonic':
+        mats.append(inner(v, div(grad(div(grad(u))))))
+    H = LinearOperator(mats)
+    uh = np.random.random((4, 12))
+    uh[:, SD.slice().stop:] = 0
+    f = np.array([H.matvec(w, np.zeros_like(w)) for w in uh])
+    assert np.allclose(H.get_solver(1)(f, np.zeros_like(f)), uh)
+    from shenfun.la import TDMA, PDMA as la_PDMA
+    B = mats[1]
+    Solver = TDMA if bc == (0, 0) else la_PDMA
+    b = np.random.random((3, 4, 12, 5))
+    wh = Solver(B)(b.copy(), axis=2)
+    for i in np.ndindex((3, 4)):
+        assert np.allclose(wh[i], Solver(B)(b[i].copy(), axis=0))
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('bc', ((0, 0), 'Biharmonic'))
+@pytest.mark.parametrize('axis', (0, 1, 2, 3))
+def test_solver_4D(family, bc, axis):
+    from shenfun import LinearOperator, chebyshev, legendre
+    SD = Basis(12, family, bc=bc)
+    T = nonperiodic_space(SD, axis, (4, 6, 5, 7))
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if bc == 'Biharmonic':
+        mats = inner(v, div(grad(div(grad(u)))))
+    elif family == 'C':
+        mats = inner(v, div(grad(u)))
+    else:
+        mats = inner(grad(v), grad(u))
+    uh = Function(T)
+    uh[:] = np.random.random(uh.shape)+1j*np.random.random(uh.shape)
+    s = [slice(None)]*4
+    s[axis] = slice(SD.slice().stop, None)
+    uh[tuple(s)] = 0
+    H = LinearOperator(mats)
+    f = H.matvec(uh, np.zeros_like(uh), format='csr')
+    wh = H.solve(f.copy(), u=Function(T))
+    assert np.allclose(wh, uh)
+
+    if bc == (0, 0):
+        mod = chebyshev if family == 'C' else legendre
+        if family == 'C':
+            mats = inner(v, div(grad(u))-u)
+        else:
+            mats = inner(grad(v), grad(u))
+            mats['BDDmat'].scale = mats['BDDmat'].scale + 1
+        f = Function(T)
+        f[:] = np.random.random(f.shape)+1j*np.random.random(f.shape)
+        uh = mod.la.Helmholtz(**mats)(Function(T), f.copy())
+        wh = mod.la.IntegratedHelmholtz(**mats)(Function(T), f.copy())
+        assert np.allclose(wh, uh, rtol=1e-12, atol=1e-14)
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('nonperiodic', (2, 3))
+def test_fast_diagonalization(family, nonperiodic):
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace
+    from shenfun.la import FastDiagonalization
+    bases = [Basis(n, family, bc=(0, 0)) for n in (8, 10, 6)[:nonperiodic]]
+    if nonperiodic == 2:
+        bases.append(Basis(6, 'F', dtype='d'))
+    T = TensorProductSpace(MPI.COMM_WORLD, bases)
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    mats = inner(v, -div(grad(u)))
+    mats += inner(v, 2*u)
+    H = FastDiagonalization(T, mats)
+    uh = Function(T)
+    uh[:] = np.random.random(uh.shape)
+    if uh.dtype.char == 'D':
+        uh.imag[:] = np.random.random(uh.shape)
+    for axis in range(nonperiodic):
+        uh = np.moveaxis(uh, axis, 0)
+        uh[-2:] = 0
+        uh = np.moveaxis(uh, 0, axis)
+
+    # Apply the dense matrices of each term along all nonperiodic axes
+    f = np.zeros_like(uh)
+    for mat in mats:
+        w = uh
+        for axis in range(nonperiodic):
+            M = mat[axis].diags().toarray()*mat[axis].scale
+            w = np.moveaxis(w, axis, 0)
+            z = np.zeros_like(w)
+            z[:M.shape[0]] = np.tensordot(M, w[:M.shape[1]], (1, 0))
+            w = np.moveaxis(z, 0, axis)
+        f += mat['scale']*w
+    f0 = f.copy()
+    assert np.allclose(H(f, np.zeros_like(f)), uh)
+    assert np.allclose(FastDiagonalization(T, mats)(f), uh)
+
+    # The mass matrix may be given by the caller
+    B = [t[0] for t in mats if t[0].trialfunction[1] == 0][0]
+    assert np.allclose(FastDiagonalization(T, mats, mass={0: B.get_key()})(f0), uh)
+    from shenfun.la import _eigen_cache, _eigen_cache_maxsize
+    assert len(_eigen_cache) <= _eigen_cache_maxsize
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_krylov(family):
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace, VariableCoefficient, ExprOperator, \
+        LinearOperator
+    from shenfun.la import CG, GMRES, BiCGStab
+    SD = Basis(16, family, bc=(0, 0))
+    K0 = Basis(8, 'F', dtype='d')
+    T = TensorProductSpace(MPI.COMM_WORLD, (SD, K0))
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    uh = Function(T)
+    uh[:] = np.random.random(uh.shape) + 1j*np.random.random(uh.shape)
+    uh = T.forward(T.backward(uh), uh)
+
+    # Variable coefficient, preconditioned with constant coefficient Helmholtz
+    L = inner(v, VariableCoefficient(lambda x, y: 2+x**2+np.sin(y), div(grad(u))))
+    f = L(uh)
+    for Solver in (GMRES, BiCGStab):
+        solver = Solver(L, L.preconditioner(), rtol=1e-12)
+        wh = solver(f)
+        assert solver.converged
+        assert len(solver.timings) == solver.iterations
+        assert len(solver.residuals) == solver.iterations + 1
+        assert np.allclose(wh, uh)
+
+    if family == 'L':
+        A = ExprOperator(v, -div(grad(u)) + 2*u)
+        f = A(uh)
+        solver = CG(A, rtol=1e-12)
+        assert np.allclose(solver(f), uh)
+        solver = CG(A, LinearOperator(inner(v, -div(grad(u)) + 2*u)), rtol=1e-12)
+        assert np.allclose(solver(f), uh)
+        assert solver.iterations == 1
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_solver_cache(family):
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace, LinearOperator, chebyshev, legendre
+    from shenfun.la import SolverCache
+    SD = Basis(12, family, bc=(0, 0))
+    K0 = Basis(8, 'F', dtype='d')
+    T = TensorProductSpace(MPI.COMM_WORLD, (K0, SD))
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if family == 'C':
+        A = inner(v, div(grad(u)))['ADDmat']
+    else:
+        A = inner(grad(v), grad(u))['ADDmat']
+    A.scale = np.ones((1, 1))
+    B = inner(v, u)
+    Solver = (chebyshev if family == 'C' else legendre).la.Helmholtz
+    cache = SolverCache(maxsize=2)
+    H = {}
+    for dt in (0.1, 0.2, 0.1, 0.3, 0.1):
+        H[dt] = cache(Solver, A, B, np.ones((1, 1)), np.full((5, 1), 1./dt))
+    assert cache.hits == 2 and cache.misses == 3
+    assert len(cache) == 2
+    assert np.all([m[1] > 0 for m in cache.memory()])
+    uh = Function(T)
+    uh[:] = np.random.random(uh.shape)
+    uh[:, -2:] = 0
+    f = LinearOperator([A, B*(1./0.1)]).matvec(uh, Function(T))
+    assert np.allclose(H[0.1](Function(T), f), uh)
+
+    # LinearOperators share factorizations only through a given cache, keyed
+    # on the definition of the bases, not on the instances
+    cache = SolverCache()
+    for i in range(2):
+        LinearOperator(inner(v, div(grad(u))-2*u), cache=cache).get_solver(2)
+    LinearOperator(inner(v, div(grad(u))-2*u)).get_solver(2)
+    T2 = TensorProductSpace(MPI.COMM_WORLD, (Basis(8, 'F', dtype='d'), Basis(12, family, bc=(0, 0))))
+    H2 = LinearOperator(inner(TestFunction(T2), div(grad(TrialFunction(T2)))-2*TrialFunction(T2)),
+                        cache=cache)
+    LinearOperator([H2]).get_solver(2)
+    assert cache.hits == 2 and cache.misses == 1
+
+@pytest.mark.parametrize('bc', ((0, 0), 'Neumann', 'Biharmonic'))
+@pytest.mark.parametrize('axis', (0, 1, 2))
+def test_mixed_precision(bc, axis):
+    from shenfun.chebyshev.la import Helmholtz, Biharmonic
+    T = nonperiodic_space(Basis(24, 'C', bc=bc), axis)
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if bc == 'Biharmonic':
+        mats = inner(v, div(grad(div(grad(u))))+u)
+        Solver = Biharmonic
+    else:
+        mats = inner(v, div(grad(u))-u)
+        Solver = Helmholtz
+    f = Function(T)
+    f[:] = np.random.random(f.shape)+1j*np.random.random(f.shape)
+    uh = Solver(**mats)(Function(T), f.copy())
+    H = Solver(precision='single', tol=1e-13, **mats)
+    assert H.u0.dtype == np.float32
+    wh = H(Function(T), f.copy())
+    assert H.refinement_steps > 0
+    assert len(H.residuals) == H.refinement_steps+1
+    assert np.allclose(wh, uh, rtol=1e-12, atol=1e-14)
+
+    assert_batch_solve(H, f, uh)
+
+    # Data of wrong length along the axis never reaches the Cython solvers
+    s = [slice(None)]*3
+    s[axis] = slice(0, 12)
+    fs = f[tuple(s)].copy()
+    with pytest.raises(AssertionError):
+        H(np.zeros_like(fs), fs)
+
+@pytest.mark.parametrize('bc', ((2, 1), 'Neumann', 'Biharmonic'))
+def test_almost_banded(bc):
+    import sympy as sp
+    from shenfun import LinearOperator
+    from shenfun.ultraspherical.matrices import UltrasphericalMatrix
+    from shenfun.ultraspherical.la import AlmostBandedSolver
+    x = sp.Symbol('x')
+    T = Basis(N, 'U', bc=bc, plan=True)
+    if bc == 'Biharmonic':
+        ue = (1-x**2)**2*sp.sin(2*x)
+        V = Basis(N, 'U', alpha=4, plan=True)
+        mats = inner(TestFunction(V), div(grad(div(grad(TrialFunction(T)))))-2*TrialFunction(T))
+        fe = ue.diff(x, 4) - 2*ue
+    else:
+        ue = sp.cos(sp.pi*x) if bc == 'Neumann' else (3+x)/2 + (1-x**2)*sp.exp(x)
+        V = Basis(N, 'U', alpha=2, plan=True)
+        mats = inner(TestFunction(V), div(grad(TrialFunction(T)))-TrialFunction(T))
+        fe = ue.diff(x, 2) - ue
+    X = T.mesh(N)
+    f_hat = inner(TestFunction(V), Array(V, buffer=sp.lambdify(x, fe)(X)))
+    H = LinearOperator(mats)
+    u_hat = H.solve(f_hat.copy(), u=Function(T))
+    assert np.allclose(T.backward(u_hat), sp.lambdify(x, ue)(X))
+
+    # Compare with dense solve of the boundary bordered system
+    k = len(T.boundary_conditions)
+    A = sum(m.diags().toarray()*m.scale for m in mats.values())
+    h = V.norm_squared()[:N-k]
+    M = np.vstack((T.boundary_matrix(), A[:N-k]/h[:, None]))
+    b = np.concatenate((T.boundary_values(), f_hat[:N-k]/h))
+    assert np.allclose(u_hat, np.linalg.solve(M, b), atol=1e-12)
+
+    # The solution is truncated at the tolerance of the solver
+    S = AlmostBandedSolver(*mats.values(), tol=1e-6)
+    w_hat, n = S.solve(f_hat.copy(), u=Function(T))
+    assert n < N and np.all(w_hat[n:] == 0)
+    assert np.allclose(w_hat, u_hat, atol=1e-5)
+
+    # Variable coefficient ODE (1+x^2) u'' + x u' = f
+    if bc == (2, 1):
+        A = UltrasphericalMatrix((V, 0), (T, 2), coefficient=lambda x: 1+x**2)
+        B = UltrasphericalMatrix((V, 0), (T, 1), coefficient=np.array([0, 1.]))
+        fe = (1+x**2)*ue.diff(x, 2) + x*ue.diff(x)
+        f_hat = inner(TestFunction(V), Array(V, buffer=sp.lambdify(x, fe)(X)))
+        u_hat = LinearOperator([A, B]).solve(f_hat, u=Function(T))
+        assert np.allclose(T.backward(u_hat), sp.lambdify(x, ue)(X))
+
+@pytest.mark.parametrize('axis', (0, 1))
+def test_almost_banded_tensor(axis):
+    from mpi4py import MPI
+    from shenfun import TensorProductSpace, LinearOperator
+    import sympy as sp
+    x, y = sp.symbols('x,y')
+    T = Basis(N, 'U', bc=(0, 0))
+    V = Basis(N, 'U', alpha=2)
+    K = Basis(12, 'F', dtype='d' if axis == 0 else 'D')
+    if axis == 0:
+        TT = TensorProductSpace(MPI.COMM_WORLD, (T, K))
+        VV = TensorProductSpace(MPI.COMM_WORLD, (V, K))
+        ue = (1-x**2)*sp.cos(4*x)*sp.sin(2*y)
+    else:
+        TT = TensorProductSpace(MPI.COMM_WORLD, (K, T), axes=(1, 0))
+        VV = TensorProductSpace(MPI.COMM_WORLD, (K, V), axes=(1, 0))
+        ue = (1-y**2)*sp.cos(4*y)*sp.sin(2*x)
+    fe = ue.diff(x, 2) + ue.diff(y, 2) - 2*ue
+    X = TT.local_mesh(True)
+    fj = Array(VV)
+    fj[:] = sp.lambdify((x, y), fe)(*X)
+    H = LinearOperator(inner(TestFunction(VV), div(grad(TrialFunction(TT)))-2*TrialFunction(TT)))
+    u_hat = H.solve(inner(TestFunction(VV), fj), u=Function(TT))
+    assert np.allclose(TT.backward(u_hat), sp.lambdify((x, y), ue)(*X))
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+@pytest.mark.parametrize('axis', (0, 1, 2))
+def test_integrated_helmholtz(family, axis):
+    from shenfun import chebyshev, legendre
+    mod = chebyshev if family == 'C' else legendre
+    T = nonperiodic_space(Basis(40, family, bc=(0, 0)), axis)
+    u = TrialFunction(T)
+    v = TestFunction(T)
+    if family == 'C':
+        mats = inner(v, div(grad(u))-u)
+    else:
+        mats = inner(grad(v), grad(u))
+        mats['BDDmat'].scale = mats['BDDmat'].scale + 1
+    f = Function(T)
+    f[:] = np.random.random(f.shape)+1j*np.random.random(f.shape)
+    uh = mod.la.Helmholtz(**mats)(Function(T), f.copy())
+    H = mod.la.IntegratedHelmholtz(**mats)
+    wh = H(Function(T), f.copy())
+    assert np.allclose(wh, uh, rtol=1e-12, atol=1e-14)
+
+    assert_batch_solve(H, f, uh)
+
+    # Large N and small alpha/beta in 1D, compared with the dense solve
+    SD = Basis(1000, family, bc=(0, 0))
+    u = TrialFunction(SD)
+    v = TestFunction(SD)
+    A = inner(v, div(grad(u))) if family == 'C' else inner(grad(v), grad(u))
+    B = inner(v, u)
+    sign = 1 if family == 'C' else -1
+    alfa, beta = np.array([sign*1e-6]), np.array([-1.])
+    f = np.random.random(1000)
+    wh = mod.la.IntegratedHelmholtz(A, B, alfa, beta)(np.zeros(1000), f.copy())
+    M = alfa[0]*A.diags().toarray()+beta[0]*B.diags().toarray()
+    ue = solve(M, f[:-2])
+    assert np.linalg.norm(wh[:-2]-ue) < 1e-10*np.linalg.norm(ue)
+
 if __name__ == "__main__":
     test_solve('GC')
-
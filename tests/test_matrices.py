@@ -259,6 +259,68 @@ def test_sub(key, mat, quad):
     mc = m1 - m2
     assert mc.scale == 0.0
 
+@pytest.mark.parametrize('key, mat, quad', mats_and_quads)
+def test_copy_on_write(key, mat, quad):
+    test = key[0]
+    trial = key[1]
+    m = mat((test[0](N, quad=quad), test[1]),
+            (trial[0](N, quad=quad), trial[1]))
+    assert m._solver is None
+    mc = 2*m
+    assert mc.__class__ is m.__class__
+    for key, val in six.iteritems(m):
+        assert mc[key] is val
+    c0 = np.zeros(N)
+    c1 = np.zeros(N)
+    m.matvec(a, c0, format='csr')
+    mc.matvec(a, c1, format='csr')
+    assert np.allclose(c1, 2*c0)
+
+    md = {key: np.array(val, copy=True) for key, val in six.iteritems(m)}
+    mc += shenfun.SparseMatrix({0: 1}, m.shape)
+    for key, val in six.iteritems(m):
+        assert np.allclose(val, md[key])
+    assert m.scale == 1.0
+
+def test_lazy_solver():
+    SD = shenfun.Basis(8, 'C', bc=(0, 0), plan=True)
+    u = shenfun.TrialFunction(SD)
+    v = shenfun.TestFunction(SD)
+    B = shenfun.inner(u, v)
+    assert B._solver is None
+    z = shenfun.Function(SD, val=1)
+    c0 = B.solve(z.copy())
+    assert B._solver is not None
+    B2 = 2*B
+    assert B2._solver is None
+    c1 = B2.solve(z.copy())
+    assert np.allclose(c0, 2*c1)
+
+@pytest.mark.parametrize('alpha', (0, 1, 2, 4))
+@pytest.mark.parametrize('k', (0, 1, 2, 4))
+def test_ultraspherical_mat(alpha, k):
+    from numpy.polynomial import chebyshev as n_cheb
+    from shenfun.ultraspherical import bases as ubases
+    T = ubases.Basis(N)
+    V = ubases.Basis(N, alpha=alpha)
+    A = shenfun.spectralbase.inner_product((V, 0), (T, k))
+    if alpha >= k:
+        assert max(A.keys()) <= 2*alpha-k and min(A.keys()) >= k
+    # Exact quadrature
+    x, w = n_cheb.chebgauss(4*N)
+    w = w*(1-x**2)**alpha
+    P = n_cheb.chebvander(x, N-1)
+    D = np.dot(w*V.get_vandermonde_basis(P).T, T.get_vandermonde_basis_derivative(P, k))
+    assert np.allclose(A.diags().toarray(), D, atol=1e-12*abs(D).max())
+
+    # Variable coefficient
+    if alpha >= k:
+        B = ubases.Basis(N, alpha=alpha)
+        M = shenfun.ultraspherical.UltrasphericalMatrix((B, 0), (T, k), coefficient=lambda x: 1+x**2)
+        D = np.dot(w*(1+x**2)*V.get_vandermonde_basis(P).T, T.get_vandermonde_basis_derivative(P, k))
+        assert np.allclose(M.diags().toarray(), D, atol=1e-12*abs(D).max())
+        assert M.get_key() != A.get_key()
+
 if __name__=='__main__':
     #test_add(*mats_and_quads[0])
     #test_mul2()
@@ -4,8 +4,8 @@ import numpy as np
 from mpi4py import MPI
 from shenfun.chebyshev import bases as cbases
 from shenfun.legendre import bases as lbases
-from shenfun import Function, project, Dx, Array, Basis, TensorProductSpace, \
-   VectorTensorProductSpace, MixedTensorProductSpace
+from shenfun import Function, project, Dx, Array, Basis, TensorProductSpace, Convolve, \
+   VectorTensorProductSpace, MixedTensorProductSpace, PointEvaluator, GridEvaluator
 from sympy import symbols, cos, sin, lambdify
 from itertools import product
 
@@ -356,6 +356,122 @@ def test_project_2dirichlet(quad):
     dxy = duxyl(*X)
     assert np.allclose(dxy, dudxy)
 
+@pytest.mark.parametrize('quad', lquads)
+def test_project_3dirichlet(quad):
+    x, y, z = symbols("x,y,z")
+    ue = (cos(2*y)*sin(2*x)*cos(z))*(1-x**2)*(1-y**2)*(1-z**2)
+    sizes = (20, 21, 22)
+
+    D = [lbases.ShenDirichletBasis(n, quad=quad) for n in sizes]
+    B = [lbases.Basis(n, quad=quad) for n in sizes]
+    DDD = TensorProductSpace(comm, D)
+    BDD = TensorProductSpace(comm, (B[0], D[1], D[2]))
+    BBB = TensorProductSpace(comm, B)
+
+    X = DDD.local_mesh(True)
+    uq = Array(DDD)
+    uq[:] = lambdify((x, y, z), ue, 'numpy')(*X)
+    uh = Function(DDD)
+    uh = DDD.forward(uq, uh)
+
+    dudx_hat = project(Dx(uh, 0, 1), BDD)
+    dudx = Array(BDD)
+    dudx = BDD.backward(dudx_hat, dudx)
+    dx = lambdify((x, y, z), ue.diff(x, 1), 'numpy')(*X)
+    assert np.allclose(dx, dudx)
+
+    dudxyz_hat = project(Dx(uh, 0, 1) + Dx(uh, 1, 1) + Dx(uh, 2, 1), BBB)
+    dudxyz = Array(BBB)
+    dudxyz = BBB.backward(dudxyz_hat, dudxyz)
+    duedxyz = ue.diff(x, 1) + ue.diff(y, 1) + ue.diff(z, 1)
+    dxyz = lambdify((x, y, z), duedxyz, 'numpy')(*X)
+    assert np.allclose(dxyz, dudxyz)
+
+def test_autotune(tmpdir):
+    filename = str(tmpdir.join('autotune.json'))
+    bases = (Basis(12, 'F', dtype='D'), Basis(14, 'C', bc=(0, 0)),
+             Basis(16, 'F', dtype='d'))
+    T = TensorProductSpace(comm, bases, autotune=filename)
+    assert T.axes[-1][-1] == 2
+    assert T.subcomm[2].Get_size() == 1
+    assert T.local_slice(True)[1] == slice(0, 14)
+    u = Array(T)
+    u[:] = random_like(u)
+    u_hat = Function(T)
+    u_hat = T.forward(u, u_hat)
+    u = T.backward(u_hat, u)
+    u_hat2 = Function(T)
+    u_hat2 = T.forward(u, u_hat2)
+    assert allclose(u_hat, u_hat2)
+
+    # Second time the choice is read from file
+    T2 = TensorProductSpace(comm, bases, autotune=filename)
+    assert T2.axes == T.axes
+    assert [c.Get_size() for c in T2.subcomm] == [c.Get_size() for c in T.subcomm]
+    T.destroy()
+    T2.destroy()
+
+    # Padding is part of the key
+    bases = (Basis(12, 'F', dtype='D', padding_factor=1.5), Basis(14, 'C', bc=(0, 0)),
+             Basis(16, 'F', dtype='d', padding_factor=1.5))
+    T = TensorProductSpace(comm, bases, autotune=filename)
+    if comm.Get_rank() == 0:
+        import json
+        with open(filename) as f:
+            assert len(json.load(f)) == 2
+    T.destroy()
+
+@pytest.mark.parametrize('family', ('chebyshev', 'legendre'))
+def test_balance(family):
+    import importlib
+    from shenfun import TestFunction, TrialFunction, inner, div, grad
+    x, y, z = symbols("x,y,z")
+    ue = (cos(2*y) + sin(2*z))*(1-x**2)
+    fe = ue.diff(x, 2) + ue.diff(y, 2) + ue.diff(z, 2)
+    ul = lambdify((x, y, z), ue, 'numpy')
+    fl = lambdify((x, y, z), fe, 'numpy')
+    def get_bases():
+        return (Basis(24, family, bc=(0, 0)), Basis(6, 'F', dtype='D'),
+                Basis(6, 'F', dtype='d'))
+    T0 = TensorProductSpace(comm, get_bases())
+    T = TensorProductSpace(comm, get_bases(), balance=True)
+    assert T.axes[0][-1] == 0
+    assert T.axes[-1][-1] == 2
+    assert T.local_slice(True)[0] == slice(0, 24)
+    # The estimate agrees with the actual distribution
+    axes = [axis for group in T.axes for axis in group]
+    dims = [c.Get_size() for c in T.subcomm]
+    assert comm.allreduce(T.local_work(), op=MPI.MAX) == T._max_work(axes, dims)
+    assert comm.allreduce(T.local_work()) == 22*6*4
+    w0, w = T0.load_imbalance(), T.load_imbalance()
+    assert len(w) == comm.Get_size()
+    assert abs(w.mean()-1) < 1e-12
+    assert w.max() <= w0.max() + 1e-12
+
+    # Solve Poisson's equation on the balanced space
+    X = T.local_mesh(True)
+    v = TestFunction(T)
+    u = TrialFunction(T)
+    fj = Array(T, buffer=fl(*X))
+    if family == 'chebyshev':
+        matrices = inner(v, div(grad(u)))
+        f_hat = inner(v, fj)
+    else:
+        matrices = inner(grad(v), grad(u))
+        f_hat = inner(v, fj)
+        f_hat *= -1
+    H = importlib.import_module('shenfun.'+family).la.Helmholtz(**matrices)
+    u_hat = H(Function(T), f_hat)
+    assert np.allclose(T.backward(u_hat, Array(T)), ul(*X))
+    T0.destroy()
+    T.destroy()
+
+    # Nonperiodic axis is never distributed in spectral space
+    T = TensorProductSpace(comm, (Basis(64, family, bc=(0, 0)), Basis(3, 'F', dtype='D'),
+                                  Basis(3, 'F', dtype='d')), balance=True)
+    assert T.local_slice(True)[0] == slice(0, 64)
+    T.destroy()
+
 @pytest.mark.parametrize('typecode', 'dD')
 @pytest.mark.parametrize('dim', (1, 2))
 @pytest.mark.parametrize('ST,quad', bases_and_quads)
@@ -419,6 +535,223 @@ def test_eval_tensor(typecode, dim, ST, quad):
             bases.pop(axis)
             fft.destroy()
 
+@pytest.mark.parametrize('typecode', 'dD')
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_point_evaluator(typecode, family):
+    x, y, z = symbols("x,y,z")
+    ue = (sin(x)*cos(2*z) + 2)*(1-y**2) + y
+    ul = lambdify((x, y, z), ue, 'numpy')
+    bases = (Basis(16, 'F', dtype='D'), Basis(18, family, bc=(1, -1)),
+             Basis(20, 'F', dtype=typecode))
+    T = TensorProductSpace(comm, bases, axes=(1, 0, 2), dtype=typecode)
+    X = T.local_mesh(True)
+    u_hat = Function(T)
+    u_hat = T.forward(Array(T, buffer=ul(*X).astype(typecode)), u_hat)
+    points = np.random.random((40, 3))
+    points[:, 1] = 2*points[:, 1] - 1
+    points = comm.bcast(points)
+    uq = ul(*points.T)
+    result = u_hat.eval(points)
+    assert np.allclose(uq, result, 0, 1e-8)
+    H = PointEvaluator(T, points, root=0, chunksize=100)
+    result = H(u_hat)
+    if comm.Get_rank() == 0:
+        assert np.allclose(uq, result, 0, 1e-8)
+    T.destroy()
+
+@pytest.mark.parametrize('typecode', 'dD')
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_grid_evaluator(typecode, family):
+    x, y, z = symbols("x,y,z")
+    ue = (sin(x)*cos(2*z) + 2)*(1-y**2) + y
+    ul = lambdify((x, y, z), ue, 'numpy')
+    for slab in (True, False):
+        bases = (Basis(16, 'F', dtype='D'), Basis(18, family, bc=(1, -1)),
+                 Basis(20, 'F', dtype=typecode))
+        T = TensorProductSpace(comm, bases, axes=(1, 0, 2), dtype=typecode, slab=slab)
+        u_hat = Function(T)
+        u_hat = T.forward(Array(T, buffer=ul(*T.local_mesh(True)).astype(typecode)), u_hat)
+        grid = (np.linspace(0, 2*np.pi, 9), np.linspace(-1, 1, 11), np.linspace(0, 2*np.pi, 13))
+        H = GridEvaluator(T, grid)
+        result = H(u_hat)
+        assert result.shape == tuple(s.stop-s.start for s in H.local_slice())
+        assert np.allclose(ul(*H.local_mesh(True)), result, 0, 1e-8)
+        T.destroy()
+        H.destroy()
+
+def test_space_registry():
+    from shenfun.tensorproductspace import space_registry, SpaceRegistry
+    def get_bases(padding_factor=1):
+        return (Basis(8, 'F', dtype='D', padding_factor=padding_factor),
+                Basis(10, 'C', bc=(1, -1)),
+                Basis(12, 'F', dtype='d', padding_factor=padding_factor))
+    n = len(space_registry)
+    T0 = space_registry.get(comm, get_bases())
+    T1 = space_registry.get(comm, get_bases())
+    Tp = space_registry.get(comm, get_bases(1.5))
+    assert T0 is T1
+    assert Tp is not T0
+    assert space_registry.count(T0) == 2
+    assert len(space_registry) == n+2
+    T1.destroy()
+    assert space_registry.count(T0) == 1
+    u = Array(T0)
+    u[:] = random_like(u)
+    u_hat = T0.forward(u, Function(T0))
+    assert allclose(T0.forward(T0.backward(u_hat, Array(T0)), Function(T0)), u_hat)
+    T0.destroy()
+    assert space_registry.count(T0) == 0
+    Tp.destroy()
+
+    # Convolve plans the unpadded space of the padded shape only once
+    Tp = TensorProductSpace(comm, (Basis(8, 'F', dtype='D', padding_factor=1.5),
+                                   Basis(12, 'F', dtype='d', padding_factor=1.5)))
+    C0 = Convolve(Tp)
+    C1 = Convolve(Tp)
+    assert C0.newspace is C1.newspace
+    C0.destroy()
+    C0.destroy()    # Releases only once
+    assert space_registry.count(C1.newspace) == 1
+
+    # Released also without destroy
+    del C1
+    Tp.destroy()
+    assert len(space_registry) == n
+
+    # Array boundary values are keyed on their contents
+    key = lambda val: SpaceRegistry.base_key(Basis(10, 'C', bc=(np.full(4, val), 0)))
+    assert key(1.) == key(1.)
+    assert key(1.) != key(2.)
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_time_dependent_bcs(family):
+    x, y, z, t = symbols("x,y,z,t")
+    ue = (sin(x)*cos(2*z) + 2)*(1-y**2) + (1-y)/2*sin(x)*cos(t) + (1+y)/2*(cos(2*z)+t)
+    bc = (ue.subs(y, 1), ue.subs(y, -1))
+    bases = (Basis(16, 'F', dtype='D'), Basis(18, family, bc=bc),
+             Basis(20, 'F', dtype='d'))
+    T = TensorProductSpace(comm, bases, axes=(1, 0, 2))
+    SD = T.bases[1]
+    SD.bc.update_bcs({t: 0.5})
+    ua = Array(T, buffer=lambdify((x, y, z), ue.subs(t, 0.5), 'numpy')(*T.local_mesh(True)))
+    u_hat = T.forward(ua, Function(T))
+    assert np.allclose(T.backward(u_hat, Array(T)), ua)
+
+    # Compare with the boundary values of a space created for t = 0.5
+    bases = (Basis(16, 'F', dtype='D'), Basis(18, family, bc=tuple(b.subs(t, 0.5) for b in bc)),
+             Basis(20, 'F', dtype='d'))
+    T2 = TensorProductSpace(comm, bases, axes=(1, 0, 2))
+    for i in range(2):
+        assert np.allclose(SD.bc.bcs[i], T2.bases[1].bc.bcs[i])
+        assert np.allclose(SD.bc.bcs_final[i], T2.bases[1].bc.bcs_final[i])
+
+    # Updates leave the arrays of the transforms of T alone
+    T.forward.input_array[...] = 1
+    T.forward.output_array[...] = 2
+    SD.bc.update_bcs({t: 0.7})
+    SD.bc.update_bcs({t: 0.5})
+    assert np.all(T.forward.input_array == 1)
+    assert np.all(T.forward.output_array == 2)
+    for i in range(2):
+        assert np.allclose(SD.bc.bcs_final[i], T2.bases[1].bc.bcs_final[i])
+    T.destroy()
+    T2.destroy()
+
+    # Parameters without values are not silently set to zero
+    a = symbols("a")
+    bases = (Basis(16, 'F', dtype='D'), Basis(18, family, bc=(a*bc[0], bc[1])),
+             Basis(20, 'F', dtype='d'))
+    T = TensorProductSpace(comm, bases, axes=(1, 0, 2))
+    SD = T.bases[1]
+    with pytest.raises(RuntimeError):
+        SD.bc.update_bcs({t: 0.5})
+    SD.bc.update_bcs({t: 0.5, a: 1})
+    for i in range(2):
+        assert np.allclose(SD.bc.bcs_final[i], T2.bases[1].bc.bcs_final[i])
+    T.destroy()
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_4D(family):
+    x, y, z, w = symbols("x,y,z,w")
+    ue = (sin(x)*cos(2*z) + cos(w))*(1-y**2) + y
+    ul = lambdify((x, y, z, w), ue, 'numpy')
+    bases = (Basis(8, 'F', dtype='D'), Basis(14, family, bc=(1, -1)),
+             Basis(6, 'F', dtype='D'), Basis(8, 'F', dtype='d'))
+    T = TensorProductSpace(comm, bases)
+    ua = Array(T, buffer=ul(*T.local_mesh(True)))
+    u_hat = T.forward(ua, Function(T))
+    assert np.allclose(T.backward(u_hat, Array(T)), ua)
+    points = np.random.random((10, 4))
+    points[:, 1] = 2*points[:, 1] - 1
+    points = comm.bcast(points)
+    for cython in (None, True):
+        assert np.allclose(T.eval(points, u_hat, cython=cython), ul(*points.T))
+    T.destroy()
+
+    if family == 'C':
+        # Derivative recurrence along the first axis of arrays of any dimension
+        fk = np.random.random((10, 3, 4, 2))
+        ck = cbases.Basis.derivative_coefficients(fk)
+        for i in np.ndindex(fk.shape[1:]):
+            ci = cbases.Basis.derivative_coefficients(fk[(slice(None),)+i].copy())
+            assert np.allclose(ck[(slice(None),)+i], ci)
+
+@pytest.mark.parametrize('d', (2, 3, 4))
+def test_sparse_grid(d):
+    from shenfun import SparseTensorProductSpace, TestFunction, TrialFunction, \
+        inner, div, grad
+    S = SparseTensorProductSpace(comm, [Basis(32, 'F', dtype='D') for i in range(d)])
+    assert S.shape()[0] < 32**d
+    u_hat = Function(S)
+    u_hat[:] = comm.bcast(random_like(u_hat) + 1j*random_like(u_hat))
+    u = u_hat.backward()
+    assert np.allclose(u, S.eval(np.array(S.mesh()).T, u_hat))
+    assert np.allclose(u.forward(), u_hat)
+
+    # Poisson problem with solution in the hyperbolic cross
+    x = S.mesh()
+    ue = lambda x: np.sin(x[0])*np.cos(2*x[-1]) + np.cos(x[1]+x[0])
+    fe = lambda x: -5*np.sin(x[0])*np.cos(2*x[-1]) - 2*np.cos(x[1]+x[0])
+    v = TestFunction(S)
+    A = inner(v, div(grad(TrialFunction(S))))
+    b = inner(v, Array(S, buffer=fe(x).astype(complex)))
+    u_hat = A.solve(b, Function(S))
+    points = comm.bcast(np.random.random((10, d))*2*np.pi)
+    assert np.allclose(S.eval(points, u_hat), ue(points.T))
+    assert np.allclose(S.norm(u_hat)**2, (2*np.pi)**d*(0.25 + 0.5))
+    S.destroy()
+
+@pytest.mark.parametrize('family', ('C', 'L'))
+def test_regrid(family):
+    x, y, z = symbols("x,y,z")
+    ue = (sin(x)*cos(2*z) + cos(3*z))*(1-y**2) + y
+    ul = lambdify((x, y, z), ue, 'numpy')
+    def space(N, slab):
+        bases = (Basis(N[0], 'F', dtype='D'), Basis(N[1], family, bc=(1, -1)),
+                 Basis(N[2], 'F', dtype='d'))
+        return TensorProductSpace(comm, bases, axes=(1, 0, 2), slab=slab)
+    T0 = space((10, 14, 12), True)
+    T1 = space((17, 20, 18), False)
+    u0 = Function(T0)
+    u0 = T0.forward(Array(T0, buffer=ul(*T0.local_mesh(True))), u0)
+    u1 = u0.refine(T1)
+    ue1 = Function(T1)
+    ue1 = T1.forward(Array(T1, buffer=ul(*T1.local_mesh(True))), ue1)
+    assert np.allclose(u1, ue1, 0, 1e-12)
+    u2 = u1.coarsen(T0)
+    assert np.allclose(u2, u0, 0, 1e-12)
+
+    # Nyquist modes are split and added back for even N
+    K0 = TensorProductSpace(comm, (Basis(8, 'F', dtype='D'), Basis(10, 'F', dtype='D')))
+    K1 = TensorProductSpace(comm, (Basis(13, 'F', dtype='D'), Basis(16, 'F', dtype='D')))
+    v0 = Function(K0)
+    v0[:] = random_like(v0) + 1j*random_like(v0)
+    v1 = v0.refine(K1)
+    v2 = v1.coarsen(K0)
+    assert np.allclose(v0, v2)
+    for T in (T0, T1, K0, K1):
+        T.destroy()
+
 
 if __name__ == '__main__':
     #test_transform('f', 4)
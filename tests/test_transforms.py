@@ -492,6 +492,38 @@ def test_ABBmat(SB, quad):
 
 #test_ABBmat(lbases.ShenBiharmonicBasis, 'LG')
 
+@pytest.mark.parametrize('alpha', (0, 1, 2, 3))
+@pytest.mark.parametrize('quad', cquads)
+@pytest.mark.parametrize('axis', (0, 1, 2))
+def test_ultraspherical_transforms(alpha, quad, axis):
+    from shenfun.ultraspherical import bases as ubases
+    ST = ubases.Basis(N, quad=quad, alpha=alpha, plan=True)
+    points, weights = ST.points_and_weights(N)
+    fl = lambdify(x, sin(2*x)*cos(3*x), 'numpy')
+    fj = fl(points)
+    f_hat = shenfun.Function(ST)
+    f_hat = ST.forward(fj, f_hat)
+    u1 = ST.backward(f_hat, shenfun.Array(ST))
+    assert np.allclose(fj, u1)
+    assert np.allclose(ST.eval(np.array([0.5]), f_hat), fl(0.5))
+
+    # Scalar product is the weighted inner product of the interpolant
+    V = ST.get_vandermonde_basis(ST.vandermonde(points))
+    xx, ww = np.polynomial.chebyshev.chebgauss(2*N)
+    ww = ww*(1-xx**2)**alpha
+    VV = ST.get_vandermonde_basis(ST.vandermonde(xx))
+    c = ST.scalar_product(fj, shenfun.Function(ST))
+    assert np.allclose(c, np.dot(ww*VV.T, np.dot(VV, f_hat)))
+
+    # Multidimensional version
+    bc = [np.newaxis,]*3
+    bc[axis] = slice(None)
+    fj = np.broadcast_to(fj[tuple(bc)], (N,)*3).copy()
+    ST.plan((N,)*3, axis, fj.dtype, {})
+    u00 = ST.forward(fj, shenfun.Function(ST))
+    u11 = ST.backward(u00, shenfun.Array(ST))
+    assert np.allclose(fj, u11)
+
 if __name__ == '__main__':
     #test_convolve(fbases.R2CBasis, 8)
     #test_ADDmat(lbases.ShenNeumannBasis, "GL")